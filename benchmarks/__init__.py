@@ -0,0 +1,6 @@
+"""
+オフラインで実行できるベンチマーク群。
+
+各モジュールは `uv run python benchmarks/<name>.py` でスクリプトとして実行できます。
+実際のLLMやネットワークには接続せず、偽のチャットモデルやツールで計測します。
+"""
@@ -0,0 +1,249 @@
+"""
+台本どおりに応答する偽LLMで、実際の create_agent_graph を多数のターン動かすエンドツーエンドのベンチマーク。
+
+シナリオ（benchmarks/scenarios.py）ごとに以下を計測します。
+  - ターンあたりのフレームワークのオーバーヘッド: ターンの所要時間から、LLM呼び出しとツール実行の時間を除いたもの
+  - ツールのスループット: tools ノードの実行時間1秒あたりのツール呼び出し数
+  - メモリの増加量: tracemalloc で計測した、ベンチマーク開始時から終了時までの増加量（計測用に別途もう一度実行します）
+  - チェックポイントのサイズ: SQLite に保存されたチェックポイントの合計バイト数
+LLMとネットワークには接続しないため、結果はコミット間で比較できます。
+
+使い方:
+    uv run python benchmarks/bench_agent_e2e.py --output before.json
+    uv run python benchmarks/bench_agent_e2e.py --output after.json --compare before.json
+    uv run python benchmarks/bench_agent_e2e.py --scenario long_session --turns 300 --latency 0.05
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import ExitStack, contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+from langchain_core.messages import AIMessage
+
+# Add project root to sys.path for module discovery
+project_root_path = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root_path))
+
+from src.config import Config
+from src.core import agent
+from src.core.checkpointer import create_checkpointer, close_checkpointer
+from src.core.compaction import BackgroundCompactor
+from src.core.tracing import tracer, TurnProfiler
+from benchmarks.bench_checkpoint_size import measure_checkpoint_bytes
+from benchmarks.scenarios import SCENARIOS, Scenario
+from benchmarks.scripted_model import ScriptedChatModel
+
+# 値が大きいほど良い指標（それ以外は小さいほど良い）
+HIGHER_IS_BETTER = {"tool_calls_per_second"}
+
+
+@contextmanager
+def _override(target, **values):
+    """target の属性を一時的に書き換え、終了時に元に戻します。"""
+    previous = {name: getattr(target, name) for name in values}
+    for name, value in values.items():
+        setattr(target, name, value)
+    try:
+        yield
+    finally:
+        for name, value in previous.items():
+            setattr(target, name, value)
+
+
+def _percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _covered_seconds(spans) -> float:
+    """スパンの区間の和集合の長さ（並行に実行されたツールを二重に数えない）。"""
+    total = 0
+    end = None
+    for span in sorted(spans, key=lambda s: s.start_time_ns):
+        if end is None or span.start_time_ns > end:
+            total += span.end_time_ns - span.start_time_ns
+            end = span.end_time_ns
+        elif span.end_time_ns > end:
+            total += span.end_time_ns - end
+            end = span.end_time_ns
+    return total / 1e9
+
+
+def _run_turns(scenario: Scenario, turns: int, latency: float, trace_memory: bool) -> dict:
+    with tempfile.TemporaryDirectory() as tmp, ExitStack() as stack:
+        workdir = Path(tmp) / "workspace"
+        workdir.mkdir()
+        model = ScriptedChatModel(script=scenario.build(workdir, turns), latency=latency)
+        summarizer = ScriptedChatModel(script=[AIMessage(content="これまでの会話の要約: ユーザーの質問に順に回答した。")], latency=latency)
+        config_overrides = {
+            "DEBUG_MODE": False,
+            "WRITE_INNER_THOUGHTS": False,
+            "CHECKPOINT_BACKEND": "sqlite",
+            "CHECKPOINT_DB_PATH": str(Path(tmp) / "checkpoints.sqlite"),
+        }
+        if scenario.context_token_budget is not None:
+            config_overrides["CONTEXT_TOKEN_BUDGET"] = scenario.context_token_budget
+        if scenario.summary_keep_tokens is not None:
+            config_overrides["SUMMARY_KEEP_TOKENS"] = scenario.summary_keep_tokens
+        stack.enter_context(_override(Config, **config_overrides))
+        stack.enter_context(_override(agent, llm_with_tools=model, llm=summarizer, prompt_cache=None))
+
+        checkpointer = create_checkpointer()
+        agent_app = agent.create_agent_graph(checkpointer)
+        compactor = BackgroundCompactor(agent_app)
+        profiler = TurnProfiler()
+        tracer.add_exporter(profiler)
+        stack.callback(tracer.remove_exporter, profiler)
+        config = {"configurable": {"thread_id": f"bench_{scenario.name}"}}
+
+        if trace_memory:
+            gc.collect()
+            tracemalloc.start()
+            memory_start = tracemalloc.get_traced_memory()[0]
+
+        turn_seconds, overhead_seconds, tools_seconds = [], [], 0.0
+        tool_calls = 0
+        start = time.perf_counter()
+        for turn in range(turns):
+            # main.py の chat と同様に、前のターンの要約はユーザーの入力を待つ間に行われる
+            compactor.wait()
+            with tracer.span("turn", "turn") as turn_span:
+                agent_app.invoke({"input": f"ターン {turn} の依頼です。"}, config=config)
+            spans = profiler.take(turn_span.trace_id)
+            work_spans = [span for span in spans if span.kind in ("llm", "tool")]
+            turn_seconds.append(turn_span.duration)
+            overhead_seconds.append(turn_span.duration - _covered_seconds(work_spans))
+            tools_seconds += sum(span.duration for span in spans if span.kind == "node" and span.name == "tools")
+            tool_calls += sum(1 for span in spans if span.kind == "tool")
+            compactor.schedule(config)
+        compactor.close()
+        wall_seconds = time.perf_counter() - start
+
+        if trace_memory:
+            gc.collect()
+            memory_end, memory_peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            return {
+                "memory_growth_kb": (memory_end - memory_start) / 1024,
+                "memory_growth_per_turn_kb": (memory_end - memory_start) / 1024 / turns,
+                "memory_peak_kb": memory_peak / 1024,
+            }
+
+        saver = getattr(checkpointer, "saver", checkpointer)
+        if hasattr(checkpointer, "flush"):
+            checkpointer.flush()
+        checkpoint_bytes, checkpoints = measure_checkpoint_bytes(saver)
+        close_checkpointer(checkpointer)
+        return {
+            "turns": turns,
+            "wall_seconds": wall_seconds,
+            "llm_calls": model.calls,
+            "summaries": summarizer.calls,
+            "tool_calls": tool_calls,
+            "turn_latency_mean_ms": statistics.fmean(turn_seconds) * 1000,
+            "overhead_mean_ms": statistics.fmean(overhead_seconds) * 1000,
+            "overhead_p50_ms": _percentile(overhead_seconds, 0.5) * 1000,
+            "overhead_p95_ms": _percentile(overhead_seconds, 0.95) * 1000,
+            "tool_calls_per_second": tool_calls / tools_seconds if tools_seconds else 0.0,
+            "checkpoint_bytes": checkpoint_bytes,
+            "checkpoint_bytes_per_checkpoint": checkpoint_bytes / checkpoints if checkpoints else 0,
+        }
+
+
+def run_scenario(scenario: Scenario, turns: Optional[int] = None, latency: float = 0.0, measure_memory: bool = True) -> dict:
+    """
+    シナリオを実行し、計測結果を辞書で返します。
+    measure_memory が True の場合、tracemalloc による遅延が時間の計測に影響しないよう、メモリの計測のためにもう一度実行します。
+    """
+    turns = turns or scenario.turns
+    result = _run_turns(scenario, turns, latency, trace_memory=False)
+    if measure_memory:
+        result.update(_run_turns(scenario, turns, latency, trace_memory=True))
+    return result
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=project_root_path, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_benchmarks(scenario_names: list[str], turns: Optional[int] = None, latency: float = 0.0, measure_memory: bool = True) -> dict:
+    """指定したシナリオを順に実行し、比較用のメタデータと共に結果を返します。"""
+    return {
+        "metadata": {
+            "git_revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "latency": latency,
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+        },
+        "scenarios": {name: run_scenario(SCENARIOS[name], turns, latency, measure_memory) for name in scenario_names},
+    }
+
+
+def format_results(results: dict) -> str:
+    lines = [f"リビジョン: {results['metadata']['git_revision']} / LLMの遅延: {results['metadata']['latency']}s"]
+    for name, metrics in results["scenarios"].items():
+        lines.append(f"\n[{name}] {SCENARIOS[name].description if name in SCENARIOS else ''}")
+        for key, value in metrics.items():
+            lines.append(f"  {key:<34} {value:>12.2f}" if isinstance(value, float) else f"  {key:<34} {value:>12}")
+    return "\n".join(lines)
+
+
+def compare_results(baseline: dict, current: dict) -> str:
+    """2つの結果を比較し、指標ごとの変化率を表形式で返します。悪化した指標には '!' を付けます。"""
+    lines = [f"比較: {baseline['metadata']['git_revision']} -> {current['metadata']['git_revision']}"]
+    for name, metrics in current["scenarios"].items():
+        base_metrics = baseline["scenarios"].get(name)
+        if base_metrics is None:
+            continue
+        lines.append(f"\n[{name}]")
+        for key, value in metrics.items():
+            base = base_metrics.get(key)
+            if not isinstance(base, (int, float)) or not base:
+                continue
+            change = (value - base) / base * 100
+            worse = change < 0 if key in HIGHER_IS_BETTER else change > 0
+            marker = "!" if worse and abs(change) >= 10 else " "
+            lines.append(f" {marker}{key:<34} {base:>12.2f} -> {value:>12.2f} ({change:+.1f}%)")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS), help="実行するシナリオ（複数指定可、省略時は全て）")
+    parser.add_argument("--turns", type=int, help="ターン数（省略時はシナリオごとのデフォルト）")
+    parser.add_argument("--latency", type=float, default=0.0, help="LLM呼び出し1回あたりの人工的な遅延（秒）")
+    parser.add_argument("--no-memory", action="store_true", help="メモリの計測（2回目の実行）を省略する")
+    parser.add_argument("--output", help="結果を書き出すJSONファイル")
+    parser.add_argument("--compare", help="比較対象の結果のJSONファイル")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.scenario or list(SCENARIOS), args.turns, args.latency, not args.no_memory)
+    print(format_results(results))
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print("\n" + compare_results(json.load(f), results))
+
+
+if __name__ == "__main__":
+    main()
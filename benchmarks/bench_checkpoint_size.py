@@ -0,0 +1,85 @@
+"""
+チェックポイント1件あたりの保存サイズを、メッセージの重複排除の有無で比較するベンチマーク。
+
+毎ターン「read_file の呼び出し → 大きなファイル内容の ToolMessage → 回答」を行う会話を偽モデルで再現し、
+SQLite のチェックポイント（checkpoints / writes / message_blobs テーブル）の合計バイト数を計測します。
+重複排除なしでは会話履歴がチェックポイントごとに丸ごと複製されるため、1件あたりのサイズがターン数に比例して増えます。
+
+使い方:
+    uv run python benchmarks/bench_checkpoint_size.py --turns 25 --file-kb 8
+"""
+import argparse
+import sys
+import tempfile
+from pathlib import Path
+
+from langchain_core.language_models.fake_chat_models import FakeMessagesListChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.tools import tool
+
+# Add project root to sys.path for module discovery
+project_root_path = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root_path))
+
+from src.config import Config
+from src.core import agent
+from src.core.checkpointer import PrunedSqliteSaver
+
+
+def measure_checkpoint_bytes(saver: PrunedSqliteSaver) -> tuple[int, int]:
+    """(保存されている合計バイト数, チェックポイント数) を返します。"""
+    conn = saver.conn
+    checkpoint_bytes, checkpoints = conn.execute("SELECT COALESCE(SUM(LENGTH(checkpoint)), 0), COUNT(*) FROM checkpoints").fetchone()
+    write_bytes = conn.execute("SELECT COALESCE(SUM(LENGTH(value)), 0) FROM writes").fetchone()[0]
+    blob_bytes = 0
+    if conn.execute("SELECT name FROM sqlite_master WHERE name = 'message_blobs'").fetchone():
+        blob_bytes = conn.execute("SELECT COALESCE(SUM(LENGTH(data)), 0) FROM message_blobs").fetchone()[0]
+    return checkpoint_bytes + write_bytes + blob_bytes, checkpoints
+
+
+def run_session(db_path: str, turns: int, file_kb: int, dedup_messages: bool) -> tuple[int, int]:
+    responses = []
+    for turn in range(turns):
+        responses.append(AIMessage(content="", tool_calls=[{"name": "read_file", "args": {"path": f"file_{turn}.txt"}, "id": f"call_{turn}"}]))
+        responses.append(AIMessage(content=f"file_{turn}.txt を確認しました。"))
+    agent.llm_with_tools = FakeMessagesListChatModel(responses=responses)
+
+    @tool
+    def read_file(path: str) -> str:
+        """偽の read_file"""
+        return (path + "\n") * (file_kb * 1024 // (len(path) + 1))
+
+    agent.tools["read_file"] = read_file
+
+    # 保持数の制限なしで、全チェックポイントの合計サイズを比較する
+    saver = PrunedSqliteSaver.from_path(db_path, keep_last=0, vacuum_interval=0, dedup_messages=dedup_messages)
+    agent_app = agent.create_agent_graph(saver)
+    config = {"configurable": {"thread_id": "bench"}}
+    for turn in range(turns):
+        agent_app.invoke({"input": f"file_{turn}.txt を読んでください"}, config=config)
+    result = measure_checkpoint_bytes(saver)
+    saver.close()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=25, help="会話のターン数")
+    parser.add_argument("--file-kb", type=int, default=8, help="read_file が返す内容のサイズ (KB)")
+    args = parser.parse_args()
+
+    Config.DEBUG_MODE = False
+    Config.WRITE_INNER_THOUGHTS = False
+    Config.CONTEXT_TOKEN_BUDGET = 0
+    agent.prompt_cache = None
+
+    print(f"ターン数: {args.turns} / ファイルサイズ: {args.file_kb}KB")
+    with tempfile.TemporaryDirectory() as tmp:
+        for dedup_messages in (False, True):
+            total, checkpoints = run_session(str(Path(tmp) / f"dedup_{dedup_messages}.sqlite"), args.turns, args.file_kb, dedup_messages)
+            label = "重複排除あり" if dedup_messages else "重複排除なし"
+            print(f"{label}: 合計 {total / 1024:.1f}KB / チェックポイント {checkpoints} 件 / 1件あたり {total / checkpoints / 1024:.1f}KB")
+
+
+if __name__ == "__main__":
+    main()
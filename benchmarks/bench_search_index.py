@@ -0,0 +1,127 @@
+"""
+search_file_content の検索を、トライグラム索引で候補のファイルを絞り込む場合と全てのファイルを走査する場合で比較するベンチマーク。
+
+合成したソースコードのツリー（または --path で指定したディレクトリ）に対して、索引の作成・差分更新にかかる時間と、
+いくつかの正規表現について1回の検索にかかる時間・検索したファイル数を計測します。どちらの方法でも一致した行の数が同じことも確認します。
+
+使い方:
+    uv run python benchmarks/bench_search_index.py --files 3000
+    uv run python benchmarks/bench_search_index.py --path /path/to/repository --repeat 5
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add project root to sys.path for module discovery
+project_root_path = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root_path))
+
+from src.config import Config
+from src.tools import search_engine
+from src.tools.search_index import SearchIndex
+
+DEFAULT_PATTERNS = [
+    r"def handle_request_\d+\(",
+    r"TODO\(owner\d\)",
+    r"class \w+Service\b",
+    r"(?i)deprecated_api",
+    r"return None",
+]
+
+_WORDS = [
+    "request", "response", "session", "client", "server", "config", "handler", "cache", "value", "result",
+    "buffer", "stream", "record", "message", "parser", "token", "index", "state", "event", "worker",
+]
+
+def build_tree(root: Path, files: int, lines: int, seed: int = 0):
+    """
+    ランダムな識別子を含む Python 風のファイルを files 個作成します。
+    DEFAULT_PATTERNS の最後以外に一致する行は、それぞれ約3%のファイルにのみ含まれます（最後のパターンはほぼ全てのファイルに一致）。
+    """
+    rng = random.Random(seed)
+    rare_lines = [
+        lambda a, b, c: f"def handle_request_{rng.randrange(100)}({a}, {b}):",
+        lambda a, b, c: f"    # TODO(owner{rng.randrange(10)}): {a} {b} {c}",
+        lambda a, b, c: f"class {a.title()}{b.title()}Service:",
+        lambda a, b, c: f"    {a}.Deprecated_API({b})",
+    ]
+    for i in range(files):
+        directory = root / f"pkg{i % 40:02}" / f"mod{i % 7}"
+        directory.mkdir(parents=True, exist_ok=True)
+        features = [make for make in rare_lines if rng.random() < 0.03]
+        out = []
+        for line in range(lines):
+            a, b, c = rng.choice(_WORDS), rng.choice(_WORDS), rng.choice(_WORDS)
+            kind = rng.random()
+            if features and kind < 0.01:
+                out.append(rng.choice(features)(a, b, c))
+            elif kind < 0.05:
+                out.append("    return None")
+            else:
+                out.append(f"    {a}_{b} = {c}_{rng.randrange(1000)}({a}, {b}_{rng.randrange(50)})")
+        (directory / f"file_{i}.py").write_text("\n".join(out) + "\n", encoding="utf-8")
+
+def _time_search(pattern: str, root: str, index: SearchIndex | None, repeat: int, workers: int) -> tuple[float, int, int]:
+    """(1回あたりの秒数の中央値, 検索したファイル数, 一致した行の数)"""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        paths = index.candidate_paths(root, pattern) if index is not None else None
+        result = search_engine.search(pattern, root, max_results=10 ** 9, timeout=600, workers=workers, paths=paths)
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples), result.files_scanned, result.match_count
+
+def run(root: str, patterns: list[str], repeat: int, workers: int, db_path: str, modify: bool):
+    index = SearchIndex.from_path(db_path, max_file_bytes=Config.SEARCH_INDEX_MAX_FILE_BYTES)
+    index.add_root(root)
+    stats = index.refresh(root)
+    _, postings = index.stats()
+    index.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    print(f"索引の作成: {stats.files} ファイル / {stats.seconds:.2f}秒 / {postings} トライグラム / {os.path.getsize(db_path) / 1024 / 1024:.1f}MB")
+    print(f"変更なしの差分更新: {index.refresh(root).seconds * 1000:.0f}ms")
+    if modify:
+        # 1%のファイルに追記して、変更されたファイルのみを読み直す差分更新の時間を計測する
+        changed = sorted(str(path) for path in Path(root).rglob("*.py"))[::100]
+        for path in changed:
+            with open(path, "a", encoding="utf-8") as f:
+                f.write("    appended_line = None\n")
+        print(f"{len(changed)} ファイルを変更した後の差分更新: {index.refresh(root).seconds * 1000:.0f}ms")
+
+    print(f"\n{'パターン':<28} {'全走査':>10} {'索引':>10} {'検索したファイル':>18} {'一致':>8}")
+    for pattern in patterns:
+        full_seconds, full_files, full_matches = _time_search(pattern, root, None, repeat, workers)
+        index_seconds, index_files, index_matches = _time_search(pattern, root, index, repeat, workers)
+        assert full_matches == index_matches, f"{pattern}: 結果が一致しません ({full_matches} != {index_matches})"
+        print(
+            f"{pattern:<28} {full_seconds * 1000:>8.0f}ms {index_seconds * 1000:>8.0f}ms "
+            f"{index_files:>8} / {full_files:<8} {index_matches:>8}"
+        )
+    index.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--path", help="検索するディレクトリ（省略した場合は合成したツリー）")
+    parser.add_argument("--files", type=int, default=3000, help="合成するファイル数")
+    parser.add_argument("--lines", type=int, default=300, help="合成するファイルあたりの行数")
+    parser.add_argument("--pattern", action="append", help="検索する正規表現（複数指定可）")
+    parser.add_argument("--repeat", type=int, default=3, help="パターンごとの検索回数（中央値を表示）")
+    parser.add_argument("--workers", type=int, default=Config.SEARCH_WORKERS, help="検索のワーカープロセス数")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = args.path
+        if root is None:
+            root = str(Path(tmp) / "tree")
+            started = time.perf_counter()
+            build_tree(Path(root), args.files, args.lines)
+            print(f"合成したツリー: {args.files} ファイル x {args.lines} 行 ({time.perf_counter() - started:.1f}秒)")
+        run(root, args.pattern or DEFAULT_PATTERNS, args.repeat, args.workers, str(Path(tmp) / "index.sqlite"), modify=args.path is None)
+
+
+if __name__ == "__main__":
+    main()
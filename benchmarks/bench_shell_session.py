@@ -0,0 +1,65 @@
+"""
+run_shell_command の1コマンドあたりのオーバーヘッドを、コマンドごとにシェルを起動する方法と永続的なシェルのセッションで比較するベンチマーク。
+
+短いコマンドを繰り返し実行し、1回あたりの所要時間の中央値と95パーセンタイルを表示します。
+セッション方式ではシェルの起動が不要になるため、差はコマンド自体の実行時間が短いほど大きくなります。
+
+使い方:
+    uv run python benchmarks/bench_shell_session.py
+    uv run python benchmarks/bench_shell_session.py --runs 500
+"""
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add project root to sys.path for module discovery
+project_root_path = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root_path))
+
+from src.tools.shell_process import run_process
+from src.tools.shell_session import ShellSession, is_supported
+
+COMMANDS = {
+    "true": "true",
+    "echo": "echo hello",
+    "ls": "ls",
+    "cd && pwd": "cd .. && cd - > /dev/null && pwd",
+    "python -c pass": f"{sys.executable} -c pass",
+}
+
+_OUTPUT_BYTES = 16 * 1024
+
+def _measure(run, runs: int) -> tuple[float, float]:
+    """(1回あたりの秒数の中央値, 95パーセンタイル)"""
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        run()
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=200, help="コマンドごとの実行回数")
+    args = parser.parse_args()
+    if not is_supported():
+        sys.exit("永続的なシェルのセッションは bash がある POSIX 環境でのみ使用できます。")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        session = ShellSession(tmp)
+        print(f"{'コマンド':<16} {'起動 (中央値/p95)':>22} {'セッション (中央値/p95)':>26} {'倍率':>8}")
+        for name, command in COMMANDS.items():
+            spawn = _measure(lambda: run_process(command, tmp, None, _OUTPUT_BYTES, _OUTPUT_BYTES), args.runs)
+            persistent = _measure(lambda: session.run(command, None, None, _OUTPUT_BYTES, _OUTPUT_BYTES), args.runs)
+            print(
+                f"{name:<16} {spawn[0] * 1000:>9.2f}ms / {spawn[1] * 1000:>6.2f}ms "
+                f"{persistent[0] * 1000:>11.2f}ms / {persistent[1] * 1000:>6.2f}ms {spawn[0] / persistent[0]:>7.1f}x"
+            )
+        session.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+execute_tools の1ターンあたりの実行時間を、逐次実行と並行実行で比較するベンチマーク。
+
+読み取り専用ツールを、指定した遅延でスリープする偽ツールに差し替えて計測します。
+並行実行時の1ターンの所要時間は、最も遅いツール呼び出し程度まで短縮されるはずです。
+
+使い方:
+    uv run python benchmarks/bench_tool_concurrency.py
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+from langchain_core.messages import AIMessage
+from langchain_core.tools import tool
+
+# Add project root to sys.path for module discovery
+project_root_path = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root_path))
+
+from src.config import Config
+from src.core import agent
+
+# 各ツール呼び出しの人工的な遅延（秒）。web_fetch や internet_search のネットワーク待ちを模擬する
+DELAYS = [0.30, 0.10, 0.20, 0.25, 0.15]
+
+
+def _make_sleeping_tool(name: str):
+    @tool(name)
+    def sleeping_tool(delay: float) -> str:
+        """指定秒数スリープする偽ツール"""
+        time.sleep(delay)
+        return f"{name} finished after {delay}s"
+    return sleeping_tool
+
+
+def _run_turn(tool_calls: list[dict], concurrency: int) -> float:
+    Config.MAX_TOOL_CONCURRENCY = concurrency
+    state = {"chat_history": [AIMessage(content="", tool_calls=tool_calls)], "always_allowed_tools": set()}
+    start = time.perf_counter()
+    agent.execute_tools(state)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3, help="計測の繰り返し回数")
+    args = parser.parse_args()
+
+    Config.DEBUG_MODE = False
+    Config.WRITE_INNER_THOUGHTS = False
+
+    tool_names = ["read_file", "web_fetch", "internet_search", "read_many_files", "search_file_content"]
+    for name in tool_names:
+        agent.tools[name] = _make_sleeping_tool(name)
+    tool_calls = [
+        {"name": name, "args": {"delay": delay}, "id": f"call_{i}"}
+        for i, (name, delay) in enumerate(zip(tool_names, DELAYS))
+    ]
+
+    print(f"ツール呼び出し数: {len(tool_calls)} / 合計遅延: {sum(DELAYS):.2f}s / 最大遅延: {max(DELAYS):.2f}s")
+    for concurrency in (1, len(tool_calls)):
+        timings = [_run_turn(tool_calls, concurrency) for _ in range(args.repeat)]
+        label = "逐次実行" if concurrency == 1 else f"並行実行 (上限 {concurrency})"
+        print(f"{label}: 最小 {min(timings):.3f}s / 平均 {sum(timings) / len(timings):.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+web_fetch の本文抽出によるトークン数の削減を、benchmarks/fixtures/web の HTML で計測するベンチマーク。
+
+各ページについて、HTML をそのまま返した場合（raw=True）と本文を抜き出した場合の概算トークン数、削減率、抽出にかかった時間を表示します。
+トークン数は会話履歴の要約の判定と同じ estimate_text_tokens() で数えます。
+
+使い方:
+    uv run python benchmarks/bench_web_extract.py
+    uv run python benchmarks/bench_web_extract.py --show blog_ja.html
+"""
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# Add project root to sys.path for module discovery
+project_root_path = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root_path))
+
+from src.core.token_accounting import estimate_text_tokens
+from src.tools.html_extract import extract_main_content
+
+FIXTURES_DIR = Path(__file__).resolve().parent / "fixtures" / "web"
+
+def _measure(html: str, runs: int) -> float:
+    """抽出1回あたりの秒数の中央値"""
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        extract_main_content(html, "https://example.com/")
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=20, help="ページごとの抽出の実行回数")
+    parser.add_argument("--show", metavar="FILE", help="指定したフィクスチャの抽出結果を表示する")
+    args = parser.parse_args()
+
+    if args.show:
+        page = extract_main_content((FIXTURES_DIR / args.show).read_text(encoding="utf-8"), "https://example.com/")
+        print(f"Title: {page.title}\n\n{page.text}")
+        return
+
+    print(f"{'ページ':<20} {'HTML (トークン)':>16} {'本文 (トークン)':>16} {'削減率':>8} {'倍率':>7} {'抽出時間':>10}")
+    raw_total = extracted_total = 0
+    for path in sorted(FIXTURES_DIR.glob("*.html")):
+        html = path.read_text(encoding="utf-8")
+        page = extract_main_content(html, "https://example.com/")
+        raw_tokens, extracted_tokens = estimate_text_tokens(html), estimate_text_tokens(page.text)
+        raw_total += raw_tokens
+        extracted_total += extracted_tokens
+        print(
+            f"{path.name:<20} {raw_tokens:>16} {extracted_tokens:>16} {1 - extracted_tokens / raw_tokens:>8.0%} "
+            f"{raw_tokens / extracted_tokens:>6.1f}x {_measure(html, args.runs) * 1000:>8.2f}ms"
+        )
+    print(f"{'合計':<20} {raw_total:>16} {extracted_total:>16} {1 - extracted_total / raw_total:>8.0%} {raw_total / extracted_total:>6.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+エンドツーエンドベンチマークのシナリオ。
+
+各シナリオは作業ディレクトリにファイルを用意し、ScriptedChatModel に渡す台本（ターンごとのツール呼び出しと回答）を作成します。
+ツールは偽物ではなく実際の読み取り専用ツール（read_file, search_file_content など）が作業ディレクトリに対して実行されます。
+"""
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Optional
+
+from langchain_core.messages import AIMessage
+
+
+@dataclass
+class Scenario:
+    name: str
+    description: str
+    # デフォルトのターン数
+    turns: int
+    # build(作業ディレクトリ, ターン数) -> 台本。作業ディレクトリに必要なファイルを作成する
+    build: Callable[[Path, int], list[AIMessage]]
+    # 会話履歴の要約を開始するトークン数。None の場合は Config の値を使用する
+    context_token_budget: Optional[int] = None
+    summary_keep_tokens: Optional[int] = None
+
+
+def _tool_call(turn: int, index: int, name: str, **args) -> dict:
+    return {"name": name, "args": args, "id": f"call_{turn}_{index}"}
+
+
+def _build_file_heavy(workdir: Path, turns: int) -> list[AIMessage]:
+    """8KB のファイルを20個用意し、毎ターン3ファイルを並行して読む。"""
+    files = []
+    for i in range(20):
+        path = workdir / f"module_{i:02d}.py"
+        path.write_text("".join(f"def function_{i}_{line}(value):\n    return value * {line}\n" for line in range(200)), encoding="utf-8")
+        files.append(path)
+    script = []
+    for turn in range(turns):
+        tool_calls = [_tool_call(turn, k, "read_file", path=str(files[(turn * 3 + k) % len(files)])) for k in range(3)]
+        script.append(AIMessage(content="ファイルを確認します。", tool_calls=tool_calls))
+        script.append(AIMessage(content=f"{len(tool_calls)} 個のファイルを確認しました。関数の定義に問題はありません。"))
+    return script
+
+
+def _build_search_heavy(workdir: Path, turns: int) -> list[AIMessage]:
+    """10ディレクトリ × 20ファイルのツリーを用意し、毎ターン全体を正規表現で検索してディレクトリを一覧する。"""
+    for d in range(10):
+        directory = workdir / f"package_{d}"
+        directory.mkdir()
+        for f in range(20):
+            lines = [f"line {n} of file {f} in package {d}\n" for n in range(60)]
+            lines[(d + f) % 60] = f"# TODO-{(d * 20 + f) % 10}: refactor this block\n"
+            (directory / f"file_{f:02d}.txt").write_text("".join(lines), encoding="utf-8")
+    script = []
+    for turn in range(turns):
+        tool_calls = [
+            _tool_call(turn, 0, "search_file_content", pattern=f"TODO-{turn % 10}\\b", path=str(workdir)),
+            _tool_call(turn, 1, "list_directory_contents", path=str(workdir / f"package_{turn % 10}")),
+        ]
+        script.append(AIMessage(content="", tool_calls=tool_calls))
+        script.append(AIMessage(content=f"TODO-{turn % 10} の箇所を一覧しました。"))
+    return script
+
+
+def _build_long_session(workdir: Path, turns: int) -> list[AIMessage]:
+    """ツールを使わない短い応答を多数のターン繰り返し、会話履歴の要約を何度も発生させる。"""
+    return [AIMessage(content=f"ターン {turn} の質問への回答です。" + "補足説明。" * 40) for turn in range(turns)]
+
+
+SCENARIOS = {
+    scenario.name: scenario
+    for scenario in [
+        Scenario("file_heavy", "毎ターン3ファイル (各8KB) を read_file で並行して読む", 30, _build_file_heavy),
+        Scenario("search_heavy", "毎ターン200ファイルを search_file_content で検索し、ディレクトリを一覧する", 30, _build_search_heavy),
+        Scenario(
+            "long_session", "ツールなしの短い応答を多数のターン繰り返し、バックグラウンドで要約する", 150, _build_long_session,
+            context_token_budget=4000, summary_keep_tokens=1500,
+        ),
+    ]
+}
@@ -0,0 +1,52 @@
+"""
+台本どおりの応答を返す偽チャットモデル。
+
+ベンチマークやテストで実際の create_agent_graph を動かすために、LLMの代わりに使用します。
+"""
+import time
+from typing import Any
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from src.core.token_accounting import message_text
+
+
+def estimate_tokens(text: str) -> int:
+    """usage_metadata に記録するおおよそのトークン数（4文字で1トークン）。"""
+    return max(1, len(text) // 4)
+
+
+class ScriptedChatModel(BaseChatModel):
+    """
+    script の応答を呼び出し順に返す偽チャットモデル。
+
+    呼び出しごとに latency 秒待機して、実際のLLMの応答時間を模擬します。
+    応答は毎回新しいメッセージとして返され（同じ id のメッセージが履歴に重複しないように）、
+    入力と出力の文字数から見積もった usage_metadata が付与されます。
+    script を使い切った場合は先頭から繰り返します。
+    """
+    script: list[AIMessage]
+    latency: float = 0.0
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted-fake"
+
+    def _next_response(self, messages: list[BaseMessage]) -> AIMessage:
+        response = self.script[self.calls % len(self.script)]
+        self.calls += 1
+        input_tokens = sum(estimate_tokens(message_text(m)) for m in messages)
+        output_tokens = estimate_tokens(message_text(response)) + 20 * len(response.tool_calls)
+        return AIMessage(
+            content=response.content,
+            tool_calls=response.tool_calls,
+            usage_metadata={"input_tokens": input_tokens, "output_tokens": output_tokens, "total_tokens": input_tokens + output_tokens},
+        )
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        if self.latency:
+            time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._next_response(messages))])
@@ -1,44 +1,302 @@
+import asyncio
 import typer
 import os
 import sys
+import uuid
+from datetime import datetime
 from pathlib import Path
-from langchain_core.messages import BaseMessage, AIMessage
+from typing import Optional
+from langchain_core.messages import AIMessage
 
 # Add project root to sys.path for module discovery
 current_file_path = Path(__file__).resolve()
 project_root_path = current_file_path.parent
 sys.path.append(str(project_root_path))
 
-from src.core.agent import create_agent_graph
+from src.core.agent import create_agent_graph, llm_cache
+from src.core.checkpointer import create_checkpointer, close_checkpointer
+from src.core.compaction import BackgroundCompactor
+from src.core.llm_cache import SqliteLLMCache
+from src.core.streaming import StreamCallbacks, TurnMetrics, stream_turn, astream_turn
+from src.core.tracing import tracer, JsonlSpanExporter, TurnProfiler, format_turn_profile
+from src.tools import http_client
+from src.tools.file_cache import file_cache
+from src.tools.search_index import SearchIndex
+from src.config import Config
+from src.logging_config import logger
 
 app = typer.Typer()
 
+@app.callback(invoke_without_command=True)
+def main(ctx: typer.Context):
+    """
+    サブコマンドが指定されていない場合は chat を開始します。
+    """
+    if ctx.invoked_subcommand is None:
+        chat(stream=True, thread_id=None, profile=False)
+
+class _ConsoleStreamPrinter:
+    """ストリーミング中のトークンとツールイベントをコンソールに逐次表示します。"""
+
+    def __init__(self):
+        self.current_step = None
+
+    def on_token(self, text: str, step: int):
+        if self.current_step != step:
+            # 新しいLLM呼び出しの出力は改行して表示する
+            prefix = "AI: " if self.current_step is None else "\nAI: "
+            typer.echo(prefix, nl=False)
+            self.current_step = step
+        typer.echo(text, nl=False)
+
+    def on_tool_event(self, event: dict):
+        if self.current_step is not None:
+            typer.echo("")
+            self.current_step = None
+        if event["event"] == "tool_start":
+            typer.echo(f"[ツール開始] {event['tool']}")
+        else:
+            typer.echo(f"[ツール完了] {event['tool']} ({event.get('duration', 0.0):.2f}秒)")
+
+    def callbacks(self) -> StreamCallbacks:
+        return StreamCallbacks(on_token=self.on_token, on_tool_event=self.on_tool_event)
+
+    def finish(self, final_ai_message, metrics: TurnMetrics):
+        if self.current_step is not None:
+            typer.echo("")
+        elif isinstance(final_ai_message, AIMessage):
+            # トークンが一つもストリーミングされなかった場合は最終応答をまとめて表示する
+            typer.echo(f"AI: {final_ai_message.content}")
+        _report_turn_metrics(metrics)
+
+def _report_turn_metrics(metrics: TurnMetrics):
+    ttft = f"{metrics.time_to_first_token:.2f}秒" if metrics.time_to_first_token is not None else "-"
+    typer.echo(f"(最初のトークンまで: {ttft} / ターン合計: {metrics.total_latency:.2f}秒 / ツール呼び出し: {metrics.tool_calls}回)")
+    logger.debug(
+        "Turn metrics: time_to_first_token=%s total_latency=%.3f tool_calls=%d token_chunks=%d",
+        metrics.time_to_first_token, metrics.total_latency, metrics.tool_calls, metrics.token_chunks,
+    )
+
+def _session_thread_id(thread_id: Optional[str]) -> str:
+    """--thread-id が指定されていなければ、新しい会話のスレッドIDを作成して表示します。"""
+    if thread_id is not None:
+        return thread_id
+    thread_id = f"{datetime.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:8]}"
+    typer.echo(f"新しい会話を開始します（スレッドID: {thread_id}。--thread-id {thread_id} で再開できます）。")
+    return thread_id
+
+def _report_resumed_session(snapshot, thread_id: str):
+    """保存済みの会話があれば、再開したことを表示します。"""
+    history = snapshot.values.get("chat_history", []) if snapshot.values else []
+    if history or (snapshot.values and snapshot.values.get("conversation_summary")):
+        typer.echo(f"スレッド '{thread_id}' の会話を再開します（履歴 {len(history)} 件）。")
+
+def _turn_input(user_input: str, first_turn: bool) -> dict:
+    """
+    ターンの入力。プロセスの最初のターンでは always_allowed_tools をリセットし、
+    再開した会話のチェックポイントに残っている以前のプロセスの「常に許可」を引き継がないようにします。
+    """
+    if first_turn:
+        return {"input": user_input, "always_allowed_tools": None}
+    return {"input": user_input}
+
+DEFAULT_TRACE_FILE = "logs/traces.jsonl"
+
+def _start_tracing(profile: bool) -> tuple[list, Optional[TurnProfiler]]:
+    """
+    TRACE_FILE または --profile が指定されていればトレースの出力先を登録します。
+    (登録した出力先のリスト, --profile 用のプロファイラ) を返します。
+    """
+    exporters = []
+    profiler = None
+    if Config.TRACE_FILE or profile:
+        exporters.append(JsonlSpanExporter(Config.TRACE_FILE or DEFAULT_TRACE_FILE))
+    if profile:
+        profiler = TurnProfiler()
+        exporters.append(profiler)
+    for exporter in exporters:
+        tracer.add_exporter(exporter)
+    return exporters, profiler
+
+def _stop_tracing(exporters: list):
+    for exporter in exporters:
+        tracer.remove_exporter(exporter)
+        if isinstance(exporter, JsonlSpanExporter):
+            exporter.close()
+
+def _report_cache_stats():
+    """
+    ファイルキャッシュのヒット率をログに記録し、LLM応答キャッシュが有効な場合はこのセッションでのヒット・ミスの回数を表示します。
+    """
+    file_stats = file_cache.stats()
+    logger.info(
+        "File cache stats: hits=%d misses=%d hit_rate=%.2f invalidations=%d evictions=%d entries=%d bytes=%d",
+        file_stats.hits, file_stats.misses, file_stats.hit_rate, file_stats.invalidations, file_stats.evictions,
+        file_stats.entries, file_stats.total_bytes,
+    )
+    if llm_cache is None:
+        return
+    stats = llm_cache.stats()
+    typer.echo(f"LLMキャッシュ: ヒット {stats.hits}回 / ミス {stats.misses}回 (ヒット率 {stats.hit_rate:.0%})")
+    logger.info("LLM cache stats: hits=%d misses=%d evictions=%d entries=%d", stats.hits, stats.misses, stats.evictions, stats.entries)
+
+def _report_turn_profile(profiler: Optional[TurnProfiler], turn_span):
+    if profiler is not None:
+        typer.echo(format_turn_profile(profiler.take(turn_span.trace_id)))
+
+_STREAM_OPTION = typer.Option(True, "--stream/--no-stream", help="応答をトークン単位で逐次表示し、ターンごとのレイテンシを表示します。")
+_THREAD_ID_OPTION = typer.Option(None, "--thread-id", help="会話のスレッドID。同じIDを指定すると保存済みの会話を再開します（省略時は新しい会話を開始します）。")
+_PROFILE_OPTION = typer.Option(False, "--profile", help="ターンごとにノード・LLM呼び出し・ツール実行・承認待ちの所要時間とトークン数の内訳を表示し、トレースを記録します。")
+
 @app.command()
-def chat():
+def chat(stream: bool = _STREAM_OPTION, thread_id: Optional[str] = _THREAD_ID_OPTION, profile: bool = _PROFILE_OPTION):
     """
     CLI AIアシスタントと会話します。
     """
     typer.echo("CLI AIアシスタントと会話を開始します。終了するには 'exit' と入力してください。")
-    agent_app = create_agent_graph()
-    
+    checkpointer = create_checkpointer()
+    agent_app = create_agent_graph(checkpointer)
+    # 応答の表示後に、ユーザーの入力を待つ間に会話履歴を要約する
+    compactor = BackgroundCompactor(agent_app)
+    exporters, profiler = _start_tracing(profile)
+
     # 会話のスレッドIDを定義
-    config = {"configurable": {"thread_id": "main_chat_session"}}
-
-    while True:
-        user_input = input("あなた: ")
-        if user_input.lower() == "exit":
-            typer.echo("会話を終了します。")
-            break
-
-        # エージェントを呼び出し、応答を取得
-        # input と chat_history は LangGraph の State に自動的にマージされる
-        initial_state = {"input": user_input}
-        result = agent_app.invoke(initial_state, config=config)
-        
-        # エージェントの最終応答を表示
-        final_ai_message = result.get("chat_history", [])[-1]
-        if isinstance(final_ai_message, AIMessage):
-            typer.echo(f"AI: {final_ai_message.content}")
+    thread_id = _session_thread_id(thread_id)
+    config = {"configurable": {"thread_id": thread_id}}
+    _report_resumed_session(agent_app.get_state(config), thread_id)
+
+    first_turn = True
+    try:
+        while True:
+            user_input = input("あなた: ")
+            if user_input.lower() == "exit":
+                typer.echo("会話を終了します。")
+                break
+
+            # 前のターンの要約が終わっていなければ、反映されるまで待つ
+            compactor.wait()
+
+            # エージェントを呼び出し、応答を取得
+            # input と chat_history は LangGraph の State に自動的にマージされる
+            initial_state = _turn_input(user_input, first_turn)
+            with tracer.span("turn", "turn", **{"session.thread_id": thread_id}) as turn_span:
+                if stream:
+                    printer = _ConsoleStreamPrinter()
+                    final_ai_message, metrics = stream_turn(agent_app, initial_state, config, printer.callbacks())
+                    printer.finish(final_ai_message, metrics)
+                else:
+                    result = agent_app.invoke(initial_state, config=config)
+
+                    # エージェントの最終応答を表示
+                    final_ai_message = result.get("chat_history", [])[-1]
+                    if isinstance(final_ai_message, AIMessage):
+                        typer.echo(f"AI: {final_ai_message.content}")
+            _report_turn_profile(profiler, turn_span)
+            first_turn = False
+            compactor.schedule(config)
+    finally:
+        # 要約と未保存のチェックポイントを反映してから終了する
+        compactor.close()
+        close_checkpointer(checkpointer)
+        _stop_tracing(exporters)
+        _report_cache_stats()
+
+async def _achat_loop(stream: bool, thread_id: Optional[str], profile: bool):
+    checkpointer = create_checkpointer()
+    agent_app = create_agent_graph(checkpointer)
+    compactor = BackgroundCompactor(agent_app)
+    exporters, profiler = _start_tracing(profile)
+    thread_id = _session_thread_id(thread_id)
+    config = {"configurable": {"thread_id": thread_id}}
+    _report_resumed_session(await agent_app.aget_state(config), thread_id)
+
+    first_turn = True
+    try:
+        while True:
+            # input() はブロッキングのため、イベントループを止めないよう別スレッドで待機する
+            user_input = await asyncio.to_thread(input, "あなた: ")
+            if user_input.lower() == "exit":
+                typer.echo("会話を終了します。")
+                break
+
+            await compactor.await_pending()
+
+            initial_state = _turn_input(user_input, first_turn)
+            with tracer.span("turn", "turn", **{"session.thread_id": thread_id}) as turn_span:
+                if stream:
+                    printer = _ConsoleStreamPrinter()
+                    final_ai_message, metrics = await astream_turn(agent_app, initial_state, config, printer.callbacks())
+                    printer.finish(final_ai_message, metrics)
+                else:
+                    result = await agent_app.ainvoke(initial_state, config=config)
+
+                    final_ai_message = result.get("chat_history", [])[-1]
+                    if isinstance(final_ai_message, AIMessage):
+                        typer.echo(f"AI: {final_ai_message.content}")
+            _report_turn_profile(profiler, turn_span)
+            first_turn = False
+            compactor.aschedule(config)
+    finally:
+        await compactor.await_pending()
+        await http_client.aclose()
+        compactor.close()
+        close_checkpointer(checkpointer)
+        _stop_tracing(exporters)
+        _report_cache_stats()
+
+@app.command()
+def achat(stream: bool = _STREAM_OPTION, thread_id: Optional[str] = _THREAD_ID_OPTION, profile: bool = _PROFILE_OPTION):
+    """
+    CLI AIアシスタントと非同期モード (asyncio) で会話します。
+    """
+    typer.echo("CLI AIアシスタントと非同期モードで会話を開始します。終了するには 'exit' と入力してください。")
+    asyncio.run(_achat_loop(stream, thread_id, profile))
+
+@app.command("llm-cache")
+def llm_cache_command(
+    clear: bool = typer.Option(False, "--clear", help="保存されている応答を全て削除します。"),
+    export: Optional[str] = typer.Option(None, "--export", help="保存されている応答を JSONL ファイルに書き出します。"),
+    seed: Optional[str] = typer.Option(None, "--seed", help="記録済みのセッション（--export で書き出した JSONL）を読み込みます。"),
+):
+    """
+    LLM応答キャッシュ (LLM_CACHE_PATH) の状態を表示し、削除・書き出し・読み込みを行います。
+    """
+    cache = SqliteLLMCache.from_path(Config.LLM_CACHE_PATH, max_entries=Config.LLM_CACHE_MAX_ENTRIES, ttl_seconds=Config.LLM_CACHE_TTL)
+    try:
+        if clear:
+            cache.clear()
+            typer.echo("LLMキャッシュを削除しました。")
+        if seed:
+            typer.echo(f"{cache.seed_from_jsonl(seed)} 件の応答を {seed} から読み込みました。")
+        if export:
+            typer.echo(f"{cache.export_jsonl(export)} 件の応答を {export} に書き出しました。")
+        stats = cache.stats()
+        typer.echo(f"{Config.LLM_CACHE_PATH}: {stats.entries} 件 ({stats.total_bytes / 1024:.1f}KB)")
+    finally:
+        cache.close()
+
+@app.command("index")
+def index_command(
+    path: str = typer.Argument(".", help="索引を作成するディレクトリ。"),
+    rebuild: bool = typer.Option(False, "--rebuild", help="既存の索引を破棄して作り直します。"),
+):
+    """
+    search_file_content の検索索引 (SEARCH_INDEX_PATH) を作成・更新します。
+    2回目以降は変更・追加・削除されたファイルのみを反映します。
+    """
+    index = SearchIndex.from_path(Config.SEARCH_INDEX_PATH, max_file_bytes=Config.SEARCH_INDEX_MAX_FILE_BYTES)
+    try:
+        if rebuild:
+            index.invalidate(path)
+        index.add_root(path)
+        stats = index.refresh(path)
+        files, postings = index.stats()
+    finally:
+        index.close()
+    typer.echo(
+        f"{os.path.abspath(path)}: {stats.files} ファイル中 {stats.indexed} 件を索引に追加・更新し、{stats.removed} 件を削除しました ({stats.seconds:.2f}秒)。"
+    )
+    typer.echo(f"{Config.SEARCH_INDEX_PATH}: {files} ファイル / {postings} トライグラム ({os.path.getsize(Config.SEARCH_INDEX_PATH) / 1024 / 1024:.1f}MB)")
 
 if __name__ == "__main__":
-    app()
\ No newline at end of file
+    app()
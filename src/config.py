@@ -15,13 +15,100 @@ class Config: # クラス名を変更
     API_BASE: Optional[str] = os.getenv("GEMINI_API_BASE")
     TAVILY_API_KEY: Optional[str] = os.getenv("TAVILY_API_KEY")
 
+    # GEMINI_CONTEXT_CACHE: 不変のシステムプロンプトとツール定義を Gemini の明示的コンテキストキャッシュに載せるかどうか。
+    GEMINI_CONTEXT_CACHE: bool = os.getenv("GEMINI_CONTEXT_CACHE", "false").lower() in ("1", "true", "yes")
+    # GEMINI_CONTEXT_CACHE_TTL: コンテキストキャッシュの有効期間（秒）。
+    GEMINI_CONTEXT_CACHE_TTL: int = int(os.getenv("GEMINI_CONTEXT_CACHE_TTL", "3600"))
+
     # 会話履歴設定
-    # MAX_CONVERSATION_TURNS: 会話履歴がこのターン数を超えたら要約を開始する。0の場合は要約しない。
-    MAX_CONVERSATION_TURNS: int = int(os.getenv("MAX_CONVERSATION_TURNS", "10"))
-    # SUMMARY_CONVERSATION_TURNS: 要約後に保持する会話のターン数。
-    SUMMARY_CONVERSATION_TURNS: int = int(os.getenv("SUMMARY_CONVERSATION_TURNS", "5"))
+    # CONTEXT_TOKEN_BUDGET: 会話履歴のトークン数がこの値以上になったら要約を開始する。0の場合は要約しない。
+    CONTEXT_TOKEN_BUDGET: int = int(os.getenv("CONTEXT_TOKEN_BUDGET", "32000"))
+    # SUMMARY_KEEP_TOKENS: 要約後に詳細なまま保持する最新の会話のトークン数の目安。
+    SUMMARY_KEEP_TOKENS: int = int(os.getenv("SUMMARY_KEEP_TOKENS", "8000"))
+
+    # チェックポイント（会話状態の保存）設定
+    # CHECKPOINT_BACKEND: "sqlite" の場合は会話をファイルに保存し、同じスレッドIDで再開できる。"memory" の場合はプロセス終了時に失われる。
+    CHECKPOINT_BACKEND: str = os.getenv("CHECKPOINT_BACKEND", "sqlite")
+    # CHECKPOINT_DB_PATH: SQLite のデータベースファイルのパス。
+    CHECKPOINT_DB_PATH: str = os.getenv("CHECKPOINT_DB_PATH", "checkpoints/checkpoints.sqlite")
+    # CHECKPOINT_KEEP_LAST: スレッドごとに保持する最新のチェックポイント数。0の場合はすべて保持する。
+    CHECKPOINT_KEEP_LAST: int = int(os.getenv("CHECKPOINT_KEEP_LAST", "20"))
+    # CHECKPOINT_VACUUM_INTERVAL: この回数チェックポイントを保存するごとに VACUUM を実行する。0の場合は実行しない。
+    CHECKPOINT_VACUUM_INTERVAL: int = int(os.getenv("CHECKPOINT_VACUUM_INTERVAL", "500"))
+    # CHECKPOINT_DEDUP_MESSAGES: メッセージの本体を内容のハッシュで一度だけ保存し、チェックポイントには参照のみを書き込むかどうか。
+    CHECKPOINT_DEDUP_MESSAGES: bool = os.getenv("CHECKPOINT_DEDUP_MESSAGES", "true").lower() in ("1", "true", "yes")
+    # CHECKPOINT_WRITE_BEHIND: チェックポイントの書き込みをバックグラウンドでまとめて行うかどうか。
+    CHECKPOINT_WRITE_BEHIND: bool = os.getenv("CHECKPOINT_WRITE_BEHIND", "true").lower() in ("1", "true", "yes")
+
+    # LLM応答キャッシュ設定
+    # LLM_CACHE: temperature=0 の同じ依頼を再実行する場合（CIやデモ）に、LLMの応答を SQLite にキャッシュするかどうか。
+    LLM_CACHE: bool = os.getenv("LLM_CACHE", "false").lower() in ("1", "true", "yes")
+    # LLM_CACHE_PATH: キャッシュのデータベースファイルのパス。
+    LLM_CACHE_PATH: str = os.getenv("LLM_CACHE_PATH", "cache/llm_cache.sqlite")
+    # LLM_CACHE_MAX_ENTRIES: 保持する応答の最大数。超えた場合は最後に使用された時刻が古いものから削除する。0の場合は制限しない。
+    LLM_CACHE_MAX_ENTRIES: int = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "2000"))
+    # LLM_CACHE_TTL: 応答の有効期間（秒）。0の場合は期限なし。
+    LLM_CACHE_TTL: int = int(os.getenv("LLM_CACHE_TTL", "604800"))
+    # LLM_CACHE_SEED_FILE: 起動時にキャッシュへ読み込む、記録済みのセッション（llm-cache --export で書き出した JSONL）。
+    LLM_CACHE_SEED_FILE: str = os.getenv("LLM_CACHE_SEED_FILE", "")
+
+    # ツール実行設定
+    # FILE_CACHE_MAX_BYTES: 読み取り専用のファイルツールが共有するファイル内容のキャッシュの最大サイズ（バイト）。0の場合はキャッシュしない。
+    FILE_CACHE_MAX_BYTES: int = int(os.getenv("FILE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+    # READ_FILE_MAX_BYTES: read_file が1回に返す最大バイト数。これより大きなファイルを範囲を指定せずに読み込んだ場合は先頭と末尾のみを返す。
+    READ_FILE_MAX_BYTES: int = int(os.getenv("READ_FILE_MAX_BYTES", str(256 * 1024)))
+    # READ_FILE_PREVIEW_LINES: 大きなファイルの先頭と末尾として表示する行数（それぞれ）。
+    READ_FILE_PREVIEW_LINES: int = int(os.getenv("READ_FILE_PREVIEW_LINES", "50"))
+    # READ_MANY_FILES_MAX_BYTES: read_many_files が1回に返す最大バイト数。超えた場合は行の区切りで打ち切り、省略したファイルを示す。
+    READ_MANY_FILES_MAX_BYTES: int = int(os.getenv("READ_MANY_FILES_MAX_BYTES", str(512 * 1024)))
+    # READ_MANY_FILES_WORKERS: read_many_files がファイルを並行して読み込むスレッド数。
+    READ_MANY_FILES_WORKERS: int = int(os.getenv("READ_MANY_FILES_WORKERS", "8"))
+    # SEARCH_MAX_RESULTS: search_file_content が返す一致した行の最大件数（デフォルト値）。これに達した時点で検索を打ち切る。
+    SEARCH_MAX_RESULTS: int = int(os.getenv("SEARCH_MAX_RESULTS", "200"))
+    # SEARCH_TIMEOUT: search_file_content の1回の検索にかける時間の上限（秒）。超えた場合はそれまでの結果を返す。
+    SEARCH_TIMEOUT: float = float(os.getenv("SEARCH_TIMEOUT", "30"))
+    # SEARCH_WORKERS: search_file_content がファイルの検索に使用するワーカープロセスの数。1の場合はプロセスを作成せずに逐次実行する。
+    SEARCH_WORKERS: int = int(os.getenv("SEARCH_WORKERS", str(min(4, os.cpu_count() or 1))))
+    # SEARCH_INDEX: search_file_content がトライグラム索引で検索するファイルを絞り込むかどうか。
+    # "auto" の場合は SEARCH_INDEX_PATH が存在する場合（index コマンドで作成した場合）のみ、"true" の場合は検索したディレクトリの索引を自動的に作成する。
+    SEARCH_INDEX: str = os.getenv("SEARCH_INDEX", "auto").lower()
+    # SEARCH_INDEX_PATH: 検索索引のデータベースファイルのパス。
+    SEARCH_INDEX_PATH: str = os.getenv("SEARCH_INDEX_PATH", "cache/search_index.sqlite")
+    # SEARCH_INDEX_MAX_FILE_BYTES: 索引に含める最大のファイルサイズ（バイト）。これより大きなファイルは索引を使わずに常に検索する。
+    SEARCH_INDEX_MAX_FILE_BYTES: int = int(os.getenv("SEARCH_INDEX_MAX_FILE_BYTES", str(4 * 1024 * 1024)))
+    # SHELL_TIMEOUT: run_shell_command のコマンドの実行時間の上限（秒）のデフォルト値。超えた場合はプロセスグループ全体を停止する。0の場合は制限しない。
+    SHELL_TIMEOUT: float = float(os.getenv("SHELL_TIMEOUT", "120"))
+    # SHELL_OUTPUT_HEAD_BYTES / SHELL_OUTPUT_TAIL_BYTES: コマンドの出力（標準出力・標準エラー出力それぞれ）のうち、結果に含める先頭と末尾のバイト数。
+    SHELL_OUTPUT_HEAD_BYTES: int = int(os.getenv("SHELL_OUTPUT_HEAD_BYTES", str(16 * 1024)))
+    SHELL_OUTPUT_TAIL_BYTES: int = int(os.getenv("SHELL_OUTPUT_TAIL_BYTES", str(16 * 1024)))
+    # SHELL_JOBS_MAX_FINISHED: 状態を確認できるよう保持する終了済みのバックグラウンドジョブの最大数。超えた場合は最後に確認された時刻が古いものから破棄する。
+    SHELL_JOBS_MAX_FINISHED: int = int(os.getenv("SHELL_JOBS_MAX_FINISHED", "16"))
+    # SHELL_SESSION: run_shell_command を会話のスレッドごとに起動したままの bash で実行するかどうか。cd や export した環境変数が次のコマンドに引き継がれる。
+    SHELL_SESSION: bool = os.getenv("SHELL_SESSION", "true").lower() in ("1", "true", "yes")
+    # SHELL_SESSION_MAX: 同時に保持するシェルのセッションの最大数。超えた場合は最後に使用された時刻が古いものから終了する。
+    SHELL_SESSION_MAX: int = int(os.getenv("SHELL_SESSION_MAX", "8"))
+    # WEB_FETCH_TIMEOUT: web_fetch の接続・読み込みのタイムアウト（秒）。
+    WEB_FETCH_TIMEOUT: float = float(os.getenv("WEB_FETCH_TIMEOUT", "20"))
+    # WEB_FETCH_MAX_BYTES: web_fetch で読み込む本文の最大バイト数（展開後）。超えた部分は読み込まずに接続を閉じる。
+    WEB_FETCH_MAX_BYTES: int = int(os.getenv("WEB_FETCH_MAX_BYTES", str(5 * 1024 * 1024)))
+    # WEB_FETCH_MAX_TOKENS: web_fetch が返す本文（HTML の場合は抜き出した本文）の最大トークン数（概算）。超えた部分は段落の区切りで省略する。0の場合は制限しない。
+    WEB_FETCH_MAX_TOKENS: int = int(os.getenv("WEB_FETCH_MAX_TOKENS", "8000"))
+    # WEB_FETCH_CACHE: web_fetch の応答を保存し、ETag / Last-Modified による条件付きリクエストで再利用するかどうか。
+    WEB_FETCH_CACHE: bool = os.getenv("WEB_FETCH_CACHE", "true").lower() in ("1", "true", "yes")
+    # WEB_FETCH_CACHE_PATH: web_fetch のキャッシュのデータベースファイルのパス。
+    WEB_FETCH_CACHE_PATH: str = os.getenv("WEB_FETCH_CACHE_PATH", "cache/http_cache.sqlite")
+    # WEB_FETCH_CACHE_MAX_ENTRIES: 保持する応答の最大数。超えた場合は最後に使用された時刻が古いものから削除する。0の場合は制限しない。
+    WEB_FETCH_CACHE_MAX_ENTRIES: int = int(os.getenv("WEB_FETCH_CACHE_MAX_ENTRIES", "500"))
+    # MAX_TOOL_CONCURRENCY: 1ターン内の読み取り専用ツールを並行実行する際の最大スレッド数。1の場合は逐次実行する。
+    MAX_TOOL_CONCURRENCY: int = int(os.getenv("MAX_TOOL_CONCURRENCY", "4"))
 
     # デバッグ設定
-    DEBUG_MODE: bool = True
+    # DEBUG_MODE: 詳細なデバッグログをファイルに記録するかどうか。環境変数 DEBUG_MODE=true で有効になる。
+    DEBUG_MODE: bool = os.getenv("DEBUG_MODE", "false").lower() in ("1", "true", "yes")
+    # LOG_VALUE_MAX_CHARS: デバッグログに出力する状態やメッセージの各値の最大文字数。0の場合は切り詰めない。
+    LOG_VALUE_MAX_CHARS: int = int(os.getenv("LOG_VALUE_MAX_CHARS", "500"))
+    # TRACE_FILE: ノード・LLM呼び出し・ツール実行・承認待ちのスパンを OTLP/JSON 形式で追記するファイル。
+    # 空の場合は chat --profile を指定したときのみ logs/traces.jsonl に出力する。
+    TRACE_FILE: str = os.getenv("TRACE_FILE", "")
     # エージェントの内部思考を表示するかどうか
     WRITE_INNER_THOUGHTS: bool = True
@@ -1,10 +1,18 @@
 from typing import TypedDict, List, Annotated, Optional, Dict, Any
-from langchain_core.messages import BaseMessage, AIMessage, ToolMessage, HumanMessage
+from langchain_core.messages import BaseMessage, AIMessage, ToolMessage, HumanMessage, SystemMessage, RemoveMessage
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.runnables import RunnableLambda
 from langgraph.graph import StateGraph, END
+from langgraph.graph.message import add_messages
+from langgraph.config import get_stream_writer
+from langgraph.constants import TAG_NOSTREAM
+from langgraph.checkpoint.base import BaseCheckpointSaver
 from langgraph.checkpoint.memory import MemorySaver
 from langchain_google_genai import ChatGoogleGenerativeAI
-import operator
+import asyncio
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 import os
 import sys
@@ -16,29 +24,56 @@ project_root_path = current_file_path.parent.parent.parent # Adjusted for src/co
 sys.path.append(str(project_root_path))
 
 from src.config import Config
-from src.core.prompts import create_agent_prompt
-from src.logging_config import logger
+from src.core.prompts import create_static_system_prompt, create_volatile_context, create_summary_context
+from src.core.prompt_cache import GeminiContextCacheClient, PromptCacheManager
+from src.core.llm_cache import create_llm_cache
+from src.core.token_accounting import count_message_tokens, count_history_tokens, message_text
+from src.core.tracing import tracer, record_llm_call
+from src.logging_config import logger, StateSummary, Truncated
 
-from src.tools.file_operations import file_tools, read_many_files, search_file_content
+from src.tools.file_operations import file_tools, read_many_files, search_file_content, describe_operations
 from src.tools.internet_search import internet_search
-from src.tools.command_execution import run_shell_command
+from src.tools.command_execution import run_shell_command, shell_job_status, kill_shell_job
 from src.tools.think_tool import think_tool
 from src.tools.work_tool import work_tool
 from src.tools.web_fetch import web_fetch
 
 # Define the tools
-all_tools = file_tools + [internet_search, run_shell_command, read_many_files, search_file_content, think_tool, work_tool, web_fetch]
+all_tools = file_tools + [internet_search, run_shell_command, shell_job_status, kill_shell_job, read_many_files, search_file_content, think_tool, work_tool, web_fetch]
 tools = {t.name: t for t in all_tools}
 
 # Initialize LLM and bind tools
-llm = ChatGoogleGenerativeAI(model=Config.MODEL_NAME, temperature=0)
+# LLM_CACHE が有効な場合、エージェントと要約のLLM呼び出しの応答をキャッシュする
+llm_cache = create_llm_cache()
+llm = ChatGoogleGenerativeAI(model=Config.MODEL_NAME, temperature=0, cache=llm_cache)
 llm_with_tools = llm.bind_tools(all_tools)
 
+# Gemini の明示的コンテキストキャッシュ（不変のシステムプロンプトとツール定義をキャッシュする）
+prompt_cache = None
+if Config.GEMINI_CONTEXT_CACHE:
+    prompt_cache = PromptCacheManager(
+        GeminiContextCacheClient(llm), Config.MODEL_NAME, all_tools,
+        ttl_seconds=Config.GEMINI_CONTEXT_CACHE_TTL,
+    )
+
+def merge_allowed_tools(current: set[str], update: Optional[set[str]]) -> set[str]:
+    """
+    always_allowed_tools のリデューサー。追加されたツールを和集合で加え、None の場合は空にします。
+    チェックポイントから再開した会話で、以前のプロセスで与えた「常に許可」を引き継がないために使用します。
+    """
+    if update is None:
+        return set()
+    return current | update
+
 # Define the state for our graph
 class AgentState(TypedDict):
     input: str
-    chat_history: Annotated[list[BaseMessage], operator.add]
-    always_allowed_tools: Annotated[set[str], operator.or_]
+    # add_messages: 通常は新しいメッセージを追記するだけのリデューサー。
+    # 要約時は要約済みのメッセージを RemoveMessage(id=...) で取り除く
+    chat_history: Annotated[list[BaseMessage], add_messages]
+    always_allowed_tools: Annotated[set[str], merge_allowed_tools]
+    # 履歴から外れた古い会話のローリング要約。要約のたびに、前回の要約と新たに外れた会話から更新される
+    conversation_summary: Optional[str]
 
     # Fields for work_tool
     overall_policy: Optional[str]
@@ -55,33 +90,41 @@ class AgentState(TypedDict):
     todo_list: Optional[List[Dict[str, Any]]]
 
 # Agent node function
-def run_agent(state: AgentState):
-    if Config.DEBUG_MODE:
-        logger.debug(f"--- 1. Entering run_agent ---")
-        logger.debug(f"Current State: {state}")
+def _resolve_cached_content() -> Optional[str]:
+    """明示的コンテキストキャッシュが有効な場合、不変プレフィックスのキャッシュ名を返します。"""
+    if prompt_cache is None:
+        return None
+    return prompt_cache.get_cached_content(create_static_system_prompt())
+
+def _build_agent_request(state: AgentState, cached_content: Optional[str]):
+    """
+    このターンのLLM呼び出しに使うモデルとメッセージ列を構築します。
 
-    # Dynamically create the prompt and chain for this turn
-    system_prompt_str = create_agent_prompt(state)
+    メッセージ列は「不変のシステムプロンプト → 古い会話の要約 → 会話履歴 → 毎ターン変わる状況 + ユーザー入力」の順に並べ、
+    プロバイダー側のプレフィックスキャッシュが会話履歴まで含めてヒットするようにします。
+    cached_content が指定された場合、システムプロンプトとツール定義はキャッシュ側に含まれるため送信しません。
+    """
+    volatile_context = create_volatile_context(state)
     if Config.DEBUG_MODE:
-        logger.debug(f"Generated System Prompt:\n{system_prompt_str}")
-        
-    prompt = ChatPromptTemplate.from_messages(
-        [
-            ("system", system_prompt_str),
-            MessagesPlaceholder(variable_name="chat_history"),
-            ("user", "{input}"),
-        ]
-    )
-    chain = prompt | llm_with_tools
+        logger.debug("Generated Volatile Context:\n%s", volatile_context)
 
-    # Invoke the chain with the current state
-    result = chain.invoke({
-        "input": state["input"],
-        "chat_history": state["chat_history"]
-    })
-    
+    # 古い会話の要約は履歴の先頭に置く（要約が更新されるのは履歴が入れ替わるときだけ）
+    summary_messages = []
+    if state.get("conversation_summary"):
+        summary_messages.append(HumanMessage(content=create_summary_context(state["conversation_summary"])))
+    user_message = HumanMessage(content=[
+        {"type": "text", "text": volatile_context},
+        {"type": "text", "text": state["input"]},
+    ])
+    if cached_content:
+        return llm.bind(cached_content=cached_content), [*summary_messages, *state["chat_history"], user_message]
+    return llm_with_tools, [SystemMessage(content=create_static_system_prompt()), *summary_messages, *state["chat_history"], user_message]
+
+def _log_agent_result(result: AIMessage):
+    # トークン数は作成時に一度だけ計算し、メッセージと一緒にチェックポイントへ保存する
+    count_message_tokens(result)
     if Config.DEBUG_MODE:
-        logger.debug(f"LLM Result: {result}")
+        logger.debug("LLM Result: %s", Truncated(result))
 
     if Config.WRITE_INNER_THOUGHTS:
         print(f"\n<INNER_THOUGHT>\n: Agent generated AIMessage: {result.content}\n</INNER_THOUGHT>\n")
@@ -89,63 +132,309 @@ def run_agent(state: AgentState):
             for tool_call in result.tool_calls:
                 print(f"\n<INNER_THOUGHT>\n Tool Call: {tool_call['name']} with args {tool_call['args']}\n</INNER_THOUGHT>\n")
 
-    # 会話履歴の要約処理
-    if Config.MAX_CONVERSATION_TURNS > 0 and len(state["chat_history"]) >= Config.MAX_CONVERSATION_TURNS:
-        
-        # --- 要約境界の調整ロジック ---
-        # AIMessage(tool_calls)とToolMessageのペアが分断されるのを防ぐ
-        split_point = len(state["chat_history"]) - Config.SUMMARY_CONVERSATION_TURNS
-        
-        # split_pointが0より大きく、かつその位置のメッセージがToolMessageである場合、
-        # ToolMessageシーケンスの前に来るAIMessageを含めるようにsplit_pointを後退させる
-        if split_point > 0:
-            while split_point > 0 and isinstance(state["chat_history"][split_point], ToolMessage):
-                split_point -= 1
-        
-        # split_pointが負になるのを防ぐ
-        split_point = max(0, split_point)
-        
-        # 境界調整後のメッセージリストを定義
-        messages_to_summarize = state["chat_history"][:split_point]
-        recent_history = state["chat_history"][split_point:]
-
-        # 要約対象のメッセージがない場合は、要約処理をスキップ
-        if not messages_to_summarize:
-            return {"chat_history": state["chat_history"] + [result]}
-
-        # 要約プロンプト
-        summarize_prompt = ChatPromptTemplate.from_messages([
-            ("system", "以下の「会話履歴全体」を参考にし、「要約対象の会話」を簡潔に要約してください。要約は、会話の主要なテーマ、決定事項、ユーザーの要求、要求への対応に関係する情報、未解決の課題に焦点を当てて必ず出力してください。要約中にtool_call_idを含めないでください。"),
-            ("system", "--- 会話履歴全体 ---"),
-            MessagesPlaceholder(variable_name="full_context_history"), # Full history for context
-            ("system", "--- 要約対象の会話 ---"),
-            MessagesPlaceholder(variable_name="messages_to_summarize") # Only the part to summarize
-        ])
-        summarize_chain = summarize_prompt | llm
-        
-        # LLMで要約を実行
-        summary_response = summarize_chain.invoke({
-            "full_context_history": state["chat_history"],
-            "messages_to_summarize": messages_to_summarize
-        })
-        summary_message = AIMessage(content=f"会話の要約: {summary_response.content}")
-        
-        # 新しい会話履歴を構築
-        # 要約メッセージ + 調整後の最新の会話履歴 + 現在のLLMの応答
-        new_chat_history = [summary_message] + recent_history
-        
-        if Config.WRITE_INNER_THOUGHTS:
-            print(f"\n<INNER_THOUGHT>\n: 古い会話が要約されました: {summary_message.content}\n</INNER_THOUGHT>\n")
+def _split_history_for_summary(chat_history: list[BaseMessage]):
+    """
+    会話履歴を要約対象と保持対象に分割します。
+    履歴のトークン数が CONTEXT_TOKEN_BUDGET 未満の場合など、要約が不要な場合は None を返します。
+    """
+    if Config.CONTEXT_TOKEN_BUDGET <= 0:
+        return None
+    history_tokens = count_history_tokens(chat_history)
+    if history_tokens < Config.CONTEXT_TOKEN_BUDGET:
+        return None
+
+    # 新しいメッセージから順に、SUMMARY_KEEP_TOKENS に収まる範囲を保持対象とする（最新の1件は必ず保持する）
+    split_point = len(chat_history) - 1
+    kept_tokens = count_message_tokens(chat_history[split_point])
+    while split_point > 0:
+        next_tokens = count_message_tokens(chat_history[split_point - 1])
+        if kept_tokens + next_tokens > Config.SUMMARY_KEEP_TOKENS:
+            break
+        kept_tokens += next_tokens
+        split_point -= 1
+
+    # --- 要約境界の調整ロジック ---
+    # AIMessage(tool_calls)とToolMessageのペアが分断されるのを防ぐ
+    # split_pointの位置のメッセージがToolMessageである場合、
+    # ToolMessageシーケンスの前に来るAIMessageを含めるようにsplit_pointを後退させる
+    while split_point > 0 and isinstance(chat_history[split_point], ToolMessage):
+        split_point -= 1
+    
+    # 境界調整後のメッセージリストを定義
+    messages_to_summarize = chat_history[:split_point]
+    recent_history = chat_history[split_point:]
+
+    # 要約対象のメッセージがない場合は、要約処理をスキップ
+    if not messages_to_summarize:
+        return None
+    if Config.DEBUG_MODE:
+        logger.debug("History tokens %d exceeded budget %d; keeping %d messages", history_tokens, Config.CONTEXT_TOKEN_BUDGET, len(recent_history))
+    return messages_to_summarize, recent_history
+
+def _build_summarize_chain():
+    # 要約プロンプト
+    # 会話履歴全体は渡さず、前回までの要約と新たに履歴から外れる会話だけを渡すことで、
+    # 要約1回あたりの入力サイズをセッションの長さに関係なく一定の範囲に収める
+    summarize_prompt = ChatPromptTemplate.from_messages([
+        ("system", "あなたは会話履歴の要約を更新します。「これまでの要約」に「新たに要約対象となった会話」の内容を統合し、更新後の要約のみを出力してください。要約は、会話の主要なテーマ、決定事項、ユーザーの要求、要求への対応に関係する情報、未解決の課題に焦点を当てて簡潔にまとめてください。既に不要になった情報は削除して構いません。要約中にtool_call_idを含めないでください。"),
+        ("human", "--- これまでの要約 ---\n{previous_summary}\n\n--- 新たに要約対象となった会話 ---\n{transcript}"),
+    ])
+    # 要約のトークンはユーザーへの応答ではないため、ストリーミング出力から除外する
+    return (summarize_prompt | llm).with_config(tags=[TAG_NOSTREAM])
+
+def _format_transcript(messages: list[BaseMessage]) -> str:
+    """要約対象のメッセージを、ロール付きのテキストに変換します。"""
+    role_labels = {"human": "ユーザー", "ai": "AI", "tool": "ツール結果", "system": "システム"}
+    return "\n".join(f"[{role_labels.get(m.type, m.type)}] {message_text(m)}" for m in messages)
+
+def _summarize_inputs(state: AgentState, messages_to_summarize: list[BaseMessage]) -> dict:
+    return {
+        "previous_summary": state.get("conversation_summary") or "（なし）",
+        "transcript": _format_transcript(messages_to_summarize),
+    }
+
+def _compaction_update(state: AgentState, summary_response: AIMessage, messages_to_summarize: list[BaseMessage]) -> dict:
+    """要約結果から、会話履歴と要約フィールドを更新する値を作成します。"""
+    summary = message_text(summary_response)
+
+    if Config.WRITE_INNER_THOUGHTS:
+        print(f"\n<INNER_THOUGHT>\n: 古い会話が要約されました: {summary}\n</INNER_THOUGHT>\n")
+    if Config.DEBUG_MODE:
+        logger.debug("--- Conversation Summarized ---")
+        logger.debug("Original history length: %d", len(state['chat_history']))
+        logger.debug("Summarized history length: %d", len(state['chat_history']) - len(messages_to_summarize))
+        logger.debug("Summary: %s", Truncated(summary))
+    # 要約対象のメッセージだけをIDで削除する（要約は履歴ではなく conversation_summary に保持する）。
+    # 同じステップでツールノードが追記する ToolMessage とは競合しないため、更新の適用順序によらず結果は同じになる
+    return {
+        "chat_history": [RemoveMessage(id=message.id) for message in messages_to_summarize],
+        "conversation_summary": summary,
+    }
+
+def needs_compaction(state: AgentState) -> bool:
+    """会話履歴がトークン予算を超えており、要約が必要かどうかを判定します。"""
+    return _split_history_for_summary(state["chat_history"]) is not None
+
+def summarize_history(state: AgentState) -> dict:
+    """
+    会話履歴の要約ノード。
+
+    ツール実行と並行して（またはターン終了後にバックグラウンドで）実行され、
+    ユーザーへの応答を待たせずに古い会話を conversation_summary へ移します。要約が不要な場合は空の辞書を返します。
+    """
+    if Config.DEBUG_MODE:
+        logger.debug("--- Entering summarize_history ---")
+
+    split = _split_history_for_summary(state["chat_history"])
+    if split is None:
+        return {}
+    messages_to_summarize, _ = split
+    inputs = _summarize_inputs(state, messages_to_summarize)
+    with tracer.span("summarize_llm", "llm", **{"gen_ai.request.model": Config.MODEL_NAME}) as span:
+        summary_response = _build_summarize_chain().invoke(inputs)
+        record_llm_call(span, messages_to_summarize, summary_response)
+    return _compaction_update(state, summary_response, messages_to_summarize)
+
+async def asummarize_history(state: AgentState) -> dict:
+    """summarize_history の非同期版。"""
+    if Config.DEBUG_MODE:
+        logger.debug("--- Entering asummarize_history ---")
+
+    split = _split_history_for_summary(state["chat_history"])
+    if split is None:
+        return {}
+    messages_to_summarize, _ = split
+    inputs = _summarize_inputs(state, messages_to_summarize)
+    with tracer.span("summarize_llm", "llm", **{"gen_ai.request.model": Config.MODEL_NAME}) as span:
+        summary_response = await _build_summarize_chain().ainvoke(inputs)
+        record_llm_call(span, messages_to_summarize, summary_response)
+    return _compaction_update(state, summary_response, messages_to_summarize)
+
+def run_agent(state: AgentState):
+    if Config.DEBUG_MODE:
+        logger.debug("--- 1. Entering run_agent ---")
+        logger.debug("Current State: %s", StateSummary(state))
+
+    # Build the request for this turn and invoke the model
+    model, messages = _build_agent_request(state, _resolve_cached_content())
+    with tracer.span("llm", "llm", **{"gen_ai.request.model": Config.MODEL_NAME}) as span:
+        result = model.invoke(messages)
+        record_llm_call(span, messages, result)
+    _log_agent_result(result)
+    # 会話履歴の要約は応答を待たせないよう、summarize ノードまたは BackgroundCompactor で行う
+    return {"chat_history": [result]}
+
+async def arun_agent(state: AgentState):
+    """run_agent の非同期版。LLM呼び出しを ainvoke で行い、イベントループをブロックしません。"""
+    if Config.DEBUG_MODE:
+        logger.debug("--- 1. Entering arun_agent ---")
+        logger.debug("Current State: %s", StateSummary(state))
+
+    cached_content = await asyncio.to_thread(_resolve_cached_content)
+    model, messages = _build_agent_request(state, cached_content)
+    with tracer.span("llm", "llm", **{"gen_ai.request.model": Config.MODEL_NAME}) as span:
+        result = await model.ainvoke(messages)
+        record_llm_call(span, messages, result)
+    _log_agent_result(result)
+    return {"chat_history": [result]}
+
+# ファイルシステムやシステム状態を変更しない（読み取り専用の）ツール
+# これらはユーザー承認なしで実行され、同一ターン内で並行実行される
+READ_ONLY_TOOLS = frozenset([
+    "list_directory_contents", "read_file", "internet_search", "read_many_files",
+    "search_file_content", "think_tool", "work_tool", "web_fetch", "shell_job_status",
+])
+
+def is_modifying_tool(tool_name: str) -> bool:
+    """ファイルシステムやシステム状態を変更する可能性があるツールかどうかを判定します。"""
+    # run_shell_command はファイルシステムを変更する可能性があるため、常に承認を求める
+    if tool_name == "run_shell_command":
+        return True
+    return tool_name not in READ_ONLY_TOOLS
+
+def _emit_tool_event(event: str, tool_call: dict, **payload):
+    """
+    ツールの開始・終了イベントを LangGraph の custom ストリームに送出します。
+    グラフ外から直接呼び出された場合は何もしません。
+    """
+    try:
+        writer = get_stream_writer()
+    except (RuntimeError, KeyError):
+        return
+    writer({"event": event, "tool": tool_call["name"], "tool_call_id": tool_call["id"], **payload})
+
+def _tool_error_message(tool_call: dict, error: Exception) -> ToolMessage:
+    error_message = f"ツール '{tool_call['name']}' の実行中にエラーが発生しました: {error}"
+    if Config.DEBUG_MODE:
+        logger.debug("--- Tool Execution Error ---\n%s", error_message)
+    return ToolMessage(content=error_message, tool_call_id=tool_call["id"])
+
+def _record_tool_payload(span, tool_call: dict, message: ToolMessage):
+    if span.recording:
+        span.set_attribute("payload.input_bytes", len(str(tool_call["args"]).encode("utf-8")))
+        span.set_attribute("payload.output_bytes", len(message_text(message).encode("utf-8")))
+
+def _invoke_tool(tool_call: dict) -> ToolMessage:
+    """単一のツール呼び出しを実行し、結果を ToolMessage として返します。"""
+    _emit_tool_event("tool_start", tool_call)
+    start = time.perf_counter()
+    with tracer.span(f"tool:{tool_call['name']}", "tool", **{"tool.name": tool_call["name"]}) as span:
+        try:
+            output = tools[tool_call["name"]].invoke(tool_call["args"])
+            message = ToolMessage(content=str(output), tool_call_id=tool_call["id"])
+        except Exception as e:
+            message = _tool_error_message(tool_call, e)
+            span.set_attribute("tool.error", str(e))
+        # トークン数は作成時に一度だけ計算し、メッセージと一緒にチェックポイントへ保存する
+        count_message_tokens(message)
+        _record_tool_payload(span, tool_call, message)
+    _emit_tool_event("tool_end", tool_call, duration=time.perf_counter() - start)
+    return message
+
+async def _ainvoke_tool(tool_call: dict) -> ToolMessage:
+    """
+    _invoke_tool の非同期版。
+    ネイティブな非同期実装を持つツールはそれを使用し、持たないツールはスレッドプールで実行されます。
+    """
+    _emit_tool_event("tool_start", tool_call)
+    start = time.perf_counter()
+    with tracer.span(f"tool:{tool_call['name']}", "tool", **{"tool.name": tool_call["name"]}) as span:
+        try:
+            output = await tools[tool_call["name"]].ainvoke(tool_call["args"])
+            message = ToolMessage(content=str(output), tool_call_id=tool_call["id"])
+        except Exception as e:
+            message = _tool_error_message(tool_call, e)
+            span.set_attribute("tool.error", str(e))
+        # トークン数は作成時に一度だけ計算し、メッセージと一緒にチェックポイントへ保存する
+        count_message_tokens(message)
+        _record_tool_payload(span, tool_call, message)
+    _emit_tool_event("tool_end", tool_call, duration=time.perf_counter() - start)
+    return message
+
+def _invoke_tools_concurrently(tool_calls: list[dict]) -> list[ToolMessage]:
+    """
+    読み取り専用ツールの呼び出しを、上限付きのスレッドプールで並行実行します。
+    返される ToolMessage の順序は tool_calls の順序と一致します。
+    """
+    max_workers = min(Config.MAX_TOOL_CONCURRENCY, len(tool_calls))
+    if max_workers <= 1:
+        return [_invoke_tool(tool_call) for tool_call in tool_calls]
+    # ワーカースレッドでもストリーム出力やコールバックが使えるよう、呼び出しごとにコンテキストを引き継ぐ
+    contexts = [contextvars.copy_context() for _ in tool_calls]
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tool") as executor:
+        # executor.map は入力順に結果を返す
+        return list(executor.map(lambda context, tool_call: context.run(_invoke_tool, tool_call), contexts, tool_calls))
+
+async def _ainvoke_tools_concurrently(tool_calls: list[dict]) -> list[ToolMessage]:
+    """_invoke_tools_concurrently の非同期版。同時実行数はセマフォで制限します。"""
+    semaphore = asyncio.Semaphore(max(1, Config.MAX_TOOL_CONCURRENCY))
+
+    async def _limited(tool_call: dict) -> ToolMessage:
+        async with semaphore:
+            return await _ainvoke_tool(tool_call)
+
+    # asyncio.gather は入力順に結果を返す
+    return list(await asyncio.gather(*(_limited(tool_call) for tool_call in tool_calls)))
+
+def _request_tool_approval(tool_name: str, tool_args: dict) -> Optional[str]:
+    """
+    ツール実行の可否をユーザーに確認します。
+    非対話環境で入力が得られない場合は None を返します。
+    """
+    print(f"\n--- ツール実行の確認 ---")
+    if tool_name == "batch_file_operations":
+        # ファイルの内容を含む引数をそのまま表示すると長くなるため、操作の一覧にまとめて表示する
+        operations = tool_args.get("operations") or []
+        print(f"AIは '{tool_name}' で以下の {len(operations)} 件の操作をまとめて実行しようとしています:")
+        print(describe_operations(operations))
+    else:
+        print(f"AIは '{tool_name}' を実行しようとしています。引数: {tool_args}")
+    print("選択肢:")
+    print("  1. 一度だけ実行許可")
+    print("  2. 今後も実行許可 (この種類のツールは次回から確認しません)")
+    print("  3. 実行を許可せず、新しい指示を入力する")
+
+    try:
+        # uv run 環境での EOFError を考慮
+        return input("選択肢 (1/2/3): ")
+    except EOFError:
+        return None
+
+def _resolve_tool_approval(tool_name: str, user_choice: Optional[str]):
+    """
+    ユーザーの選択を解釈します。
+
+    Returns:
+        tuple[bool, bool, Optional[str]]: (実行するか, 今後も許可するか, 実行しない場合に返すメッセージ)
+    """
+    if user_choice is None:
+        if Config.DEBUG_MODE:
+            logger.debug("非対話環境のため、ツール実行をスキップします。")
+        return False, False, f"ツール '{tool_name}' は非対話環境のためスキップされました。"
+    if user_choice == "1":
         if Config.DEBUG_MODE:
-            logger.debug(f"--- Conversation Summarized ---")
-            logger.debug(f"Original history length: {len(state['chat_history'])}")
-            logger.debug(f"Summarized history length: {len(new_chat_history)}")
-            logger.debug(f"Summary: {summary_message.content}")
+            logger.debug("ユーザーが '%s' の一度限りの実行を許可しました。", tool_name)
+        return True, False, None
+    if user_choice == "2":
+        if Config.DEBUG_MODE:
+            logger.debug("ユーザーが '%s' の今後も実行を許可しました。", tool_name)
+        return True, True, None
+    if user_choice == "3":
+        if Config.DEBUG_MODE:
+            logger.debug("ユーザーが '%s' の実行を拒否しました。", tool_name)
+        return False, False, f"ツール '{tool_name}' の実行はユーザーによって拒否されました。"
+    if Config.DEBUG_MODE:
+        logger.debug("無効な選択です。ツール実行をスキップします。")
+    return False, False, f"ツール '{tool_name}' の実行は無効な選択のためスキップされました。"
+
+def _finish_tool_execution(tool_messages: list[ToolMessage], updated_always_allowed_tools: set[str]):
+    if Config.DEBUG_MODE:
+        logger.debug("Final Tool Messages: %s", StateSummary({"tool_messages": tool_messages}))
         
-        return {"chat_history": new_chat_history + [result]}
-    
-    # 要約が不要な場合、通常の処理
-    return {"chat_history": state["chat_history"] + [result]}
+    if Config.WRITE_INNER_THOUGHTS:
+        print(f"\n<INNER_THOUGHT>\nTool execution completed. Results: {tool_messages}\n</INNER_THOUGHT>\n")
+    # 更新された always_allowed_tools を state に含めて返す
+    return {"chat_history": tool_messages, "always_allowed_tools": updated_always_allowed_tools}
 
 # Custom tool execution node
 def execute_tools(state: AgentState):
@@ -154,9 +443,16 @@ def execute_tools(state: AgentState):
         
     last_message = state["chat_history"][-1]
     if Config.DEBUG_MODE:
-        logger.debug(f"Last message (containing tool calls): {last_message}")
+        logger.debug("Last message (containing tool calls): %s", Truncated(last_message))
         
     tool_messages = []
+    # 承認不要のツール呼び出しをまとめて並行実行するためのバッファ
+    pending_calls = []
+
+    def _flush_pending_calls():
+        if pending_calls:
+            tool_messages.extend(_invoke_tools_concurrently(pending_calls))
+            pending_calls.clear()
     
     # always_allowed_tools を state から取得
     current_always_allowed_tools = state.get("always_allowed_tools", set())
@@ -164,107 +460,159 @@ def execute_tools(state: AgentState):
 
     for tool_call in last_message.tool_calls:
         tool_name = tool_call["name"]
-        tool_to_call = tools[tool_name]
         tool_args = tool_call["args"]
         if Config.DEBUG_MODE:
-            logger.debug(f"Processing tool call: {tool_name} with args: {tool_args}")
-
-        def _invoke_tool():
-            try:
-                output = tool_to_call.invoke(tool_args)
-                return ToolMessage(content=str(output), tool_call_id=tool_call["id"])
-            except Exception as e:
-                error_message = f"ツール '{tool_name}' の実行中にエラーが発生しました: {e}"
-                if Config.DEBUG_MODE:
-                    logger.debug(f"--- Tool Execution Error ---\n{error_message}")
-                return ToolMessage(content=error_message, tool_call_id=tool_call["id"])
-
-        # ファイルシステムを変更する可能性のあるツールを特定
-        is_modifying_tool = tool_name not in ["list_directory_contents", "read_file", "internet_search", "read_many_files", "search_file_content", "think_tool", "work_tool", "web_fetch"]
-        # run_shell_command はファイルシステムを変更する可能性があるため、常に承認を求める
-        if tool_name == "run_shell_command":
-            is_modifying_tool = True
-
-        # 常に許可されているツールか、変更操作でない場合は直接実行
-        if not is_modifying_tool or tool_name in current_always_allowed_tools:
+            logger.debug("Processing tool call: %s with args: %s", tool_name, Truncated(tool_args))
+
+        # 変更操作でないツールは、後続の読み取り専用ツールとまとめて並行実行する
+        if not is_modifying_tool(tool_name):
             if Config.DEBUG_MODE:
-                logger.debug(f"Executing tool '{tool_name}' directly (always allowed or non-modifying).")
-            tool_messages.append(_invoke_tool())
+                logger.debug("Queueing tool '%s' for concurrent execution (non-modifying).", tool_name)
+            pending_calls.append(tool_call)
             continue # 次のツール呼び出しへ
 
-        # ユーザーに確認を求める
-        print(f"\n--- ツール実行の確認 ---")
-        print(f"AIは '{tool_name}' を実行しようとしています。引数: {tool_args}")
-        print("選択肢:")
-        print("  1. 一度だけ実行許可")
-        print("  2. 今後も実行許可 (この種類のツールは次回から確認しません)")
-        print("  3. 実行を許可せず、新しい指示を入力する")
+        # 変更操作の前に、それ以前の読み取り専用ツールを完了させて実行順序を保つ
+        _flush_pending_calls()
 
-        user_choice = None
-        try:
-            # uv run 環境での EOFError を考慮
-            user_choice = input("選択肢 (1/2/3): ")
-        except EOFError:
+        # 常に許可されているツールは確認なしで直接実行
+        if tool_name in current_always_allowed_tools:
             if Config.DEBUG_MODE:
-                logger.debug("非対話環境のため、ツール実行をスキップします。")
-            tool_messages.append(ToolMessage(content=f"ツール '{tool_name}' は非対話環境のためスキップされました。", tool_call_id=tool_call["id"]))
+                logger.debug("Executing tool '%s' directly (always allowed).", tool_name)
+            tool_messages.append(_invoke_tool(tool_call))
             continue # 次のツール呼び出しへ
 
-        if user_choice == "1":
-            if Config.DEBUG_MODE:
-                logger.debug(f"ユーザーが '{tool_name}' の一度限りの実行を許可しました。")
-            tool_messages.append(_invoke_tool())
-        elif user_choice == "2":
-            if Config.DEBUG_MODE:
-                logger.debug(f"ユーザーが '{tool_name}' の今後も実行を許可しました。")
+        # ユーザーに確認を求める
+        with tracer.span("approval", "approval", **{"tool.name": tool_name}):
+            user_choice = _request_tool_approval(tool_name, tool_args)
+        should_execute, always_allow, rejection = _resolve_tool_approval(tool_name, user_choice)
+        if always_allow:
             updated_always_allowed_tools.add(tool_name) # セットに追加
-            tool_messages.append(_invoke_tool())
-        elif user_choice == "3":
-            if Config.DEBUG_MODE:
-                logger.debug(f"ユーザーが '{tool_name}' の実行を拒否しました。")
-            tool_messages.append(ToolMessage(content=f"ツール '{tool_name}' の実行はユーザーによって拒否されました。", tool_call_id=tool_call["id"]))
+        if should_execute:
+            tool_messages.append(_invoke_tool(tool_call))
         else:
-            if Config.DEBUG_MODE:
-                logger.debug("無効な選択です。ツール実行をスキップします。")
-            tool_messages.append(ToolMessage(content=f"ツール '{tool_name}' の実行は無効な選択のためスキップされました。", tool_call_id=tool_call["id"]))
-            
+            tool_messages.append(ToolMessage(content=rejection, tool_call_id=tool_call["id"]))
+
+    # 残っている読み取り専用ツールを実行
+    _flush_pending_calls()
+    return _finish_tool_execution(tool_messages, updated_always_allowed_tools)
+
+async def aexecute_tools(state: AgentState):
+    """
+    execute_tools の非同期版。
+    読み取り専用ツールは asyncio タスクとして並行実行し、承認が必要なツールは逐次実行します。
+    """
     if Config.DEBUG_MODE:
-        logger.debug(f"Final Tool Messages: {tool_messages}")
-        
-    if Config.WRITE_INNER_THOUGHTS:
-        print(f"\n<INNER_THOUGHT>\nTool execution completed. Results: {tool_messages}\n</INNER_THOUGHT>\n")
-    # 更新された always_allowed_tools を state に含めて返す
-    return {"chat_history": tool_messages, "always_allowed_tools": updated_always_allowed_tools}
+        logger.debug("--- 3. Entering aexecute_tools ---")
+
+    last_message = state["chat_history"][-1]
+    tool_messages = []
+    pending_calls = []
+
+    async def _flush_pending_calls():
+        if pending_calls:
+            tool_messages.extend(await _ainvoke_tools_concurrently(pending_calls))
+            pending_calls.clear()
+
+    current_always_allowed_tools = state.get("always_allowed_tools", set())
+    updated_always_allowed_tools = set(current_always_allowed_tools)
+
+    for tool_call in last_message.tool_calls:
+        tool_name = tool_call["name"]
+        if Config.DEBUG_MODE:
+            logger.debug("Processing tool call: %s with args: %s", tool_name, Truncated(tool_call['args']))
+
+        if not is_modifying_tool(tool_name):
+            pending_calls.append(tool_call)
+            continue
+
+        await _flush_pending_calls()
+
+        if tool_name in current_always_allowed_tools:
+            tool_messages.append(await _ainvoke_tool(tool_call))
+            continue
+
+        # input() はブロッキングのため、イベントループを止めないよう別スレッドで待機する
+        with tracer.span("approval", "approval", **{"tool.name": tool_name}):
+            user_choice = await asyncio.to_thread(_request_tool_approval, tool_name, tool_call["args"])
+        should_execute, always_allow, rejection = _resolve_tool_approval(tool_name, user_choice)
+        if always_allow:
+            updated_always_allowed_tools.add(tool_name)
+        if should_execute:
+            tool_messages.append(await _ainvoke_tool(tool_call))
+        else:
+            tool_messages.append(ToolMessage(content=rejection, tool_call_id=tool_call["id"]))
+
+    await _flush_pending_calls()
+    return _finish_tool_execution(tool_messages, updated_always_allowed_tools)
 
 # Conditional logic for branching
 def should_continue(state: AgentState):
     if Config.DEBUG_MODE:
-        logger.debug(f"--- 2. Entering should_continue ---")
-        logger.debug(f"Current State: {state}")
+        logger.debug("--- 2. Entering should_continue ---")
+        logger.debug("Current State: %s", StateSummary(state))
         
     last_message = state["chat_history"][-1]
     if isinstance(last_message, AIMessage) and last_message.tool_calls:
         decision = "tools"
+        # 履歴が予算を超えている場合は、ツール実行と並行して要約する
+        if needs_compaction(state):
+            decision = ["tools", "summarize"]
     else:
         decision = "end"
         
     if Config.DEBUG_MODE:
-        logger.debug(f"Decision: {decision}")
+        logger.debug("Decision: %s", decision)
         
     return decision
 
 
+def _traced_node(name: str, func, afunc) -> RunnableLambda:
+    """ノードの実行をスパンとして記録する RunnableLambda を作成します。"""
+    def _run(state: AgentState):
+        with tracer.span(name, "node", **{"langgraph.node": name}) as span:
+            update = func(state)
+            _record_node_payload(span, state, update)
+            return update
+
+    async def _arun(state: AgentState):
+        with tracer.span(name, "node", **{"langgraph.node": name}) as span:
+            update = await afunc(state)
+            _record_node_payload(span, state, update)
+            return update
+
+    return RunnableLambda(_run, afunc=_arun, name=name)
+
+def _record_node_payload(span, state: AgentState, update: dict):
+    if span.recording:
+        span.set_attribute("payload.input_messages", len(state.get("chat_history") or []))
+        span.set_attribute("payload.output_messages", len(update.get("chat_history") or []))
+
 # Build the graph
-def create_agent_graph():
+def create_agent_graph(checkpointer: Optional[BaseCheckpointSaver] = None):
+    """
+    エージェントのグラフを構築します。
+    各ノードは同期版と非同期版の両方を持つため、返されたグラフは invoke/stream と
+    ainvoke/astream のどちらでも実行できます。
+
+    summarize ノードは tools ノードと同じステップで並行実行され、両者の更新はステップの終了時に
+    まとめて反映されます。そのため次の agent ノードは常に要約済みの履歴を受け取ります。
+
+    Args:
+        checkpointer (Optional[BaseCheckpointSaver]): 会話状態の保存先。省略した場合はメモリ上に保存します
+            （永続化する場合は src.core.checkpointer.create_checkpointer で作成したものを渡します）。
+    """
     workflow = StateGraph(AgentState)
-    workflow.add_node("agent", run_agent)
-    workflow.add_node("tools", execute_tools)
+    workflow.add_node("agent", _traced_node("agent", run_agent, arun_agent))
+    workflow.add_node("tools", _traced_node("tools", execute_tools, aexecute_tools))
+    workflow.add_node("summarize", _traced_node("summarize", summarize_history, asummarize_history))
     workflow.set_entry_point("agent")
     workflow.add_conditional_edges(
         "agent",
         should_continue,
-        {"tools": "tools", "end": END},
+        {"tools": "tools", "summarize": "summarize", "end": END},
     )
     workflow.add_edge("tools", "agent")
-    memory = MemorySaver()
-    return workflow.compile(checkpointer=memory)
\ No newline at end of file
+    workflow.add_edge("summarize", "agent")
+    if checkpointer is None:
+        checkpointer = MemorySaver()
+    return workflow.compile(checkpointer=checkpointer)
@@ -0,0 +1,322 @@
+import asyncio
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Any, AsyncIterator, Iterator, Optional, Sequence
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import BaseCheckpointSaver, ChannelVersions, Checkpoint, CheckpointMetadata, CheckpointTuple
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+from src.config import Config
+from src.core.message_store import ContentAddressedSerializer, InMemoryBlobStore, SqliteBlobStore
+from src.logging_config import logger
+
+class PrunedSqliteSaver(SqliteSaver):
+    """
+    スレッドごとに最新 keep_last 件のチェックポイントだけを保持する SqliteSaver。
+
+    チェックポイントを保存するたびに古いチェックポイントとその書き込みを削除し、
+    vacuum_interval 回の保存ごとに VACUUM でデータベースファイルを縮小します。
+    WAL モードかつ synchronous=NORMAL で動作するため、コミットごとの fsync は行いません
+    （アプリケーションが異常終了してもデータベースは壊れず、OSが停止した場合に直近のコミットが失われる可能性があるのみ）。
+    非同期メソッドは同期メソッドをスレッドで実行するため、ainvoke/astream でも使用できます。
+    """
+
+    def __init__(self, conn: sqlite3.Connection, *, keep_last: int = 20, vacuum_interval: int = 500,
+                 dedup_messages: bool = False, serde=None):
+        super().__init__(conn, serde=serde)
+        # シリアライズ中（ロックの保持中）にメッセージの保存先が同じロックを取得するため、再入可能にする
+        self.lock = threading.RLock()
+        if dedup_messages:
+            # メッセージはチェックポイントと同じ接続・同じトランザクションで message_blobs テーブルに保存する
+            self.serde = ContentAddressedSerializer(SqliteBlobStore(conn, lock=self.lock))
+        self.keep_last = keep_last
+        self.vacuum_interval = vacuum_interval
+        self._puts_since_vacuum = 0
+        self._vacuum_due = False
+        self._deferring_commit = False
+
+    @classmethod
+    def from_path(cls, path: str, **kwargs) -> "PrunedSqliteSaver":
+        """データベースファイルのパスから作成します。親ディレクトリがなければ作成します。"""
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        # 書き込み用のワーカースレッドなど、作成したスレッド以外からも使用する
+        conn = sqlite3.connect(path, check_same_thread=False)
+        return cls(conn, **kwargs)
+
+    def setup(self) -> None:
+        if self.is_setup:
+            return
+        super().setup()
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS writes_by_checkpoint ON writes (thread_id, checkpoint_ns, checkpoint_id)"
+        )
+
+    @contextmanager
+    def cursor(self, transaction: bool = True) -> Iterator[sqlite3.Cursor]:
+        # batch() の実行中はコミットを遅らせ、まとめて1回のトランザクションにする
+        with self.lock:
+            self.setup()
+            cur = self.conn.cursor()
+            try:
+                yield cur
+            finally:
+                if transaction and not self._deferring_commit:
+                    self.conn.commit()
+                cur.close()
+
+    @contextmanager
+    def batch(self):
+        """ブロック内の書き込みを1回のコミットにまとめます。"""
+        self._deferring_commit = True
+        try:
+            yield
+        except BaseException:
+            with self.lock:
+                self.conn.rollback()
+            raise
+        else:
+            with self.lock:
+                self.conn.commit()
+        finally:
+            self._deferring_commit = False
+        self._vacuum_if_due()
+
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+            new_versions: ChannelVersions) -> RunnableConfig:
+        # メッセージの保存（シリアライズ）からチェックポイントの書き込みまでをロック内で行い、
+        # ガベージコレクションが書き込み途中のメッセージを削除しないようにする
+        with self.lock:
+            next_config = super().put(config, checkpoint, metadata, new_versions)
+        self.prune(next_config["configurable"]["thread_id"], next_config["configurable"]["checkpoint_ns"])
+        self._puts_since_vacuum += 1
+        if self.vacuum_interval > 0 and self._puts_since_vacuum >= self.vacuum_interval:
+            self._vacuum_due = True
+        # VACUUM はトランザクション内で実行できないため、batch() の実行中は終了時まで遅らせる
+        if not self._deferring_commit:
+            self._vacuum_if_due()
+        return next_config
+
+    def prune(self, thread_id: str, checkpoint_ns: str = "") -> None:
+        """スレッドの最新 keep_last 件より古いチェックポイントと、それに紐づく書き込みを削除します。"""
+        if self.keep_last <= 0:
+            return
+        with self.cursor() as cur:
+            # チェックポイントIDは時刻順に並ぶ（SqliteSaver.list と同じ並び順）
+            cur.execute(
+                """DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id NOT IN (
+                    SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?
+                    ORDER BY checkpoint_id DESC LIMIT ?)""",
+                (str(thread_id), checkpoint_ns, str(thread_id), checkpoint_ns, self.keep_last),
+            )
+            cur.execute(
+                """DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id NOT IN (
+                    SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?)""",
+                (str(thread_id), checkpoint_ns, str(thread_id), checkpoint_ns),
+            )
+
+    def vacuum(self) -> None:
+        """
+        削除済みの領域を解放してデータベースファイルを縮小し、WALファイルを切り詰めます。
+        メッセージを ContentAddressedSerializer で保存している場合は、どのチェックポイントからも参照されなくなったメッセージも削除します。
+        """
+        collect_garbage = getattr(self.serde, "collect_garbage", None)
+        if collect_garbage is not None:
+            with self.lock:
+                self.setup()
+                rows = self.conn.execute("SELECT type, checkpoint FROM checkpoints UNION ALL SELECT type, value FROM writes").fetchall()
+                collect_garbage(rows)
+        with self.lock:
+            self.setup()
+            self.conn.commit()
+            self.conn.execute("VACUUM")
+            self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self._puts_since_vacuum = 0
+        self._vacuum_due = False
+        logger.debug("Checkpoint database vacuumed")
+
+    def _vacuum_if_due(self):
+        if self._vacuum_due:
+            self.vacuum()
+
+    def close(self) -> None:
+        self.conn.close()
+
+    # SqliteSaver は非同期メソッドを持たないため、同期メソッドをスレッドで実行する
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config: Optional[RunnableConfig], *, filter: Optional[dict[str, Any]] = None,
+                    before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> AsyncIterator[CheckpointTuple]:
+        items = await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for item in items:
+            yield item
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+                   new_versions: ChannelVersions) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[tuple[str, Any]], task_id: str,
+                          task_path: str = "") -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+_STOP = object()
+
+class WriteBehindCheckpointer(BaseCheckpointSaver):
+    """
+    チェックポイントの書き込みをワーカースレッドに任せ、エージェントのループをディスクI/Oで待たせないラッパー。
+
+    put / put_writes はキューに積むだけで即座に戻り、ワーカースレッドが溜まった書き込みを
+    まとめて1回のトランザクションで保存します（保存先が batch() を持つ場合）。
+    読み出しの前には未保存の書き込みをすべて反映するため、読み出し結果は常に最新です。
+    """
+
+    def __init__(self, saver: BaseCheckpointSaver, max_batch_size: int = 64):
+        super().__init__(serde=saver.serde)
+        self.saver = saver
+        self.max_batch_size = max_batch_size
+        self._queue: queue.Queue = queue.Queue()
+        self._error: Optional[Exception] = None
+        self._worker = threading.Thread(target=self._run, name="checkpoint-writer", daemon=True)
+        self._worker.start()
+
+    def _run(self):
+        while True:
+            items = [self._queue.get()]
+            while len(items) < self.max_batch_size:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = any(item is _STOP for item in items)
+            try:
+                batch = getattr(self.saver, "batch", None)
+                with batch() if batch else nullcontext():
+                    for item in items:
+                        if item is _STOP:
+                            continue
+                        method, args = item
+                        getattr(self.saver, method)(*args)
+            except Exception as e:
+                logger.error("チェックポイントの保存に失敗しました: %s", e)
+                self._error = e
+            finally:
+                for _ in items:
+                    self._queue.task_done()
+            if stop:
+                return
+
+    def _raise_pending_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise RuntimeError(f"チェックポイントの保存に失敗しました: {error}") from error
+
+    def flush(self) -> None:
+        """キューに積まれた書き込みがすべて保存されるまで待ちます。"""
+        self._queue.join()
+        self._raise_pending_error()
+
+    def close(self) -> None:
+        """未保存の書き込みを反映してからワーカースレッドを停止し、保存先を閉じます。"""
+        if self._worker.is_alive():
+            self._queue.put(_STOP)
+            self._worker.join()
+        close = getattr(self.saver, "close", None)
+        if close:
+            close()
+        self._raise_pending_error()
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        self.flush()
+        return self.saver.get_tuple(config)
+
+    def list(self, config: Optional[RunnableConfig], *, filter: Optional[dict[str, Any]] = None,
+             before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> Iterator[CheckpointTuple]:
+        self.flush()
+        return self.saver.list(config, filter=filter, before=before, limit=limit)
+
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+            new_versions: ChannelVersions) -> RunnableConfig:
+        self._raise_pending_error()
+        self._queue.put(("put", (config, checkpoint, metadata, new_versions)))
+        # 保存先の put と同じ形の設定を、保存の完了を待たずに返す
+        return {
+            "configurable": {
+                "thread_id": config["configurable"]["thread_id"],
+                "checkpoint_ns": config["configurable"].get("checkpoint_ns", ""),
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[tuple[str, Any]], task_id: str,
+                   task_path: str = "") -> None:
+        self._raise_pending_error()
+        self._queue.put(("put_writes", (config, list(writes), task_id, task_path)))
+
+    def delete_thread(self, thread_id: str) -> None:
+        self.flush()
+        self.saver.delete_thread(thread_id)
+
+    def get_next_version(self, current, channel):
+        return self.saver.get_next_version(current, channel)
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config: Optional[RunnableConfig], *, filter: Optional[dict[str, Any]] = None,
+                    before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> AsyncIterator[CheckpointTuple]:
+        items = await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for item in items:
+            yield item
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+                   new_versions: ChannelVersions) -> RunnableConfig:
+        # キューに積むだけなのでイベントループをブロックしない
+        return self.put(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[tuple[str, Any]], task_id: str,
+                          task_path: str = "") -> None:
+        self.put_writes(config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+def create_checkpointer() -> BaseCheckpointSaver:
+    """
+    Config の設定に従ってチェックポインターを作成します。
+
+    CHECKPOINT_BACKEND が "sqlite" の場合は CHECKPOINT_DB_PATH に会話を永続化し、
+    同じ thread_id で起動すると前回の会話を再開できます。"memory" の場合はプロセス終了時に会話が失われます。
+    CHECKPOINT_DEDUP_MESSAGES が有効な場合、メッセージの本体はチェックポイントとは別に内容のハッシュで一度だけ保存されます。
+    """
+    backend = Config.CHECKPOINT_BACKEND.lower()
+    if backend == "memory":
+        serde = ContentAddressedSerializer(InMemoryBlobStore()) if Config.CHECKPOINT_DEDUP_MESSAGES else None
+        return MemorySaver(serde=serde)
+    if backend != "sqlite":
+        raise ValueError(f"未対応のチェックポイントバックエンドです: {Config.CHECKPOINT_BACKEND}")
+
+    saver = PrunedSqliteSaver.from_path(
+        Config.CHECKPOINT_DB_PATH,
+        keep_last=Config.CHECKPOINT_KEEP_LAST,
+        vacuum_interval=Config.CHECKPOINT_VACUUM_INTERVAL,
+        dedup_messages=Config.CHECKPOINT_DEDUP_MESSAGES,
+    )
+    if Config.CHECKPOINT_WRITE_BEHIND:
+        return WriteBehindCheckpointer(saver)
+    return saver
+
+def close_checkpointer(checkpointer: BaseCheckpointSaver) -> None:
+    """未保存の書き込みを反映してチェックポインターを閉じます（close を持たない場合は何もしません）。"""
+    close = getattr(checkpointer, "close", None)
+    if close:
+        close()
@@ -0,0 +1,78 @@
+import asyncio
+import contextvars
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional
+
+from src.core.agent import summarize_history, asummarize_history
+from src.logging_config import logger
+
+class BackgroundCompactor:
+    """
+    ターン終了後の会話履歴の要約を、ユーザーへの応答表示と切り離してバックグラウンドで実行します。
+
+    schedule() で要約を開始し、次のターンを開始する前に wait() で完了を待ちます。
+    要約結果は update_state によって1つのチェックポイントとして反映されるため、
+    次のターンの agent ノードは要約前か要約後のどちらかの履歴のみを受け取ります。
+    非同期モードでは aschedule() / await_pending() を使用します。
+    """
+
+    def __init__(self, agent_app):
+        # agent_app: create_agent_graph で作成したコンパイル済みグラフ
+        self.agent_app = agent_app
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="compaction")
+        self._future: Optional[Future] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def schedule(self, config: dict):
+        """config のスレッドについて、必要であれば要約をバックグラウンドで開始します。"""
+        self.wait()
+        context = contextvars.copy_context()
+        self._future = self._executor.submit(context.run, self._compact, config)
+
+    def wait(self):
+        """実行中の要約があれば、完了して結果が反映されるまで待ちます。"""
+        future, self._future = self._future, None
+        if future is None:
+            return
+        try:
+            future.result()
+        except Exception as e:
+            # 要約に失敗しても会話は続行できる（次のツール実行時やターン終了時に再度要約される）
+            logger.warning("会話履歴のバックグラウンド要約に失敗しました: %s", e)
+
+    def close(self):
+        """実行中の要約の完了を待ってから、ワーカースレッドを終了します。"""
+        self.wait()
+        self._executor.shutdown()
+
+    def aschedule(self, config: dict):
+        """schedule の非同期版。実行中のイベントループ上のタスクとして要約を開始します。"""
+        self._task = asyncio.create_task(self._acompact(config))
+
+    async def await_pending(self):
+        """wait の非同期版。"""
+        task, self._task = self._task, None
+        if task is None:
+            return
+        try:
+            await task
+        except Exception as e:
+            logger.warning("会話履歴のバックグラウンド要約に失敗しました: %s", e)
+
+    def _compact(self, config: dict):
+        snapshot = self.agent_app.get_state(config)
+        # 実行途中で中断されたスレッドは要約しない
+        if snapshot.next or not snapshot.values.get("chat_history"):
+            return
+        update = summarize_history(snapshot.values)
+        if update:
+            # agent ノードの更新として記録し、次のターンが通常どおり agent ノードから始まるようにする
+            self.agent_app.update_state(config, update, as_node="agent")
+
+    async def _acompact(self, config: dict):
+        snapshot = await self.agent_app.aget_state(config)
+        if snapshot.next or not snapshot.values.get("chat_history"):
+            return
+        update = await asummarize_history(snapshot.values)
+        if update:
+            await self.agent_app.aupdate_state(config, update, as_node="agent")
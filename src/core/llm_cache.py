@@ -0,0 +1,258 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Optional, Sequence
+
+from langchain_core.caches import BaseCache
+from langchain_core.messages import messages_from_dict, message_to_dict
+from langchain_core.outputs import ChatGeneration, Generation
+
+from src.config import Config
+from src.logging_config import logger
+
+# キーの計算方法（正規化の内容）を変更した場合は値を上げ、古いエントリーがヒットしないようにする
+CACHE_KEY_VERSION = "2"
+
+# プロンプトのうち、同じ依頼を再実行するたびに変わる部分。キーの計算時にはプレースホルダーに置き換える
+_VOLATILE_PATTERNS = [
+    (re.compile(r"今日の日付は \d{4}-\d{2}-\d{2} です"), "今日の日付は <DATE> です"),
+]
+
+def _normalize_text(text: str) -> str:
+    for pattern, replacement in _VOLATILE_PATTERNS:
+        text = pattern.sub(replacement, text)
+    # 本文はそのまま比較する（ファイルの内容やコードではインデントなどの空白の違いが意味を持つ）
+    return text
+
+def _normalize_content(content: Any) -> Any:
+    if isinstance(content, str):
+        return _normalize_text(content)
+    if isinstance(content, list):
+        return [
+            {**part, "text": _normalize_text(part["text"])} if isinstance(part, dict) and isinstance(part.get("text"), str)
+            else _normalize_content(part)
+            for part in content
+        ]
+    return content
+
+def normalize_prompt(prompt: str) -> str:
+    """
+    LangChain がキャッシュのキーとして渡すメッセージ列（langchain_core.load.dumps の出力）を正規化します。
+
+    メッセージID・レスポンスのメタデータ・トークン数などの応答ごとに変わる情報を取り除き、
+    ツール呼び出しのIDは出現順の連番に置き換えます。本文は日付のみを _normalize_text でプレースホルダーに置き換え、それ以外はそのまま比較します。
+    """
+    try:
+        messages = json.loads(prompt)
+    except ValueError:
+        return _normalize_text(prompt)
+    if not isinstance(messages, list):
+        return _normalize_text(prompt)
+
+    tool_call_ids: dict[str, str] = {}
+
+    def _tool_call_id(original: str) -> str:
+        return tool_call_ids.setdefault(original, f"call_{len(tool_call_ids)}")
+
+    normalized = []
+    for message in messages:
+        kwargs = message.get("kwargs", {}) if isinstance(message, dict) else {}
+        entry = {"type": kwargs.get("type"), "content": _normalize_content(kwargs.get("content"))}
+        if kwargs.get("tool_calls"):
+            entry["tool_calls"] = [
+                {"name": call.get("name"), "args": call.get("args"), "id": _tool_call_id(str(call.get("id")))}
+                for call in kwargs["tool_calls"]
+            ]
+        if kwargs.get("tool_call_id"):
+            entry["tool_call_id"] = _tool_call_id(kwargs["tool_call_id"])
+        if kwargs.get("name"):
+            entry["name"] = kwargs["name"]
+        normalized.append(entry)
+    return json.dumps(normalized, ensure_ascii=False, sort_keys=True)
+
+def cache_key(prompt: str, llm_string: str) -> str:
+    """
+    モデル名・バインドされたツールのスキーマ・パラメーター（llm_string）と、正規化したメッセージ列のハッシュ。
+    """
+    digest = hashlib.sha256()
+    for part in (CACHE_KEY_VERSION, llm_string, normalize_prompt(prompt)):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+def _dump_generations(generations: Sequence[Generation]) -> str:
+    entries = []
+    for generation in generations:
+        if isinstance(generation, ChatGeneration):
+            message = generation.message.model_copy(update={"id": None})
+            entries.append({"message": message_to_dict(message), "generation_info": generation.generation_info})
+        else:
+            entries.append({"text": generation.text, "generation_info": generation.generation_info})
+    return json.dumps(entries, ensure_ascii=False)
+
+def _load_generations(data: str) -> list[Generation]:
+    generations = []
+    for entry in json.loads(data):
+        if "message" in entry:
+            message = messages_from_dict([entry["message"]])[0]
+            generations.append(ChatGeneration(message=message, generation_info=entry.get("generation_info")))
+        else:
+            generations.append(Generation(text=entry["text"], generation_info=entry.get("generation_info")))
+    return generations
+
+@dataclass
+class CacheStats:
+    """キャッシュの利用状況。hits / misses / evictions はこのプロセスでの回数です。"""
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    entries: int = 0
+    total_bytes: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+class SqliteLLMCache(BaseCache):
+    """
+    LLMの応答を SQLite に保存するキャッシュ。
+
+    チャットモデルの cache 引数に渡すと、同じモデル・ツール・メッセージ列（cache_key を参照）への呼び出しは
+    LLMを呼び出さずに保存済みの応答を返します。temperature=0 で同じ依頼を繰り返し再実行する場合（CIやデモ）に使用します。
+
+    max_entries を超えた場合は最後に使用された時刻が古いものから削除し（LRU）、
+    ttl_seconds を過ぎたエントリーは使用しません（0の場合は期限なし）。
+    """
+
+    def __init__(self, conn: sqlite3.Connection, *, max_entries: int = 2000, ttl_seconds: int = 0):
+        self.conn = conn
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._stats = CacheStats()
+        with self._lock:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, generations TEXT NOT NULL, created_at REAL NOT NULL, last_used_at REAL NOT NULL, hits INTEGER NOT NULL DEFAULT 0)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_last_used ON llm_cache (last_used_at)")
+            self.conn.commit()
+
+    @classmethod
+    def from_path(cls, path: str, **kwargs) -> "SqliteLLMCache":
+        """path のデータベースファイルを開きます（親ディレクトリが存在しない場合は作成します）。"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        return cls(sqlite3.connect(path, check_same_thread=False), **kwargs)
+
+    def _is_expired(self, created_at: float, now: float) -> bool:
+        return self.ttl_seconds > 0 and now - created_at > self.ttl_seconds
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[list[Generation]]:
+        key = cache_key(prompt, llm_string)
+        now = time.time()
+        with self._lock:
+            row = self.conn.execute("SELECT generations, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is not None and self._is_expired(row[1], now):
+                self.conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._stats.evictions += 1
+                row = None
+            if row is None:
+                self._stats.misses += 1
+                self.conn.commit()
+                return None
+            self.conn.execute("UPDATE llm_cache SET last_used_at = ?, hits = hits + 1 WHERE key = ?", (now, key))
+            self.conn.commit()
+            self._stats.hits += 1
+        if Config.DEBUG_MODE:
+            logger.debug("LLM cache hit: %s", key[:12])
+        return _load_generations(row[0])
+
+    def update(self, prompt: str, llm_string: str, return_val: Sequence[Generation]) -> None:
+        self._put(cache_key(prompt, llm_string), _dump_generations(return_val), time.time())
+
+    def _put(self, key: str, generations: str, created_at: float):
+        now = time.time()
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, generations, created_at, last_used_at) VALUES (?, ?, ?, ?)",
+                (key, generations, created_at, now),
+            )
+            self._evict()
+            self.conn.commit()
+
+    def _evict(self):
+        if self.ttl_seconds > 0:
+            cur = self.conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+            self._stats.evictions += max(cur.rowcount, 0)
+        if self.max_entries > 0:
+            cur = self.conn.execute(
+                "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY last_used_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._stats.evictions += max(cur.rowcount, 0)
+
+    def clear(self, **kwargs: Any) -> None:
+        with self._lock:
+            self.conn.execute("DELETE FROM llm_cache")
+            self.conn.commit()
+
+    def stats(self) -> CacheStats:
+        """このプロセスでのヒット・ミス・削除の回数と、保存しているエントリー数・合計バイト数を返します。"""
+        with self._lock:
+            entries, total_bytes = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(generations)), 0) FROM llm_cache").fetchone()
+        return CacheStats(self._stats.hits, self._stats.misses, self._stats.evictions, entries, total_bytes)
+
+    def export_jsonl(self, path: str) -> int:
+        """
+        保存している応答を1行1件の JSONL ファイルに書き出し、件数を返します。
+        書き出したファイルは seed_from_jsonl で別の環境（CIなど）のキャッシュに読み込めます。
+        """
+        with self._lock:
+            rows = self.conn.execute("SELECT key, generations, created_at FROM llm_cache ORDER BY created_at").fetchall()
+        with open(path, "w", encoding="utf-8") as f:
+            for key, generations, created_at in rows:
+                f.write(json.dumps({"key": key, "generations": json.loads(generations), "created_at": created_at}, ensure_ascii=False) + "\n")
+        return len(rows)
+
+    def seed_from_jsonl(self, path: str) -> int:
+        """
+        export_jsonl で記録したセッションの応答をキャッシュに読み込み、件数を返します。
+        読み込んだエントリーは読み込んだ時点で作成されたものとして扱います（TTLは読み込み時から数えます）。
+        """
+        count = 0
+        now = time.time()
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                self._put(entry["key"], json.dumps(entry["generations"], ensure_ascii=False), now)
+                count += 1
+        return count
+
+    def close(self) -> None:
+        with self._lock:
+            self.conn.close()
+
+def create_llm_cache() -> Optional[SqliteLLMCache]:
+    """
+    LLM_CACHE が有効な場合、Config の設定に従ってLLMの応答キャッシュを作成します。無効な場合は None を返します。
+    LLM_CACHE_SEED_FILE が指定されている場合は、記録済みのセッションの応答を読み込みます。
+    """
+    if not Config.LLM_CACHE:
+        return None
+    cache = SqliteLLMCache.from_path(
+        Config.LLM_CACHE_PATH, max_entries=Config.LLM_CACHE_MAX_ENTRIES, ttl_seconds=Config.LLM_CACHE_TTL,
+    )
+    if Config.LLM_CACHE_SEED_FILE:
+        count = cache.seed_from_jsonl(Config.LLM_CACHE_SEED_FILE)
+        logger.info("Seeded LLM cache with %d responses from %s", count, Config.LLM_CACHE_SEED_FILE)
+    return cache
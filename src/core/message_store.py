@@ -0,0 +1,203 @@
+import hashlib
+import sqlite3
+import threading
+from typing import Any, Iterable, Optional, Protocol
+
+from langchain_core.messages import BaseMessage
+from langgraph.checkpoint.serde.base import SerializerProtocol
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+from src.logging_config import logger
+
+# チェックポイント内でメッセージの代わりに置かれる参照のキー
+MESSAGE_REF_KEY = "__msg_ref__"
+
+class BlobStore(Protocol):
+    """シリアライズ済みのメッセージを、内容のハッシュをキーとして保存するストアのインターフェース。"""
+
+    def put(self, key: str, type_: str, data: bytes) -> None:
+        """key のメッセージを保存します。既に存在する場合は何もしません。"""
+        ...
+
+    def get_many(self, keys: Iterable[str]) -> dict[str, tuple[str, bytes]]:
+        """keys のメッセージをまとめて取得します。"""
+        ...
+
+    def retain(self, keys: set[str]) -> int:
+        """keys 以外のメッセージを削除し、削除した件数を返します。"""
+        ...
+
+    def total_bytes(self) -> int:
+        """保存しているメッセージの合計バイト数を返します。"""
+        ...
+
+class InMemoryBlobStore:
+    """メモリ上の BlobStore。MemorySaver と組み合わせて使用します。"""
+
+    def __init__(self):
+        self._blobs: dict[str, tuple[str, bytes]] = {}
+        self._lock = threading.Lock()
+
+    def put(self, key: str, type_: str, data: bytes) -> None:
+        with self._lock:
+            self._blobs.setdefault(key, (type_, data))
+
+    def get_many(self, keys: Iterable[str]) -> dict[str, tuple[str, bytes]]:
+        with self._lock:
+            return {key: self._blobs[key] for key in keys if key in self._blobs}
+
+    def retain(self, keys: set[str]) -> int:
+        with self._lock:
+            stale = [key for key in self._blobs if key not in keys]
+            for key in stale:
+                del self._blobs[key]
+        return len(stale)
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            return sum(len(data) for _, data in self._blobs.values())
+
+class SqliteBlobStore:
+    """
+    SQLite の message_blobs テーブルに保存する BlobStore。
+
+    lock を指定した場合はチェックポインターと接続・ロックを共有し、コミットはチェックポインターに任せます。
+    メッセージはそれを参照するチェックポイントと同じトランザクションで保存されるため、参照先が欠けることはありません。
+    """
+
+    # SQLite の1文に含められるパラメーター数の上限より小さい値
+    _QUERY_CHUNK = 500
+
+    def __init__(self, conn: sqlite3.Connection, lock: Optional[threading.RLock] = None):
+        self.conn = conn
+        self._owns_transaction = lock is None
+        self._lock = lock or threading.RLock()
+        with self._lock:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS message_blobs (hash TEXT PRIMARY KEY, type TEXT NOT NULL, data BLOB NOT NULL)"
+            )
+            self._commit()
+
+    def _commit(self):
+        if self._owns_transaction:
+            self.conn.commit()
+
+    def put(self, key: str, type_: str, data: bytes) -> None:
+        with self._lock:
+            self.conn.execute("INSERT OR IGNORE INTO message_blobs (hash, type, data) VALUES (?, ?, ?)", (key, type_, data))
+            self._commit()
+
+    def get_many(self, keys: Iterable[str]) -> dict[str, tuple[str, bytes]]:
+        keys = list(keys)
+        found = {}
+        with self._lock:
+            for i in range(0, len(keys), self._QUERY_CHUNK):
+                chunk = keys[i:i + self._QUERY_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                for key, type_, data in self.conn.execute(
+                    f"SELECT hash, type, data FROM message_blobs WHERE hash IN ({placeholders})", chunk
+                ):
+                    found[key] = (type_, data)
+        return found
+
+    def retain(self, keys: set[str]) -> int:
+        with self._lock:
+            self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS live_message_blobs (hash TEXT PRIMARY KEY)")
+            self.conn.execute("DELETE FROM live_message_blobs")
+            self.conn.executemany("INSERT OR IGNORE INTO live_message_blobs (hash) VALUES (?)", ((key,) for key in keys))
+            cur = self.conn.execute("DELETE FROM message_blobs WHERE hash NOT IN (SELECT hash FROM live_message_blobs)")
+            self._commit()
+            return cur.rowcount
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            return self.conn.execute("SELECT COALESCE(SUM(LENGTH(data)), 0) FROM message_blobs").fetchone()[0]
+
+    def close(self) -> None:
+        if self._owns_transaction:
+            self.conn.close()
+
+class ContentAddressedSerializer(SerializerProtocol):
+    """
+    チェックポイント内のメッセージを BlobStore に一度だけ保存し、チェックポイントにはハッシュによる参照のみを書き込むシリアライザー。
+
+    会話履歴はステップごとにチェックポイントへ丸ごと保存されるため、通常は同じメッセージ
+    （特にファイルの内容やWebページなどの大きな ToolMessage）が何十回も複製されます。
+    このシリアライザーを使うと、各メッセージの本体はセッション全体で1回だけ保存されます。
+    メッセージ以外の値は内部のシリアライザー（JsonPlusSerializer）でそのままシリアライズします。
+    """
+
+    def __init__(self, store: BlobStore, inner: Optional[SerializerProtocol] = None):
+        self.store = store
+        self.inner = inner or JsonPlusSerializer()
+
+    def dumps_typed(self, obj: Any) -> tuple[str, bytes]:
+        return self.inner.dumps_typed(_map_messages(obj, self._store_message))
+
+    def loads_typed(self, data: tuple[str, bytes]) -> Any:
+        obj = self.inner.loads_typed(data)
+        keys = set(_collect_refs(obj))
+        if not keys:
+            return obj
+        blobs = self.store.get_many(keys)
+        missing = keys - blobs.keys()
+        if missing:
+            raise KeyError(f"チェックポイントが参照するメッセージが見つかりません: {sorted(missing)}")
+        messages = {key: self.inner.loads_typed(blob) for key, blob in blobs.items()}
+        return _resolve_refs(obj, messages)
+
+    def _store_message(self, message: BaseMessage) -> dict:
+        type_, data = self.inner.dumps_typed(message)
+        key = hashlib.sha256(type_.encode("utf-8") + b"\0" + data).hexdigest()
+        self.store.put(key, type_, data)
+        return {MESSAGE_REF_KEY: key}
+
+    def collect_garbage(self, serialized_values: Iterable[tuple[str, bytes]]) -> int:
+        """
+        serialized_values（保存されているチェックポイントと書き込み）から参照されていないメッセージを削除し、削除した件数を返します。
+        保存したメッセージを参照するチェックポイントがまだ書き込まれていない状態で呼び出さないよう、呼び出し元で書き込みと排他制御してください。
+        """
+        live_keys = set()
+        for type_, data in serialized_values:
+            if type_ is None or data is None:
+                continue
+            live_keys.update(_collect_refs(self.inner.loads_typed((type_, data))))
+        removed = self.store.retain(live_keys)
+        logger.debug("Removed %d unreferenced message blobs", removed)
+        return removed
+
+def _map_messages(obj: Any, fn):
+    """obj に含まれるメッセージを fn の戻り値に置き換えた値を返します。"""
+    if isinstance(obj, BaseMessage):
+        return fn(obj)
+    if isinstance(obj, list):
+        return [_map_messages(item, fn) for item in obj]
+    if isinstance(obj, tuple):
+        return tuple(_map_messages(item, fn) for item in obj)
+    if type(obj) is dict:
+        return {key: _map_messages(value, fn) for key, value in obj.items()}
+    return obj
+
+def _is_ref(obj: Any) -> bool:
+    return type(obj) is dict and len(obj) == 1 and MESSAGE_REF_KEY in obj
+
+def _collect_refs(obj: Any):
+    if _is_ref(obj):
+        yield obj[MESSAGE_REF_KEY]
+    elif isinstance(obj, (list, tuple)):
+        for item in obj:
+            yield from _collect_refs(item)
+    elif type(obj) is dict:
+        for value in obj.values():
+            yield from _collect_refs(value)
+
+def _resolve_refs(obj: Any, messages: dict[str, BaseMessage]):
+    if _is_ref(obj):
+        return messages[obj[MESSAGE_REF_KEY]]
+    if isinstance(obj, list):
+        return [_resolve_refs(item, messages) for item in obj]
+    if isinstance(obj, tuple):
+        return tuple(_resolve_refs(item, messages) for item in obj)
+    if type(obj) is dict:
+        return {key: _resolve_refs(value, messages) for key, value in obj.items()}
+    return obj
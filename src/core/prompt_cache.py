@@ -0,0 +1,109 @@
+import hashlib
+import json
+import threading
+import time
+from typing import Optional, Protocol, Sequence
+
+from langchain_core.messages import SystemMessage
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from src.logging_config import logger
+
+class ContextCacheClient(Protocol):
+    """
+    プロバイダー側のコンテキストキャッシュを操作するクライアントのインターフェース。
+    テストではローカルの偽クライアントに差し替えられます。
+    """
+
+    def create(self, *, system_instruction: str, tools: Sequence, ttl_seconds: int) -> str:
+        """システムプロンプトとツール定義をキャッシュし、キャッシュ名を返します。"""
+        ...
+
+    def delete(self, name: str) -> None:
+        """キャッシュを削除します。"""
+        ...
+
+class GeminiContextCacheClient:
+    """Gemini の明示的コンテキストキャッシュ (cachedContents API) を使用するクライアント。"""
+
+    def __init__(self, llm):
+        # llm: ChatGoogleGenerativeAI。モデル名と認証情報はこのインスタンスのものを使用する
+        self.llm = llm
+
+    def create(self, *, system_instruction: str, tools: Sequence, ttl_seconds: int) -> str:
+        return self.llm.create_cached_content(
+            [SystemMessage(content=system_instruction)],
+            tools=list(tools),
+            ttl=ttl_seconds,
+        )
+
+    def delete(self, name: str) -> None:
+        from google.generativeai import caching
+        caching.CachedContent.get(name).delete()
+
+def compute_prefix_key(model_name: str, static_prompt: str, tools: Sequence) -> str:
+    """モデル名・不変のシステムプロンプト・ツールスキーマから、キャッシュの同一性を表すキーを計算します。"""
+    tool_schemas = [convert_to_openai_tool(t) for t in tools]
+    payload = json.dumps(
+        {"model": model_name, "system": static_prompt, "tools": tool_schemas},
+        ensure_ascii=False, sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class PromptCacheManager:
+    """
+    不変のプロンプトプレフィックス（システムプロンプト + ツール定義）に対応する
+    コンテキストキャッシュを作成・再利用します。
+
+    プレフィックスが変化した場合や有効期限が近づいた場合は作り直します。
+    キャッシュの作成に失敗した場合は一定時間キャッシュを使わずに動作し、呼び出し元は
+    通常のリクエスト（システムプロンプトとツールを毎回送信）にフォールバックします。
+    """
+
+    def __init__(self, client: ContextCacheClient, model_name: str, tools: Sequence,
+                 ttl_seconds: int = 3600, refresh_margin_seconds: int = 60, retry_after_seconds: int = 300):
+        self.client = client
+        self.model_name = model_name
+        self.tools = list(tools)
+        self.ttl_seconds = ttl_seconds
+        self.refresh_margin_seconds = refresh_margin_seconds
+        self.retry_after_seconds = retry_after_seconds
+        self._lock = threading.Lock()
+        self._key: Optional[str] = None
+        self._name: Optional[str] = None
+        self._expires_at = 0.0
+        self._disabled_until = 0.0
+
+    def get_cached_content(self, static_prompt: str) -> Optional[str]:
+        """
+        static_prompt に対応するキャッシュ名を返します。キャッシュが使えない場合は None を返します。
+        """
+        key = compute_prefix_key(self.model_name, static_prompt, self.tools)
+        now = time.monotonic()
+        with self._lock:
+            if self._name and self._key == key and now < self._expires_at - self.refresh_margin_seconds:
+                return self._name
+            if now < self._disabled_until:
+                return None
+
+            previous_name = self._name
+            try:
+                name = self.client.create(system_instruction=static_prompt, tools=self.tools, ttl_seconds=self.ttl_seconds)
+            except Exception as e:
+                logger.warning("コンテキストキャッシュの作成に失敗したため、通常のリクエストで続行します: %s", e)
+                self._name = None
+                self._disabled_until = now + self.retry_after_seconds
+                return None
+
+            self._key = key
+            self._name = name
+            self._expires_at = now + self.ttl_seconds
+            logger.debug("Context cache created: %s", name)
+
+        # プレフィックスが変わって不要になった古いキャッシュは削除する（失敗しても有効期限で消える）
+        if previous_name and previous_name != name:
+            try:
+                self.client.delete(previous_name)
+            except Exception as e:
+                logger.debug("Failed to delete stale context cache %s: %s", previous_name, e)
+        return name
@@ -1,36 +1,23 @@
 import platform
-from datetime import datetime
+from datetime import date
+from functools import lru_cache
 from typing import List, Dict, Any, Optional
 
 from src.config import Config
 
-# 基本的なエージェントプロンプトを生成する関数
-def create_agent_prompt(state: dict) -> str:
-    os_name = platform.system()
-    today_date = datetime.now().isoformat()
-
-    # --- stateから作業状況を生成 ---
-    work_context_fields = [
-        "overall_policy", "worker_role", "work_rules", "work_plan",
-        "work_content", "work_purpose", "work_results", "current_issues",
-        "issue_countermeasures", "next_steps", "memos"
-    ]
-    
-    work_context_str = ""
-    for field in work_context_fields:
-        value = state.get(field)
-        work_context_str += f"- {field}: {value or '未設定'}\n"
+# 作業状況としてプロンプトに埋め込む state のフィールド
+WORK_CONTEXT_FIELDS = [
+    "overall_policy", "worker_role", "work_rules", "work_plan",
+    "work_content", "work_purpose", "work_results", "current_issues",
+    "issue_countermeasures", "next_steps", "memos"
+]
 
-    todo_list = state.get("todo_list")
-    if todo_list:
-        work_context_str += "- todo_list:\n"
-        for i, item in enumerate(todo_list):
-            status = "完了" if item.get("completed") else "未完了"
-            task = item.get("task", "（タスク内容不明）")
-            work_context_str += f"  - [{status}] {task}\n"
-    else:
-        work_context_str += "- todo_list: 未設定\n"
-    # ---
+# 基本的なエージェントプロンプト（毎ターン不変の部分）を生成する関数
+# プロバイダー側のプレフィックスキャッシュ・コンテキストキャッシュが効くよう、
+# 日付や作業状況など毎ターン変わり得る値はここに含めず、create_volatile_context で別途生成する
+@lru_cache(maxsize=1)
+def create_static_system_prompt() -> str:
+    os_name = platform.system()
 
     prompt = f"""
 <AIの役割>
@@ -57,14 +44,14 @@ def create_agent_prompt(state: dict) -> str:
 - ツール実行時にエラーが発生した場合、同じツール呼び出しを単純に繰り返さないこと。エラーメッセージを注意深く分析し、引数が間違っていたか、アプローチ自体が問題だったかを判断すること。可能であれば、引数を修正して再試行するか、別のツールを使ってタスクの達成を試みること。自身で解決できない場合は、問題をユーザーに報告すること。
 - タスクが複数のステップを要する場合、または複雑な思考プロセスを伴う場合は、tool実行結果のうち回答に必要な情報をmemosフィールドに「作業用メモリ」として書き込むこと。
 - 作業完了時、またはmemosに記録された情報が不要になった場合は、memosフィールドから該当する情報を削除し、常に最新かつ必要な情報のみを保持すること。
-- 会話履歴は、**会話ターン数が** `MAX_CONVERSATION_TURNS`（現在: {Config.MAX_CONVERSATION_TURNS} ターン）**を超過すると**自動的に要約され、最新の `SUMMARY_CONVERSATION_TURNS`（現在: {Config.SUMMARY_CONVERSATION_TURNS} ターン）のみが詳細に保持されます。重要な情報や長期的に参照する必要がある内容は、必ず `memos` に追記してください。
+- 会話履歴は、**履歴のトークン数が** `CONTEXT_TOKEN_BUDGET`（現在: {Config.CONTEXT_TOKEN_BUDGET} トークン）**に達すると**自動的に要約され、最新の約 `SUMMARY_KEEP_TOKENS`（現在: {Config.SUMMARY_KEEP_TOKENS} トークン）分の会話のみが詳細に保持されます。大きなツール結果（ファイルやWebページの内容など）は多くのトークンを消費するため、早く要約対象になります。要約された古い会話は、会話履歴の先頭に <これまでの会話の要約> として提示されます。重要な情報や長期的に参照する必要がある内容は、必ず `memos` に追記してください。
 - 最終回答をユーザーに提示する前に、必ずthink_toolを用いて回答内容を自己評価すること。
 - 自己評価の結果、問題が見つかった場合は、回答を修正し、再度think_toolで評価を行うこと。
 - 問題がないと判断された場合にのみ、最終回答をユーザーに提示すること。
 </タスク遂行の考え方>
 
 <TODOリスト管理>
-todo_list は {{{{"task": "タスク内容", "completed": False}}}}の形式で管理する。
+todo_list は {{"task": "タスク内容", "completed": False}}の形式で管理する。
 更新時は最新の AgentState を取得し、追加・完了・削除を反映したリスト全体を渡す。
 重複タスクを追加しない。
 完了マーク対象のタスクIDが有効であることを確認する。
@@ -77,12 +64,9 @@ todo_list は {{{{"task": "タスク内容", "completed": False}}}}の形式で
 
 <環境情報>
 - 現在のOSは {os_name} です。ファイルパスを扱う際は、このOSの形式に従ってください。
-- 今日の日付は {today_date} です。
+- 今日の日付と現在の作業状況は、ユーザーの入力の直前に <現在の状況> として提示されます。
 </環境情報>
 
-<現在の作業状況>
-{work_context_str}</現在の作業状況>
-
 # <利用可能なツール> に関する注意:
 # このプロンプトには、利用可能なツールの一覧は明示的に記載されていません。
 # LangChainの `bind_tools` 機能により、エージェントに渡されたツールリストから、
@@ -91,8 +75,44 @@ todo_list は {{{{"task": "タスク内容", "completed": False}}}}の形式で
 # 修正するだけでよく、このプロンプトファイルを変更する必要はありません。
 
 <ユーザー承認が必要なツール>
-ファイルシステムを変更するツール（write_file, delete_file, create_directory, delete_directory, move, run_shell_command など）を実行する際は必ずユーザーの確認を得る。
+ファイルシステムを変更するツール（write_file, apply_patch, batch_file_operations, delete_file, create_directory, delete_directory, move, run_shell_command, kill_shell_job など）を実行する際は必ずユーザーの確認を得る。
 拒否された場合は別の方法を検討するか、ユーザーに明確化を求める。
 </ユーザー承認が必要なツール>
 """
     return prompt
+
+# 毎ターン変わり得る情報（日付・作業状況）を生成する関数
+# ユーザー入力の直前に置かれるため、変化してもそれ以前のプロンプトのキャッシュは無効化されない
+def create_volatile_context(state: dict) -> str:
+    # 日単位の粒度にすることで、同じ日のターン間ではこのブロックも変化しにくくする
+    today_date = date.today().isoformat()
+
+    # --- stateから作業状況を生成 ---
+    work_context_str = ""
+    for field in WORK_CONTEXT_FIELDS:
+        value = state.get(field)
+        work_context_str += f"- {field}: {value or '未設定'}\n"
+
+    todo_list = state.get("todo_list")
+    if todo_list:
+        work_context_str += "- todo_list:\n"
+        for i, item in enumerate(todo_list):
+            status = "完了" if item.get("completed") else "未完了"
+            task = item.get("task", "（タスク内容不明）")
+            work_context_str += f"  - [{status}] {task}\n"
+    else:
+        work_context_str += "- todo_list: 未設定\n"
+    # ---
+
+    return f"""<現在の状況>
+- 今日の日付は {today_date} です。
+
+<現在の作業状況>
+{work_context_str}</現在の作業状況>
+</現在の状況>"""
+
+# 履歴から外れた古い会話の要約を、会話履歴の先頭に置くメッセージ用の文字列に整形する関数
+def create_summary_context(conversation_summary: str) -> str:
+    return f"""<これまでの会話の要約>
+{conversation_summary}
+</これまでの会話の要約>"""
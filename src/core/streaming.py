@@ -0,0 +1,105 @@
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional
+
+from langchain_core.messages import AIMessage, BaseMessage
+
+# 1ターン分のストリーミングで購読するモード
+# messages: LLMのトークン, custom: ツールの開始・終了イベント, values: 各ステップ後の状態
+STREAM_MODES = ["messages", "custom", "values"]
+
+@dataclass
+class TurnMetrics:
+    """1ターン（ユーザー入力から最終応答まで）の計測結果。"""
+    # ターン開始から最初のトークンが表示されるまでの秒数。トークンが出力されなかった場合は None
+    time_to_first_token: Optional[float] = None
+    # ターン全体の所要秒数
+    total_latency: float = 0.0
+    # ターン中に実行されたツール呼び出しの数
+    tool_calls: int = 0
+    # ターン中に出力されたトークン（チャンク）の数
+    token_chunks: int = 0
+
+@dataclass
+class StreamCallbacks:
+    """ストリーミング中のイベントを受け取るコールバック群。"""
+    # LLMのトークン。第2引数は LangGraph のステップ番号で、ステップが変わったら改行するなどに使う
+    on_token: Callable[[str, int], None] = lambda text, step: None
+    # ツールの開始・終了イベント（execute_tools が custom ストリームに送出する辞書）
+    on_tool_event: Callable[[dict], None] = lambda event: None
+
+@dataclass
+class _TurnRecorder:
+    callbacks: StreamCallbacks
+    started_at: float = field(default_factory=time.perf_counter)
+    metrics: TurnMetrics = field(default_factory=TurnMetrics)
+    final_state: Optional[dict] = None
+
+    def handle(self, mode: str, payload: Any):
+        if mode == "messages":
+            chunk, metadata = payload
+            # 要約などエージェントノード以外のLLM出力は表示しない
+            if metadata.get("langgraph_node") != "agent":
+                return
+            text = _chunk_text(chunk)
+            if not text:
+                return
+            if self.metrics.time_to_first_token is None:
+                self.metrics.time_to_first_token = time.perf_counter() - self.started_at
+            self.metrics.token_chunks += 1
+            self.callbacks.on_token(text, metadata.get("langgraph_step", 0))
+        elif mode == "custom":
+            if isinstance(payload, dict) and payload.get("event") in ("tool_start", "tool_end"):
+                if payload["event"] == "tool_end":
+                    self.metrics.tool_calls += 1
+                self.callbacks.on_tool_event(payload)
+        elif mode == "values":
+            self.final_state = payload
+
+    def finish(self) -> tuple[Optional[AIMessage], TurnMetrics]:
+        self.metrics.total_latency = time.perf_counter() - self.started_at
+        final_message = None
+        if self.final_state:
+            history = self.final_state.get("chat_history", [])
+            if history and isinstance(history[-1], AIMessage):
+                final_message = history[-1]
+        return final_message, self.metrics
+
+def _chunk_text(chunk: BaseMessage) -> str:
+    """メッセージチャンクから表示用のテキストを取り出します。"""
+    content = chunk.content
+    if isinstance(content, str):
+        return content
+    # Gemini はコンテンツをパーツのリストで返すことがある
+    parts = []
+    for part in content:
+        if isinstance(part, str):
+            parts.append(part)
+        elif isinstance(part, dict) and part.get("type") == "text":
+            parts.append(part.get("text", ""))
+    return "".join(parts)
+
+def stream_turn(agent_app, state: dict, config: dict, callbacks: StreamCallbacks) -> tuple[Optional[AIMessage], TurnMetrics]:
+    """
+    エージェントの1ターンをストリーミング実行します。
+
+    Args:
+        agent_app: create_agent_graph で作成したコンパイル済みグラフ。
+        state (dict): グラフへの入力（{"input": ...}）。
+        config (dict): thread_id などを含む実行設定。
+        callbacks (StreamCallbacks): トークンやツールイベントを受け取るコールバック。
+
+    Returns:
+        tuple[Optional[AIMessage], TurnMetrics]: 最終的なAIの応答と、このターンの計測結果。
+    """
+    recorder = _TurnRecorder(callbacks)
+    for mode, payload in agent_app.stream(state, config=config, stream_mode=STREAM_MODES):
+        recorder.handle(mode, payload)
+    return recorder.finish()
+
+async def astream_turn(agent_app, state: dict, config: dict, callbacks: StreamCallbacks) -> tuple[Optional[AIMessage], TurnMetrics]:
+    """stream_turn の非同期版。"""
+    recorder = _TurnRecorder(callbacks)
+    async for mode, payload in agent_app.astream(state, config=config, stream_mode=STREAM_MODES):
+        recorder.handle(mode, payload)
+    return recorder.finish()
@@ -0,0 +1,63 @@
+import json
+import math
+from typing import Iterable
+
+from langchain_core.messages import AIMessage, BaseMessage
+
+# メッセージごとのトークン数をキャッシュする response_metadata のキー
+TOKEN_COUNT_KEY = "token_count"
+# ロールや区切りなど、本文以外にメッセージ1件あたりでかかるトークン数の概算
+MESSAGE_OVERHEAD_TOKENS = 4
+
+def estimate_text_tokens(text: str) -> int:
+    """
+    テキストのトークン数をローカルで概算します。
+
+    ASCII文字はおよそ4文字で1トークン、日本語などの非ASCII文字はおよそ1文字で1トークンとして数えます。
+    """
+    if not text:
+        return 0
+    ascii_chars = len(text.encode("ascii", errors="ignore"))
+    non_ascii_chars = len(text) - ascii_chars
+    return math.ceil(ascii_chars / 4) + non_ascii_chars
+
+def message_text(message: BaseMessage) -> str:
+    """トークン数の概算に使う、メッセージの本文（ツール呼び出しの引数を含む）を返します。"""
+    content = message.content
+    if isinstance(content, str):
+        text = content
+    else:
+        parts = []
+        for part in content:
+            if isinstance(part, str):
+                parts.append(part)
+            elif isinstance(part, dict):
+                parts.append(str(part.get("text", "")))
+        text = "".join(parts)
+    if isinstance(message, AIMessage) and message.tool_calls:
+        text += json.dumps([{"name": tc["name"], "args": tc["args"]} for tc in message.tool_calls], ensure_ascii=False)
+    return text
+
+def count_message_tokens(message: BaseMessage) -> int:
+    """
+    メッセージのトークン数を返します。
+
+    一度計算した値は message.response_metadata にキャッシュされ、チェックポイントにも保存されるため、
+    同じメッセージについて再計算は行いません。LLMの応答で usage_metadata がある場合はその出力トークン数を、
+    ない場合はローカルの概算値を使用します。
+    """
+    cached = message.response_metadata.get(TOKEN_COUNT_KEY)
+    if cached is not None:
+        return cached
+
+    usage = getattr(message, "usage_metadata", None)
+    if usage and usage.get("output_tokens"):
+        count = usage["output_tokens"] + MESSAGE_OVERHEAD_TOKENS
+    else:
+        count = estimate_text_tokens(message_text(message)) + MESSAGE_OVERHEAD_TOKENS
+    message.response_metadata[TOKEN_COUNT_KEY] = count
+    return count
+
+def count_history_tokens(messages: Iterable[BaseMessage]) -> int:
+    """メッセージ列全体のトークン数を返します。"""
+    return sum(count_message_tokens(message) for message in messages)
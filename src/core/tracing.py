@@ -0,0 +1,219 @@
+import contextvars
+import json
+import os
+import secrets
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional, Protocol
+
+from src.core.token_accounting import message_text
+
+# 種類ごとの OpenTelemetry の SpanKind（1: INTERNAL, 3: CLIENT）
+_OTEL_SPAN_KINDS = {"llm": 3}
+_STATUS_OK = 1
+_STATUS_ERROR = 2
+
+class Span:
+    """
+    1つの処理（グラフのノード、LLM呼び出し、ツール実行、承認待ちなど）の計測結果。
+
+    kind は処理の種類（"turn", "node", "llm", "tool", "approval"）です。
+    """
+
+    def __init__(self, name: str, kind: str, trace_id: str, parent: Optional["Span"], attributes: dict):
+        self.name = name
+        self.kind = kind
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_span_id = parent.span_id if parent else None
+        self.attributes = attributes
+        self.start_time_ns = time.time_ns()
+        self.end_time_ns: Optional[int] = None
+        self.error: Optional[str] = None
+
+    # 記録中のスパンかどうか。属性の計算にコストがかかる場合はこれを確認してから計算する
+    recording = True
+
+    @property
+    def duration(self) -> float:
+        """所要秒数。"""
+        return ((self.end_time_ns or time.time_ns()) - self.start_time_ns) / 1e9
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def to_otlp(self) -> dict:
+        """OpenTelemetry の OTLP/JSON 形式のスパンに変換します。"""
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": _OTEL_SPAN_KINDS.get(self.kind, 1),
+            "startTimeUnixNano": str(self.start_time_ns),
+            "endTimeUnixNano": str(self.end_time_ns),
+            "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in {"agent.span_kind": self.kind, **self.attributes}.items()],
+            "status": {"code": _STATUS_ERROR, "message": self.error} if self.error else {"code": _STATUS_OK},
+        }
+        if self.parent_span_id:
+            span["parentSpanId"] = self.parent_span_id
+        return span
+
+class _NoopSpan:
+    """トレースが無効な場合に返される、何も記録しないスパン。"""
+    recording = False
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+_NOOP_SPAN = _NoopSpan()
+
+def _otlp_value(value: Any) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+class SpanExporter(Protocol):
+    """終了したスパンを受け取る出力先のインターフェース。"""
+
+    def export(self, span: Span) -> None:
+        ...
+
+class Tracer:
+    """
+    スパンを記録し、登録された出力先に渡します。
+
+    現在のスパンは contextvars で管理されるため、ワーカースレッドや asyncio タスクで実行される子の処理にも
+    親子関係が引き継がれます。出力先が1つも登録されていない場合は何も記録しません。
+    """
+
+    def __init__(self):
+        self._exporters: list[SpanExporter] = []
+        self._current: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self._exporters)
+
+    def add_exporter(self, exporter: SpanExporter):
+        self._exporters.append(exporter)
+
+    def remove_exporter(self, exporter: SpanExporter):
+        self._exporters.remove(exporter)
+
+    @contextmanager
+    def span(self, name: str, kind: str, **attributes) -> Iterator[Span]:
+        """
+        ブロックの実行をスパンとして記録します。ブロック内で例外が発生した場合はエラーとして記録します。
+        """
+        if not self._exporters:
+            yield _NOOP_SPAN
+            return
+        parent = self._current.get()
+        trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        span = Span(name, kind, trace_id, parent, attributes)
+        token = self._current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            self._current.reset(token)
+            span.end_time_ns = time.time_ns()
+            for exporter in list(self._exporters):
+                exporter.export(span)
+
+# アプリケーション全体で共有するトレーサー
+tracer = Tracer()
+
+class JsonlSpanExporter:
+    """スパンを1行1件の OTLP/JSON 形式でファイルに追記します。"""
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        line = json.dumps(span.to_otlp(), ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + "\n")
+            # ディスクへの書き出しはルートのスパン（ターン全体など）が終了したときにまとめて行う
+            if span.parent_span_id is None:
+                self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+class TurnProfiler:
+    """ターンごとの内訳を表示するために、終了したスパンをトレースIDごとに保持します。"""
+
+    def __init__(self):
+        self._spans: dict[str, list[Span]] = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        with self._lock:
+            self._spans[span.trace_id].append(span)
+
+    def take(self, trace_id: str) -> list[Span]:
+        """
+        trace_id のスパンを取り出します。
+        それ以外のトレース（ターン外で実行されたバックグラウンドの要約など）のスパンは破棄します。
+        """
+        with self._lock:
+            spans = self._spans.pop(trace_id, [])
+            self._spans.clear()
+            return spans
+
+def record_llm_call(span, messages: list, result) -> None:
+    """LLM呼び出しのスパンに、入出力のメッセージ数・バイト数とトークン数を記録します。"""
+    if not span.recording:
+        return
+    span.set_attribute("gen_ai.request.message_count", len(messages))
+    span.set_attribute("payload.input_bytes", sum(len(message_text(m).encode("utf-8")) for m in messages))
+    span.set_attribute("payload.output_bytes", len(message_text(result).encode("utf-8")))
+    usage = getattr(result, "usage_metadata", None) or {}
+    if usage.get("input_tokens") is not None:
+        span.set_attribute("gen_ai.usage.input_tokens", usage["input_tokens"])
+    if usage.get("output_tokens") is not None:
+        span.set_attribute("gen_ai.usage.output_tokens", usage["output_tokens"])
+
+def format_turn_profile(spans: list[Span]) -> str:
+    """1ターン分のスパンを、処理ごとの回数・合計時間・トークン数の内訳に整形します。"""
+    turn = next((span for span in spans if span.kind == "turn"), None)
+    rows: dict[tuple[str, str], dict] = {}
+    for span in spans:
+        if span.kind == "turn":
+            continue
+        row = rows.setdefault((span.kind, span.name), {"count": 0, "duration": 0.0, "input_tokens": 0, "output_tokens": 0, "bytes": 0, "errors": 0})
+        row["count"] += 1
+        row["duration"] += span.duration
+        row["input_tokens"] += span.attributes.get("gen_ai.usage.input_tokens", 0)
+        row["output_tokens"] += span.attributes.get("gen_ai.usage.output_tokens", 0)
+        row["bytes"] += span.attributes.get("payload.output_bytes", 0)
+        row["errors"] += 1 if span.error else 0
+
+    total = turn.duration if turn else sum(row["duration"] for (kind, _), row in rows.items() if kind == "node")
+    lines = [f"--- プロファイル (ターン合計 {total:.2f}秒) ---"]
+    for (kind, name), row in sorted(rows.items(), key=lambda item: -item[1]["duration"]):
+        detail = []
+        if row["input_tokens"] or row["output_tokens"]:
+            detail.append(f"入力 {row['input_tokens']} / 出力 {row['output_tokens']} トークン")
+        if row["bytes"]:
+            detail.append(f"出力 {row['bytes']}B")
+        if row["errors"]:
+            detail.append(f"エラー {row['errors']}件")
+        suffix = f"  ({', '.join(detail)})" if detail else ""
+        lines.append(f"{kind:<9} {name:<28} {row['count']:>3}回 {row['duration']:>8.3f}秒{suffix}")
+    return "\n".join(lines)
@@ -1,7 +1,13 @@
+import atexit
 import logging
+import logging.handlers
 import os
+import queue
 from datetime import datetime
 import uuid
+from typing import Optional
+
+from src.config import Config
 
 def setup_logging():
     """
@@ -9,8 +15,11 @@ def setup_logging():
 
     ロガーは 'logs' ディレクトリ内に一意の名前を持つファイルに書き込みます。
     ログファイル名は YYYY-MM-DD_HH-MM-SS_UUID.log の形式になります。
-    コンソールにはINFOレベル以上のログを出力し、ファイルにはDEBUGレベル以上の
-    全てのログを記録します。
+    コンソールにはINFOレベル以上のログを出力し、ファイルには DEBUG_MODE が有効な場合はDEBUGレベル以上、
+    無効な場合はINFOレベル以上のログを記録します。
+
+    ログの書き込みは QueueHandler / QueueListener によってバックグラウンドのスレッドで行われるため、
+    ログを出力する側（エージェントのループ）がディスクへの書き込みを待つことはありません。
 
     Args:
         なし
@@ -30,7 +39,8 @@ def setup_logging():
 
     # ルートロガーではなく、名前付きロガーを取得
     logger = logging.getLogger("LangChainCLIAgent")
-    logger.setLevel(logging.DEBUG) # 全てのメッセージをキャプチャするために最低レベルを設定
+    # DEBUG_MODE が無効な場合、logger.debug の呼び出しはメッセージを組み立てる前に破棄される
+    logger.setLevel(logging.DEBUG if Config.DEBUG_MODE else logging.INFO)
 
     # 親ロガーへの伝播を防ぐ
     logger.propagate = False
@@ -54,11 +64,59 @@ def setup_logging():
     file_handler.setFormatter(formatter)
     console_handler.setFormatter(formatter)
 
-    # ハンドラをロガーに追加
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+    # ロガーにはキューに積むだけのハンドラを追加し、実際の書き込みはリスナーのスレッドで行う
+    log_queue = queue.SimpleQueue()
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    listener = logging.handlers.QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    listener.start()
+    # プロセス終了時にキューに残っているログを書き出す
+    atexit.register(listener.stop)
 
     return logger
 
+class StateSummary:
+    """
+    ログ出力用に AgentState を要約する遅延評価オブジェクト。
+
+    文字列に変換されたとき（ログが実際に出力されるとき）に初めて要約を作成します。
+    メッセージのリストは件数と種類ごとのバイト数に、その他の値は LOG_VALUE_MAX_CHARS 文字までに切り詰めて表示します。
+    """
+
+    def __init__(self, state: dict):
+        self.state = state
+
+    def __str__(self) -> str:
+        parts = []
+        for key, value in self.state.items():
+            if value is None or value == "" or value == []:
+                continue
+            if isinstance(value, list) and value and all(hasattr(item, "type") and hasattr(item, "content") for item in value):
+                parts.append(f"{key}={_summarize_messages(value)}")
+            else:
+                parts.append(f"{key}={Truncated(value)}")
+        return "{" + ", ".join(parts) + "}"
+
+class Truncated:
+    """ログ出力時に repr を limit 文字までに切り詰める遅延評価オブジェクト。"""
+
+    def __init__(self, value, limit: Optional[int] = None):
+        self.value = value
+        self.limit = limit if limit is not None else Config.LOG_VALUE_MAX_CHARS
+
+    def __str__(self) -> str:
+        text = self.value if isinstance(self.value, str) else repr(self.value)
+        if self.limit > 0 and len(text) > self.limit:
+            return f"{text[:self.limit]}...({len(text)} chars)"
+        return text
+
+def _summarize_messages(messages: list) -> str:
+    counts: dict[str, list[int]] = {}
+    for message in messages:
+        stats = counts.setdefault(message.type, [0, 0])
+        stats[0] += 1
+        stats[1] += len(str(message.content).encode("utf-8"))
+    detail = ", ".join(f"{message_type}: {count}件 {size}B" for message_type, (count, size) in counts.items())
+    return f"[{len(messages)}件 ({detail})]"
+
 # 他のモジュールからインポートするためのロガーインスタンス
 logger = setup_logging()
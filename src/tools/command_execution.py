@@ -1,56 +1,192 @@
-import subprocess
+import asyncio
 import os
+from typing import Optional
 from langchain_core.tools import tool
+from langgraph.config import get_config
+
+from src.config import Config
+from src.tools import shell_session
+from src.tools.shell_process import OutputBuffer, ProcessResult, arun_process, run_process, shell_jobs
+from src.tools.shell_session import shell_sessions
+
+def _format_command_result(command: str, cwd: str, result: ProcessResult, timeout: Optional[float] = None) -> str:
+    """コマンドの実行結果をエージェントに返す文字列に整形します。"""
+    # stdoutとstderrをUTF-8でデコードし、エラーは置換（長い出力は先頭と末尾のみ）
+    decoded_stdout = result.stdout.render()
+    decoded_stderr = result.stderr.render()
+
+    output = f"Command: {command}\n"
+    output += f"Directory: {cwd if cwd else os.getcwd()}\n"
+    output += f"Stdout: {decoded_stdout if decoded_stdout else '(empty)'}\n"
+    output += f"Stderr: {decoded_stderr if decoded_stderr else '(empty)'}\n"
+    output += f"Exit Code: {result.returncode}\n"
+
+    if result.timed_out:
+        output += f"Error: Command timed out after {timeout:g} seconds and its process group was killed\n"
+    elif result.returncode != 0:
+        output += f"Error: Command exited with non-zero status {result.returncode}\n"
+    else:
+        output += f"Error: (none)\n"
+
+    if getattr(result, "restarted", False):
+        output += "Note: シェルのセッションが終了したため、次のコマンドは新しいシェルで実行されます（cd や export した状態は引き継がれません）。\n"
+    return output
+
+def _thread_id() -> str:
+    """ツールを呼び出した会話のスレッドID。グラフの外から呼び出された場合は "default" です。"""
+    try:
+        return str(get_config().get("configurable", {}).get("thread_id", "default"))
+    except RuntimeError:
+        return "default"
+
+def _session() -> Optional[shell_session.ShellSession]:
+    """この会話で使用するシェルのセッション。セッションを使用しない設定・環境の場合は None を返します。"""
+    if not Config.SHELL_SESSION or not shell_session.is_supported():
+        return None
+    return shell_sessions.get(_thread_id())
+
+def _resolve_timeout(timeout: Optional[float]) -> Optional[float]:
+    """ツールの引数とデフォルト値から実行時間の上限を決めます。0以下の場合は制限しません。"""
+    if timeout is None:
+        timeout = Config.SHELL_TIMEOUT
+    return timeout if timeout > 0 else None
+
+def _start_background_job(command: str, cwd: Optional[str]) -> str:
+    if cwd is None and Config.SHELL_SESSION:
+        # セッションで cd している場合は、そのディレクトリでジョブを開始する
+        session = shell_sessions.peek(_thread_id())
+        cwd = session.cwd if session is not None else None
+    job = shell_jobs.start(command, cwd, Config.SHELL_OUTPUT_HEAD_BYTES, Config.SHELL_OUTPUT_TAIL_BYTES)
+    return (
+        f"バックグラウンドジョブ {job.job_id} を開始しました。\n"
+        f"Command: {command}\n"
+        f"Directory: {cwd if cwd else os.getcwd()}\n"
+        f"進行状況と出力の末尾は shell_job_status、停止は kill_shell_job で確認・実行できます。"
+    )
 
 @tool
-def run_shell_command(command: str, cwd: str = None) -> str:
+def run_shell_command(command: str, cwd: str = None, timeout: Optional[float] = None, background: bool = False) -> str:
     """
     指定されたシェルコマンドを実行し、その結果を返します。
     ファイルシステムやシステム状態を変更する可能性のあるコマンドを実行する前に、ユーザーの確認を求めます。
+    コマンドは会話ごとに起動したままのシェルで実行されるため、cd・export・仮想環境の有効化などの状態は次のコマンドに引き継がれます。
     コマンドの出力はUTF-8でデコードされ、デコードできない文字は代替文字に置き換えられます。
+    出力が長い場合は先頭と末尾のみを返し、省略したバイト数を示します。
 
     Args:
         command (str): 実行するシェルコマンド文字列。
-        cwd (str, optional): コマンドを実行するディレクトリ。指定しない場合は現在の作業ディレクトリで実行されます。
+        cwd (str, optional): このコマンドのみを実行するディレクトリ。指定しない場合はシェルの現在のディレクトリ（以前のコマンドで cd した場所）で実行されます。
+        timeout (float, optional): 実行時間の上限（秒）。超えた場合はコマンドと子プロセスを停止します。指定しない場合は設定値（デフォルト120秒）です。
+        background (bool, optional): True の場合はコマンドの終了を待たずにジョブIDを返します。時間のかかるビルドやテストに使用し、
+            shell_job_status で進行状況と出力を確認し、kill_shell_job で停止します。
 
     Returns:
-        str: コマンドの標準出力、標準エラー出力、および終了コードを含む結果文字列。
+        str: コマンドの標準出力、標準エラー出力、および終了コードを含む結果文字列（background の場合はジョブID）。
              エラーが発生した場合は、エラーメッセージを返します。
     """
     try:
-        # subprocess.run を使用してコマンドを実行
-        # shell=True を指定することで、シェルを介してコマンドを実行します。
-        # capture_output=True で標準出力と標準エラー出力をキャプチャします。
-        # text=False (または省略) で出力をバイトとして扱います。
-        result = subprocess.run(
-            command, 
-            shell=True, 
-            capture_output=True, 
-            cwd=cwd, 
-            check=False # エラーが発生しても例外を発生させない
-        )
-
-        # stdoutとstderrをUTF-8でデコードし、エラーは置換
-        decoded_stdout = result.stdout.decode('utf-8', errors='replace')
-        decoded_stderr = result.stderr.decode('utf-8', errors='replace')
-
-        output = f"Command: {command}\n"
-        output += f"Directory: {cwd if cwd else os.getcwd()}\n"
-        output += f"Stdout: {decoded_stdout if decoded_stdout else '(empty)'}\n"
-        output += f"Stderr: {decoded_stderr if decoded_stderr else '(empty)'}\n"
-        output += f"Exit Code: {result.returncode}\n"
-
-        if result.returncode != 0:
-            output += f"Error: Command exited with non-zero status {result.returncode}\n"
-        else:
-            output += f"Error: (none)\n"
-
-        return output
+        if background:
+            return _start_background_job(command, cwd)
+        # 出力はパイプから読み続け、先頭と末尾のみを保持する。タイムアウト時はプロセスグループ全体を停止する
+        limit = _resolve_timeout(timeout)
+        session = _session()
+        if session is not None:
+            directory = cwd or session.cwd
+            result = session.run(command, cwd, limit, Config.SHELL_OUTPUT_HEAD_BYTES, Config.SHELL_OUTPUT_TAIL_BYTES)
+            return _format_command_result(command, directory, result, limit)
+        result = run_process(command, cwd, limit, Config.SHELL_OUTPUT_HEAD_BYTES, Config.SHELL_OUTPUT_TAIL_BYTES)
+        return _format_command_result(command, cwd, result, limit)
 
     except FileNotFoundError:
         return f"エラー: コマンドが見つかりません: {command}"
     except Exception as e:
         return f"コマンド実行中に予期せぬエラーが発生しました: {e}"
 
+async def _arun_shell_command(command: str, cwd: str = None, timeout: Optional[float] = None, background: bool = False) -> str:
+    """run_shell_command の非同期版。asyncio のサブプロセスを使用し、スレッドを占有しません。"""
+    try:
+        if background:
+            return _start_background_job(command, cwd)
+        limit = _resolve_timeout(timeout)
+        session = _session()
+        if session is not None:
+            # セッションはコマンドを1つずつ実行するため、待機はスレッドで行う
+            directory = cwd or session.cwd
+            result = await asyncio.to_thread(session.run, command, cwd, limit, Config.SHELL_OUTPUT_HEAD_BYTES, Config.SHELL_OUTPUT_TAIL_BYTES)
+            return _format_command_result(command, directory, result, limit)
+        result = await arun_process(command, cwd, limit, Config.SHELL_OUTPUT_HEAD_BYTES, Config.SHELL_OUTPUT_TAIL_BYTES)
+        return _format_command_result(command, cwd, result, limit)
+
+    except FileNotFoundError:
+        return f"エラー: コマンドが見つかりません: {command}"
+    except Exception as e:
+        return f"コマンド実行中に予期せぬエラーが発生しました: {e}"
+
+# ainvoke 時にはネイティブな非同期実装を使用する
+run_shell_command.coroutine = _arun_shell_command
+
+def _describe_output(name: str, buffer: OutputBuffer, tail_bytes: int) -> str:
+    text = buffer.tail(tail_bytes)
+    shown = len(text.encode("utf-8"))
+    if not text:
+        return f"{name}: (empty)\n"
+    if shown < buffer.total_bytes:
+        return f"{name} (合計 {buffer.total_bytes} バイトのうち末尾 {shown} バイト):\n{text}\n"
+    return f"{name}:\n{text}\n"
+
+def _job_state(job) -> str:
+    returncode = job.process.poll()
+    if returncode is None:
+        return f"実行中 ({job.process.elapsed():.1f}秒経過)"
+    if job.process.killed:
+        return f"停止済み (Exit Code {returncode}, {job.process.elapsed():.1f}秒)"
+    return f"終了 (Exit Code {returncode}, {job.process.elapsed():.1f}秒)"
+
+@tool
+def shell_job_status(job_id: Optional[str] = None, tail_bytes: int = 4096) -> str:
+    """
+    run_shell_command の background=True で開始したジョブの状態と、出力の末尾を返します。
+
+    Args:
+        job_id (str, optional): 確認するジョブID（例: "job-1"）。指定しない場合は全てのジョブの一覧を返します。
+        tail_bytes (int, optional): 表示する標準出力・標準エラー出力の末尾のバイト数。デフォルトは4096。
+
+    Returns:
+        str: ジョブの状態（実行中・終了・停止済みと終了コード）と出力の末尾。
+    """
+    if job_id is None:
+        jobs = shell_jobs.list()
+        if not jobs:
+            return "バックグラウンドジョブはありません。"
+        return "\n".join(f"{job.job_id}: {_job_state(job)} {job.process.command}" for job in jobs)
+
+    job = shell_jobs.get(job_id)
+    if job is None:
+        return f"エラー: ジョブ '{job_id}' が見つかりません。"
+    output = f"Job: {job.job_id} {_job_state(job)}\n"
+    output += f"Command: {job.process.command}\n"
+    output += _describe_output("Stdout", job.process.stdout, tail_bytes)
+    output += _describe_output("Stderr", job.process.stderr, tail_bytes)
+    return output
+
+@tool
+def kill_shell_job(job_id: str) -> str:
+    """
+    run_shell_command の background=True で開始したジョブを、子プロセスを含めて停止します。
+
+    Args:
+        job_id (str): 停止するジョブID（例: "job-1"）。
+
+    Returns:
+        str: 停止したジョブの状態と出力の末尾。
+    """
+    job = shell_jobs.get(job_id)
+    if job is None:
+        return f"エラー: ジョブ '{job_id}' が見つかりません。"
+    if job.process.poll() is not None:
+        return f"ジョブ {job_id} は既に終了しています。\n" + shell_job_status.invoke({"job_id": job_id})
+    job.process.kill()
+    return f"ジョブ {job_id} を停止しました。\n" + shell_job_status.invoke({"job_id": job_id})
+
 # ツールリストに含める場合は、以下のようにリストに追加します。
-# command_execution_tools = [run_shell_command]
+# command_execution_tools = [run_shell_command, shell_job_status, kill_shell_job]
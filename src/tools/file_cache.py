@@ -0,0 +1,127 @@
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+from src.config import Config
+
+@dataclass
+class FileCacheStats:
+    """ファイルキャッシュの利用状況。"""
+    hits: int = 0
+    misses: int = 0
+    invalidations: int = 0
+    evictions: int = 0
+    entries: int = 0
+    total_bytes: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+def _signature(path: str) -> Optional[tuple[int, int, int]]:
+    """ファイルやディレクトリが変更されたかどうかを判定するための (mtime_ns, size, inode)。存在しない場合は None。"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+class FileCache:
+    """
+    読み取り専用のファイルツール（read_file, read_many_files, list_directory_contents）が共有する、
+    デコード済みのファイル内容とディレクトリ一覧のキャッシュ。
+
+    エントリーは絶対パスと (mtime_ns, size, inode) をキーとし、参照のたびに stat で変更がないことを確認します。
+    ファイルを変更するツールは invalidate() で直ちにエントリーを無効化します。
+    保持する合計サイズ（デコード前のバイト数）が max_bytes を超えた場合は、最後に使用された時刻が古いものから削除します（LRU）。
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[tuple[str, str], tuple[tuple, Any, int]] = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._stats = FileCacheStats()
+
+    def read_text(self, path: str) -> str:
+        """ファイルを UTF-8（デコードできないバイトは置換）として読み込みます。"""
+        return self.get("file", path, _read_text)
+
+    def list_dir(self, path: str) -> tuple[str, ...]:
+        """ディレクトリ内の項目名の一覧を返します。"""
+        return self.get("dir", path, _list_dir)
+
+    def get(self, kind: str, path: str, load: Callable[[str], tuple[Any, int]]) -> Any:
+        """
+        path から作成した値（kind ごとに別のエントリー）を返します。
+        キャッシュにない場合やファイルが変更された場合は load(絶対パス) で (値, サイズ) を作成して保存します。
+        """
+        key = (kind, os.path.abspath(path))
+        signature = _signature(key[1])
+        if signature is not None and self.max_bytes > 0:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] == signature:
+                    self._entries.move_to_end(key)
+                    self._stats.hits += 1
+                    return entry[1]
+                self._stats.misses += 1
+
+        # 読み込み中に変更された場合に古い内容を新しい署名で保存しないよう、前後の署名が一致した場合のみ保存する
+        value, size = load(key[1])
+        if signature is not None and self.max_bytes > 0 and size <= self.max_bytes and _signature(key[1]) == signature:
+            with self._lock:
+                self._remove(key)
+                self._entries[key] = (signature, value, size)
+                self._total_bytes += size
+                while self._total_bytes > self.max_bytes:
+                    self._remove(next(iter(self._entries)))
+                    self._stats.evictions += 1
+        return value
+
+    def _remove(self, key: tuple[str, str]):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._total_bytes -= entry[2]
+
+    def invalidate(self, path: str):
+        """path とその配下、および親ディレクトリの一覧のエントリーを無効化します。"""
+        target = os.path.abspath(path)
+        prefix = target.rstrip(os.sep) + os.sep
+        parent = os.path.dirname(target)
+        with self._lock:
+            stale = [
+                key for key in self._entries
+                if key[1] == target or key[1].startswith(prefix) or key == ("dir", parent)
+            ]
+            for key in stale:
+                self._remove(key)
+            self._stats.invalidations += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def stats(self) -> FileCacheStats:
+        with self._lock:
+            return FileCacheStats(
+                self._stats.hits, self._stats.misses, self._stats.invalidations, self._stats.evictions,
+                len(self._entries), self._total_bytes,
+            )
+
+def _read_text(path: str) -> tuple[str, int]:
+    with open(path, 'rb') as f: # Read as binary
+        raw_content = f.read()
+    # Decode as UTF-8 with replacement for robustness
+    return raw_content.decode('utf-8', errors='replace'), len(raw_content)
+
+def _list_dir(path: str) -> tuple[tuple[str, ...], int]:
+    contents = tuple(os.listdir(path))
+    return contents, sum(len(name) for name in contents)
+
+# ファイルツール全体で共有するキャッシュ
+file_cache = FileCache(Config.FILE_CACHE_MAX_BYTES)
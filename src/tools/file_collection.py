@@ -0,0 +1,123 @@
+import os
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from itertools import islice
+from typing import Callable, Iterable, Iterator, Optional
+
+from src.tools.path_matcher import DEFAULT_PRUNED_DIRS, PathMatcher, PatternSet, compile_glob
+from src.tools.search_engine import SNIFF_BYTES
+
+# read_many_files が useDefaultExcludes=True の場合に除外する gitignore 形式のパターン
+DEFAULT_EXCLUDES = [
+    "node_modules/", ".git/", "__pycache__/", "*.pyc", "*.log", "*.tmp",
+    "*.zip", "*.tar.gz", "*.rar", "*.7z", "*.exe", "*.dll", "*.so", "*.dylib",
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.bmp", "*.ico", "*.mp3", "*.mp4",
+    "*.avi", "*.mov", "*.flv", "*.wmv", "*.pdf", "*.doc", "*.docx", "*.xls",
+    "*.xlsx", "*.ppt", "*.pptx", "*.sqlite3", "*.db", ".DS_Store",
+    ".venv/", ".pytest_cache/", "uv.lock",
+]
+
+def _split_glob(pattern: str) -> tuple[str, str]:
+    """glob パターンを、ワイルドカードを含まない先頭のディレクトリと残りのパターンに分けます。"""
+    parts = pattern.replace(os.sep, "/").split("/")
+    for i, part in enumerate(parts):
+        if any(c in part for c in "*?["):
+            base = "/".join(parts[:i])
+            if not base:
+                base = "/" if pattern.startswith("/") else "."
+            return base, "/".join(parts[i:])
+    return pattern, ""
+
+def collect_files(
+    paths: Iterable[str],
+    exclude: Iterable[str] = (),
+    include: Iterable[str] = (),
+    recursive: bool = True,
+    use_default_excludes: bool = True,
+    use_gitignore: bool = True,
+) -> list[str]:
+    """
+    ファイル・ディレクトリ・glob パターンのリストから、読み込むファイルのパスを重複なく名前順に返します。
+
+    exclude と include は gitignore 形式のパターンで、'/' を含まないパターン（'*.log' など）は任意の階層の名前に、
+    末尾が '/' のパターン（'node_modules/' など）はディレクトリに一致します。ディレクトリと glob パターンの走査では、
+    除外されたディレクトリ（use_gitignore が True の場合は .gitignore で除外されたものを含む）の中には入りません。
+    include を指定した場合は、いずれかに一致するファイルのみを返します。明示的に指定したファイルには .gitignore を適用しません。
+    """
+    excludes = list(exclude) + (DEFAULT_EXCLUDES if use_default_excludes else [])
+    includes = list(include)
+    pruned_dirs = DEFAULT_PRUNED_DIRS if use_default_excludes else frozenset()
+    found: set[str] = set()
+
+    def add(path: str, base: str):
+        if includes and not PatternSet.from_patterns(base, includes).matches(path):
+            return
+        found.add(os.path.normpath(path))
+
+    for p in paths:
+        if os.path.isfile(p):
+            base = os.path.dirname(os.path.abspath(p))
+            if not PatternSet.from_patterns(base, excludes).matches(p):
+                add(p, base)
+        elif os.path.isdir(p):
+            matcher = PathMatcher.for_directory(p, excludes, use_gitignore, pruned_dirs)
+            for path in matcher.walk(p, recursive):
+                add(path, p)
+        else:
+            base, rest = _split_glob(p)
+            if not rest or not os.path.isdir(base):
+                continue
+            regex = compile_glob(rest)
+            matcher = PathMatcher.for_directory(base, excludes, use_gitignore, pruned_dirs)
+            for path in matcher.walk(base, recursive="/" in rest or "**" in rest):
+                if regex.match(os.path.relpath(path, base).replace(os.sep, "/")):
+                    add(path, base)
+    return sorted(found)
+
+@dataclass
+class FileContent:
+    """read_files() で読み込んだファイル。partial はファイルの先頭の max_bytes バイトのみを読み込んだことを表します。"""
+    path: str
+    text: str = ""
+    size: int = 0
+    binary: bool = False
+    partial: bool = False
+    error: Optional[str] = None
+
+def _load(path: str, max_bytes: int, read_text: Callable[[str], str]) -> FileContent:
+    try:
+        size = os.path.getsize(path)
+        if size <= max_bytes:
+            text = read_text(path)
+        else:
+            # 出力に収まらない大きなファイルは、全体を読まずに先頭のみを読む
+            with open(path, "rb") as f:
+                text = f.read(max_bytes).decode("utf-8", errors="replace")
+    except Exception as e:
+        return FileContent(path, error=str(e))
+    if "\0" in text[:SNIFF_BYTES]:
+        return FileContent(path, size=size, binary=True)
+    return FileContent(path, text, size, partial=size > max_bytes)
+
+def read_files(paths: list[str], max_bytes: int, workers: int, read_text: Callable[[str], str]) -> Iterator[FileContent]:
+    """
+    paths を workers 個のスレッドで並行して読み込み、paths の順に返します。
+    先読みするのは workers * 2 件までで、呼び出し側が途中で読み込みをやめた場合、残りのファイルは読み込みません。
+    """
+    workers = max(workers, 1)
+    remaining = iter(paths)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="read_many_files") as executor:
+        window: deque[Future] = deque(
+            executor.submit(_load, path, max_bytes, read_text) for path in islice(remaining, workers * 2)
+        )
+        try:
+            while window:
+                future = window.popleft()
+                following = next(remaining, None)
+                if following is not None:
+                    window.append(executor.submit(_load, following, max_bytes, read_text))
+                yield future.result()
+        finally:
+            for future in window:
+                future.cancel()
@@ -2,10 +2,23 @@ import os
 import shutil
 from langchain_core.tools import tool
 from pathlib import Path
-import fnmatch
 import re
+from typing import Any, Dict, List, Optional
+from src.config import Config
+from src.tools.file_cache import file_cache
+from src.tools.file_collection import collect_files, read_files
+from src.tools.file_patch import PatchError, apply_edits, apply_hunks, atomic_write, count_changes, parse_unified_diff, read_text_exact
+from src.tools.file_transaction import FileTransaction
+from src.tools.file_reader import preview, read_bytes, read_lines
+from src.tools import search_index
+from src.tools.search_engine import format_lines, search
 # from src.tools.utils import cleanse_text_data # cleanse_text_dataはここでは使用しない
 
+def _invalidate(path: str):
+    """ファイルを変更したツールから呼び出し、ファイル内容のキャッシュと検索索引の path のエントリーを無効化します。"""
+    file_cache.invalidate(path)
+    search_index.invalidate(path)
+
 @tool
 def list_directory_contents(path: str) -> str:
     """指定されたパスのディレクトリ内容を一覧表示します。"""
@@ -15,7 +28,7 @@ def list_directory_contents(path: str) -> str:
         return f"エラー: パス '{path}' はディレクトリではありません。"
 
     try:
-        contents = os.listdir(path)
+        contents = file_cache.list_dir(path)
         if not contents:
             return f"ディレクトリ '{path}' は空です。"
         
@@ -24,19 +37,60 @@ def list_directory_contents(path: str) -> str:
         return f"ディレクトリ '{path}' の読み込み中にエラーが発生しました: {e}"
 
 @tool
-def read_file(path: str) -> str:
-    """指定されたパスのファイル内容を読み込んで返します。"""
+def read_file(path: str, start_line: Optional[int] = None, end_line: Optional[int] = None, start_byte: Optional[int] = None, end_byte: Optional[int] = None) -> str:
+    """
+    指定されたパスのファイル内容を読み込んで返します。
+
+    大きなファイルは範囲を指定せずに読み込むと、先頭と末尾の行および全体の行数とサイズのみを返します。
+    その場合は行範囲またはバイト範囲を指定して、必要な部分をページ単位で読み込んでください。
+
+    Args:
+        path (str): 読み込むファイルのパス。
+        start_line (int, optional): 読み込みを開始する行番号（1始まり）。
+        end_line (int, optional): 読み込みを終了する行番号（この行を含む）。
+        start_byte (int, optional): 読み込みを開始するバイト位置（0始まり）。行範囲と同時には指定できません。
+        end_byte (int, optional): 読み込みを終了するバイト位置（この位置を含まない）。
+    """
     if not os.path.exists(path):
         return f"エラー: パス '{path}' が見つかりません。"
     if not os.path.isfile(path):
         return f"エラー: パス '{path}' はファイルではありません。"
+    line_range = start_line is not None or end_line is not None
+    byte_range = start_byte is not None or end_byte is not None
+    if line_range and byte_range:
+        return "エラー: 行範囲 (start_line/end_line) とバイト範囲 (start_byte/end_byte) は同時に指定できません。"
 
     try:
-        with open(path, 'rb') as f: # Read as binary
-            raw_content = f.read()
-        
-        # Decode as UTF-8 with replacement for robustness
-        content = raw_content.decode('utf-8', errors='replace')
+        max_bytes = Config.READ_FILE_MAX_BYTES
+        if line_range:
+            part = read_lines(path, start_line or 1, end_line, max_bytes)
+            header = f"ファイル '{path}' の {part.start}〜{part.end} 行目 (全 {part.total_lines} 行, {part.size} バイト)"
+            if part.resume_byte is not None:
+                note = (
+                    f"\n(1行が出力の上限を超えたため、{part.end} 行目を途中で切りました。"
+                    f"この行の続きは start_byte={part.resume_byte} のバイト範囲で読み込めます)"
+                )
+            else:
+                note = f"\n(出力の上限に達したため {part.end} 行目までを表示しています。続きは start_line={part.end + 1} で読み込めます)" if part.truncated else ""
+            return f"{header}:\n---\n{part.text}\n---{note}"
+        if byte_range:
+            part = read_bytes(path, start_byte or 0, end_byte, max_bytes)
+            header = f"ファイル '{path}' の {part.start}〜{part.end} バイト目 (全 {part.size} バイト)"
+            note = f"\n(出力の上限に達したため {part.end} バイト目までを表示しています。続きは start_byte={part.end} で読み込めます)" if part.truncated else ""
+            return f"{header}:\n---\n{part.text}\n---{note}"
+
+        if os.path.getsize(path) > max_bytes:
+            # 大きなファイルは先頭と末尾のみを返し、必要な範囲を指定して読み込んでもらう
+            head_tail = preview(path, Config.READ_FILE_PREVIEW_LINES, max_bytes)
+            omitted = head_tail.tail_start_line - 1 - head_tail.head_lines
+            return (
+                f"ファイル '{path}' は大きいため、先頭と末尾のみを表示します (全 {head_tail.total_lines} 行, {head_tail.size} バイト)。"
+                "他の部分は start_line/end_line または start_byte/end_byte を指定して読み込んでください。\n"
+                f"---\n{head_tail.head}\n... ({head_tail.head_lines + 1}〜{head_tail.tail_start_line - 1} 行目の {omitted} 行を省略) ...\n{head_tail.tail}\n---"
+            )
+
+        # UTF-8 としてデコードした内容は、ファイルが変更されるまでキャッシュされる
+        content = file_cache.read_text(path)
 
         return f"ファイル '{path}' の内容:\n---\n{content}\n---"
     except Exception as e:
@@ -50,8 +104,8 @@ def write_file(path: str, content: str) -> str:
         return f"エラー: ディレクトリ '{directory}' が見つかりません。先にディレクトリを作成してください。"
     
     try:
-        with open(path, 'w', encoding='utf-8') as f:
-            f.write(content)
+        atomic_write(path, content)
+        _invalidate(path)
         return f"ファイル '{path}' に内容を書き込みました。"
     except Exception as e:
         return f"ファイル '{path}' への書き込み中にエラーが発生しました: {e}"
@@ -66,6 +120,7 @@ def delete_file(path: str) -> str:
 
     try:
         os.remove(path)
+        _invalidate(path)
         return f"ファイル '{path}' を削除しました。"
     except Exception as e:
         return f"ファイル '{path}' の削除中にエラーが発生しました: {e}"
@@ -92,6 +147,7 @@ def delete_directory(path: str) -> str:
 
     try:
         shutil.rmtree(path)
+        _invalidate(path)
         return f"ディレクトリ '{path}' を削除しました。"
     except Exception as e:
         return f"ディレクトリ '{path}' の削除中にエラーが発生しました: {e}"
@@ -104,6 +160,8 @@ def move(source_path: str, destination_path: str) -> str:
     
     try:
         shutil.move(source_path, destination_path)
+        _invalidate(source_path)
+        _invalidate(destination_path)
         return f"'{source_path}' を '{destination_path}' に移動しました。"
     except Exception as e:
         return f"'{source_path}' の移動中にエラーが発生しました: {e}"
@@ -122,8 +180,8 @@ def modify_file_content(path: str, old_text: str, new_text: str) -> str:
         modified_content = content.replace(old_text, new_text)
         
         # 修正した内容をファイルに書き戻す
-        with open(path, 'w', encoding='utf-8') as f:
-            f.write(modified_content)
+        atomic_write(path, modified_content)
+        _invalidate(path)
             
         return f"ファイル '{path}' の内容を修正しました。'{old_text}' を '{new_text}' に置換しました。"
     except FileNotFoundError:
@@ -131,130 +189,349 @@ def modify_file_content(path: str, old_text: str, new_text: str) -> str:
     except Exception as e:
         return f"ファイル '{path}' の修正中にエラーが発生しました: {e}"
 
+def _plan_patch(patch: Optional[str], path: Optional[str], edits: Optional[List[Dict[str, Any]]]) -> list[tuple[str, Optional[str], Optional[str]]]:
+    """
+    パッチまたは編集をメモリ上で全て適用し、(パス, 変更前の内容, 変更後の内容) のリストを返します。
+    変更前の内容が None のファイルは新規作成、変更後の内容が None のファイルは削除を表します。
+    1つでも適用できない変更がある場合は PatchError を送出します（ファイルには何も書き込みません）。
+    """
+    if patch and edits:
+        raise PatchError("'patch' と 'edits' はどちらか一方のみを指定してください。")
+    if edits:
+        if not path:
+            raise PatchError("'edits' を指定する場合は 'path' も指定してください。")
+        if not os.path.isfile(path):
+            raise PatchError(f"ファイル '{path}' が見つかりません。新しいファイルは write_file で作成してください。")
+        original = read_text_exact(path)
+        return [(path, original, apply_edits(original, edits))]
+    if not patch:
+        raise PatchError("'patch'（unified diff）または 'path' と 'edits' を指定してください。")
+
+    originals: dict[str, Optional[str]] = {}
+    texts: dict[str, Optional[str]] = {}
+
+    def load(file_path: str) -> str:
+        target = os.path.join(path, file_path) if path else file_path
+        if target not in texts:
+            exists = os.path.isfile(target)
+            originals[target] = texts[target] = read_text_exact(target) if exists else None
+        return target
+
+    for file_patch in parse_unified_diff(patch):
+        target = load(file_patch.path)
+        source = target
+        if file_patch.old_path is not None and file_patch.new_path is not None and file_patch.old_path != file_patch.new_path and texts[target] is None:
+            # 変更後のパスにファイルがない場合は名前の変更として、変更前のファイルにハンクを適用して新しいパスに書き込み、元のファイルを削除する
+            old_target = os.path.join(path, file_patch.old_path) if path else file_patch.old_path
+            if old_target in texts:
+                exists = texts[old_target] is not None
+            else:
+                exists = os.path.isfile(old_target)
+            if exists:
+                source = load(file_patch.old_path)
+        current = texts[source]
+        if file_patch.old_path is None and current is not None:
+            raise PatchError(f"ファイル '{target}' は既に存在するため、新規作成のパッチを適用できません。")
+        if file_patch.old_path is not None and current is None:
+            raise PatchError(f"ファイル '{target}' が見つかりません。")
+        try:
+            updated = apply_hunks(current or "", file_patch.hunks)
+        except PatchError as e:
+            raise PatchError(f"ファイル '{target}': {e}") from e
+        if source != target:
+            texts[source] = None
+        texts[target] = None if file_patch.new_path is None else updated
+    return [(target, originals[target], texts[target]) for target in texts]
+
+def _write_changes(changes: list[tuple[str, Optional[str], Optional[str]]]):
+    """
+    _plan_patch() の結果をファイルに書き込みます。各ファイルは atomic_write() で置き換え、
+    途中でエラーが発生した場合は、既に書き込んだファイルを元の内容に戻してから例外を送出します。
+    """
+    done = []
+    try:
+        for target, old_text, new_text in changes:
+            if new_text is None:
+                os.remove(target)
+            else:
+                directory = os.path.dirname(target)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                atomic_write(target, new_text)
+            done.append((target, old_text))
+            _invalidate(target)
+    except Exception:
+        for target, old_text in reversed(done):
+            if old_text is None:
+                os.remove(target)
+            else:
+                atomic_write(target, old_text)
+            _invalidate(target)
+        raise
+
 @tool
-def read_many_files(paths: list[str], exclude: list[str] = None, include: list[str] = None, recursive: bool = True, useDefaultExcludes: bool = True) -> str:
+def apply_patch(patch: Optional[str] = None, path: Optional[str] = None, edits: Optional[List[Dict[str, Any]]] = None) -> str:
+    """
+    unified diff のパッチ、または1つのファイルに対する複数の置換を1回の呼び出しで適用します。
+    ファイル全体を write_file で書き直すよりも出力が少なく済むため、既存のファイルの一部を変更する場合はこのツールを優先してください。
+    全ての変更を適用できることを確認してから書き込むため、1つでも適用できない変更がある場合はどのファイルも変更されません。
+    ファイルは一時ファイルに書き込んでから置き換えるため、書き込みの途中で内容が壊れることはありません。
+
+    Args:
+        patch (str, optional): unified diff（`diff -u` / `git diff` 形式）。複数のファイル、新規作成（--- /dev/null）、削除（+++ /dev/null）、名前の変更（--- a/old.txt と +++ b/new.txt）に対応します。
+            ハンクの行番号がずれていても、変更前の行（文脈行と '-' の行）が一致する最も近い位置に適用されます。
+        path (str, optional): edits を適用するファイルのパス。patch と併せて指定した場合は、パッチ内のパスの基準となるディレクトリです。
+        edits (list[dict], optional): path のファイルに順に適用する置換のリスト。各項目は {"old_text": "置換前の文字列", "new_text": "置換後の文字列", "replace_all": False} の形式です。
+            replace_all が False（デフォルト）の場合、old_text はファイル内にちょうど1回現れる必要があります。
+
+    Returns:
+        str: 変更したファイルと追加・削除した行数の一覧、またはエラーメッセージ。
+    """
+    try:
+        changes = _plan_patch(patch, path, edits)
+    except PatchError as e:
+        return f"エラー: 変更を適用できませんでした（ファイルは変更されていません）。{e}"
+    except Exception as e:
+        return f"パッチの適用中にエラーが発生しました（ファイルは変更されていません）: {e}"
+
+    try:
+        _write_changes(changes)
+    except Exception as e:
+        return f"ファイルの書き込み中にエラーが発生したため、変更を元に戻しました: {e}"
+
+    summary = []
+    for target, old_text, new_text in changes:
+        if old_text is None:
+            summary.append(f"- {target}: 新規作成 (+{len(new_text.splitlines())} 行)")
+        elif new_text is None:
+            summary.append(f"- {target}: 削除")
+        else:
+            added, removed = count_changes(old_text, new_text)
+            summary.append(f"- {target}: +{added} -{removed} 行")
+    return f"{len(changes)} 個のファイルに変更を適用しました。\n" + "\n".join(summary)
+
+# batch_file_operations で使用できる操作と、その必須の引数（同名のツールと同じ引数名）
+BATCH_OPERATIONS = {
+    "write_file": ("path", "content"),
+    "apply_patch": (),
+    "create_directory": ("path",),
+    "delete_file": ("path",),
+    "delete_directory": ("path",),
+    "move": ("source_path", "destination_path"),
+}
+
+def describe_operation(operation: Dict[str, Any]) -> str:
+    """batch_file_operations の1つの操作を、内容を省略した1行の説明にします（承認時の表示と結果の報告に使用）。"""
+    op = operation.get("op")
+    if op == "move":
+        return f"move {operation.get('source_path')} -> {operation.get('destination_path')}"
+    if op == "write_file":
+        return f"write_file {operation.get('path')} ({len(operation.get('content') or '')} 文字)"
+    if op == "apply_patch":
+        if operation.get("edits"):
+            return f"apply_patch {operation.get('path')} ({len(operation['edits'])} 件の置換)"
+        targets = [file_patch.path for file_patch in parse_unified_diff(operation.get("patch") or "")] if operation.get("patch") else []
+        return f"apply_patch {', '.join(targets)}"
+    return f"{op} {operation.get('path')}"
+
+def describe_operations(operations: List[Dict[str, Any]]) -> str:
+    """batch_file_operations の操作の一覧を、番号付きの複数行の説明にします。"""
+    lines = []
+    for number, operation in enumerate(operations, start=1):
+        try:
+            lines.append(f"  {number}. {describe_operation(operation)}")
+        except Exception:
+            lines.append(f"  {number}. {operation}")
+    return "\n".join(lines)
+
+def _validate_operations(operations: List[Dict[str, Any]]) -> Optional[str]:
+    """操作の一覧の形式を確認し、不正な場合はエラーメッセージを返します。"""
+    if not operations:
+        return "'operations' が空です。"
+    for number, operation in enumerate(operations, start=1):
+        op = operation.get("op") if isinstance(operation, dict) else None
+        if op not in BATCH_OPERATIONS:
+            return f"操作 {number}: 'op' は {', '.join(BATCH_OPERATIONS)} のいずれかを指定してください（指定された値: {op!r}）。"
+        missing = [key for key in BATCH_OPERATIONS[op] if not isinstance(operation.get(key), str)]
+        if missing:
+            return f"操作 {number} ({op}): {', '.join(missing)} を文字列で指定してください。"
+        if op == "apply_patch" and not (operation.get("patch") or (operation.get("path") and operation.get("edits"))):
+            return f"操作 {number} (apply_patch): 'patch'、または 'path' と 'edits' を指定してください。"
+    return None
+
+def _apply_operation(transaction: FileTransaction, operation: Dict[str, Any]) -> list[str]:
+    """1つの操作をトランザクション内で実行し、変更したパスのリストを返します。"""
+    op = operation["op"]
+    if op == "write_file":
+        transaction.write_file(operation["path"], operation["content"])
+        return [operation["path"]]
+    if op == "apply_patch":
+        changes = _plan_patch(operation.get("patch"), operation.get("path"), operation.get("edits"))
+        for target, _, new_text in changes:
+            if new_text is None:
+                transaction.delete_file(target)
+            else:
+                transaction.write_file(target, new_text)
+        return [target for target, _, _ in changes]
+    if op == "move":
+        transaction.move(operation["source_path"], operation["destination_path"])
+        return [operation["source_path"], operation["destination_path"]]
+    getattr(transaction, op)(operation["path"])
+    return [operation["path"]]
+
+@tool
+def batch_file_operations(operations: List[Dict[str, Any]]) -> str:
+    """
+    複数のファイル操作を、1回のユーザー確認でまとめて順に実行します。プロジェクトの雛形の作成など、多数のファイルを変更する場合に使用してください。
+    操作はトランザクションとして実行され、1つでも失敗した場合はそれまでの操作を全て取り消して、実行前の状態に戻します。
+
+    Args:
+        operations (list[dict]): 実行する操作のリスト。各項目は "op" に操作の種類を指定し、同名のツールと同じ引数を指定します。
+            - {"op": "write_file", "path": "...", "content": "..."}（親ディレクトリが存在しない場合は作成します）
+            - {"op": "apply_patch", "patch": "unified diff"} または {"op": "apply_patch", "path": "...", "edits": [{"old_text": "...", "new_text": "..."}]}
+            - {"op": "create_directory", "path": "..."}
+            - {"op": "delete_file", "path": "..."}
+            - {"op": "delete_directory", "path": "..."}
+            - {"op": "move", "source_path": "...", "destination_path": "..."}
+
+    Returns:
+        str: 実行した操作の一覧、または失敗した操作とエラーの内容。
+    """
+    error = _validate_operations(operations)
+    if error is not None:
+        return f"エラー: {error}（ファイルは変更されていません）"
+
+    transaction = FileTransaction()
+    touched: list[str] = []
+    for number, operation in enumerate(operations, start=1):
+        try:
+            touched.extend(_apply_operation(transaction, operation))
+        except Exception as e:
+            rollback_error = transaction.rollback()
+            for path in touched:
+                _invalidate(path)
+            if rollback_error is not None:
+                return (
+                    f"エラー: 操作 {number} ({describe_operation(operation)}) が失敗しました: {e}\n"
+                    f"変更を元に戻す途中でエラーが発生したため、一部の変更が残っている可能性があります: {rollback_error}"
+                )
+            return f"エラー: 操作 {number} ({describe_operation(operation)}) が失敗したため、全ての変更を元に戻しました: {e}"
+    transaction.commit()
+    for path in touched:
+        _invalidate(path)
+    return f"{len(operations)} 件の操作を実行しました。\n" + describe_operations(operations)
+
+def _clip_text(text: str, max_bytes: int) -> str:
+    """text を UTF-8 で max_bytes バイト以内の最後の改行までに切り詰めます（改行が含まれない場合は空文字列）。"""
+    data = text.encode("utf-8")
+    if len(data) <= max_bytes:
+        return text
+    return data[:data.rfind(b"\n", 0, max_bytes) + 1].decode("utf-8", errors="ignore")
+
+@tool
+def read_many_files(paths: list[str], exclude: list[str] = None, include: list[str] = None, recursive: bool = True, useDefaultExcludes: bool = True, respectGitIgnore: bool = True) -> str:
     """
     複数のファイルやディレクトリの内容を読み込みます。globパターンもサポートします。
     テキストファイルのみを対象とし、バイナリファイルはスキップされます。
+    出力が上限のサイズを超える場合は、そこで打ち切り、省略したファイルを末尾に示します。
 
     Args:
         paths (list[str]): 読み込むファイルやディレクトリのパス、またはglobパターンのリスト。
-        exclude (list[str], optional): 除外するファイルやディレクトリのglobパターン。
-        include (list[str], optional): 追加で含めるglobパターン。
+        exclude (list[str], optional): 除外するファイルやディレクトリのglobパターン（.gitignore と同じ形式。例: '*.log', 'build/'）。
+        include (list[str], optional): 読み込むファイルを絞り込むglobパターン。指定した場合はいずれかに一致するファイルのみを読み込みます。
         recursive (bool, optional): ディレクトリを再帰的に検索するかどうか。デフォルトはTrue。
         useDefaultExcludes (bool, optional): デフォルトの除外パターンを適用するかどうか。デフォルトはTrue。
+        respectGitIgnore (bool, optional): .gitignore で除外されたファイルを読み込まないかどうか。デフォルトはTrue。
 
     Returns:
         str: 読み込んだファイルの内容を連結した文字列。各ファイルの内容は`--- {filePath} ---`で区切られます。
              エラーが発生した場合は、エラーメッセージを返します。
     """
-    if exclude is None:
-        exclude = []
-    if include is None:
-        include = []
-
-    default_excludes = [
-        "node_modules/", ".git/", "__pycache__/", "*.pyc", "*.log", "*.tmp",
-        "*.zip", "*.tar.gz", "*.rar", "*.7z", "*.exe", "*.dll", "*.so", "*.dylib",
-        "*.png", "*.jpg", "*.jpeg", "*.gif", "*.bmp", "*.ico", "*.mp3", "*.mp4",
-        "*.avi", ".mov", ".flv", ".wmv", ".pdf", ".doc", ".docx", ".xls",
-        ".xlsx", ".ppt", ".pptx", ".sqlite3", ".db", ".DS_Store",
-        ".venv/", ".pytest_cache/", "uv.lock"
-    ]
-    if not useDefaultExcludes:
-        default_excludes = []
-
-    all_files_to_read = []
-    for p in paths:
-        base_path = Path(p)
-        if base_path.is_file():
-            all_files_to_read.append(base_path)
-        elif base_path.is_dir():
-            if recursive:
-                for root, _, files in os.walk(base_path):
-                    for file in files:
-                        all_files_to_read.append(Path(root) / file)
-            else:
-                for item in os.listdir(base_path):
-                    item_path = base_path / item
-                    if item_path.is_file():
-                        all_files_to_read.append(item_path)
-        else:
-            for f in Path('.').glob(p):
-                if f.is_file():
-                    all_files_to_read.append(f)
-
-    filtered_files = []
-    for file_path in all_files_to_read:
-        file_str = str(file_path)
-        if any(fnmatch.fnmatch(file_str, ex) for ex in exclude + default_excludes):
+    files = collect_files(
+        paths, exclude or [], include or [], recursive=recursive,
+        use_default_excludes=useDefaultExcludes, use_gitignore=respectGitIgnore,
+    )
+
+    max_bytes = Config.READ_MANY_FILES_MAX_BYTES
+    content_parts = []
+    used = 0
+    truncated_marker = None
+    for i, item in enumerate(read_files(files, max_bytes, Config.READ_MANY_FILES_WORKERS, file_cache.read_text)):
+        if item.binary:
             continue
-        if include and not any(fnmatch.fnmatch(file_str, inc) for inc in include):
+        if item.error is not None:
+            part = f"--- {item.path} (読み込みエラー: {item.error}) ---"
+        else:
+            part = f"--- {item.path} ---\n{item.text}"
+        size = len(part.encode("utf-8")) + 1
+        if used + size <= max_bytes and not item.partial:
+            content_parts.append(part)
+            used += size
             continue
-        filtered_files.append(file_path)
 
-    content_parts = []
-    for file_path in sorted(filtered_files): # ソートして一貫性を保つ
-        try:
-            with open(file_path, 'rb') as f: # Read as binary
-                raw_content = f.read()
-            
-            # Decode as UTF-8 with replacement for robustness
-            content = raw_content.decode('utf-8', errors='replace')
-            content_parts.append(f"---\n{content}\n---")
-        except Exception as e:
-            content_parts.append(f"--- {file_path} (読み込みエラー: {e}) ---")
+        # 上限に達したファイルは収まる行までを出力し、残りのファイルは読み込まずに省略する
+        clipped = _clip_text(part, max(max_bytes - used, 0))
+        if clipped.count("\n") >= 1:
+            content_parts.append(clipped.rstrip("\n"))
+            shown_lines = clipped.count("\n")
+            omitted = [f"{item.path} の {shown_lines} 行目以降"]
+        else:
+            omitted = [item.path]
+        omitted += files[i + 1:]
+        listed = ", ".join(omitted[:20]) + (f" ほか {len(omitted) - 20} 件" if len(omitted) > 20 else "")
+        truncated_marker = (
+            f"--- [truncated] 出力の上限 ({max_bytes} バイト) に達したため、以下を省略しました: {listed}。"
+            f"必要な場合は read_file で範囲を指定するか、paths を絞って読み込んでください ---"
+        )
+        break
 
-    if not content_parts:
+    if not content_parts and truncated_marker is None:
         return "指定された条件に一致するファイルは見つかりませんでした。"
-    
+
+    if truncated_marker is not None:
+        content_parts.append(truncated_marker)
     return "\n".join(content_parts) + "\n--- End of content ---"
 
 @tool
-def search_file_content(pattern: str, include: str = None, path: str = None) -> str:
+def search_file_content(pattern: str, include: str = None, path: str = None, max_results: Optional[int] = None, context_lines: int = 0) -> str:
     """
     指定されたディレクトリ内のファイル内容から正規表現パターンを検索します。
     マッチした行、ファイルパス、行番号を返します。
+    .gitignore で除外されたファイル、.git や node_modules などのディレクトリ、バイナリファイルは検索しません。
 
     Args:
         pattern (str): 検索する正規表現パターン。
         include (str, optional): 検索対象ファイルをフィルタリングするglobパターン（例: '*.py', 'src/**/*.js'）。
         path (str, optional): 検索対象ディレクトリの絶対パス。指定しない場合は現在の作業ディレクトリ。
+        max_results (int, optional): 返すマッチした行の最大件数。達した時点で検索を打ち切ります。指定しない場合は設定値（デフォルト200件）。
+        context_lines (int, optional): マッチした行の前後に表示する行数。前後の行は 'パス-行番号- 内容' の形式で表示されます。
 
     Returns:
         str: マッチした行、ファイルパス、行番号を含む文字列。
              検索結果がない場合は、その旨を伝えます。
     """
     search_path = Path(path) if path else Path.cwd()
-    results = []
-    compiled_pattern = re.compile(pattern)
-
-    all_files = []
-    for root, _, files in os.walk(search_path):
-        for file_name in files:
-            all_files.append(Path(root) / file_name)
-
-    for file_path in all_files:
-        if include and not fnmatch.fnmatch(str(file_path), include):
-            continue
-        
-        try:
-            with open(file_path, 'rb') as f: # Read as binary
-                raw_content = f.read()
-            
-            # Decode as UTF-8 with replacement for robustness
-            content = raw_content.decode('utf-8', errors='replace')
-            
-            if content is not None: # This check is redundant as decode always returns a string with errors='replace'
-                for line_num, line in enumerate(content.splitlines(), 1):
-                    if compiled_pattern.search(line):
-                        results.append(f"{file_path}:{line_num}: {line.strip()}")
-        except Exception as e:
-            results.append(f"エラー: ファイル {file_path} の読み込み中にエラーが発生しました: {e}")
+    max_results = max_results if max_results and max_results > 0 else Config.SEARCH_MAX_RESULTS
+    context_lines = max(context_lines or 0, 0)
+    try:
+        re.compile(pattern)
+        # 検索索引が有効な場合は、パターンの文字列を含むファイルのみを検索する
+        candidates = search_index.candidate_paths(str(search_path), pattern)
+        result = search(
+            pattern, str(search_path), include=include, max_results=max_results, context_lines=context_lines,
+            timeout=Config.SEARCH_TIMEOUT, workers=Config.SEARCH_WORKERS, paths=candidates,
+        )
+    except re.error as e:
+        return f"エラー: 正規表現 '{pattern}' が不正です: {e}"
 
+    results = format_lines(result, context_lines)
+    if result.truncated:
+        results.append(f"(マッチした行が {max_results} 件に達したため、検索を打ち切りました。範囲を絞るには path や include を指定してください)")
+    elif result.timed_out:
+        results.append(f"(検索時間の上限 {Config.SEARCH_TIMEOUT:g} 秒に達したため、一部のファイルのみの結果です)")
     if not results:
         return f"パターン '{pattern}' に一致する内容はファイル内で見つかりませんでした。"
-    
+
     return "\n".join(results)
 
 # エージェントが利用するツールリスト
@@ -267,6 +544,8 @@ file_tools = [
     delete_directory,
     move,
     modify_file_content,
+    apply_patch,
+    batch_file_operations,
     read_many_files,
     search_file_content
 ]
\ No newline at end of file
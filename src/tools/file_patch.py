@@ -0,0 +1,255 @@
+import difflib
+import os
+import re
+import tempfile
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+# unified diff のハンクの見出し（例: "@@ -12,5 +12,7 @@ def main():"）。行数は省略されることがある
+_HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+# /proc から umask を読めない環境で、一度だけ求めた umask
+_umask: Optional[int] = None
+_umask_lock = threading.Lock()
+
+def _current_umask() -> int:
+    """
+    プロセスの umask を返します。Linux では /proc/self/status から読み取り、umask を変更しません。
+    それ以外の環境では最初の呼び出し時に一度だけ os.umask() で求め、他のスレッドと競合しないようロックの中で元に戻します。
+    """
+    global _umask
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("Umask:"):
+                    return int(line.split()[1], 8)
+    except (OSError, ValueError):
+        pass
+    with _umask_lock:
+        if _umask is None:
+            _umask = os.umask(0o22)
+            os.umask(_umask)
+        return _umask
+
+class PatchError(ValueError):
+    """パッチや編集の内容が対象のファイルに適用できない場合に送出されます。"""
+
+@dataclass
+class Hunk:
+    """unified diff の1つのハンク。lines は (' ' | '-' | '+', 改行を含まない行) のリストです。"""
+    old_start: int
+    lines: list[tuple[str, str]] = field(default_factory=list)
+    no_newline_at_end: bool = False
+
+    @property
+    def old_lines(self) -> list[str]:
+        return [text for op, text in self.lines if op != "+"]
+
+    @property
+    def new_lines(self) -> list[str]:
+        return [text for op, text in self.lines if op != "-"]
+
+@dataclass
+class FilePatch:
+    """1つのファイルに対するパッチ。old_path が None の場合は新規作成、new_path が None の場合は削除を表します。"""
+    old_path: Optional[str]
+    new_path: Optional[str]
+    hunks: list[Hunk] = field(default_factory=list)
+
+    @property
+    def path(self) -> str:
+        return self.new_path if self.new_path is not None else self.old_path
+
+def _header_path(line: str) -> Optional[str]:
+    """'--- a/src/main.py\t2024-01-01 ...' のような見出しからパスを取り出します。/dev/null は None を返します。"""
+    path = line[4:].split("\t", 1)[0].strip()
+    if len(path) >= 2 and path[0] == path[-1] == '"':
+        path = path[1:-1]
+    return None if path == "/dev/null" else path
+
+def _strip_prefixes(old_path: Optional[str], new_path: Optional[str]) -> tuple[Optional[str], Optional[str]]:
+    """git diff の a/・b/ の接頭辞を取り除きます。"""
+    if all(p is None or p.startswith(prefix) for p, prefix in ((old_path, "a/"), (new_path, "b/"))):
+        old_path = old_path[2:] if old_path is not None else None
+        new_path = new_path[2:] if new_path is not None else None
+    return old_path, new_path
+
+def parse_unified_diff(patch: str) -> list[FilePatch]:
+    """
+    unified diff（diff -u / git diff 形式、複数ファイル可）を解析します。
+    ハンクの行数は検証に使わず、本文の行からハンクの範囲を決めるため、行数が正しくない手書きの diff も受け付けます。
+    """
+    files: list[FilePatch] = []
+    current: Optional[FilePatch] = None
+    hunk: Optional[Hunk] = None
+    blank_lines = 0  # ハンク内の空行。後にハンクの行が続く場合のみ空の文脈行として扱う
+    lines = patch.splitlines()
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        if line.startswith("--- ") and i + 1 < len(lines) and lines[i + 1].startswith("+++ "):
+            current = FilePatch(*_strip_prefixes(_header_path(line), _header_path(lines[i + 1])))
+            if current.path is None:
+                raise PatchError(f"{i + 1} 行目: ファイルのパスがありません。")
+            files.append(current)
+            hunk, blank_lines = None, 0
+            i += 2
+            continue
+        header = _HUNK_HEADER.match(line)
+        if header:
+            if current is None:
+                raise PatchError(f"{i + 1} 行目: ハンクの前に '--- 変更前のパス' と '+++ 変更後のパス' の行が必要です。")
+            hunk, blank_lines = Hunk(int(header.group(1))), 0
+            current.hunks.append(hunk)
+        elif hunk is not None and line[:1] in (" ", "-", "+"):
+            # 末尾の空白を削除するエディタで、空の文脈行の先頭の空白が失われることがある
+            hunk.lines.extend([(" ", "")] * blank_lines)
+            blank_lines = 0
+            hunk.lines.append((line[0], line[1:]))
+        elif hunk is not None and line == "":
+            blank_lines += 1
+        elif hunk is not None and line.startswith("\\"):
+            # "\ No newline at end of file" は直前の行に改行がないことを表す
+            if hunk.lines and hunk.lines[-1][0] != "-":
+                hunk.no_newline_at_end = True
+        else:
+            # diff --git や index の行などの見出しは読み飛ばし、次のハンクまでを区切る
+            hunk, blank_lines = None, 0
+        i += 1
+
+    if not files:
+        raise PatchError("unified diff の形式のパッチが見つかりません。'--- 変更前のパス'、'+++ 変更後のパス'、'@@ ... @@' の行が必要です。")
+    return files
+
+def _split_lines(text: str) -> tuple[list[str], str, bool]:
+    """text を (改行を除いた行のリスト, 改行文字, 末尾が改行で終わるか) に分けます。"""
+    newline = "\r\n" if "\r\n" in text else "\n"
+    ends_with_newline = text.endswith("\n")
+    body = text[:-len(newline)] if text.endswith(newline) else text
+    lines = body.split(newline) if text else []
+    return lines, newline, ends_with_newline
+
+def _find_block(lines: list[str], block: list[str], start: int, hint: int) -> Optional[int]:
+    """
+    lines[start:] の中で block と一致する位置を、hint に最も近いものから探します。
+    完全に一致する位置がない場合は、行末の空白を無視して探します。
+    """
+    candidates = range(start, len(lines) - len(block) + 1)
+    ordered = sorted(candidates, key=lambda pos: abs(pos - hint))
+    for normalize in (lambda s: s, str.rstrip):
+        expected = [normalize(s) for s in block]
+        for pos in ordered:
+            if all(normalize(lines[pos + k]) == expected[k] for k in range(len(block))):
+                return pos
+    return None
+
+def apply_hunks(text: str, hunks: list[Hunk]) -> str:
+    """
+    text にハンクを順に適用した結果を返します。いずれかのハンクが一致しない場合は PatchError を送出します。
+    各ハンクは見出しの行番号に最も近い一致する位置に適用されるため、行番号がずれていても適用できます。
+    ファイルの改行文字（LF / CRLF）は維持されます。
+    """
+    lines, newline, ends_with_newline = _split_lines(text)
+    offset = 0  # 既に適用したハンクによる行番号のずれ
+    start = 0   # 次のハンクを探し始める位置（ハンクは重ならない）
+    for number, hunk in enumerate(hunks, start=1):
+        old = hunk.old_lines
+        if not old:
+            # 文脈のない追加のみのハンク（新規ファイルなど）は、見出しの行の直後に挿入する
+            pos = min(max(hunk.old_start + offset, start), len(lines))
+        else:
+            pos = _find_block(lines, old, start, max(hunk.old_start - 1 + offset, 0))
+            if pos is None:
+                preview = "\n".join(old[:5])
+                raise PatchError(f"ハンク {number}（-{hunk.old_start} 行目付近）の変更前の行がファイルの内容と一致しません:\n{preview}")
+        new = hunk.new_lines
+        lines[pos:pos + len(old)] = new
+        offset += len(new) - len(old)
+        start = pos + len(new)
+        if start == len(lines) and hunk.lines:
+            # ファイルの末尾を含むハンクでは、"\ No newline at end of file" の有無で末尾の改行を決める
+            ends_with_newline = not hunk.no_newline_at_end
+
+    if not lines:
+        return ""
+    return newline.join(lines) + (newline if ends_with_newline else "")
+
+def apply_edits(text: str, edits: list[dict[str, Any]]) -> str:
+    """
+    text に {"old_text", "new_text", "replace_all"} の編集を順に適用した結果を返します。
+    replace_all が False の場合、old_text はその時点の内容にちょうど1回現れる必要があり、
+    見つからない場合や複数ある場合は PatchError を送出します。
+    """
+    for number, edit in enumerate(edits, start=1):
+        if not isinstance(edit, dict) or "old_text" not in edit or "new_text" not in edit:
+            raise PatchError(f"編集 {number}: 'old_text' と 'new_text' を指定してください。")
+        old_text, new_text = edit["old_text"], edit["new_text"]
+        if not old_text:
+            raise PatchError(f"編集 {number}: 'old_text' が空です。")
+        # CRLF のファイルに LF で書かれた編集を適用できるよう、ファイルの改行文字に合わせる
+        if "\r\n" in text and "\r\n" not in old_text:
+            old_text, new_text = old_text.replace("\n", "\r\n"), new_text.replace("\n", "\r\n")
+        count = text.count(old_text)
+        if count == 0:
+            raise PatchError(f"編集 {number}: 'old_text' がファイルの内容に見つかりません: {edit['old_text'][:200]!r}")
+        if count > 1 and not edit.get("replace_all", False):
+            raise PatchError(
+                f"編集 {number}: 'old_text' がファイル内に {count} 箇所あります。"
+                f"前後の行を含めて一意にするか、'replace_all': true を指定してください。"
+            )
+        text = text.replace(old_text, new_text)
+    return text
+
+def read_text_exact(path: str) -> str:
+    """改行文字を変換せずに UTF-8 でファイルを読み込みます。UTF-8 でない場合は PatchError を送出します。"""
+    with open(path, "rb") as f:
+        data = f.read()
+    try:
+        return data.decode("utf-8")
+    except UnicodeDecodeError as e:
+        raise PatchError(f"ファイル '{path}' は UTF-8 のテキストではないため編集できません: {e}") from e
+
+def atomic_write(path: str, text: str):
+    """
+    同じディレクトリの一時ファイルに書き込んでから置き換えることで、path の内容を原子的に書き換えます。
+    書き込み中にエラーが発生しても、元のファイルが途中まで書かれた状態で残ることはありません。既存のファイルのパーミッションは維持されます。
+    """
+    # シンボリックリンクはリンク自体ではなくリンク先のファイルを書き換える
+    path = os.path.realpath(path)
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            os.chmod(temp_path, os.stat(path).st_mode & 0o7777)
+        except FileNotFoundError:
+            # 新規作成するファイルのパーミッションは open() と同じにする
+            os.chmod(temp_path, 0o666 & ~_current_umask())
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+def count_changes(old_text: str, new_text: str) -> tuple[int, int]:
+    """(追加された行数, 削除された行数) を求めます。先頭と末尾の共通部分を除いてから差分を取るため、大きなファイルの小さな変更でも高速です。"""
+    old, new = old_text.splitlines(), new_text.splitlines()
+    head = 0
+    while head < min(len(old), len(new)) and old[head] == new[head]:
+        head += 1
+    tail = 0
+    while tail < min(len(old), len(new)) - head and old[-1 - tail] == new[-1 - tail]:
+        tail += 1
+    matcher = difflib.SequenceMatcher(None, old[head:len(old) - tail], new[head:len(new) - tail], autojunk=False)
+    added = removed = 0
+    for op, i1, i2, j1, j2 in matcher.get_opcodes():
+        if op != "equal":
+            removed += i2 - i1
+            added += j2 - j1
+    return added, removed
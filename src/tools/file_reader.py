@@ -0,0 +1,160 @@
+import mmap
+import os
+from array import array
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
+from src.tools.file_cache import file_cache
+
+# 行オフセットの索引に記録する間隔（行数）。索引のメモリ使用量は (行数 / LINE_INDEX_STRIDE) * 8 バイト
+LINE_INDEX_STRIDE = 256
+
+@dataclass
+class LineIndex:
+    """ファイルの行数と、LINE_INDEX_STRIDE 行ごとの行の開始位置（バイト）。"""
+    size: int
+    total_lines: int
+    checkpoints: array
+
+def build_line_index(path: str) -> tuple[LineIndex, int]:
+    """ファイル全体を mmap で走査して行オフセットの索引を作成し、(索引, 索引のバイト数) を返します。"""
+    checkpoints = array("Q", [0])
+    with _mapped(path) as mm:
+        if mm is None:
+            return LineIndex(0, 0, checkpoints), checkpoints.itemsize
+        newlines = 0
+        pos = mm.find(b"\n")
+        while pos != -1:
+            newlines += 1
+            if newlines % LINE_INDEX_STRIDE == 0:
+                checkpoints.append(pos + 1)
+            pos = mm.find(b"\n", pos + 1)
+        size = len(mm)
+        # 末尾が改行で終わっていない場合、最後の行も1行として数える
+        total_lines = newlines + (0 if mm[size - 1:size] == b"\n" else 1)
+    return LineIndex(size, total_lines, checkpoints), len(checkpoints) * checkpoints.itemsize
+
+@contextmanager
+def _mapped(path: str) -> Iterator[Optional[mmap.mmap]]:
+    """ファイルを読み取り専用で mmap します。空のファイルは mmap できないため None を返します。"""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield None
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            yield mm
+
+def _line_offset(mm: mmap.mmap, index: LineIndex, line: int) -> int:
+    """0始まりの line 行目の開始位置。行数以上の場合はファイルサイズを返します。"""
+    if line >= index.total_lines:
+        return index.size
+    pos = index.checkpoints[line // LINE_INDEX_STRIDE]
+    for _ in range(line % LINE_INDEX_STRIDE):
+        pos = mm.find(b"\n", pos) + 1
+    return pos
+
+def _decode(data: bytes) -> str:
+    # Decode as UTF-8 with replacement for robustness
+    return data.decode("utf-8", errors="replace")
+
+def _clip_to_line(data: bytes, max_bytes: int) -> bytes:
+    """
+    max_bytes 以内の最後の改行までに切り詰めます。
+    1行が max_bytes を超える場合はその位置で切ります（UTF-8 の文字の途中にならないよう、文字の先頭まで戻します）。
+    """
+    if len(data) <= max_bytes:
+        return data
+    cut = data.rfind(b"\n", 0, max_bytes)
+    if cut != -1:
+        return data[:cut + 1]
+    cut = max_bytes
+    while cut > 0 and max_bytes - cut < 3 and data[cut] & 0xC0 == 0x80:
+        cut -= 1
+    return data[:cut]
+
+@dataclass
+class FileSlice:
+    """
+    ファイルから読み込んだ範囲。start / end は行範囲の場合は1始まりの行番号、バイト範囲の場合は0始まりの位置（end は含まない）。
+    resume_byte は行範囲の読み込みで end 行目を途中で切った場合に、その行の続きを読み込むバイト位置です。
+    """
+    text: str
+    start: int
+    end: int
+    total_lines: int
+    size: int
+    truncated: bool
+    resume_byte: Optional[int] = None
+
+def read_lines(path: str, start_line: int, end_line: Optional[int], max_bytes: int) -> FileSlice:
+    """
+    1始まりの start_line 行目から end_line 行目（含む、None の場合は末尾）までを読み込みます。
+    行オフセットの索引はファイルが変更されるまでキャッシュされ、mmap により要求された範囲のみを読み込みます。
+    出力が max_bytes を超える場合は行の区切りで切り詰め、truncated を True にします。
+    start_line 行目だけで max_bytes を超える場合はその行の途中で切り、続きのバイト位置を resume_byte に設定します。
+    """
+    index = file_cache.get("lines", path, build_line_index)
+    start_line = max(start_line, 1)
+    end_line = index.total_lines if end_line is None else min(end_line, index.total_lines)
+    if start_line > end_line:
+        return FileSlice("", start_line, start_line - 1, index.total_lines, index.size, False)
+    with _mapped(path) as mm:
+        begin = _line_offset(mm, index, start_line - 1)
+        end = _line_offset(mm, index, end_line)
+        data = mm[begin:min(end, begin + max_bytes + 1)]
+    clipped = _clip_to_line(data, max_bytes)
+    truncated = len(clipped) < end - begin
+    resume_byte = None
+    if truncated:
+        if clipped.endswith(b"\n"):
+            end_line = start_line + clipped.count(b"\n") - 1
+        else:
+            end_line = start_line
+            resume_byte = begin + len(clipped)
+    return FileSlice(_decode(clipped), start_line, end_line, index.total_lines, index.size, truncated, resume_byte)
+
+def read_bytes(path: str, start_byte: int, end_byte: Optional[int], max_bytes: int) -> FileSlice:
+    """0始まりの start_byte から end_byte（含まない、None の場合は末尾）までを、最大 max_bytes バイト読み込みます。"""
+    index = file_cache.get("lines", path, build_line_index)
+    start_byte = max(start_byte, 0)
+    end_byte = index.size if end_byte is None else min(end_byte, index.size)
+    if start_byte >= end_byte:
+        return FileSlice("", start_byte, start_byte, index.total_lines, index.size, False)
+    truncated = end_byte - start_byte > max_bytes
+    if truncated:
+        end_byte = start_byte + max_bytes
+    with _mapped(path) as mm:
+        data = mm[start_byte:end_byte]
+    return FileSlice(_decode(data), start_byte, end_byte, index.total_lines, index.size, truncated)
+
+@dataclass
+class FilePreview:
+    """大きなファイルの先頭と末尾。"""
+    head: str
+    head_lines: int
+    tail: str
+    tail_start_line: int
+    total_lines: int
+    size: int
+
+def preview(path: str, lines: int, max_bytes: int) -> FilePreview:
+    """ファイルの先頭と末尾の lines 行ずつ（それぞれ最大 max_bytes // 2 バイト）を読み込みます。"""
+    index = file_cache.get("lines", path, build_line_index)
+    budget = max_bytes // 2
+    with _mapped(path) as mm:
+        if mm is None:
+            return FilePreview("", 0, "", 1, 0, 0)
+        head = _clip_to_line(mm[:min(_line_offset(mm, index, min(lines, index.total_lines)), budget + 1)], budget)
+        head_lines = head.count(b"\n")
+        tail_begin = _line_offset(mm, index, max(index.total_lines - lines, head_lines))
+        min_begin = max(index.size - budget, len(head))
+        if tail_begin < min_begin:
+            # 末尾の行が長い場合は、上限内に収まる最初の行の先頭から表示する（1行も収まらない場合は行の途中から）
+            newline = mm.find(b"\n", min_begin - 1, index.size - 1)
+            tail_begin = newline + 1 if newline != -1 else min_begin
+        tail = mm[tail_begin:index.size]
+    tail_lines = tail.count(b"\n") + (1 if tail and not tail.endswith(b"\n") else 0)
+    return FilePreview(
+        _decode(head), head_lines, _decode(tail), index.total_lines - tail_lines + 1, index.total_lines, index.size,
+    )
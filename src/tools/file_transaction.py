@@ -0,0 +1,148 @@
+import os
+import shutil
+import tempfile
+from typing import Callable, Optional
+
+from src.tools.file_patch import atomic_write
+
+def _is_within(path: str, directory: str) -> bool:
+    """path が directory 自身またはその中にあるかどうか。"""
+    path, directory = os.path.abspath(path), os.path.abspath(directory)
+    return os.path.commonpath([path, directory]) == directory
+
+class FileTransaction:
+    """
+    ファイルシステムへの一連の変更を記録し、途中で失敗した場合に全てを元に戻せるようにします。
+
+    上書き・削除・移動で失われるファイルやディレクトリは、同じファイルシステム上のバックアップ用ディレクトリへ
+    名前変更で退避するため、大きなディレクトリを削除する場合でも内容をコピーしません。
+    commit() でバックアップを削除し、rollback() で記録した操作を逆順に取り消します。
+
+    バックアップ用ディレクトリは最初に変更したディレクトリの中に作成されるため、後の操作でそれを含むディレクトリを削除・移動することがあります。
+    その場合はバックアップ用ディレクトリも一緒に移動し、移動先を記録します（取り消しは逆順に行うため、以前のバックアップは元の場所に戻ってから復元されます）。
+    """
+
+    def __init__(self):
+        self._undo: list[Callable[[], None]] = []
+        self._backup_dirs: dict[int, str] = {}  # st_dev -> 新しいバックアップに使用するディレクトリ
+        self._created_dirs: list[str] = []  # 作成した全てのバックアップ用ディレクトリの現在の場所
+        self._backups = 0
+
+    def _backup_path(self, parent: str, moving: Optional[str] = None) -> str:
+        """
+        parent と同じファイルシステム上のバックアップ用ディレクトリに、新しいバックアップのパスを返します（ファイルは作成しません）。
+        moving を指定した場合は、そのパスの中にないバックアップ用ディレクトリを使用します（自分自身の中へは移動できないため）。
+        """
+        device = os.stat(parent).st_dev
+        directory = self._backup_dirs.get(device)
+        if directory is None or not os.path.isdir(directory) or (moving is not None and _is_within(directory, moving)):
+            directory = self._backup_dirs[device] = tempfile.mkdtemp(prefix=".batch_file_operations.", dir=parent)
+            self._created_dirs.append(directory)
+        self._backups += 1
+        return os.path.join(directory, str(self._backups))
+
+    def _moved(self, source: str, destination: str):
+        """source の中のバックアップ用ディレクトリが destination へ移動したことを記録し、以降のバックアップには使用しないようにします。"""
+        self._backup_dirs = {device: d for device, d in self._backup_dirs.items() if not _is_within(d, source)}
+        for i, directory in enumerate(self._created_dirs):
+            if _is_within(directory, source):
+                self._created_dirs[i] = os.path.join(destination, os.path.relpath(directory, source))
+
+    def _restore_later(self, path: str):
+        """path をバックアップ用ディレクトリへ移動し、取り消し時に元の場所へ戻すよう記録します。"""
+        backup = self._backup_path(os.path.dirname(os.path.abspath(path)), moving=path)
+        os.replace(path, backup)
+        self._moved(path, backup)
+
+        def undo():
+            os.replace(backup, path)
+            self._moved(backup, path)
+        self._undo.append(undo)
+
+    def _make_parents(self, path: str):
+        """path の親ディレクトリを作成し、新しく作成したディレクトリを取り消し時に削除するよう記録します。"""
+        parent = os.path.dirname(os.path.abspath(path))
+        created, directory = None, parent
+        while not os.path.exists(directory):
+            created, directory = directory, os.path.dirname(directory)
+        if created is not None:
+            os.makedirs(parent)
+            self._undo.append(lambda: shutil.rmtree(created))
+
+    def write_file(self, path: str, content: str):
+        if os.path.isdir(path):
+            raise IsADirectoryError(f"パス '{path}' はディレクトリです。")
+        self._make_parents(path)
+        if os.path.exists(path):
+            # 元のファイルは atomic_write で置き換えられるため、複製を残して取り消し時に戻す
+            target = os.path.realpath(path)
+            backup = self._backup_path(os.path.dirname(target))
+            shutil.copy2(target, backup)
+            atomic_write(path, content)
+            self._undo.append(lambda: os.replace(backup, target))
+        else:
+            atomic_write(path, content)
+            self._undo.append(lambda: os.remove(path))
+
+    def create_directory(self, path: str):
+        if os.path.exists(path):
+            raise FileExistsError(f"パス '{path}' は既に存在します。")
+        self._make_parents(path)
+        os.mkdir(path)
+        self._undo.append(lambda: shutil.rmtree(path))
+
+    def delete_file(self, path: str):
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"ファイル '{path}' が見つかりません。")
+        self._restore_later(path)
+
+    def delete_directory(self, path: str):
+        if not os.path.isdir(path):
+            raise FileNotFoundError(f"ディレクトリ '{path}' が見つかりません。")
+        self._restore_later(path)
+
+    def move(self, source_path: str, destination_path: str):
+        if not os.path.lexists(source_path):
+            raise FileNotFoundError(f"移動元パス '{source_path}' が見つかりません。")
+        # shutil.move と同様に、既存のディレクトリへの移動はその中へ移動する
+        if os.path.isdir(destination_path):
+            destination_path = os.path.join(destination_path, os.path.basename(os.path.normpath(source_path)))
+        if os.path.lexists(destination_path):
+            if os.path.isdir(destination_path):
+                raise FileExistsError(f"移動先パス '{destination_path}' は既に存在します。")
+            self._restore_later(destination_path)
+        self._make_parents(destination_path)
+        shutil.move(source_path, destination_path)
+        self._moved(source_path, destination_path)
+
+        def undo():
+            shutil.move(destination_path, source_path)
+            self._moved(destination_path, source_path)
+        self._undo.append(undo)
+
+    def commit(self):
+        """変更を確定し、バックアップを削除します。"""
+        self._undo.clear()
+        self._cleanup()
+
+    def rollback(self) -> Optional[str]:
+        """
+        記録した操作を逆順に取り消します。取り消せなかった操作がある場合は、そのエラーを返します
+        （その場合、失われた内容はバックアップ用ディレクトリに残ります）。
+        """
+        errors = []
+        while self._undo:
+            try:
+                self._undo.pop()()
+            except Exception as e:
+                errors.append(str(e))
+        if errors:
+            return "; ".join(errors)
+        self._cleanup()
+        return None
+
+    def _cleanup(self):
+        for directory in self._created_dirs:
+            shutil.rmtree(directory, ignore_errors=True)
+        self._created_dirs.clear()
+        self._backup_dirs.clear()
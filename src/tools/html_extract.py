@@ -0,0 +1,450 @@
+import re
+from dataclasses import dataclass, field
+from html.parser import HTMLParser
+from typing import Union
+from urllib.parse import urljoin
+
+from src.core.token_accounting import estimate_text_tokens
+
+# 要素ごと（子孫を含めて）読み飛ばすタグ
+SKIP_TAGS = {
+    "head", "script", "style", "noscript", "template", "svg", "math", "iframe", "canvas", "object", "embed",
+    "form", "button", "select", "textarea", "input", "dialog",
+}
+# 本文とはみなさないタグと ARIA ロール（ナビゲーション・サイドバー・フッターなど）
+BOILERPLATE_TAGS = {"nav", "aside"}
+BOILERPLATE_ROLES = {"navigation", "banner", "contentinfo", "complementary", "search", "menu", "menubar", "dialog", "alert"}
+_VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param", "source", "track", "wbr"}
+_BLOCK_TAGS = {
+    "html", "body", "main", "article", "section", "div", "header", "footer", "nav", "aside", "p", "h1", "h2", "h3", "h4", "h5", "h6",
+    "ul", "ol", "li", "dl", "dt", "dd", "table", "thead", "tbody", "tfoot", "tr", "td", "th", "caption", "pre", "blockquote",
+    "hr", "figure", "figcaption", "details", "summary", "address", "center", "fieldset", "legend",
+}
+# 開始タグが、開いたままの同じ種類の要素を閉じるもの（終了タグを省略した HTML 用）と、探索を止める親要素
+_IMPLIED_END = {
+    "p": ({"p"}, {"div", "section", "article", "main", "td", "th", "li", "blockquote", "body"}),
+    "li": ({"li"}, {"ul", "ol"}),
+    "dt": ({"dt", "dd"}, {"dl"}),
+    "dd": ({"dt", "dd"}, {"dl"}),
+    "tr": ({"tr", "td", "th"}, {"table", "thead", "tbody", "tfoot"}),
+    "td": ({"td", "th"}, {"tr", "table"}),
+    "th": ({"td", "th"}, {"tr", "table"}),
+}
+# class / id にこれらの語を含む要素は、_POSITIVE の語も含まない限り定型部分として除きます
+_NEGATIVE = re.compile(
+    r"(?:^|[-_\s])(?:nav|navbar|menu|breadcrumbs?|sidebar|footer|header|masthead|comments?|share|sharing|social|sns|"
+    r"ads?|advert\w*|sponsor\w*|promo\w*|banner|cookie\w*|consent|popup|modal|newsletter|subscribe|related|"
+    r"recommend\w*|widget|pagination|pager|skip-link)(?:$|[-_\s])",
+    re.IGNORECASE,
+)
+_POSITIVE = re.compile(r"(?:^|[-_\s])(?:article|content|main|post|entry|story|body|text|markdown|prose)(?:$|[-_\s])", re.IGNORECASE)
+_HIDDEN_STYLE = re.compile(r"display\s*:\s*none|visibility\s*:\s*hidden", re.IGNORECASE)
+# 段落とみなす直下のテキストの最小文字数と、本文の要素が含むべき段落の文字数の割合
+MIN_PARAGRAPH_CHARS = 25
+MAIN_CONTENT_SHARE = 0.6
+# 本文の要素として選ぶタグ（段落そのものではなく、段落や見出し・表を含む要素）
+_CONTAINER_TAGS = {"html", "body", "main", "article", "section", "div", "td", "center"}
+# 要素の木の最大の深さ（再帰で処理するため）
+MAX_DEPTH = 150
+
+@dataclass(eq=False)
+class _Element:
+    tag: str
+    attrs: dict
+    children: list[Union["_Element", str]] = field(default_factory=list)
+
+    def elements(self):
+        return (child for child in self.children if isinstance(child, _Element))
+
+class _TreeBuilder(HTMLParser):
+    """
+    HTML を簡易的な要素の木にします。SKIP_TAGS と非表示の要素は読み込まず、<title> の文字列のみを記録します。
+    終了タグの省略（<p>・<li>・<td> など）や、対応する開始タグのない終了タグを含む HTML も受け付けます。
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = _Element("document", {})
+        self.stack = [self.root]
+        self.skipping: list[str] = []
+        self.title: list[str] = []
+        self.in_title = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "title":
+            # <svg> 内の <title> などは使用せず、最初の <title> のみを記録する
+            self.in_title = not self.title
+            return
+        if self.skipping:
+            if self.skipping[-1] == "head" and tag == "body":
+                # </head> が省略されている
+                self.skipping.clear()
+            else:
+                if tag == self.skipping[-1] and tag not in _VOID_TAGS:
+                    self.skipping.append(tag)
+                return
+        attrs = {name: value or "" for name, value in attrs}
+        if tag in SKIP_TAGS or "hidden" in attrs or attrs.get("aria-hidden") == "true" or _HIDDEN_STYLE.search(attrs.get("style", "")):
+            if tag not in _VOID_TAGS:
+                self.skipping.append(tag)
+            return
+        self._close_implied(tag)
+        if len(self.stack) > MAX_DEPTH:
+            # 閉じられていない要素が極端に深く入れ子になった HTML では、以降の要素の構造を無視して文字列のみを残す
+            return
+        element = _Element(tag, attrs)
+        self.stack[-1].children.append(element)
+        if tag not in _VOID_TAGS:
+            self.stack.append(element)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in _VOID_TAGS and not self.skipping and self.stack[-1].tag == tag:
+            self.stack.pop()
+
+    def _close_implied(self, tag):
+        closes, scope = _IMPLIED_END.get(tag, (None, None))
+        if closes is None and tag in _BLOCK_TAGS:
+            # ブロック要素は開いたままの <p> を閉じる
+            closes, scope = _IMPLIED_END["p"]
+        if closes is None:
+            return
+        # <tr> は開いたままの <td> とその <tr> の両方を閉じるため、範囲内で最も外側の要素まで閉じる
+        outermost = None
+        for index in range(len(self.stack) - 1, 0, -1):
+            name = self.stack[index].tag
+            if name in scope:
+                break
+            if name in closes:
+                outermost = index
+        if outermost is not None:
+            del self.stack[outermost:]
+
+    def handle_endtag(self, tag):
+        if tag == "title":
+            self.in_title = False
+            return
+        if self.skipping:
+            if tag == self.skipping[-1]:
+                self.skipping.pop()
+            return
+        for index in range(len(self.stack) - 1, 0, -1):
+            if self.stack[index].tag == tag:
+                del self.stack[index:]
+                return
+
+    def handle_data(self, data):
+        if self.in_title:
+            self.title.append(data)
+        elif not self.skipping:
+            self.stack[-1].children.append(data)
+
+def _class_and_id(element: _Element) -> str:
+    return f"{element.attrs.get('class', '')} {element.attrs.get('id', '')}"
+
+def _is_boilerplate(element: _Element, in_content: bool) -> bool:
+    if element.tag in BOILERPLATE_TAGS or element.attrs.get("role", "").lower() in BOILERPLATE_ROLES:
+        return True
+    if element.tag in ("header", "footer") and not in_content:
+        # <article> 内の header / footer は見出しや著者を含むため残す
+        return True
+    if element.tag in ("html", "body", "main", "article"):
+        return False
+    names = _class_and_id(element)
+    return bool(_NEGATIVE.search(names)) and not _POSITIVE.search(names)
+
+def _remove_boilerplate(element: _Element, in_content: bool = False):
+    in_content = in_content or element.tag in ("article", "main")
+    kept = []
+    for child in element.children:
+        if isinstance(child, _Element):
+            if _is_boilerplate(child, in_content):
+                continue
+            _remove_boilerplate(child, in_content)
+        kept.append(child)
+    element.children = kept
+
+class _TextStats:
+    """要素ごとの文字数・リンク内の文字数・段落の文字数を1回の走査で求めます。"""
+
+    def __init__(self, root: _Element):
+        self.text: dict[_Element, int] = {}
+        self.links: dict[_Element, int] = {}
+        self.paragraphs: dict[_Element, float] = {}
+        self._visit(root, False)
+
+    def _visit(self, element: _Element, in_link: bool) -> tuple[int, int, float]:
+        in_link = in_link or element.tag == "a"
+        text = links = own = 0
+        paragraphs = 0.0
+        for child in element.children:
+            if isinstance(child, str):
+                length = len(child.strip())
+                text += length
+                own += length
+                if in_link:
+                    links += length
+            else:
+                child_text, child_links, child_paragraphs = self._visit(child, in_link)
+                text += child_text
+                links += child_links
+                paragraphs += child_paragraphs
+                if child.tag not in _BLOCK_TAGS:
+                    own += child_text
+        if own >= MIN_PARAGRAPH_CHARS and element.tag not in ("li", "td", "th", "dt", "dd"):
+            # 直下にまとまった文字列を持つ要素を段落とみなし、リンクの多い段落は軽く数える
+            paragraphs += own * (1 - min(links / text, 1.0) if text else 1.0)
+        self.text[element], self.links[element], self.paragraphs[element] = text, links, paragraphs
+        return text, links, paragraphs
+
+def _find_all(element: _Element, predicate) -> list[_Element]:
+    found = []
+    for child in element.elements():
+        if predicate(child):
+            found.append(child)
+        found.extend(_find_all(child, predicate))
+    return found
+
+def _main_content(root: _Element, stats: _TextStats) -> _Element:
+    """
+    本文の要素を選びます。<main>（role="main"）または唯一の <article> がページの文字数の大半を含む場合はそれを使用し、
+    そうでない場合は段落の文字数の MAIN_CONTENT_SHARE 以上を含む、最も深い <div>・<section> などの要素を使用します。
+    """
+    total = stats.text[root]
+    for predicate in (
+        lambda e: e.tag == "main" or e.attrs.get("role", "").lower() == "main",
+        lambda e: e.tag == "article",
+    ):
+        candidates = _find_all(root, predicate)
+        significant = [e for e in candidates if stats.text[e] >= 0.2 * total]
+        if len(significant) == 1 and stats.text[significant[0]] >= 0.5 * total:
+            return significant[0]
+    required = stats.paragraphs[root] * MAIN_CONTENT_SHARE
+    if required <= 0:
+        return root
+    node = root
+    while True:
+        deeper = next((child for child in node.elements() if child.tag in _CONTAINER_TAGS and stats.paragraphs[child] >= required), None)
+        if deeper is None:
+            return node
+        node = deeper
+
+class _MarkdownRenderer:
+    """要素の木を Markdown 風のテキスト（見出し・リスト・表・リンク・コードブロック）にします。"""
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+
+    def render(self, element: _Element) -> str:
+        blocks: list[str] = []
+        self._blocks(element, blocks)
+        return "\n\n".join(blocks)
+
+    def _blocks(self, element: _Element, out: list[str]):
+        inline: list[str] = []
+        for child in element.children:
+            if isinstance(child, _Element) and child.tag in _BLOCK_TAGS:
+                self._flush(inline, out)
+                self._block(child, out)
+            else:
+                inline.append(self._inline(child))
+        self._flush(inline, out)
+
+    @staticmethod
+    def _flush(inline: list[str], out: list[str]):
+        lines = (line.strip() for line in "".join(inline).split("\n"))
+        text = "\n".join(line for line in lines if line)
+        if text:
+            out.append(text)
+        inline.clear()
+
+    def _text(self, element: _Element) -> str:
+        """要素内の文字列を1行にします（表のセル・見出し・リストの項目用）。"""
+        parts = []
+        for child in element.children:
+            if isinstance(child, _Element) and child.tag in _BLOCK_TAGS:
+                parts.append(f" {self._text(child)} ")
+            else:
+                parts.append(self._inline(child))
+        return re.sub(r"\s+", " ", "".join(parts)).strip()
+
+    def _block(self, element: _Element, out: list[str]):
+        tag = element.tag
+        if tag in ("h1", "h2", "h3", "h4", "h5", "h6"):
+            text = self._text(element)
+            if text:
+                out.append(f"{'#' * int(tag[1])} {text}")
+        elif tag in ("ul", "ol"):
+            text = self._list(element, 0)
+            if text:
+                out.append(text)
+        elif tag == "li":
+            text = self._text(element)
+            if text:
+                out.append(f"- {text}")
+        elif tag == "table":
+            self._table(element, out)
+        elif tag == "pre":
+            self._pre(element, out)
+        elif tag == "blockquote":
+            quoted: list[str] = []
+            self._blocks(element, quoted)
+            if quoted:
+                out.append("\n".join(f"> {line}" if line else ">" for line in "\n\n".join(quoted).split("\n")))
+        elif tag == "hr":
+            out.append("---")
+        elif tag == "dt":
+            text = self._text(element)
+            if text:
+                out.append(f"**{text}**")
+        else:
+            self._blocks(element, out)
+
+    def _inline(self, node: Union[_Element, str]) -> str:
+        if isinstance(node, str):
+            return re.sub(r"\s+", " ", node)
+        tag = node.tag
+        if tag == "br":
+            return "\n"
+        if tag == "img":
+            return ""
+        text = "".join(self._inline(child) for child in node.children)
+        if tag == "a":
+            label = re.sub(r"\s+", " ", text).strip()
+            href = node.attrs.get("href", "").strip()
+            if href.startswith("#") and len(label) == 1 and not label.isalnum():
+                # 見出しの横のパーマリンク（"#"・"¶" など）
+                return ""
+            if not label or not href or href.startswith(("#", "javascript:", "mailto:")):
+                return text
+            return f"[{label}]({urljoin(self.base_url, href)})"
+        if tag in ("code", "kbd", "samp", "tt") and text.strip() and "`" not in text and "\n" not in text:
+            return f"`{text.strip()}`"
+        if tag in ("strong", "b") and text.strip():
+            return f"**{text.strip()}**"
+        if tag in _BLOCK_TAGS:
+            return f"\n{text}\n"
+        return text
+
+    def _list(self, element: _Element, depth: int) -> str:
+        lines = []
+        number = int(element.attrs.get("start", "1")) if element.attrs.get("start", "1").isdigit() else 1
+        for item in element.elements():
+            if item.tag in ("ul", "ol"):
+                # <ul> の直下に置かれた入れ子のリスト
+                lines.append(self._list(item, depth + 1))
+                continue
+            parts, nested = [], []
+            for child in item.children:
+                if isinstance(child, _Element) and child.tag in ("ul", "ol"):
+                    nested.append(self._list(child, depth + 1))
+                elif isinstance(child, _Element) and child.tag in _BLOCK_TAGS:
+                    parts.append(f" {self._text(child)} ")
+                else:
+                    parts.append(self._inline(child))
+            text = re.sub(r"\s+", " ", "".join(parts)).strip()
+            marker = f"{number}." if element.tag == "ol" else "-"
+            if text:
+                lines.append(f"{'  ' * depth}{marker} {text}")
+                number += 1
+            lines.extend(line for line in nested if line)
+        return "\n".join(lines)
+
+    def _rows(self, element: _Element) -> list[_Element]:
+        rows = []
+        for child in element.elements():
+            if child.tag == "tr":
+                rows.append(child)
+            elif child.tag in ("thead", "tbody", "tfoot"):
+                rows.extend(self._rows(child))
+        return rows
+
+    def _table(self, element: _Element, out: list[str]):
+        rows = []
+        for row in self._rows(element):
+            cells = []
+            for cell in row.elements():
+                if cell.tag not in ("td", "th"):
+                    continue
+                if _find_all(cell, lambda e: e.tag == "table"):
+                    # 入れ子の表はレイアウト用とみなし、表として整形しない
+                    self._blocks(element, out)
+                    return
+                cells.append(self._text(cell).replace("|", "\\|"))
+                span = cell.attrs.get("colspan", "1")
+                cells.extend([""] * (min(int(span), 20) - 1 if span.isdigit() else 0))
+            if any(cells):
+                rows.append(cells)
+        columns = max((len(cells) for cells in rows), default=0)
+        if columns <= 1:
+            self._blocks(element, out)
+            return
+        lines = []
+        caption = next((child for child in element.elements() if child.tag == "caption"), None)
+        if caption is not None and self._text(caption):
+            lines.append(self._text(caption))
+        for index, cells in enumerate(rows):
+            cells = cells + [""] * (columns - len(cells))
+            lines.append("| " + " | ".join(cells) + " |")
+            if index == 0:
+                lines.append("|" + " --- |" * columns)
+        out.append("\n".join(lines))
+
+    def _pre(self, element: _Element, out: list[str]):
+        def raw_text(node):
+            if isinstance(node, str):
+                return node
+            return "\n" if node.tag == "br" else "".join(raw_text(child) for child in node.children)
+
+        code = raw_text(element).strip("\n")
+        if not code.strip():
+            return
+        language = ""
+        for node in [element, *element.elements()]:
+            match = re.search(r"(?:language|lang)-([\w+#-]+)", node.attrs.get("class", ""))
+            if match:
+                language = match.group(1)
+                break
+        out.append(f"```{language}\n{code}\n```")
+
+@dataclass
+class ExtractedPage:
+    """extract_main_content() の結果。"""
+    title: str
+    text: str
+
+def extract_main_content(html: str, base_url: str = "") -> ExtractedPage:
+    """
+    HTML から本文を抜き出し、Markdown 風のテキストにします。
+
+    スクリプト・スタイル・非表示の要素・ナビゲーションやサイドバーなどの定型部分を除き、本文の要素（<main>・<article>、
+    またはまとまった段落を最も多く含む要素）のみを、見出し・リスト・表・リンク（base_url からの絶対URL）を保って出力します。
+    """
+    builder = _TreeBuilder()
+    builder.feed(html)
+    builder.close()
+    root = builder.root
+    _remove_boilerplate(root)
+    content = _main_content(root, _TextStats(root))
+    title = re.sub(r"\s+", " ", "".join(builder.title)).strip()
+    return ExtractedPage(title, _MarkdownRenderer(base_url).render(content))
+
+def truncate_to_tokens(text: str, max_tokens: int) -> tuple[str, int]:
+    """
+    text を概算で max_tokens トークン以内に収まるよう、段落の区切りで打ち切ります。(打ち切った text, 全体のトークン数) を返します。
+    max_tokens が0以下の場合は打ち切りません。
+    """
+    total = estimate_text_tokens(text)
+    if max_tokens <= 0 or total <= max_tokens:
+        return text, total
+    kept, used = [], 0
+    for block in text.split("\n\n"):
+        tokens = estimate_text_tokens(block) + 1
+        if used + tokens > max_tokens:
+            if not kept:
+                # 最初の段落だけで上限を超える場合は、文字数の比率で切り詰める
+                kept.append(block[:max(1, len(block) * (max_tokens - used) // tokens)])
+            break
+        kept.append(block)
+        used += tokens
+    return "\n\n".join(kept), total
@@ -0,0 +1,249 @@
+import asyncio
+import atexit
+import os
+import re
+import sqlite3
+import threading
+import time
+import weakref
+from dataclasses import dataclass
+from typing import Optional
+
+import httpx
+
+from src.config import Config
+from src.logging_config import logger
+
+USER_AGENT = "Mozilla/5.0 (compatible; LangChainAgent web_fetch)"
+
+@dataclass
+class FetchResult:
+    """
+    fetch() の結果。body は展開（gzip など）後の本文で、truncated は max_bytes で打ち切ったことを表します。
+    cached はキャッシュから返した場合に "fresh"（有効期間内のため再取得しなかった）または "revalidated"（304 Not Modified）になります。
+    """
+    url: str
+    status: int
+    content_type: Optional[str]
+    body: bytes
+    truncated: bool = False
+    cached: Optional[str] = None
+
+@dataclass
+class _CacheEntry:
+    url: str
+    status: int
+    content_type: Optional[str]
+    body: bytes
+    truncated: bool
+    etag: Optional[str]
+    last_modified: Optional[str]
+    fresh_until: float
+
+def _cache_policy(headers: httpx.Headers) -> Optional[float]:
+    """
+    Cache-Control から、再検証せずに使用できる秒数を返します。保存してはいけない場合は None を返します。
+    max-age がない場合は 0（次回は必ず条件付きリクエストで再検証する）です。
+    """
+    cache_control = headers.get("Cache-Control", "").lower()
+    if "no-store" in cache_control or "private" in cache_control:
+        return None
+    if "no-cache" in cache_control:
+        return 0.0
+    match = re.search(r"max-age\s*=\s*(\d+)", cache_control)
+    return float(match.group(1)) if match else 0.0
+
+class HttpCache:
+    """
+    web_fetch の応答を SQLite に保存し、ETag / Last-Modified による条件付きリクエストで再利用します。
+
+    Cache-Control の max-age の期間内はサーバーに問い合わせずに保存した本文を返し、期間を過ぎた場合（max-age がない場合を含む）は
+    If-None-Match / If-Modified-Since を付けて取得し、304 Not Modified なら保存した本文を返します。
+    no-store の応答と、ETag・Last-Modified・max-age のいずれもない（再利用できない）応答は保存しません。max_entries を超えた場合は最後に使用された時刻が古いものから削除します。
+    """
+
+    def __init__(self, conn: sqlite3.Connection, max_entries: int = 500):
+        self.conn = conn
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        with self._lock:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS http_cache ("
+                "url TEXT PRIMARY KEY, final_url TEXT NOT NULL, status INTEGER NOT NULL, content_type TEXT, body BLOB NOT NULL, "
+                "truncated INTEGER NOT NULL, etag TEXT, last_modified TEXT, fresh_until REAL NOT NULL, last_used_at REAL NOT NULL)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS http_cache_last_used ON http_cache (last_used_at)")
+            self.conn.commit()
+
+    @classmethod
+    def from_path(cls, path: str, **kwargs) -> "HttpCache":
+        """path のデータベースファイルを開きます（親ディレクトリが存在しない場合は作成します）。"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        return cls(sqlite3.connect(path, check_same_thread=False), **kwargs)
+
+    def get(self, url: str) -> Optional[_CacheEntry]:
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT final_url, status, content_type, body, truncated, etag, last_modified, fresh_until FROM http_cache WHERE url = ?", (url,)
+            ).fetchone()
+            if row is None:
+                return None
+            self.conn.execute("UPDATE http_cache SET last_used_at = ? WHERE url = ?", (time.time(), url))
+            self.conn.commit()
+        return _CacheEntry(row[0], row[1], row[2], bytes(row[3]), bool(row[4]), row[5], row[6], row[7])
+
+    def put(self, url: str, result: FetchResult, headers: httpx.Headers):
+        etag, last_modified = headers.get("ETag"), headers.get("Last-Modified")
+        max_age = _cache_policy(headers)
+        if max_age is None or (etag is None and last_modified is None and max_age <= 0):
+            return
+        now = time.time()
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO http_cache VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, result.url, result.status, result.content_type, result.body, int(result.truncated), etag, last_modified, now + max_age, now),
+            )
+            if self.max_entries > 0:
+                self.conn.execute(
+                    "DELETE FROM http_cache WHERE url IN (SELECT url FROM http_cache ORDER BY last_used_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                )
+            self.conn.commit()
+
+    def refresh(self, url: str, headers: httpx.Headers):
+        """304 Not Modified の応答の Cache-Control で、保存した応答の有効期間を更新します。"""
+        max_age = _cache_policy(headers)
+        with self._lock:
+            self.conn.execute("UPDATE http_cache SET fresh_until = ? WHERE url = ?", (time.time() + (max_age or 0.0), url))
+            self.conn.commit()
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+_client: Optional[httpx.Client] = None
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+_cache: Optional[HttpCache] = None
+_lock = threading.Lock()
+
+def _client_options() -> dict:
+    # httpx は Accept-Encoding: gzip, deflate を付けて送信し、応答を自動的に展開する
+    return {
+        "timeout": httpx.Timeout(Config.WEB_FETCH_TIMEOUT),
+        "follow_redirects": True,
+        "limits": httpx.Limits(max_connections=20, max_keepalive_connections=10),
+        "headers": {"User-Agent": USER_AGENT},
+    }
+
+def get_client() -> httpx.Client:
+    """接続を再利用する共有の httpx.Client を返します。"""
+    global _client
+    with _lock:
+        if _client is None:
+            _client = httpx.Client(**_client_options())
+        return _client
+
+def get_async_client() -> httpx.AsyncClient:
+    """実行中のイベントループごとに共有する httpx.AsyncClient を返します。"""
+    loop = asyncio.get_running_loop()
+    with _lock:
+        client = _async_clients.get(loop)
+        if client is None:
+            client = _async_clients[loop] = httpx.AsyncClient(**_client_options())
+        return client
+
+async def aclose():
+    """実行中のイベントループの httpx.AsyncClient を閉じます。イベントループを終了する前に呼び出してください。"""
+    with _lock:
+        client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+def get_http_cache() -> Optional[HttpCache]:
+    """WEB_FETCH_CACHE が有効な場合、共有の HttpCache を返します。"""
+    global _cache
+    if not Config.WEB_FETCH_CACHE:
+        return None
+    with _lock:
+        if _cache is None:
+            _cache = HttpCache.from_path(Config.WEB_FETCH_CACHE_PATH, max_entries=Config.WEB_FETCH_CACHE_MAX_ENTRIES)
+        return _cache
+
+def _close():
+    global _client, _cache
+    if _client is not None:
+        _client.close()
+        _client = None
+    if _cache is not None:
+        _cache.close()
+        _cache = None
+
+atexit.register(_close)
+
+def _prepare(url: str, cache: Optional[HttpCache]) -> tuple[Optional[_CacheEntry], dict]:
+    """保存した応答と、条件付きリクエストのヘッダーを返します。"""
+    entry = cache.get(url) if cache is not None else None
+    headers = {}
+    if entry is not None:
+        if entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+    return entry, headers
+
+def _from_entry(entry: _CacheEntry, cached: str) -> FetchResult:
+    return FetchResult(entry.url, entry.status, entry.content_type, entry.body, entry.truncated, cached)
+
+def _finish(url: str, response: httpx.Response, body: bytearray, truncated: bool, cache: Optional[HttpCache]) -> FetchResult:
+    result = FetchResult(str(response.url), response.status_code, response.headers.get("Content-Type"), bytes(body), truncated)
+    if cache is not None:
+        cache.put(url, result, response.headers)
+    return result
+
+def fetch(url: str, max_bytes: int, cache: Optional[HttpCache] = None) -> FetchResult:
+    """
+    url を共有のクライアントで取得します。本文は max_bytes バイトまで読み込んだ時点で打ち切ります。
+    cache を指定した場合は、有効期間内の保存した応答を返すか、条件付きリクエストで再検証します。
+    """
+    entry, headers = _prepare(url, cache)
+    if entry is not None and entry.fresh_until > time.time():
+        return _from_entry(entry, "fresh")
+    with get_client().stream("GET", url, headers=headers) as response:
+        if response.status_code == 304 and entry is not None:
+            cache.refresh(url, response.headers)
+            return _from_entry(entry, "revalidated")
+        response.raise_for_status()
+        body, truncated = bytearray(), False
+        for chunk in response.iter_bytes():
+            body += chunk
+            if len(body) > max_bytes:
+                del body[max_bytes:]
+                truncated = True
+                break
+    if Config.DEBUG_MODE:
+        logger.debug("web_fetch: %s %d (%d bytes%s)", url, response.status_code, len(body), ", truncated" if truncated else "")
+    return _finish(url, response, body, truncated, cache)
+
+async def afetch(url: str, max_bytes: int, cache: Optional[HttpCache] = None) -> FetchResult:
+    """
+    fetch() の非同期版。イベントループごとに共有する httpx.AsyncClient を使用します。
+    キャッシュの読み書き（SQLite）はイベントループを止めないよう別スレッドで実行します。
+    """
+    entry, headers = await asyncio.to_thread(_prepare, url, cache)
+    if entry is not None and entry.fresh_until > time.time():
+        return _from_entry(entry, "fresh")
+    async with get_async_client().stream("GET", url, headers=headers) as response:
+        if response.status_code == 304 and entry is not None:
+            await asyncio.to_thread(cache.refresh, url, response.headers)
+            return _from_entry(entry, "revalidated")
+        response.raise_for_status()
+        body, truncated = bytearray(), False
+        async for chunk in response.aiter_bytes():
+            body += chunk
+            if len(body) > max_bytes:
+                del body[max_bytes:]
+                truncated = True
+                break
+    return await asyncio.to_thread(_finish, url, response, body, truncated, cache)
@@ -1,6 +1,6 @@
 import os
 from langchain_core.tools import tool
-from tavily import TavilyClient
+from tavily import TavilyClient, AsyncTavilyClient
 
 # Tavily APIキーは環境変数から読み込まれることを想定
 # .env ファイルに TAVILY_API_KEY=YOUR_API_KEY を設定してください
@@ -10,6 +10,22 @@ if not TAVILY_API_KEY:
     raise ValueError("TAVILY_API_KEY is not set in environment variables.")
 
 tavily_client = TavilyClient(api_key=TAVILY_API_KEY)
+async_tavily_client = AsyncTavilyClient(api_key=TAVILY_API_KEY)
+
+def _format_search_results(response: dict) -> str:
+    if not response['results']:
+        return "指定されたクエリに対する検索結果は見つかりませんでした。"
+
+    # 検索結果を整形して返す
+    formatted_results = []
+    for i, result in enumerate(response['results']):
+        formatted_results.append(f"Result {i+1}:")
+        formatted_results.append(f"  Title: {result['title']}")
+        formatted_results.append(f"  URL: {result['url']}")
+        formatted_results.append(f"  Snippet: {result['content']}")
+        formatted_results.append("") # 空行で区切り
+
+    return "\n".join(formatted_results)
 
 @tool
 def internet_search(query: str) -> str:
@@ -29,24 +45,23 @@ def internet_search(query: str) -> str:
         # max_results は取得する検索結果の数を指定します。
         # include_raw_content=False で、コンテンツ全体ではなくスニペットのみを取得します。
         response = tavily_client.search(query=query, max_results=5, include_raw_content=False)
+        return _format_search_results(response)
 
-        if not response['results']:
-            return "指定されたクエリに対する検索結果は見つかりませんでした。"
-
-        # 検索結果を整形して返す
-        formatted_results = []
-        for i, result in enumerate(response['results']):
-            formatted_results.append(f"Result {i+1}:")
-            formatted_results.append(f"  Title: {result['title']}")
-            formatted_results.append(f"  URL: {result['url']}")
-            formatted_results.append(f"  Snippet: {result['content']}")
-            formatted_results.append("") # 空行で区切り
+    except Exception as e:
+        return f"インターネット検索中にエラーが発生しました: {e}"
 
-        return "\n".join(formatted_results)
+async def _ainternet_search(query: str) -> str:
+    """internet_search の非同期版。Tavily の非同期クライアントを使用します。"""
+    try:
+        response = await async_tavily_client.search(query=query, max_results=5, include_raw_content=False)
+        return _format_search_results(response)
 
     except Exception as e:
         return f"インターネット検索中にエラーが発生しました: {e}"
 
+# ainvoke 時にはネイティブな非同期実装を使用する
+internet_search.coroutine = _ainternet_search
+
 # ツールリストに含める場合は、以下のようにリストに追加します。
 # internet_search_tools = [internet_search]
 
@@ -0,0 +1,252 @@
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Iterator, Optional
+
+# .gitignore の有無にかかわらず、走査時に中に入らないディレクトリ
+DEFAULT_PRUNED_DIRS = frozenset([
+    ".git", ".hg", ".svn", "node_modules", ".venv", "venv", "__pycache__",
+    ".pytest_cache", ".mypy_cache", ".ruff_cache", ".tox",
+])
+
+def _translate_glob(pattern: str) -> str:
+    """gitignore 形式のパターン（区切り文字は '/'）を正規表現の本体に変換します。"""
+    parts = []
+    i = 0
+    n = len(pattern)
+    while i < n:
+        c = pattern[i]
+        if pattern.startswith("**/", i):
+            parts.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("**", i):
+            parts.append(".*")
+            i += 2
+        elif c == "*":
+            parts.append("[^/]*")
+            i += 1
+        elif c == "?":
+            parts.append("[^/]")
+            i += 1
+        elif c == "[":
+            end = pattern.find("]", i + 2 if pattern[i + 1:i + 2] in ("!", "^") else i + 1)
+            if end == -1:
+                parts.append(re.escape(c))
+                i += 1
+                continue
+            body = pattern[i + 1:end]
+            if body[:1] in ("!", "^"):
+                body = "^" + body[1:]
+            parts.append("[" + body.replace("\\", "\\\\") + "]")
+            i = end + 1
+        elif c == "\\" and i + 1 < n:
+            parts.append(re.escape(pattern[i + 1]))
+            i += 2
+        else:
+            parts.append(re.escape(c))
+            i += 1
+    return "".join(parts)
+
+@dataclass
+class _Rule:
+    regex: re.Pattern
+    negated: bool
+    dir_only: bool
+
+def _parse_rule(line: str) -> Optional[_Rule]:
+    """.gitignore の1行を規則に変換します。空行とコメントは None を返します。"""
+    line = line.rstrip("\n").rstrip("\r")
+    # エスケープされていない末尾の空白は無視される
+    stripped = line.rstrip(" ")
+    if stripped.endswith("\\") and len(stripped) < len(line):
+        stripped += " "
+    line = stripped
+    if not line or line.startswith("#"):
+        return None
+    negated = line.startswith("!")
+    if negated:
+        line = line[1:]
+    elif line.startswith("\\!") or line.startswith("\\#"):
+        line = line[1:]
+    dir_only = line.endswith("/")
+    line = line.rstrip("/")
+    if not line:
+        return None
+    # 先頭または途中に '/' を含むパターンは .gitignore のあるディレクトリからの相対パス、それ以外は任意の階層の名前に一致する
+    anchored = "/" in line
+    body = _translate_glob(line.lstrip("/"))
+    prefix = "^" if anchored else "^(?:.*/)?"
+    return _Rule(re.compile(prefix + body + "$", re.DOTALL), negated, dir_only)
+
+def compile_glob(pattern: str) -> re.Pattern:
+    """
+    パスの glob パターン（'*' と '?' は '/' に一致せず、'**/' は0個以上のディレクトリに一致）を、
+    '/' 区切りの相対パス全体と照合する正規表現にコンパイルします。
+    """
+    return re.compile("^" + _translate_glob(pattern) + "$", re.DOTALL)
+
+@dataclass
+class PatternSet:
+    """
+    1つの .gitignore（または gitignore 形式のパターンのリスト）の規則。base は規則の基準となるディレクトリの絶対パス。
+    """
+    base: str
+    rules: list[_Rule]
+    # 否定の規則がない場合は、全ての規則を1つの正規表現にまとめて一度の照合で判定する
+    combined_files: Optional[re.Pattern] = field(default=None)
+    combined_dirs: Optional[re.Pattern] = field(default=None)
+
+    def __post_init__(self):
+        if self.rules and not any(rule.negated for rule in self.rules):
+            file_rules = [rule.regex.pattern for rule in self.rules if not rule.dir_only]
+            all_rules = [rule.regex.pattern for rule in self.rules]
+            self.combined_files = re.compile("|".join(f"(?:{p})" for p in file_rules), re.DOTALL) if file_rules else None
+            self.combined_dirs = re.compile("|".join(f"(?:{p})" for p in all_rules), re.DOTALL)
+
+    @classmethod
+    def from_patterns(cls, base: str, patterns: list[str]) -> "PatternSet":
+        return cls(os.path.abspath(base), [rule for rule in (_parse_rule(pattern) for pattern in patterns) if rule is not None])
+
+    def matches(self, path: str, is_dir: bool = False) -> bool:
+        """
+        path、または path を含むディレクトリ（base より下）が、否定されずにいずれかの規則に一致するかどうか。
+        base の外のパスは一致しません。
+        """
+        path = os.path.abspath(path)
+        if not path.startswith(self.base.rstrip(os.sep) + os.sep):
+            return False
+        parts = os.path.relpath(path, self.base).split(os.sep)
+        for depth in range(1, len(parts)):
+            if self.match("/".join(parts[:depth]), True):
+                return True
+        return bool(self.match("/".join(parts), is_dir))
+
+    def match(self, relative: str, is_dir: bool) -> Optional[bool]:
+        """一致した最後の規則に従って、無視する場合は True、否定の規則に一致した場合は False、一致しない場合は None を返します。"""
+        if self.combined_dirs is not None:
+            combined = self.combined_dirs if is_dir else self.combined_files
+            return True if combined is not None and combined.match(relative) else None
+        result = None
+        for rule in self.rules:
+            if rule.dir_only and not is_dir:
+                continue
+            if rule.regex.match(relative):
+                result = not rule.negated
+        return result
+
+def _read_rules(path: str) -> list[_Rule]:
+    try:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            return [rule for rule in (_parse_rule(line) for line in f) if rule is not None]
+    except OSError:
+        return []
+
+def _find_repository_root(directory: str) -> Optional[str]:
+    current = directory
+    while True:
+        if os.path.exists(os.path.join(current, ".git")):
+            return current
+        parent = os.path.dirname(current)
+        if parent == current:
+            return None
+        current = parent
+
+class PathMatcher:
+    """
+    .gitignore の規則と、常に除外するディレクトリ名（DEFAULT_PRUNED_DIRS）から、パスを除外するかどうかを判定します。
+
+    規則は読み込み時に正規表現へコンパイルされ、パスごとにパターンを fnmatch し直すことはありません。
+    walk() はディレクトリを走査しながら、除外されたディレクトリの中には入らずに（枝刈りして）ファイルを列挙します。
+    """
+
+    def __init__(self, rule_sets: Optional[list[PatternSet]] = None, pruned_dirs: frozenset = DEFAULT_PRUNED_DIRS, use_gitignore: bool = True):
+        self.rule_sets = rule_sets or []
+        self.pruned_dirs = pruned_dirs
+        self.use_gitignore = use_gitignore
+
+    @classmethod
+    def for_directory(cls, directory: str, extra_patterns: Optional[list[str]] = None, use_gitignore: bool = True, pruned_dirs: frozenset = DEFAULT_PRUNED_DIRS) -> "PathMatcher":
+        """
+        directory を走査するための PathMatcher を作成します。
+
+        use_gitignore が True の場合、directory を含むリポジトリのルートから directory までの各階層の .gitignore を読み込みます
+        （directory より下の階層の .gitignore は walk() の途中で読み込みます）。
+        extra_patterns は directory を基準とする gitignore 形式のパターンとして追加されます。
+        """
+        directory = os.path.abspath(directory)
+        rule_sets = []
+        if use_gitignore:
+            root = _find_repository_root(directory) or directory
+            ancestors = []
+            current = directory
+            while True:
+                ancestors.append(current)
+                if current == root:
+                    break
+                parent = os.path.dirname(current)
+                if parent == current:
+                    break
+                current = parent
+            for ancestor in reversed(ancestors):
+                rules = _read_rules(os.path.join(ancestor, ".gitignore"))
+                if rules:
+                    rule_sets.append(PatternSet(ancestor, rules))
+        if extra_patterns:
+            extra = PatternSet.from_patterns(directory, extra_patterns)
+            if extra.rules:
+                rule_sets.append(extra)
+        return cls(rule_sets, pruned_dirs, use_gitignore)
+
+    def _with_gitignore_of(self, directory: str) -> "PathMatcher":
+        if not self.use_gitignore or any(rule_set.base == directory for rule_set in self.rule_sets):
+            return self
+        rules = _read_rules(os.path.join(directory, ".gitignore"))
+        if not rules:
+            return self
+        return PathMatcher([*self.rule_sets, PatternSet(directory, rules)], self.pruned_dirs, self.use_gitignore)
+
+    def is_ignored(self, path: str, is_dir: bool) -> bool:
+        """path（絶対パスまたはカレントディレクトリからの相対パス）自体が除外されるかどうかを判定します。"""
+        path = os.path.abspath(path)
+        if is_dir and os.path.basename(path) in self.pruned_dirs:
+            return True
+        ignored = False
+        for rule_set in self.rule_sets:
+            if path != rule_set.base and not path.startswith(rule_set.base.rstrip(os.sep) + os.sep):
+                continue
+            relative = os.path.relpath(path, rule_set.base).replace(os.sep, "/")
+            result = rule_set.match(relative, is_dir)
+            if result is not None:
+                ignored = result
+        return ignored
+
+    def walk(self, root: str, recursive: bool = True) -> Iterator[str]:
+        """
+        root 以下のファイルのパスを、各ディレクトリ内では名前順に列挙します（recursive が False の場合は root 直下のファイルのみ）。
+        除外されたディレクトリの中には入りません。root に相対パスを指定した場合は相対パスを返します。
+        """
+        stack = [(root, self._with_gitignore_of(os.path.abspath(root)))]
+        while stack:
+            directory, matcher = stack.pop()
+            try:
+                with os.scandir(directory) as it:
+                    entries = sorted(it, key=lambda entry: entry.name)
+            except OSError:
+                continue
+            subdirectories = []
+            for entry in entries:
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                    is_file = not is_dir and entry.is_file()
+                except OSError:
+                    continue
+                if not (is_dir or is_file) or matcher.is_ignored(entry.path, is_dir):
+                    continue
+                if is_dir:
+                    if recursive:
+                        subdirectories.append(entry.path)
+                else:
+                    yield entry.path
+            # スタックから名前順に取り出されるよう、逆順に積む
+            for subdirectory in reversed(subdirectories):
+                stack.append((subdirectory, matcher._with_gitignore_of(os.path.abspath(subdirectory))))
@@ -0,0 +1,382 @@
+import atexit
+import fnmatch
+import itertools
+import multiprocessing
+import os
+import re
+import signal
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Iterable, Iterator, Optional
+
+from src.logging_config import logger
+from src.tools.path_matcher import PathMatcher
+
+# ファイルの先頭からこのバイト数を読み、NUL バイトを含む場合はバイナリファイルとして検索しない
+SNIFF_BYTES = 8192
+# ワーカープロセスに1回で渡すファイル数
+FILES_PER_TASK = 16
+# 時間の上限を過ぎてもワーカーから応答がない場合（1行に対する正規表現の照合が終わらない場合）、ワーカーを強制終了するまでの猶予（秒）
+TIMEOUT_GRACE_SECONDS = 1.0
+# 同時に実行される検索を区別するための打ち切りフラグの数
+_CANCEL_SLOTS = 64
+# これ以下のサイズのファイルは全体をデコードして検索し、より大きなファイルは1行ずつ読みながら検索する
+WHOLE_FILE_MAX_BYTES = 16 * 1024 * 1024
+
+@dataclass
+class FileMatches:
+    """1つのファイルの検索結果。lines は (1始まりの行番号, 一致した行かどうか, 行の内容) のリストで、前後の行を含みます。"""
+    path: str
+    lines: list[tuple[int, bool, str]] = field(default_factory=list)
+    match_count: int = 0
+    error: Optional[str] = None
+
+@dataclass
+class SearchResult:
+    files: list[FileMatches]
+    match_count: int
+    files_scanned: int
+    truncated: bool
+    timed_out: bool
+
+# --- ワーカープロセスで実行される処理 ---
+
+# ワーカープロセス内の打ち切りフラグ（親プロセスでは None）
+_cancelled = None
+
+def _init_worker(cancelled):
+    global _cancelled
+    _cancelled = cancelled
+    # Ctrl+C は親プロセスが処理する
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+@lru_cache(maxsize=32)
+def _compile(pattern: str, flags: int) -> tuple[re.Pattern, Optional[re.Pattern]]:
+    """
+    (1行ずつ照合する正規表現, ファイル全体から候補の行を探す正規表現) を返します。
+
+    行ごとの照合で一致する行は、MULTILINE を付けてファイル全体を検索した場合にも必ず一致の開始位置を含むため、
+    ファイル全体を検索して見つかった行のみを元の正規表現で確認すれば、1行ずつ照合した場合と同じ結果になります。
+    行の外を参照する先読み・後読みや \\A・\\Z を含むパターンではこれが成り立たないため、候補の検索は行わず None を返します。
+    """
+    regex = re.compile(pattern, flags)
+    if re.search(r"\(\?<?[=!]|\\[AZ]", pattern):
+        return regex, None
+    return regex, re.compile(pattern, flags | re.MULTILINE)
+
+def _scan_lines(result: FileMatches, regex: re.Pattern, f, context: int, limit: int, deadline: float) -> bool:
+    """ファイルを1行ずつ読みながら検索します。時間の上限に達した場合は True を返します。"""
+    before: deque = deque(maxlen=context)
+    after = 0
+    for line_no, raw in enumerate(f, 1):
+        if line_no % 256 == 0 and time.time() > deadline:
+            return True
+        text = raw.decode("utf-8", errors="replace").rstrip("\r\n")
+        if result.match_count < limit and regex.search(text):
+            first = line_no - len(before)
+            result.lines.extend((first + i, False, previous) for i, previous in enumerate(before))
+            before.clear()
+            result.lines.append((line_no, True, text))
+            result.match_count += 1
+            after = context
+            if result.match_count >= limit and not context:
+                break
+        elif after:
+            result.lines.append((line_no, False, text))
+            after -= 1
+            if not after and result.match_count >= limit:
+                break
+        elif context:
+            before.append(text)
+    return False
+
+def _scan_text(result: FileMatches, regex: re.Pattern, candidates: re.Pattern, text: str, context: int, limit: int, deadline: float) -> bool:
+    """デコード済みのファイル全体から候補の行を探して検索します。時間の上限に達した場合は True を返します。"""
+    if "\r" in text:
+        text = text.replace("\r\n", "\n")
+    matched: list[tuple[int, str]] = []
+    pos = 0
+    line_no = 1
+    timed_out = False
+    while pos < len(text) and len(matched) < limit:
+        if time.time() > deadline:
+            timed_out = True
+            break
+        found = candidates.search(text, pos)
+        # 末尾の改行の後の空文字列は行として数えない
+        if found is None or (found.start() == len(text) and text.endswith("\n")):
+            break
+        start = text.rfind("\n", pos, found.start()) + 1 or pos
+        line_no += text.count("\n", pos, start)
+        end = text.find("\n", start)
+        if end == -1:
+            end = len(text)
+        line = text[start:end]
+        if regex.search(line):
+            matched.append((line_no, line))
+        pos = end + 1
+        line_no += 1
+
+    result.match_count = len(matched)
+    if not context:
+        result.lines = [(number, True, line) for number, line in matched]
+        return timed_out
+    lines = text.split("\n")
+    if text.endswith("\n"):
+        lines.pop()
+    emitted = 0
+    for i, (number, line) in enumerate(matched):
+        for context_no in range(max(number - context, emitted + 1), number):
+            result.lines.append((context_no, False, lines[context_no - 1]))
+        result.lines.append((number, True, line))
+        # 後ろの行は次に一致した行の直前まで
+        last = min(number + context, len(lines), matched[i + 1][0] - 1 if i + 1 < len(matched) else len(lines))
+        result.lines.extend((context_no, False, lines[context_no - 1]) for context_no in range(number + 1, last + 1))
+        emitted = max(number, last)
+    return timed_out
+
+def _scan_file(path: str, pattern: str, flags: int, context: int, limit: int, deadline: float) -> tuple[FileMatches, bool]:
+    """
+    ファイルを検索し、(結果, 時間の上限に達したかどうか) を返します。一致した行が limit 件に達した場合は、その後の context 行までで打ち切ります。
+    WHOLE_FILE_MAX_BYTES 以下のファイルは全体をデコードして候補の行のみを照合し、それより大きなファイルは1行ずつ読みながら照合します。
+    """
+    regex, candidates = _compile(pattern, flags)
+    result = FileMatches(path)
+    with open(path, "rb") as f:
+        head = f.read(SNIFF_BYTES)
+        if b"\0" in head:
+            return result, False
+        if candidates is not None and os.fstat(f.fileno()).st_size <= WHOLE_FILE_MAX_BYTES:
+            text = (head + f.read()).decode("utf-8", errors="replace")
+            return result, _scan_text(result, regex, candidates, text, context, limit, deadline)
+        f.seek(0)
+        return result, _scan_lines(result, regex, f, context, limit, deadline)
+
+def _scan_batch(task: tuple) -> tuple[list[FileMatches], int, bool]:
+    """
+    paths を順に検索し、(一致した行のあるファイルとエラーの結果, 検索したファイル数, 時間の上限に達したかどうか) を返します。
+    """
+    slot, pattern, flags, paths, context, limit, deadline = task
+    if _cancelled is not None and _cancelled[slot]:
+        return [], 0, False
+    results = []
+    scanned = 0
+    for path in paths:
+        if time.time() > deadline:
+            return results, scanned, True
+        scanned += 1
+        try:
+            matches, timed_out = _scan_file(path, pattern, flags, context, limit, deadline)
+        except Exception as e:
+            results.append(FileMatches(path, error=str(e)))
+            continue
+        if matches.lines:
+            results.append(matches)
+            limit -= matches.match_count
+        if timed_out:
+            return results, scanned, True
+        if limit <= 0:
+            break
+    return results, scanned, False
+
+# --- 親プロセス側の処理 ---
+
+class _WorkerPool:
+    """
+    検索に使用するワーカープロセスのプール。最初の検索で作成され、以降の検索で再利用されます。
+    同時に実行される検索が同じプールを使用するため、プールごとに使用中の検索の数を数えます。
+    正規表現の照合が時間の上限を過ぎても終わらない場合は、そのプールを以降の検索に渡さず、使用中の検索がなくなった時点で強制終了します。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pool = None
+        self._workers = 0
+        self._cancelled = None
+        self._slots = itertools.count()
+        # プールごとの使用中の検索の数（作り直しのために切り離されたプールを含む）
+        self._holders: dict = {}
+
+    def acquire(self, workers: int):
+        """
+        (プール, 打ち切りフラグの配列, この検索の打ち切りフラグの位置) を返します。使い終わったら release() を呼び出してください。
+        プロセスを作成できない環境では (None, None, 0) を返します。
+        """
+        with self._lock:
+            # 使用中のプールはワーカー数が異なっていてもそのまま使用する
+            if self._pool is None or (self._workers != workers and not self._holders.get(self._pool)):
+                self._shutdown_locked()
+                # スレッドのある親プロセスからの fork は安全でないため、forkserver（使用できない環境では spawn）でワーカーを起動する
+                method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+                context = multiprocessing.get_context(method)
+                try:
+                    cancelled = context.Array("b", _CANCEL_SLOTS, lock=False)
+                    self._pool = context.Pool(workers, initializer=_init_worker, initargs=(cancelled,))
+                except (OSError, ImportError) as e:
+                    logger.warning("検索用のワーカープロセスを作成できないため、逐次実行します: %s", e)
+                    return None, None, 0
+                self._workers = workers
+                self._cancelled = cancelled
+            self._holders[self._pool] = self._holders.get(self._pool, 0) + 1
+            slot = next(self._slots) % _CANCEL_SLOTS
+            self._cancelled[slot] = 0
+            return self._pool, self._cancelled, slot
+
+    def release(self, pool, stuck: bool = False):
+        """
+        acquire() で得たプールを返却します。stuck が True の場合（応答しないワーカーがある場合）はプールを以降の検索に渡さず、
+        他の検索が使い終わった時点で強制終了します。
+        """
+        with self._lock:
+            if stuck and pool is self._pool:
+                self._pool = None
+                self._cancelled = None
+            self._holders[pool] -= 1
+            if not self._holders[pool] and pool is not self._pool:
+                del self._holders[pool]
+                pool.terminate()
+
+    def shutdown(self):
+        with self._lock:
+            self._shutdown_locked()
+            for pool in self._holders:
+                pool.terminate()
+            self._holders.clear()
+
+    def _shutdown_locked(self):
+        """使用中の検索がない現在のプールを終了します。"""
+        if self._pool is not None:
+            self._holders.pop(self._pool, None)
+            self._pool.terminate()
+            self._pool = None
+            self._cancelled = None
+
+_worker_pool = _WorkerPool()
+atexit.register(_worker_pool.shutdown)
+
+def _batched(paths: Iterable[str], size: int) -> Iterator[list[str]]:
+    batch = []
+    for path in paths:
+        batch.append(path)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def _trim(matches: FileMatches, limit: int, context: int):
+    """結果を limit 件目の一致した行と、その後の context 行までに切り詰めます。"""
+    seen = 0
+    for i, (line_no, is_match, _) in enumerate(matches.lines):
+        if is_match:
+            seen += 1
+            if seen == limit:
+                end = i + 1
+                while end < len(matches.lines) and not matches.lines[end][1] and matches.lines[end][0] <= line_no + context:
+                    end += 1
+                del matches.lines[end:]
+                matches.match_count = limit
+                return
+
+def search(
+    pattern: str,
+    root: str,
+    include: Optional[str] = None,
+    max_results: int = 200,
+    context_lines: int = 0,
+    timeout: float = 30.0,
+    workers: int = 1,
+    flags: int = 0,
+    paths: Optional[Iterable[str]] = None,
+) -> SearchResult:
+    """
+    root 以下のファイルから正規表現 pattern に一致する行を検索します。
+
+    .gitignore と DEFAULT_PRUNED_DIRS で除外されたディレクトリには入らず、先頭に NUL バイトを含むファイルはバイナリとして検索しません。
+    include は fnmatch 形式のパターンで、root からのパスを含むファイルのパス全体と照合されます。
+    ファイルは名前順に列挙しながら workers 個のワーカープロセスに分配され、結果は列挙した順に返されます。
+    paths を指定した場合は、走査する代わりにそのファイルのみを（include で絞り込んだうえで）検索します（検索索引で絞り込んだ候補など）。
+    一致した行が max_results 件に達するか、timeout 秒を過ぎた場合は、残りのファイルを検索せずに打ち切ります。
+    pattern が不正な場合は re.error を送出します。
+    """
+    _compile(pattern, flags)
+    include_regex = re.compile(fnmatch.translate(include)) if include else None
+    deadline = time.time() + timeout
+    stop = threading.Event()
+
+    def candidates() -> Iterator[str]:
+        for path in PathMatcher.for_directory(root).walk(root) if paths is None else paths:
+            if stop.is_set():
+                return
+            if include_regex is None or include_regex.match(path):
+                yield path
+
+    pool, cancelled, slot = _worker_pool.acquire(workers) if workers > 1 else (None, None, 0)
+    tasks = (
+        (slot, pattern, flags, batch, context_lines, max_results, deadline)
+        for batch in _batched(candidates(), FILES_PER_TASK)
+    )
+
+    files: list[FileMatches] = []
+    match_count = files_scanned = 0
+    truncated = timed_out = stuck = False
+    try:
+        if pool is None:
+            batches = map(_scan_batch, tasks)
+        else:
+            batches = pool.imap(_scan_batch, tasks)
+        while True:
+            try:
+                if pool is None:
+                    batch, scanned, batch_timed_out = next(batches)
+                else:
+                    batch, scanned, batch_timed_out = batches.next(timeout=max(deadline - time.time(), 0) + TIMEOUT_GRACE_SECONDS)
+            except StopIteration:
+                break
+            except multiprocessing.TimeoutError:
+                timed_out = stuck = True
+                break
+            files_scanned += scanned
+            for matches in batch:
+                if match_count >= max_results:
+                    break
+                if matches.match_count > max_results - match_count:
+                    _trim(matches, max_results - match_count, context_lines)
+                files.append(matches)
+                match_count += matches.match_count
+            if match_count >= max_results:
+                truncated = True
+                break
+            if batch_timed_out:
+                timed_out = True
+                break
+    finally:
+        stop.set()
+        if pool is not None:
+            # 既にワーカーに渡された残りのタスクを、ファイルを開かずに終了させる
+            cancelled[slot] = 1
+            # 応答しないワーカーがある場合は、他の検索が使い終わった時点でプールを強制終了する
+            _worker_pool.release(pool, stuck=stuck)
+    return SearchResult(files, match_count, files_scanned, truncated, timed_out)
+
+def format_lines(result: SearchResult, context_lines: int = 0) -> list[str]:
+    """
+    検索結果を grep と同様の形式の行に変換します。一致した行は 'パス:行番号: 内容'、前後の行は 'パス-行番号- 内容' で、
+    前後の行を表示する場合は連続しない範囲の間に '--' を挟みます。
+    """
+    lines = []
+    for matches in result.files:
+        if matches.error is not None:
+            lines.append(f"エラー: ファイル {matches.path} の読み込み中にエラーが発生しました: {matches.error}")
+            continue
+        previous = None
+        for line_no, is_match, text in matches.lines:
+            if context_lines and lines and (previous is None or line_no > previous + 1):
+                lines.append("--")
+            separator = ":" if is_match else "-"
+            lines.append(f"{matches.path}{separator}{line_no}{separator} {text.strip()}")
+            previous = line_no
+    return lines
@@ -0,0 +1,342 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from array import array
+from dataclasses import dataclass
+from functools import lru_cache
+from re import _parser as sre_parse
+from typing import Optional
+
+from src.config import Config
+from src.logging_config import logger
+from src.tools.path_matcher import PathMatcher
+from src.tools.search_engine import SNIFF_BYTES
+
+# 索引の形式を変更した場合は値を上げ、古い索引を作り直す
+INDEX_VERSION = "1"
+# 1つの候補の条件に使用するトライグラムの最大数
+MAX_QUERY_TRIGRAMS = 32
+# 正規表現の選択肢 (a|b) を展開した条件の最大数。超えた場合は絞り込まない
+MAX_QUERY_CLAUSES = 16
+
+# files.kind の値
+_TEXT, _BINARY, _LARGE = "text", "binary", "large"
+
+# 索引に含めるのは、英数字・アンダースコア・ASCII 以外の文字（UTF-8 のバイト）が連続する部分（単語）のトライグラムのみ。
+# 記号や空白を含むトライグラムを除くことで、索引の作成が速くなり、サイズも小さくなる
+_WORD = re.compile(rb"[0-9a-z_\x80-\xff]{3,}")
+
+@lru_cache(maxsize=65536)
+def _word_trigrams(word: bytes) -> frozenset[int]:
+    return frozenset(int.from_bytes(word[i:i + 3], "big") for i in range(len(word) - 2))
+
+def _trigrams(data: bytes) -> set[int]:
+    """data（小文字に変換済み）の単語に含まれる3バイトの並びを整数の集合で返します。"""
+    # 同じ単語は多くのファイルに現れるため、単語ごとのトライグラムをキャッシュする
+    return set().union(*map(_word_trigrams, set(_WORD.findall(data))))
+
+# --- 正規表現から、一致する行が必ず含むトライグラムを求める ---
+
+# 候補の条件は、トライグラムの集合（全てを含むファイルが候補）の選択肢のリスト。None は絞り込めないことを表す
+Query = Optional[list[frozenset[int]]]
+
+def _and(left: Query, right: Query) -> Query:
+    if left is None:
+        return right
+    if right is None:
+        return left
+    if len(left) * len(right) > MAX_QUERY_CLAUSES:
+        # 展開すると多すぎる場合は、条件の少ない方のみを使う
+        return left if len(left) <= len(right) else right
+    return [a | b for a in left for b in right]
+
+def _or(queries: list[Query]) -> Query:
+    if any(query is None for query in queries):
+        return None
+    clauses = [clause for query in queries for clause in query]
+    return clauses if len(clauses) <= MAX_QUERY_CLAUSES else None
+
+def _literal_query(literal: bytearray) -> Query:
+    # 文字列の中の単語は、それを含む行の単語の一部になるため、そのトライグラムは必ず索引に含まれる
+    trigrams = _trigrams(bytes(literal).lower())
+    return [frozenset(trigrams)] if trigrams else None
+
+def _analyze(items, ignore_case: bool) -> Query:
+    query: Query = None
+    literal = bytearray()
+
+    def flush():
+        nonlocal query
+        query = _and(query, _literal_query(literal))
+        literal.clear()
+
+    for op, value in items:
+        if op is sre_parse.LITERAL:
+            char = chr(value)
+            # 大文字と小文字を区別しない場合、ASCII 以外の文字は索引（ASCII のみ小文字に変換）と一致しないことがある
+            if ignore_case and not char.isascii():
+                flush()
+            else:
+                literal.extend(char.encode("utf-8"))
+            continue
+        flush()
+        if op is sre_parse.SUBPATTERN:
+            _, add_flags, del_flags, pattern = value
+            sub_ignore_case = (ignore_case or bool(add_flags & re.IGNORECASE)) and not del_flags & re.IGNORECASE
+            query = _and(query, _analyze(pattern, sub_ignore_case))
+        elif op is sre_parse.BRANCH:
+            query = _and(query, _or([_analyze(branch, ignore_case) for branch in value[1]]))
+        elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT, sre_parse.POSSESSIVE_REPEAT) and value[0] >= 1:
+            query = _and(query, _analyze(value[2], ignore_case))
+        elif op is sre_parse.ATOMIC_GROUP:
+            query = _and(query, _analyze(value, ignore_case))
+    flush()
+    return query
+
+def build_query(pattern: str, flags: int = 0) -> Query:
+    """
+    正規表現 pattern に一致する行を含むファイルが必ず含むトライグラムの条件を返します。
+    条件を求められない場合（3文字以上の単語を含む文字列がないパターンなど）は None を返します。
+    """
+    try:
+        parsed = sre_parse.parse(pattern, flags)
+    except re.error:
+        return None
+    query = _analyze(parsed, bool(parsed.state.flags & re.IGNORECASE))
+    if query is None or any(not clause for clause in query):
+        return None
+    return [frozenset(sorted(clause)[:MAX_QUERY_TRIGRAMS]) for clause in query]
+
+# --- 索引 ---
+
+@dataclass
+class RefreshStats:
+    """refresh() の結果。"""
+    files: int = 0
+    indexed: int = 0
+    removed: int = 0
+    seconds: float = 0.0
+
+class SearchIndex:
+    """
+    ワークスペースのファイル内容のトライグラム索引（SQLite）。
+
+    search_file_content は正規表現から求めたトライグラムを全て含むファイルのみを検索し、ファイルの読み込みを省きます。
+    索引は search_file_content の呼び出しごとに、検索するディレクトリのファイルの (更新時刻, サイズ) を確認して
+    変更・追加されたファイルのみを読み直し（削除されたファイルは取り除き）、ファイルを変更するツールは invalidate() で直ちに無効化します。
+    バイナリファイルは検索対象にせず、max_file_bytes を超えるファイルは索引に含めずに常に検索します。
+    """
+
+    def __init__(self, conn: sqlite3.Connection, *, max_file_bytes: int = 4 * 1024 * 1024):
+        self.conn = conn
+        self.max_file_bytes = max_file_bytes
+        self._lock = threading.RLock()
+        with self._lock:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            row = self.conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+            if row is not None and row[0] != INDEX_VERSION:
+                self.conn.execute("DROP TABLE IF EXISTS roots")
+                self.conn.execute("DROP TABLE IF EXISTS files")
+                self.conn.execute("DROP TABLE IF EXISTS postings")
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('version', ?)", (INDEX_VERSION,))
+            self.conn.execute("CREATE TABLE IF NOT EXISTS roots (path TEXT PRIMARY KEY)")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS files ("
+                "id INTEGER PRIMARY KEY, path TEXT UNIQUE NOT NULL, mtime_ns INTEGER NOT NULL, size INTEGER NOT NULL, "
+                "kind TEXT NOT NULL, trigrams BLOB)"
+            )
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS postings (trigram INTEGER NOT NULL, file_id INTEGER NOT NULL, "
+                "PRIMARY KEY (trigram, file_id)) WITHOUT ROWID"
+            )
+            self.conn.commit()
+
+    @classmethod
+    def from_path(cls, path: str, **kwargs) -> "SearchIndex":
+        """path のデータベースファイルを開きます（親ディレクトリが存在しない場合は作成します）。"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        # 索引の作成時は postings への挿入がランダムな位置になるため、ページキャッシュを大きくする（64MB）
+        conn.execute("PRAGMA cache_size=-65536")
+        return cls(conn, **kwargs)
+
+    def roots(self) -> list[str]:
+        with self._lock:
+            return [row[0] for row in self.conn.execute("SELECT path FROM roots ORDER BY path")]
+
+    def add_root(self, path: str):
+        with self._lock:
+            self.conn.execute("INSERT OR IGNORE INTO roots (path) VALUES (?)", (os.path.abspath(path),))
+            self.conn.commit()
+
+    def covers(self, path: str) -> bool:
+        """path が索引の対象のディレクトリ（add_root で追加したディレクトリ）の中にあるかどうか。"""
+        path = os.path.abspath(path)
+        return any(path == root or path.startswith(root.rstrip(os.sep) + os.sep) for root in self.roots())
+
+    def _known_files(self, root: str) -> dict[str, tuple[int, int, int, str]]:
+        """root 以下の索引済みのファイルの {絶対パス: (id, mtime_ns, size, kind)}。"""
+        prefix = os.path.abspath(root).rstrip(os.sep) + os.sep
+        rows = self.conn.execute(
+            "SELECT path, id, mtime_ns, size, kind FROM files WHERE path >= ? AND path < ?", (prefix, prefix + "\U0010ffff"),
+        )
+        return {row[0]: row[1:] for row in rows}
+
+    def _remove(self, file_id: int):
+        row = self.conn.execute("SELECT trigrams FROM files WHERE id = ?", (file_id,)).fetchone()
+        if row is not None and row[0]:
+            trigrams = array("I")
+            trigrams.frombytes(row[0])
+            self.conn.executemany("DELETE FROM postings WHERE trigram = ? AND file_id = ?", ((t, file_id) for t in trigrams))
+        self.conn.execute("DELETE FROM files WHERE id = ?", (file_id,))
+
+    def _index_file(self, path: str, st: os.stat_result, previous_id: Optional[int]):
+        if previous_id is not None:
+            self._remove(previous_id)
+        kind = _LARGE if st.st_size > self.max_file_bytes else _TEXT
+        trigrams: set[int] = set()
+        if kind == _TEXT:
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+            except OSError:
+                return
+            if b"\0" in data[:SNIFF_BYTES]:
+                kind = _BINARY
+            else:
+                trigrams = _trigrams(data.lower())
+        blob = array("I", sorted(trigrams)).tobytes() if trigrams else None
+        cur = self.conn.execute(
+            "INSERT INTO files (path, mtime_ns, size, kind, trigrams) VALUES (?, ?, ?, ?, ?)",
+            (path, st.st_mtime_ns, st.st_size, kind, blob),
+        )
+        if trigrams:
+            file_id = cur.lastrowid
+            self.conn.executemany("INSERT INTO postings (trigram, file_id) VALUES (?, ?)", ((t, file_id) for t in trigrams))
+
+    def refresh(self, root: str, walked: Optional[list[str]] = None) -> RefreshStats:
+        """
+        root 以下の索引を更新します。(更新時刻, サイズ) が変わったファイルと新しいファイルを読み直し、
+        存在しなくなったファイル（.gitignore で除外されたファイルを含む）を取り除きます。
+        walked には PathMatcher.walk(root) の結果を渡せます（省略した場合は走査します）。
+        """
+        started = time.perf_counter()
+        if walked is None:
+            walked = list(PathMatcher.for_directory(root).walk(root))
+        stats = RefreshStats(files=len(walked))
+        with self._lock:
+            known = self._known_files(root)
+            for path in walked:
+                absolute = os.path.abspath(path)
+                entry = known.pop(absolute, None)
+                try:
+                    st = os.stat(absolute)
+                except OSError:
+                    continue
+                if entry is not None and entry[1:3] == (st.st_mtime_ns, st.st_size):
+                    continue
+                self._index_file(absolute, st, entry[0] if entry is not None else None)
+                stats.indexed += 1
+            for entry in known.values():
+                self._remove(entry[0])
+            stats.removed = len(known)
+            self.conn.commit()
+        stats.seconds = time.perf_counter() - started
+        return stats
+
+    def candidate_paths(self, root: str, pattern: str, flags: int = 0) -> list[str]:
+        """
+        索引を更新したうえで、root 以下で pattern に一致する行を含む可能性があるファイルのパスを、walk() の順に返します。
+        パスは root を基準とした PathMatcher.walk(root) と同じ形式です。
+        """
+        walked = list(PathMatcher.for_directory(root).walk(root))
+        self.refresh(root, walked)
+        query = build_query(pattern, flags)
+        if query is None:
+            return walked
+        with self._lock:
+            allowed: set[int] = set()
+            for clause in query:
+                sql = " INTERSECT ".join(["SELECT file_id FROM postings WHERE trigram = ?"] * len(clause))
+                allowed.update(row[0] for row in self.conn.execute(sql, tuple(clause)))
+            known = self._known_files(root)
+        result = []
+        for path in walked:
+            entry = known.get(os.path.abspath(path))
+            # 索引にないファイル（読み込めなかったもの）と大きなファイルは常に検索する
+            if entry is None or entry[0] in allowed or entry[3] == _LARGE:
+                result.append(path)
+        return result
+
+    def invalidate(self, path: str):
+        """path とその配下のファイルを索引から取り除き、次の検索で読み直させます。"""
+        target = os.path.abspath(path)
+        with self._lock:
+            ids = [row[0] for row in self.conn.execute(
+                "SELECT id FROM files WHERE path = ? OR (path >= ? AND path < ?)",
+                (target, target.rstrip(os.sep) + os.sep, target.rstrip(os.sep) + os.sep + "\U0010ffff"),
+            )]
+            for file_id in ids:
+                self._remove(file_id)
+            self.conn.commit()
+
+    def stats(self) -> tuple[int, int]:
+        """(索引済みのファイル数, トライグラムの出現の数)。"""
+        with self._lock:
+            files = self.conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+            postings = self.conn.execute("SELECT COUNT(*) FROM postings").fetchone()[0]
+            return files, postings
+
+    def close(self):
+        with self._lock:
+            # WAL の内容をデータベースファイルに書き戻してから閉じる
+            self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self.conn.close()
+
+_index: Optional[SearchIndex] = None
+_index_lock = threading.Lock()
+
+def get_search_index(create: bool = False) -> Optional[SearchIndex]:
+    """
+    SEARCH_INDEX の設定に従って索引を開きます。"auto" の場合は SEARCH_INDEX_PATH のファイルが存在する場合のみ（index コマンドで作成）、
+    "true" の場合は常に開き、"false" の場合は None を返します。create が True の場合は設定にかかわらず作成します。
+    """
+    global _index
+    with _index_lock:
+        if _index is not None:
+            return _index
+        mode = Config.SEARCH_INDEX
+        if not create and (mode == "false" or (mode == "auto" and not os.path.exists(Config.SEARCH_INDEX_PATH))):
+            return None
+        try:
+            _index = SearchIndex.from_path(Config.SEARCH_INDEX_PATH, max_file_bytes=Config.SEARCH_INDEX_MAX_FILE_BYTES)
+        except sqlite3.Error as e:
+            logger.warning("検索索引 %s を開けません: %s", Config.SEARCH_INDEX_PATH, e)
+            return None
+        return _index
+
+def candidate_paths(root: str, pattern: str, flags: int = 0) -> Optional[list[str]]:
+    """
+    索引が有効で root が索引の対象の場合、search_file_content が検索するファイルのパスを返します。それ以外の場合は None を返します。
+    SEARCH_INDEX が "true" の場合、対象外のディレクトリを検索すると対象に追加します（最初の検索で索引を作成します）。
+    """
+    index = get_search_index()
+    if index is None:
+        return None
+    if not index.covers(root):
+        if Config.SEARCH_INDEX != "true":
+            return None
+        index.add_root(root)
+    return index.candidate_paths(root, pattern, flags)
+
+def invalidate(path: str):
+    """ファイルを変更するツールから呼び出され、索引が開かれている場合は path のエントリーを無効化します。"""
+    index = get_search_index()
+    if index is not None:
+        index.invalidate(path)
@@ -0,0 +1,270 @@
+import asyncio
+import atexit
+import itertools
+import os
+import signal
+import subprocess
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import IO, Optional
+
+from src.config import Config
+
+# プロセスグループに SIGTERM を送ってから SIGKILL を送るまでの猶予（秒）
+KILL_GRACE_SECONDS = 2.0
+# パイプから一度に読み込むバイト数
+READ_CHUNK_BYTES = 64 * 1024
+
+class OutputBuffer:
+    """
+    プロセスの出力のうち、先頭の head_bytes バイトと末尾の tail_bytes バイトのみを保持します。
+    出力がどれだけ大きくてもメモリ使用量は head_bytes + 2 * tail_bytes 程度に収まり、省略したバイト数を記録します。
+    """
+
+    def __init__(self, head_bytes: int, tail_bytes: int):
+        self.head_bytes = head_bytes
+        self.tail_bytes = tail_bytes
+        self.total_bytes = 0
+        self._head = bytearray()
+        self._tail = bytearray()
+        self._lock = threading.Lock()
+
+    def write(self, data: bytes):
+        with self._lock:
+            self.total_bytes += len(data)
+            room = self.head_bytes - len(self._head)
+            if room > 0:
+                self._head += data[:room]
+                data = data[room:]
+            if data and self.tail_bytes > 0:
+                self._tail += data
+                # 毎回詰め直すと遅いため、上限の2倍を超えたときにまとめて捨てる
+                if len(self._tail) > 2 * self.tail_bytes:
+                    del self._tail[:-self.tail_bytes]
+
+    def render(self) -> str:
+        """保持している出力をデコードし、省略した部分がある場合はその位置にバイト数を示す行を挟みます。"""
+        with self._lock:
+            head, tail = bytes(self._head), bytes(self._tail[-self.tail_bytes:]) if self.tail_bytes else b""
+            omitted = self.total_bytes - len(head) - len(tail)
+        text = head.decode("utf-8", errors="replace")
+        if omitted > 0:
+            text += f"\n... [出力が長いため {omitted} バイトを省略しました（合計 {self.total_bytes} バイト）] ...\n"
+        return text + tail.decode("utf-8", errors="replace")
+
+    def tail(self, max_bytes: int) -> str:
+        """出力の末尾の最大 max_bytes バイト（保持している範囲内）をデコードして返します。"""
+        with self._lock:
+            # 省略した部分がない場合は先頭と末尾が連続している
+            data = bytes(self._head + self._tail) if self.total_bytes == len(self._head) + len(self._tail) else bytes(self._tail)
+        return data[-max_bytes:].decode("utf-8", errors="replace") if max_bytes > 0 else ""
+
+def process_group_options() -> dict:
+    """コマンドを独立したプロセスグループで起動するためのオプション。タイムアウト時に子孫のプロセスもまとめて停止できるようにします。"""
+    if os.name == "nt":
+        return {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+    return {"start_new_session": True}
+
+def kill_process_tree(pid: int, grace: float = KILL_GRACE_SECONDS, is_alive=None):
+    """
+    pid のプロセスグループ全体に SIGTERM を送り、grace 秒以内に終了しない場合は SIGKILL を送ります。
+    is_alive はプロセスが終了したかどうかを確認する関数です（省略した場合はグループにシグナルを送れるかで判定します）。
+    """
+    if os.name == "nt":
+        subprocess.run(["taskkill", "/F", "/T", "/PID", str(pid)], capture_output=True, check=False)
+        return
+    if is_alive is None:
+        def is_alive():
+            try:
+                os.killpg(pid, 0)
+                return True
+            except (ProcessLookupError, PermissionError):
+                return False
+    try:
+        os.killpg(pid, signal.SIGTERM)
+    except (ProcessLookupError, PermissionError):
+        return
+    deadline = time.monotonic() + grace
+    while time.monotonic() < deadline and is_alive():
+        time.sleep(0.05)
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+def _pump(stream: IO[bytes], buffer: OutputBuffer):
+    """パイプが閉じられるまで読み込んで buffer に書き込みます（出力の読み込み用のスレッドで実行）。"""
+    try:
+        while True:
+            chunk = stream.read1(READ_CHUNK_BYTES)
+            if not chunk:
+                break
+            buffer.write(chunk)
+    except (OSError, ValueError):
+        pass
+    finally:
+        try:
+            stream.close()
+        except OSError:
+            pass
+
+@dataclass
+class ProcessResult:
+    """run_process() の結果。returncode はタイムアウトで停止した場合も、停止後の終了コードです。"""
+    stdout: OutputBuffer
+    stderr: OutputBuffer
+    returncode: int
+    timed_out: bool
+    seconds: float
+
+class RunningProcess:
+    """
+    シェルコマンドを起動し、標準出力と標準エラー出力をスレッドで読み続けます。
+    出力は OutputBuffer に書き込まれるため、実行中でも出力の末尾を確認できます。
+    """
+
+    def __init__(self, command: str, cwd: Optional[str], head_bytes: int, tail_bytes: int):
+        self.command = command
+        self.cwd = cwd
+        self.started = time.monotonic()
+        self.stdout = OutputBuffer(head_bytes, tail_bytes)
+        self.stderr = OutputBuffer(head_bytes, tail_bytes)
+        self.process = subprocess.Popen(
+            command, shell=True, cwd=cwd,
+            stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            **process_group_options(),
+        )
+        self._readers = [
+            threading.Thread(target=_pump, args=(self.process.stdout, self.stdout), daemon=True, name="shell-stdout"),
+            threading.Thread(target=_pump, args=(self.process.stderr, self.stderr), daemon=True, name="shell-stderr"),
+        ]
+        for reader in self._readers:
+            reader.start()
+        self.finished: Optional[float] = None
+        self.killed = False
+
+    def poll(self) -> Optional[int]:
+        """終了している場合は終了コードを、実行中の場合は None を返します。"""
+        returncode = self.process.poll()
+        if returncode is not None and self.finished is None:
+            self.finished = time.monotonic()
+        return returncode
+
+    def elapsed(self) -> float:
+        """開始してから終了するまで（実行中の場合は現在まで）の秒数。"""
+        return (self.finished or time.monotonic()) - self.started
+
+    def wait(self, timeout: Optional[float]) -> bool:
+        """プロセスの終了を最大 timeout 秒待ち、終了した場合は出力を読み終えてから True を返します。"""
+        try:
+            self.process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            return False
+        self.poll()
+        self._join_readers()
+        return True
+
+    def kill(self):
+        """プロセスグループ全体を停止し、出力を読み終えるまで待ちます。"""
+        self.killed = True
+        kill_process_tree(self.process.pid, is_alive=lambda: self.process.poll() is None)
+        self.process.wait()
+        self.poll()
+        self._join_readers()
+
+    def _join_readers(self):
+        # バックグラウンドに残った孫プロセスがパイプを開いたままにしている場合は、出力を待たずに戻る
+        for reader in self._readers:
+            reader.join(KILL_GRACE_SECONDS)
+
+def run_process(command: str, cwd: Optional[str], timeout: Optional[float], head_bytes: int, tail_bytes: int) -> ProcessResult:
+    """コマンドを実行して終了を待ちます。timeout 秒を過ぎた場合はプロセスグループ全体を停止します。"""
+    running = RunningProcess(command, cwd, head_bytes, tail_bytes)
+    timed_out = not running.wait(timeout)
+    if timed_out:
+        running.kill()
+    return ProcessResult(running.stdout, running.stderr, running.process.returncode, timed_out, time.monotonic() - running.started)
+
+async def _apump(stream: asyncio.StreamReader, buffer: OutputBuffer):
+    while True:
+        chunk = await stream.read(READ_CHUNK_BYTES)
+        if not chunk:
+            break
+        buffer.write(chunk)
+
+async def arun_process(command: str, cwd: Optional[str], timeout: Optional[float], head_bytes: int, tail_bytes: int) -> ProcessResult:
+    """run_process() の非同期版。asyncio のサブプロセスを使用し、待機中にスレッドを占有しません。"""
+    started = time.monotonic()
+    stdout, stderr = OutputBuffer(head_bytes, tail_bytes), OutputBuffer(head_bytes, tail_bytes)
+    process = await asyncio.create_subprocess_shell(
+        command, cwd=cwd,
+        stdin=asyncio.subprocess.DEVNULL, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+        **process_group_options(),
+    )
+    readers = [asyncio.ensure_future(_apump(process.stdout, stdout)), asyncio.ensure_future(_apump(process.stderr, stderr))]
+    timed_out = False
+    try:
+        await asyncio.wait_for(process.wait(), timeout)
+    except asyncio.TimeoutError:
+        timed_out = True
+        await asyncio.to_thread(kill_process_tree, process.pid, KILL_GRACE_SECONDS, lambda: process.returncode is None)
+        await process.wait()
+    finally:
+        _, pending = await asyncio.wait(readers, timeout=KILL_GRACE_SECONDS)
+        for reader in pending:
+            reader.cancel()
+    return ProcessResult(stdout, stderr, process.returncode, timed_out, time.monotonic() - started)
+
+@dataclass
+class ShellJob:
+    """バックグラウンドで実行中（または終了済み）のコマンド。"""
+    job_id: str
+    process: RunningProcess
+
+class JobRegistry:
+    """
+    バックグラウンドジョブをジョブIDで管理します。
+    終了したジョブが max_finished を超えた場合は、最後に状態を確認された時刻が古いものから出力とともに破棄します（実行中のジョブは破棄しません）。
+    プロセスの終了時には、実行中のジョブのプロセスグループを全て停止します。
+    """
+
+    def __init__(self, max_finished: int = 16):
+        self.max_finished = max_finished
+        self._jobs: OrderedDict[str, ShellJob] = OrderedDict()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def start(self, command: str, cwd: Optional[str], head_bytes: int, tail_bytes: int) -> ShellJob:
+        process = RunningProcess(command, cwd, head_bytes, tail_bytes)
+        with self._lock:
+            job = ShellJob(f"job-{next(self._ids)}", process)
+            self._jobs[job.job_id] = job
+            self._evict_locked()
+        return job
+
+    def get(self, job_id: str) -> Optional[ShellJob]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                self._jobs.move_to_end(job_id)
+                self._evict_locked()
+            return job
+
+    def list(self) -> list[ShellJob]:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def _evict_locked(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.process.poll() is not None]
+        for job_id in finished[:max(len(finished) - max(self.max_finished, 0), 0)]:
+            del self._jobs[job_id]
+
+    def kill_all(self):
+        for job in self.list():
+            if job.process.poll() is None:
+                job.process.kill()
+
+shell_jobs = JobRegistry(Config.SHELL_JOBS_MAX_FINISHED)
+atexit.register(shell_jobs.kill_all)
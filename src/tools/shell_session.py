@@ -0,0 +1,208 @@
+import atexit
+import os
+import secrets
+import selectors
+import shlex
+import shutil
+import subprocess
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+from src.config import Config
+from src.tools.shell_process import READ_CHUNK_BYTES, OutputBuffer, ProcessResult, process_group_options, kill_process_tree
+
+# 出力のパイプが閉じられた後、シェルの終了を待つ最大の秒数。これを過ぎても動いている場合はシェルを停止する
+EXIT_WAIT_SECONDS = 0.5
+
+class SessionTimeout(Exception):
+    """コマンドが時間の上限までに終了しなかったことを表します。"""
+
+@dataclass
+class SessionResult(ProcessResult):
+    """ShellSession.run() の結果。restarted はコマンドの実行中にシェルが終了・停止され、次回は新しいシェルで実行されることを表します。"""
+    restarted: bool = False
+
+def is_supported() -> bool:
+    """永続的なシェルのセッションを使用できるかどうか（bash がある POSIX 環境のみ）。"""
+    return os.name == "posix" and shutil.which("bash") is not None
+
+class ShellSession:
+    """
+    1つの bash プロセスを起動したまま、コマンドを順に実行します。
+
+    コマンドごとにシェルを起動しないため起動のコストがかからず、cd・export・source した仮想環境などの状態が次のコマンドに引き継がれます。
+    コマンドは標準入力のパイプからヒアドキュメントで渡して eval し、終了後にコマンドごとのランダムな区切り文字列と
+    終了コード・カレントディレクトリを出力します。出力は区切り文字列までをコマンドの出力として読み込みます。
+    シェルが終了した場合（exit の実行や停止）は、次のコマンドの実行時に最後のカレントディレクトリで起動し直します。
+    """
+
+    def __init__(self, cwd: Optional[str] = None):
+        self.cwd = os.path.abspath(cwd or os.getcwd())
+        self.process: Optional[subprocess.Popen] = None
+        self.lock = threading.Lock()
+
+    def _ensure_started(self):
+        """シェルが起動していない（終了した）場合は起動します。"""
+        if self.process is not None and self.process.poll() is None:
+            return
+        self.close()
+        cwd = self.cwd if os.path.isdir(self.cwd) else os.getcwd()
+        self.process = subprocess.Popen(
+            ["bash", "--noprofile", "--norc"], cwd=cwd,
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            **process_group_options(),
+        )
+        self.cwd = cwd
+
+    def run(self, command: str, cwd: Optional[str], timeout: Optional[float], head_bytes: int, tail_bytes: int) -> SessionResult:
+        """
+        command をセッションのシェルで実行します。cwd を指定した場合はそのディレクトリで実行し、終了後に元のディレクトリへ戻ります。
+        timeout 秒を過ぎた場合は、シェルを含むプロセスグループ全体を停止します（cd・export などの状態は失われます）。
+        """
+        with self.lock:
+            self._ensure_started()
+            started = time.monotonic()
+            token = f"__agent_done_{secrets.token_hex(8)}"
+            script = f"IFS= read -r -d '' __agent_cmd <<'{token}'\n{command}\n{token}\n"
+            if cwd:
+                # 指定されたディレクトリに移動できない場合はコマンドを実行しない
+                script += f"__agent_prev=$PWD; cd -- {shlex.quote(cwd)} && eval \"$__agent_cmd\" < /dev/null; __agent_rc=$?; cd -- \"$__agent_prev\"\n"
+            else:
+                script += "eval \"$__agent_cmd\" < /dev/null; __agent_rc=$?\n"
+            script += f"printf '%s:%d:%s\\n' '{token}' \"$__agent_rc\" \"$PWD\"; printf '%s\\n' '{token}' >&2\n"
+
+            stdout, stderr = OutputBuffer(head_bytes, tail_bytes), OutputBuffer(head_bytes, tail_bytes)
+            deadline = time.monotonic() + timeout if timeout is not None else None
+            try:
+                self.process.stdin.write(script.encode("utf-8"))
+                self.process.stdin.flush()
+                status = self._read_until(token.encode("ascii"), deadline, stdout, stderr)
+            except SessionTimeout:
+                self._kill()
+                return SessionResult(stdout, stderr, self.process.returncode, True, time.monotonic() - started, restarted=True)
+            except (BrokenPipeError, OSError):
+                status = None
+
+            if status is None:
+                # コマンドが exit でシェルを終了させたか、exec >&- などでシェルの出力を閉じた・付け替えた。
+                # 後者ではシェルが動き続けて区切り文字列を読めないため、プロセスグループごと停止する
+                try:
+                    returncode = self.process.wait(self._remaining(deadline, EXIT_WAIT_SECONDS))
+                except subprocess.TimeoutExpired:
+                    self._kill()
+                    returncode = self.process.returncode
+                return SessionResult(stdout, stderr, returncode, False, time.monotonic() - started, restarted=True)
+            returncode, self.cwd = status
+            return SessionResult(stdout, stderr, returncode, False, time.monotonic() - started)
+
+    @staticmethod
+    def _remaining(deadline: Optional[float], limit: float) -> float:
+        """deadline までの残りの秒数（最大 limit 秒）。"""
+        if deadline is None:
+            return limit
+        return max(0.0, min(limit, deadline - time.monotonic()))
+
+    def _read_until(self, token: bytes, deadline: Optional[float], stdout: OutputBuffer, stderr: OutputBuffer) -> Optional[tuple[int, str]]:
+        """
+        標準出力と標準エラー出力の両方で区切り文字列を読むまで、それ以前の出力を buffer に書き込みます。
+        (終了コード, カレントディレクトリ) を返し、その前にシェルが終了した場合は None を返します。
+        """
+        selector = selectors.DefaultSelector()
+        streams = {self.process.stdout.fileno(): stdout, self.process.stderr.fileno(): stderr}
+        pending = {fd: bytearray() for fd in streams}
+        for fd in streams:
+            selector.register(fd, selectors.EVENT_READ)
+        status = None
+        try:
+            while streams:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise SessionTimeout()
+                for key, _ in selector.select(remaining):
+                    fd = key.fd
+                    data = os.read(fd, READ_CHUNK_BYTES)
+                    if not data:
+                        return None
+                    buf = pending[fd]
+                    buf += data
+                    found = buf.find(token)
+                    if found == -1:
+                        # 区切り文字列が読み込みの境界をまたぐ場合に備え、末尾は次の読み込みまで残す
+                        keep = len(token) - 1
+                        if len(buf) > keep:
+                            streams[fd].write(bytes(buf[:len(buf) - keep]))
+                            del buf[:len(buf) - keep]
+                        continue
+                    if fd == self.process.stdout.fileno():
+                        end = buf.find(b"\n", found)
+                        if end == -1:
+                            continue
+                        _, code, cwd = buf[found:end].decode("utf-8", errors="replace").split(":", 2)
+                        status = (int(code), cwd)
+                    streams[fd].write(bytes(buf[:found]))
+                    selector.unregister(fd)
+                    del streams[fd]
+        finally:
+            selector.close()
+            # タイムアウトやシェルの終了で区切り文字列を読めなかった場合も、読み込んだ出力は残す
+            for fd, buffer in streams.items():
+                buffer.write(bytes(pending[fd]))
+        return status
+
+    def _kill(self):
+        if self.process is not None and self.process.poll() is None:
+            kill_process_tree(self.process.pid, is_alive=lambda: self.process.poll() is None)
+            self.process.wait()
+
+    def close(self):
+        """シェルを終了します。次のコマンドの実行時には新しいシェルが起動されます。"""
+        if self.process is None:
+            return
+        self._kill()
+        for stream in (self.process.stdin, self.process.stdout, self.process.stderr):
+            try:
+                stream.close()
+            except OSError:
+                pass
+
+class SessionManager:
+    """
+    会話のスレッド（thread_id）ごとに ShellSession を保持します。
+    max_sessions を超えた場合は、最後に使用された時刻が古いセッションを終了します。
+    """
+
+    def __init__(self, max_sessions: int):
+        self.max_sessions = max_sessions
+        self._sessions: OrderedDict[str, ShellSession] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, thread_id: str) -> ShellSession:
+        evicted = []
+        with self._lock:
+            session = self._sessions.get(thread_id)
+            if session is None:
+                session = self._sessions[thread_id] = ShellSession()
+            self._sessions.move_to_end(thread_id)
+            while len(self._sessions) > max(self.max_sessions, 1):
+                evicted.append(self._sessions.popitem(last=False)[1])
+        for old in evicted:
+            with old.lock:
+                old.close()
+        return session
+
+    def peek(self, thread_id: str) -> Optional[ShellSession]:
+        with self._lock:
+            return self._sessions.get(thread_id)
+
+    def close_all(self):
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            session.close()
+
+shell_sessions = SessionManager(Config.SHELL_SESSION_MAX)
+atexit.register(shell_sessions.close_all)
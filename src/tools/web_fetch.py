@@ -1,43 +1,122 @@
-import urllib.request
+import asyncio
+import codecs
+import re
 import chardet
 from langchain_core.tools import tool
 
+from src.config import Config
+from src.tools.html_extract import extract_main_content, truncate_to_tokens
+from src.tools.http_client import FetchResult, afetch, fetch, get_http_cache
+
+# 文字コードの判定に使用する本文の先頭のバイト数（本文全体は走査しない）
+SNIFF_BYTES = 64 * 1024
+# <meta charset> を探す本文の先頭のバイト数（HTML の仕様では先頭 1024 バイト以内に書く）
+META_SNIFF_BYTES = 4096
+
+_HEADER_CHARSET = re.compile(r"charset\s*=\s*[\"']?([^\s;\"']+)", re.IGNORECASE)
+_META_CHARSET = re.compile(rb"<meta[^>]+charset\s*=\s*[\"']?\s*([A-Za-z0-9_.:\-]+)", re.IGNORECASE)
+_BOMS = ((codecs.BOM_UTF8, "utf-8-sig"), (codecs.BOM_UTF16_LE, "utf-16"), (codecs.BOM_UTF16_BE, "utf-16"))
+# ブラウザと同様に、ラベルの文字コードを上位互換の文字コードとして扱う（Shift_JIS の機種依存文字など）
+_SUPERSETS = {"shift_jis": "cp932", "euc_kr": "cp949", "gb2312": "gbk", "latin_1": "cp1252", "ascii": "cp1252"}
+
+def _normalize_encoding(label: str | None) -> str | None:
+    """文字コードのラベルを Python のコーデック名にします。不明なラベルの場合は None を返します。"""
+    if not label:
+        return None
+    try:
+        name = codecs.lookup(label.strip()).name
+    except LookupError:
+        return None
+    return _SUPERSETS.get(name.replace("-", "_"), name)
+
+def _is_utf8(sample: bytes) -> bool:
+    """sample が UTF-8 として正しいか。sample の末尾で途切れた文字は許容します。"""
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=False)
+        return True
+    except UnicodeDecodeError:
+        return False
+
+def detect_encoding(raw_content: bytes, content_type: str | None) -> str:
+    """
+    本文の文字コードを判定します。
+    Content-Type の charset、BOM、HTML の <meta charset> の順に確認し、いずれもない場合は本文の先頭 SNIFF_BYTES バイトのみから判定します。
+    """
+    match = _HEADER_CHARSET.search(content_type or "")
+    encoding = _normalize_encoding(match.group(1)) if match else None
+    if encoding:
+        return encoding
+    for bom, name in _BOMS:
+        if raw_content.startswith(bom):
+            return name
+    match = _META_CHARSET.search(raw_content[:META_SNIFF_BYTES])
+    encoding = _normalize_encoding(match.group(1).decode("ascii")) if match else None
+    if encoding:
+        return encoding
+    sample = raw_content[:SNIFF_BYTES]
+    if _is_utf8(sample):
+        return "utf-8"
+    return _normalize_encoding(chardet.detect(sample)["encoding"]) or "utf-8"
+
+def _decode_content(raw_content: bytes, content_type: str | None) -> str:
+    """取得したコンテンツの文字コードを判定してデコードします。"""
+    encoding = detect_encoding(raw_content, content_type)
+    if encoding == "utf-16" and not raw_content.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        # BOM のない UTF-16 はバイト順を判定できないため、リトルエンディアンとして扱う
+        encoding = "utf-16-le"
+    return raw_content.decode(encoding, errors="replace")
+
+def _is_html(content_type: str | None, text: str) -> bool:
+    if content_type:
+        return "html" in content_type.lower()
+    return text.lstrip()[:15].lower().startswith(("<!doctype html", "<html"))
+
+def _format_result(result: FetchResult, raw: bool = False) -> str:
+    text = _decode_content(result.body, result.content_type)
+    if not raw and _is_html(result.content_type, text):
+        # スクリプト・スタイル・ナビゲーションなどを除き、本文のみを Markdown 風のテキストにする
+        page = extract_main_content(text, result.url)
+        text = page.text
+        if page.title and not text.startswith("# "):
+            text = f"# {page.title}\n\n{text}"
+    if not raw:
+        text, total_tokens = truncate_to_tokens(text, Config.WEB_FETCH_MAX_TOKENS)
+        if total_tokens > Config.WEB_FETCH_MAX_TOKENS > 0:
+            text += f"\n\n[注意: 本文が上限 ({Config.WEB_FETCH_MAX_TOKENS} トークン) を超えたため、以降を省略しました（全体で約 {total_tokens} トークン）]"
+    if result.truncated:
+        text += f"\n\n[注意: 本文が上限 ({Config.WEB_FETCH_MAX_BYTES} バイト) を超えたため、以降を省略しました]"
+    return text
+
 @tool(parse_docstring=True)
-def web_fetch(url: str) -> str:
+def web_fetch(url: str, raw: bool = False) -> str:
     """
     指定されたURLのコンテンツを取得し、文字コードを自動判定してテキストを返します。
-    取得したコンテンツは、表示不可能な制御文字を除去してクリーンアップされます。
+    HTMLページの場合は、ナビゲーションや広告などを除いた本文を、見出し・リスト・表・リンクを保った Markdown 形式で返します。
+    本文が大きい場合は上限までを返します。同じURLを再度取得した場合は、変更がなければ保存した内容を返します。
 
     Args:
         url (str): 取得したいコンテンツのURL。
+        raw (bool, optional): True の場合は本文を抜き出さず、HTML をそのまま返します。ページの構造や埋め込まれたデータが必要な場合にのみ使用します。
 
     Returns:
         str: URLから取得したコンテンツのテキスト。エラーが発生した場合はエラーメッセージを返します。
     """
     try:
-        with urllib.request.urlopen(url) as response:
-            raw_content = response.read()
-            
-            # chardetで文字コードを判定
-            result = chardet.detect(raw_content)
-            detected_encoding = result['encoding']
-            
-            # 判定できなかった場合のフォールバック
-            if detected_encoding is None:
-                # ヘッダーから取得を試みる
-                content_type = response.getheader('Content-Type')
-                if content_type and 'charset=' in content_type:
-                    detected_encoding = content_type.split('charset=')[-1].strip()
-                else:
-                    # 最終フォールバック
-                    detected_encoding = 'utf-8'
-
-            try:
-                # 判定した文字コードでデコード
-                text_content = raw_content.decode(detected_encoding, errors='replace')
-                return text_content
-            except (UnicodeDecodeError, TypeError, LookupError) as e:
-                return f"""エラー: コンテンツのデコード中に問題が発生しました。\n判定されたエンコーディング: {detected_encoding}\nエラー詳細: {e}"""
+        # 接続を再利用する共有のクライアントで取得し、上限を超えた本文は読み込まない
+        return _format_result(fetch(url, Config.WEB_FETCH_MAX_BYTES, get_http_cache()), raw)
 
     except Exception as e:
-        return f"エラー: URLの取得中に問題が発生しました - {e}"
\ No newline at end of file
+        return f"エラー: URLの取得中に問題が発生しました - {e}"
+
+async def _aweb_fetch(url: str, raw: bool = False) -> str:
+    """web_fetch の非同期版。イベントループごとに共有する httpx の非同期クライアントを使用します。"""
+    try:
+        result = await afetch(url, Config.WEB_FETCH_MAX_BYTES, get_http_cache())
+        # 本文の抜き出しは CPU を使うため、イベントループを止めないようスレッドで行う
+        return await asyncio.to_thread(_format_result, result, raw)
+
+    except Exception as e:
+        return f"エラー: URLの取得中に問題が発生しました - {e}"
+
+# ainvoke 時にはネイティブな非同期実装を使用する
+web_fetch.coroutine = _aweb_fetch
@@ -0,0 +1,100 @@
+import sys
+import asyncio
+import time
+from pathlib import Path
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeMessagesListChatModel
+from langchain_core.messages import AIMessage, ToolMessage
+from langchain_core.tools import tool
+
+# Add project root to sys.path to allow importing from src
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.core import agent
+from src.config import Config
+
+
+def _scripted_responses():
+    return [
+        AIMessage(content="", tool_calls=[
+            {"name": "read_file", "args": {"path": "a.txt"}, "id": "call_a"},
+            {"name": "read_file", "args": {"path": "b.txt"}, "id": "call_b"},
+        ]),
+        AIMessage(content="読み込みが完了しました。"),
+    ]
+
+
+@pytest.fixture
+def scripted_agent(monkeypatch):
+    """LLM を台本どおりに応答する偽モデルに、read_file を非同期の偽ツールに差し替えます。"""
+    monkeypatch.setattr(Config, "DEBUG_MODE", False)
+    monkeypatch.setattr(Config, "WRITE_INNER_THOUGHTS", False)
+    monkeypatch.setattr(Config, "CONTEXT_TOKEN_BUDGET", 0)
+    monkeypatch.setattr(agent, "llm_with_tools", FakeMessagesListChatModel(responses=_scripted_responses()))
+
+    def _read_file(path: str) -> str:
+        """偽の read_file"""
+        time.sleep(0.2)
+        return f"content of {path}"
+
+    async def _aread_file(path: str) -> str:
+        await asyncio.sleep(0.2)
+        return f"content of {path}"
+
+    read_file = tool(_read_file)
+    read_file.name = "read_file"
+    read_file.coroutine = _aread_file
+    monkeypatch.setitem(agent.tools, "read_file", read_file)
+    return agent.create_agent_graph()
+
+
+def test_graph_runs_with_ainvoke(scripted_agent):
+    """create_agent_graph が返すグラフを ainvoke で実行できることをテストします。"""
+    config = {"configurable": {"thread_id": "async_test"}}
+
+    start = time.perf_counter()
+    result = asyncio.run(scripted_agent.ainvoke({"input": "2つのファイルを読んで"}, config=config))
+    elapsed = time.perf_counter() - start
+
+    history = result["chat_history"]
+    tool_messages = [m for m in history if isinstance(m, ToolMessage)]
+    assert [m.tool_call_id for m in tool_messages] == ["call_a", "call_b"]
+    assert [m.content for m in tool_messages] == ["content of a.txt", "content of b.txt"]
+    assert history[-1].content == "読み込みが完了しました。"
+    # 2つの読み取り専用ツールは asyncio タスクとして並行実行される
+    assert elapsed < 0.35
+
+
+def test_same_graph_runs_with_invoke(scripted_agent):
+    """同じグラフを同期の invoke でも実行できることをテストします。"""
+    config = {"configurable": {"thread_id": "sync_test"}}
+
+    result = scripted_agent.invoke({"input": "2つのファイルを読んで"}, config=config)
+
+    assert result["chat_history"][-1].content == "読み込みが完了しました。"
+
+
+def test_aexecute_tools_asks_approval_without_blocking_loop(monkeypatch):
+    """承認が必要なツールが、イベントループを止めずに承認を待って実行されることをテストします。"""
+    monkeypatch.setattr(Config, "DEBUG_MODE", False)
+    monkeypatch.setattr(Config, "WRITE_INNER_THOUGHTS", False)
+    monkeypatch.setattr("builtins.input", lambda prompt: "2")
+
+    @tool
+    def write_file(path: str, content: str) -> str:
+        """偽の write_file"""
+        return f"wrote {path}"
+
+    monkeypatch.setitem(agent.tools, "write_file", write_file)
+    state = {
+        "chat_history": [AIMessage(content="", tool_calls=[
+            {"name": "write_file", "args": {"path": "a.txt", "content": "x"}, "id": "w1"},
+        ])],
+        "always_allowed_tools": set(),
+    }
+
+    result = asyncio.run(agent.aexecute_tools(state))
+
+    assert result["chat_history"][0].content == "wrote a.txt"
+    assert result["always_allowed_tools"] == {"write_file"}
@@ -0,0 +1,44 @@
+import sys
+from pathlib import Path
+import pytest
+
+# Add project root to sys.path to allow importing from src
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.config import Config
+from src.core import agent
+from benchmarks.bench_agent_e2e import compare_results, run_benchmarks
+from benchmarks.scenarios import SCENARIOS
+
+
+@pytest.mark.parametrize("scenario_name", sorted(SCENARIOS))
+def test_scenarios_drive_the_real_graph(scenario_name):
+    """各シナリオが実際のグラフとツールを最後まで実行し、計測結果を返すことをテストします。"""
+    llm_with_tools = agent.llm_with_tools
+    budget = Config.CONTEXT_TOKEN_BUDGET
+
+    results = run_benchmarks([scenario_name], turns=4)
+
+    metrics = results["scenarios"][scenario_name]
+    assert metrics["turns"] == 4
+    tools_per_turn = {"file_heavy": 3, "search_heavy": 2, "long_session": 0}[scenario_name]
+    assert metrics["llm_calls"] == 4 * (2 if tools_per_turn else 1)
+    assert metrics["tool_calls"] == 4 * tools_per_turn
+    assert metrics["overhead_mean_ms"] >= 0
+    assert metrics["checkpoint_bytes"] > 0
+    assert "memory_growth_kb" in metrics
+    # ベンチマークの終了後は、差し替えたモデルと設定が元に戻っている
+    assert agent.llm_with_tools is llm_with_tools
+    assert Config.CONTEXT_TOKEN_BUDGET == budget
+
+
+def test_compare_marks_regressions():
+    """比較結果で、10%以上悪化した指標に '!' が付くことをテストします。"""
+    baseline = {"metadata": {"git_revision": "a"}, "scenarios": {"s": {"overhead_mean_ms": 10.0, "tool_calls_per_second": 100.0}}}
+    current = {"metadata": {"git_revision": "b"}, "scenarios": {"s": {"overhead_mean_ms": 15.0, "tool_calls_per_second": 120.0}}}
+
+    lines = compare_results(baseline, current).splitlines()
+
+    assert any(line.startswith(" !overhead_mean_ms") and "+50.0%" in line for line in lines)
+    assert any(line.startswith("  tool_calls_per_second") and "+20.0%" in line for line in lines)
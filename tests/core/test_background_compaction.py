@@ -0,0 +1,121 @@
+import asyncio
+import sys
+import time
+from pathlib import Path
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeMessagesListChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.tools import tool
+
+# Add project root to sys.path to allow importing from src
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.core import agent
+from src.core.compaction import BackgroundCompactor
+from src.config import Config
+
+DELAY = 0.3
+OLD_ANSWER = "古い回答" * 10
+
+
+class RecordingModel(FakeMessagesListChatModel):
+    """エージェントに渡されたメッセージ列を記録する偽モデル。"""
+    requests: list = []
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        self.requests.append(messages)
+        return super()._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+
+@pytest.fixture
+def compacting_agent(monkeypatch):
+    monkeypatch.setattr(Config, "DEBUG_MODE", False)
+    monkeypatch.setattr(Config, "WRITE_INNER_THOUGHTS", False)
+    monkeypatch.setattr(Config, "CONTEXT_TOKEN_BUDGET", 40)
+    monkeypatch.setattr(Config, "SUMMARY_KEEP_TOKENS", 30)
+    monkeypatch.setattr(agent, "prompt_cache", None)
+    monkeypatch.setattr(agent, "llm", FakeMessagesListChatModel(responses=[AIMessage(content="要約です。") for _ in range(5)], sleep=DELAY))
+
+    @tool
+    def read_file(path: str) -> str:
+        """偽の read_file"""
+        time.sleep(DELAY)
+        return "内容"
+
+    monkeypatch.setitem(agent.tools, "read_file", read_file)
+    agent_app = agent.create_agent_graph()
+    config = {"configurable": {"thread_id": "compaction_test"}}
+    # 予算を超える古い会話を履歴に用意しておく
+    agent_app.update_state(config, {"chat_history": [AIMessage(content=OLD_ANSWER, id="old")]}, as_node="agent")
+    return agent_app, config
+
+
+def _use_agent_responses(monkeypatch, responses):
+    model = RecordingModel(responses=responses, requests=[])
+    monkeypatch.setattr(agent, "llm_with_tools", model)
+    return model
+
+
+def test_summarization_runs_concurrently_with_tools(compacting_agent, monkeypatch):
+    """要約がツール実行と並行して行われ、次のLLM呼び出しには要約済みの履歴が渡されることをテストします。"""
+    agent_app, config = compacting_agent
+    model = _use_agent_responses(monkeypatch, [
+        AIMessage(content="", tool_calls=[{"name": "read_file", "args": {"path": "a.txt"}, "id": "call_1"}]),
+        AIMessage(content="回答です。"),
+    ])
+
+    start = time.perf_counter()
+    result = agent_app.invoke({"input": "質問"}, config=config)
+    elapsed = time.perf_counter() - start
+
+    # 直列なら 2 * DELAY かかる
+    assert elapsed < 1.8 * DELAY
+    assert result["conversation_summary"] == "要約です。"
+    assert [m.id for m in result["chat_history"]][0] != "old"
+    second_request = "\n".join(str(m.content) for m in model.requests[1])
+    assert "要約です。" in second_request
+    assert OLD_ANSWER not in second_request
+
+
+def test_turn_without_tools_is_compacted_after_the_response(compacting_agent, monkeypatch):
+    """ツールを使わないターンでは応答が要約を待たずに返り、要約は次のターンの前に反映されることをテストします。"""
+    agent_app, config = compacting_agent
+    model = _use_agent_responses(monkeypatch, [AIMessage(content="回答1"), AIMessage(content="回答2")])
+    compactor = BackgroundCompactor(agent_app)
+
+    start = time.perf_counter()
+    result = agent_app.invoke({"input": "質問1"}, config=config)
+    assert time.perf_counter() - start < DELAY
+    assert "conversation_summary" not in result
+
+    compactor.schedule(config)
+    compactor.wait()
+    snapshot = agent_app.get_state(config)
+    assert snapshot.next == ()
+    assert snapshot.values["conversation_summary"] == "要約です。"
+    assert "old" not in [m.id for m in snapshot.values["chat_history"]]
+
+    result = agent_app.invoke({"input": "質問2"}, config=config)
+    compactor.close()
+
+    assert result["chat_history"][-1].content == "回答2"
+    assert "要約です。" in "\n".join(str(m.content) for m in model.requests[1])
+
+
+def test_async_background_compaction(compacting_agent, monkeypatch):
+    """非同期モードでも、ターン終了後の要約が次のターンの前に反映されることをテストします。"""
+    agent_app, config = compacting_agent
+    _use_agent_responses(monkeypatch, [AIMessage(content="回答1"), AIMessage(content="回答2")])
+    compactor = BackgroundCompactor(agent_app)
+
+    async def _run():
+        await agent_app.ainvoke({"input": "質問1"}, config=config)
+        compactor.aschedule(config)
+        await compactor.await_pending()
+        return await agent_app.ainvoke({"input": "質問2"}, config=config)
+
+    result = asyncio.run(_run())
+
+    assert result["conversation_summary"] == "要約です。"
+    assert [m.content for m in result["chat_history"]] == ["回答1", "回答2"]
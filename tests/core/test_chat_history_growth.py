@@ -0,0 +1,85 @@
+import sys
+from pathlib import Path
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeMessagesListChatModel
+from langchain_core.messages import AIMessage, ToolMessage
+from langchain_core.tools import tool
+
+# Add project root to sys.path to allow importing from src
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.core import agent
+from src.core.compaction import BackgroundCompactor
+from src.config import Config
+
+TURNS = 100
+
+
+@pytest.fixture
+def looping_agent(monkeypatch):
+    """毎ターン「ツール呼び出し → ツール結果 → 最終回答」の3メッセージを生成する偽エージェント。"""
+    monkeypatch.setattr(Config, "DEBUG_MODE", False)
+    monkeypatch.setattr(Config, "WRITE_INNER_THOUGHTS", False)
+    monkeypatch.setattr(Config, "CONTEXT_TOKEN_BUDGET", 0)
+    # 実際のモデルと同様、呼び出しごとに別のメッセージ（別のID）を返す
+    responses = []
+    for turn in range(TURNS):
+        responses.append(AIMessage(content="", tool_calls=[{"name": "read_file", "args": {"path": "a.txt"}, "id": f"call_{turn}"}]))
+        responses.append(AIMessage(content="回答です。"))
+    monkeypatch.setattr(agent, "llm_with_tools", FakeMessagesListChatModel(responses=responses))
+
+    @tool
+    def read_file(path: str) -> str:
+        """偽の read_file"""
+        return "x" * 200
+
+    monkeypatch.setitem(agent.tools, "read_file", read_file)
+    return agent.create_agent_graph()
+
+
+def _checkpoint_size(agent_app, config) -> int:
+    checkpoint = agent_app.checkpointer.get_tuple(config).checkpoint
+    return len(agent_app.checkpointer.serde.dumps_typed(checkpoint)[1])
+
+
+def test_history_and_checkpoint_grow_linearly(looping_agent):
+    """100ターンのシミュレーションで、会話履歴とチェックポイントが線形にしか増えないことをテストします。"""
+    config = {"configurable": {"thread_id": "growth_test"}}
+    sizes = {}
+
+    for turn in range(1, TURNS + 1):
+        result = looping_agent.invoke({"input": f"質問 {turn}"}, config=config)
+        # 各ターンで追加されるのは AIMessage(tool_calls), ToolMessage, AIMessage の3件のみ
+        assert len(result["chat_history"]) == 3 * turn
+        if turn in (TURNS // 2, TURNS):
+            sizes[turn] = _checkpoint_size(looping_agent, config)
+
+    # 線形増加ならターン数が2倍になってもチェックポイントのサイズはおよそ2倍にとどまる
+    assert sizes[TURNS] <= 2.2 * sizes[TURNS // 2]
+
+
+def test_summarization_replaces_history(monkeypatch):
+    """要約時は既存の履歴が最新の会話で置き換えられ、要約は専用フィールドに保持されることをテストします。"""
+    monkeypatch.setattr(Config, "DEBUG_MODE", False)
+    monkeypatch.setattr(Config, "WRITE_INNER_THOUGHTS", False)
+    # 「回答です。」は1件あたり 5 + 4 = 9 トークンと概算される。6件で要約を開始し、最新2件を保持する
+    monkeypatch.setattr(Config, "CONTEXT_TOKEN_BUDGET", 54)
+    monkeypatch.setattr(Config, "SUMMARY_KEEP_TOKENS", 18)
+    monkeypatch.setattr(agent, "llm_with_tools", FakeMessagesListChatModel(responses=[AIMessage(content="回答です。") for _ in range(7)]))
+    monkeypatch.setattr(agent, "llm", FakeMessagesListChatModel(responses=[AIMessage(content="要約です。") for _ in range(7)]))
+    agent_app = agent.create_agent_graph()
+    compactor = BackgroundCompactor(agent_app)
+    config = {"configurable": {"thread_id": "summary_test"}}
+
+    # CLI と同様に、ターンの終了後に要約を開始し、次のターンの前に完了を待つ
+    for turn in range(1, 8):
+        compactor.wait()
+        result = agent_app.invoke({"input": f"質問 {turn}"}, config=config)
+        compactor.schedule(config)
+    compactor.close()
+
+    history = result["chat_history"]
+    assert len(history) == 3
+    assert result["conversation_summary"] == "要約です。"
+    assert history[-1].content == "回答です。"
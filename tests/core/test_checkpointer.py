@@ -0,0 +1,143 @@
+import asyncio
+import sys
+import time
+from pathlib import Path
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeMessagesListChatModel
+from langchain_core.messages import AIMessage
+
+# Add project root to sys.path to allow importing from src
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.core import agent
+from src.core.checkpointer import PrunedSqliteSaver, WriteBehindCheckpointer, create_checkpointer
+from src.config import Config
+
+THREAD = {"configurable": {"thread_id": "persist_test"}}
+
+
+@pytest.fixture(autouse=True)
+def answering_agent(monkeypatch):
+    monkeypatch.setattr(Config, "DEBUG_MODE", False)
+    monkeypatch.setattr(Config, "WRITE_INNER_THOUGHTS", False)
+    monkeypatch.setattr(Config, "CONTEXT_TOKEN_BUDGET", 0)
+    monkeypatch.setattr(agent, "prompt_cache", None)
+    monkeypatch.setattr(agent, "llm_with_tools", FakeMessagesListChatModel(responses=[AIMessage(content=f"回答{i}") for i in range(20)]))
+
+
+def _checkpoint_rows(saver: PrunedSqliteSaver):
+    checkpoint_ids = {row[0] for row in saver.conn.execute("SELECT checkpoint_id FROM checkpoints")}
+    write_ids = {row[0] for row in saver.conn.execute("SELECT checkpoint_id FROM writes")}
+    return checkpoint_ids, write_ids
+
+
+def test_only_the_last_checkpoints_are_kept(tmp_path):
+    """スレッドごとに最新 keep_last 件のチェックポイントだけが保持されることをテストします。"""
+    saver = PrunedSqliteSaver.from_path(str(tmp_path / "cp.sqlite"), keep_last=3)
+    agent_app = agent.create_agent_graph(saver)
+
+    for turn in range(5):
+        result = agent_app.invoke({"input": f"質問 {turn}"}, config=THREAD)
+
+    checkpoint_ids, write_ids = _checkpoint_rows(saver)
+    assert len(checkpoint_ids) == 3
+    # 削除されたチェックポイントの書き込みは残らない
+    assert write_ids <= checkpoint_ids
+    assert [m.content for m in result["chat_history"]] == [f"回答{i}" for i in range(5)]
+    assert len(agent_app.get_state(THREAD).values["chat_history"]) == 5
+
+
+def test_session_resumes_from_disk(tmp_path, monkeypatch):
+    """プロセスを再起動しても、同じ thread_id で会話を再開できることをテストします。"""
+    monkeypatch.setattr(Config, "CHECKPOINT_BACKEND", "sqlite")
+    monkeypatch.setattr(Config, "CHECKPOINT_DB_PATH", str(tmp_path / "nested" / "cp.sqlite"))
+    monkeypatch.setattr(Config, "CHECKPOINT_WRITE_BEHIND", True)
+
+    checkpointer = create_checkpointer()
+    agent.create_agent_graph(checkpointer).invoke({"input": "最初の質問"}, config=THREAD)
+    checkpointer.close()
+
+    checkpointer = create_checkpointer()
+    agent_app = agent.create_agent_graph(checkpointer)
+    assert [m.content for m in agent_app.get_state(THREAD).values["chat_history"]] == ["回答0"]
+    result = agent_app.invoke({"input": "続きの質問"}, config=THREAD)
+    checkpointer.close()
+
+    assert [m.content for m in result["chat_history"]] == ["回答0", "回答1"]
+
+
+def test_resumed_session_does_not_keep_tool_approvals(tmp_path):
+    """「常に許可」はチェックポイントに残っていても、再開後の最初のターンで always_allowed_tools に None を渡すとリセットされることをテストします。"""
+    saver = PrunedSqliteSaver.from_path(str(tmp_path / "cp.sqlite"))
+    agent_app = agent.create_agent_graph(saver)
+    agent_app.invoke({"input": "最初の質問", "always_allowed_tools": {"delete_file"}}, config=THREAD)
+    agent_app.invoke({"input": "次の質問", "always_allowed_tools": {"write_file"}}, config=THREAD)
+    assert agent_app.get_state(THREAD).values["always_allowed_tools"] == {"delete_file", "write_file"}
+
+    resumed = agent.create_agent_graph(saver)
+    resumed.invoke({"input": "再開後の質問", "always_allowed_tools": None}, config=THREAD)
+    values = resumed.get_state(THREAD).values
+    assert values["always_allowed_tools"] == set()
+    assert [m.content for m in values["chat_history"]] == ["回答0", "回答1", "回答2"]
+
+
+def test_vacuum_runs_periodically(tmp_path, monkeypatch):
+    """vacuum_interval 回の保存ごとに VACUUM が実行されることをテストします。"""
+    saver = PrunedSqliteSaver.from_path(str(tmp_path / "cp.sqlite"), keep_last=2, vacuum_interval=4)
+    vacuums = []
+    original_vacuum = saver.vacuum
+    monkeypatch.setattr(saver, "vacuum", lambda: (vacuums.append(1), original_vacuum()))
+    agent_app = agent.create_agent_graph(saver)
+
+    for turn in range(4):
+        agent_app.invoke({"input": f"質問 {turn}"}, config=THREAD)
+
+    # 1ターンあたり3回（入力の受け付け・agent ノードの実行前・実行後）保存される
+    puts = 4 * 3
+    assert len(vacuums) == puts // 4
+
+
+class SlowSaver(PrunedSqliteSaver):
+    """fsync の遅いディスクを模した保存先。batch() の回数を記録する。"""
+    batches: int = 0
+
+    def batch(self):
+        self.batches += 1
+        time.sleep(0.05)
+        return super().batch()
+
+
+def test_write_behind_does_not_block_and_batches_writes(tmp_path):
+    """書き込みがエージェントのループを待たせず、まとめて保存されることをテストします。"""
+    inner = SlowSaver.from_path(str(tmp_path / "cp.sqlite"), keep_last=0)
+    checkpointer = WriteBehindCheckpointer(inner)
+    agent_app = agent.create_agent_graph(checkpointer)
+
+    start = time.perf_counter()
+    for turn in range(5):
+        agent_app.invoke({"input": f"質問 {turn}"}, config=THREAD)
+    elapsed = time.perf_counter() - start
+    checkpointer.flush()
+
+    checkpoint_ids, _ = _checkpoint_rows(inner)
+    # 各保存を個別に行うと put / put_writes の回数分（数十回）の待ち時間がかかる
+    assert inner.batches < len(checkpoint_ids)
+    assert elapsed < 0.05 * len(checkpoint_ids)
+    assert len(agent_app.get_state(THREAD).values["chat_history"]) == 5
+    checkpointer.close()
+
+
+def test_write_behind_with_async_graph(tmp_path):
+    """非同期実行（ainvoke）でも永続化されたチェックポイントを使用できることをテストします。"""
+    checkpointer = WriteBehindCheckpointer(PrunedSqliteSaver.from_path(str(tmp_path / "cp.sqlite")))
+    agent_app = agent.create_agent_graph(checkpointer)
+
+    async def _run():
+        await agent_app.ainvoke({"input": "質問1"}, config=THREAD)
+        return await agent_app.ainvoke({"input": "質問2"}, config=THREAD)
+
+    result = asyncio.run(_run())
+    checkpointer.close()
+
+    assert [m.content for m in result["chat_history"]] == ["回答0", "回答1"]
@@ -0,0 +1,104 @@
+import sys
+import time
+import threading
+from pathlib import Path
+import pytest
+from langchain_core.messages import AIMessage, ToolMessage
+from langchain_core.tools import tool
+
+# Add project root to sys.path to allow importing from src
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.core import agent
+from src.config import Config
+
+
+@pytest.fixture
+def fake_tools(monkeypatch):
+    """読み取り専用ツールを、一定時間スリープする偽ツールに差し替えます。"""
+    monkeypatch.setattr(Config, "DEBUG_MODE", False)
+    monkeypatch.setattr(Config, "WRITE_INNER_THOUGHTS", False)
+    monkeypatch.setattr(Config, "MAX_TOOL_CONCURRENCY", 4)
+
+    calls = []
+
+    @tool
+    def read_file(path: str) -> str:
+        """偽の read_file"""
+        calls.append(("read_file", path, threading.current_thread().name))
+        time.sleep(0.2)
+        return f"content of {path}"
+
+    @tool
+    def write_file(path: str, content: str) -> str:
+        """偽の write_file"""
+        calls.append(("write_file", path, threading.current_thread().name))
+        return f"wrote {path}"
+
+    monkeypatch.setitem(agent.tools, "read_file", read_file)
+    monkeypatch.setitem(agent.tools, "write_file", write_file)
+    return calls
+
+
+def _tool_call(name, call_id, **args):
+    return {"name": name, "args": args, "id": call_id}
+
+
+def test_read_only_tools_run_concurrently(fake_tools):
+    """読み取り専用ツールが並行実行され、ToolMessage の順序が tool_calls と一致することをテストします。"""
+    tool_calls = [_tool_call("read_file", f"id_{i}", path=f"f{i}.txt") for i in range(4)]
+    state = {"chat_history": [AIMessage(content="", tool_calls=tool_calls)], "always_allowed_tools": set()}
+
+    start = time.perf_counter()
+    result = agent.execute_tools(state)
+    elapsed = time.perf_counter() - start
+
+    # 4 × 0.2 秒 = 0.8 秒ではなく、最も遅い呼び出し程度で完了する
+    assert elapsed < 0.6
+    messages = result["chat_history"]
+    assert [m.tool_call_id for m in messages] == [f"id_{i}" for i in range(4)]
+    assert [m.content for m in messages] == [f"content of f{i}.txt" for i in range(4)]
+
+
+def test_concurrency_limit_one_runs_sequentially(fake_tools, monkeypatch):
+    """MAX_TOOL_CONCURRENCY が 1 の場合は呼び出し元スレッドで逐次実行されることをテストします。"""
+    monkeypatch.setattr(Config, "MAX_TOOL_CONCURRENCY", 1)
+    tool_calls = [_tool_call("read_file", f"id_{i}", path=f"f{i}.txt") for i in range(2)]
+    state = {"chat_history": [AIMessage(content="", tool_calls=tool_calls)], "always_allowed_tools": set()}
+
+    result = agent.execute_tools(state)
+
+    assert all(thread == threading.current_thread().name for _, _, thread in fake_tools)
+    assert [m.tool_call_id for m in result["chat_history"]] == ["id_0", "id_1"]
+
+
+def test_modifying_tool_is_serialized_between_reads(fake_tools, monkeypatch):
+    """承認が必要なツールの前後で、読み取り専用ツールの実行順序が保たれることをテストします。"""
+    prompts = []
+    monkeypatch.setattr("builtins.input", lambda prompt: prompts.append(prompt) or "1")
+    tool_calls = [
+        _tool_call("read_file", "r1", path="a.txt"),
+        _tool_call("write_file", "w1", path="a.txt", content="x"),
+        _tool_call("read_file", "r2", path="a.txt"),
+    ]
+    state = {"chat_history": [AIMessage(content="", tool_calls=tool_calls)], "always_allowed_tools": set()}
+
+    result = agent.execute_tools(state)
+
+    assert len(prompts) == 1
+    assert [name for name, _, _ in fake_tools] == ["read_file", "write_file", "read_file"]
+    assert [m.tool_call_id for m in result["chat_history"]] == ["r1", "w1", "r2"]
+
+
+def test_unknown_tool_returns_error_message(fake_tools, monkeypatch):
+    """存在しないツールの呼び出しがエラーメッセージとして返されることをテストします。"""
+    monkeypatch.setattr("builtins.input", lambda prompt: "1")
+    tool_calls = [_tool_call("read_file", "r1", path="a.txt"), _tool_call("no_such_tool", "x1")]
+    state = {"chat_history": [AIMessage(content="", tool_calls=tool_calls)], "always_allowed_tools": set()}
+
+    result = agent.execute_tools(state)
+
+    assert isinstance(result["chat_history"][1], ToolMessage)
+    assert result["chat_history"][1].tool_call_id == "x1"
+    assert "no_such_tool" in result["chat_history"][1].content
@@ -0,0 +1,118 @@
+import sqlite3
+import sys
+from pathlib import Path
+from langchain_core.load import dumps
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+
+# Add project root to sys.path to allow importing from src
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.core import llm_cache
+from src.core.llm_cache import SqliteLLMCache
+from benchmarks.scripted_model import ScriptedChatModel
+
+
+def _model(cache: SqliteLLMCache) -> ScriptedChatModel:
+    return ScriptedChatModel(script=[AIMessage(content="1回目の応答"), AIMessage(content="2回目の応答")], cache=cache)
+
+
+def _conversation(date: str, call_id: str, message_id: str) -> list:
+    return [
+        SystemMessage(content="システムプロンプト"),
+        AIMessage(content="", id=message_id, tool_calls=[{"name": "read_file", "args": {"path": "a.txt"}, "id": call_id}]),
+        ToolMessage(content="内容", tool_call_id=call_id),
+        HumanMessage(content=[{"type": "text", "text": f"- 今日の日付は {date} です。"}, {"type": "text", "text": "要約して  ください"}]),
+    ]
+
+
+def test_repeated_prompt_is_served_from_cache():
+    """同じメッセージ列への2回目の呼び出しはLLMを呼び出さずにキャッシュから返されることをテストします。"""
+    cache = SqliteLLMCache(sqlite3.connect(":memory:"))
+    model = _model(cache)
+
+    first = model.invoke([HumanMessage(content="こんにちは")])
+    second = model.invoke([HumanMessage(content="こんにちは")])
+    third = model.invoke([HumanMessage(content="別の質問")])
+
+    assert first.content == second.content == "1回目の応答"
+    assert third.content == "2回目の応答"
+    assert model.calls == 2
+    stats = cache.stats()
+    assert (stats.hits, stats.misses, stats.entries) == (1, 2, 2)
+
+
+def test_key_ignores_ids_and_dates():
+    """メッセージID・ツール呼び出しID・日付の違いはキャッシュのキーに影響しないことをテストします。"""
+    cache = SqliteLLMCache(sqlite3.connect(":memory:"))
+    model = _model(cache)
+
+    model.invoke(_conversation("2025-01-01", "call_abc", "run-1"))
+    cached = model.invoke([*_conversation("2025-06-30", "call_xyz", "run-2")[:3], HumanMessage(content=[
+        {"type": "text", "text": "- 今日の日付は 2025-06-30 です。"}, {"type": "text", "text": "要約して  ください"},
+    ])])
+
+    assert cached.content == "1回目の応答"
+    assert model.calls == 1
+    # 内容が異なる場合はヒットしない
+    model.invoke([*_conversation("2025-01-01", "call_abc", "run-1")[:3], HumanMessage(content="別の依頼")])
+    assert model.calls == 2
+
+
+def test_key_keeps_whitespace_in_message_bodies():
+    """ツールの結果（ファイルの内容など）の空白やインデントの違いは、別のキーになることをテストします。"""
+    def prompt(source: str) -> str:
+        return dumps([HumanMessage(content="直して"), ToolMessage(content=source, tool_call_id="call_1")])
+
+    indented = prompt("def f():\n    return 1\n")
+    broken = prompt("def f():\nreturn 1\n")
+    assert llm_cache.cache_key(indented, "model") != llm_cache.cache_key(broken, "model")
+    assert llm_cache.cache_key(indented, "model") == llm_cache.cache_key(prompt("def f():\n    return 1\n"), "model")
+
+
+def test_key_depends_on_bound_tools():
+    """バインドされたツールが異なる場合は別のキーになることをテストします。"""
+    prompt = '[{"kwargs": {"type": "human", "content": "x"}}]'
+
+    assert llm_cache.cache_key(prompt, "model---[('tools', ['a'])]") != llm_cache.cache_key(prompt, "model---[('tools', ['b'])]")
+
+
+def test_lru_and_ttl_eviction(monkeypatch):
+    """最大件数を超えた場合は最後に使用された時刻が古いものから、有効期間を過ぎたものは参照時に削除されることをテストします。"""
+    now = [1000.0]
+    monkeypatch.setattr(llm_cache.time, "time", lambda: now[0])
+    cache = SqliteLLMCache(sqlite3.connect(":memory:"), max_entries=2, ttl_seconds=100)
+    model = ScriptedChatModel(script=[AIMessage(content=f"応答{i}") for i in range(10)], cache=cache)
+
+    for prompt in ("a", "b"):
+        model.invoke(prompt)
+        now[0] += 1
+    model.invoke("a")  # a を最近使用したものにする
+    now[0] += 1
+    model.invoke("c")  # b が削除される
+    calls = model.calls
+    model.invoke("a")
+    model.invoke("b")
+    assert model.calls == calls + 1
+
+    now[0] += 200
+    model.invoke("a")
+    assert model.calls == calls + 2
+    assert cache.stats().evictions >= 2
+
+
+def test_export_and_seed_from_recorded_session(tmp_path):
+    """書き出した応答を別のキャッシュに読み込むと、LLMを呼び出さずに同じ応答が返されることをテストします。"""
+    recorded = SqliteLLMCache(sqlite3.connect(":memory:"))
+    _model(recorded).invoke(_conversation("2025-01-01", "call_abc", "run-1"))
+    session_file = tmp_path / "session.jsonl"
+    assert recorded.export_jsonl(str(session_file)) == 1
+
+    replay = SqliteLLMCache.from_path(str(tmp_path / "cache" / "llm_cache.sqlite"))
+    assert replay.seed_from_jsonl(str(session_file)) == 1
+    model = _model(replay)
+    result = model.invoke(_conversation("2025-03-03", "call_def", "run-9"))
+
+    assert result.content == "1回目の応答"
+    assert model.calls == 0
+    replay.close()
@@ -0,0 +1,65 @@
+import logging
+import logging.handlers
+import sys
+from pathlib import Path
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+# Add project root to sys.path to allow importing from src
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.logging_config import logger, StateSummary, Truncated
+
+
+class CountingValue:
+    """文字列に変換された回数を記録するオブジェクト。"""
+    conversions = 0
+
+    def __str__(self):
+        CountingValue.conversions += 1
+        return "value"
+
+
+def test_logger_writes_through_a_queue():
+    """ロガーがキュー経由でバックグラウンドのスレッドに書き込みを任せることをテストします。"""
+    # pytest が追加するキャプチャ用のハンドラを除き、ファイルやコンソールへ直接書き込むハンドラは持たない
+    assert isinstance(logger.handlers[0], logging.handlers.QueueHandler)
+    assert not any(type(handler) in (logging.FileHandler, logging.StreamHandler) for handler in logger.handlers)
+
+
+def test_disabled_debug_logs_are_not_formatted():
+    """DEBUGレベルが無効な場合、ログの引数が文字列に変換されないことをテストします。"""
+    previous_level = logger.level
+    logger.setLevel(logging.INFO)
+    CountingValue.conversions = 0
+    try:
+        logger.debug("Current State: %s", CountingValue())
+    finally:
+        logger.setLevel(previous_level)
+
+    assert CountingValue.conversions == 0
+
+
+def test_state_summary_reports_counts_and_sizes_instead_of_content():
+    """状態の要約がメッセージの本文を含まず、件数とバイト数のみを表示することをテストします。"""
+    big_content = "秘密の内容" * 1000
+    state = {
+        "input": "質問",
+        "chat_history": [HumanMessage(content="こんにちは"), ToolMessage(content=big_content, tool_call_id="c"), AIMessage(content="回答")],
+        "work_plan": None,
+    }
+
+    summary = str(StateSummary(state))
+
+    assert "秘密の内容" not in summary
+    assert "chat_history=[3件" in summary
+    assert f"tool: 1件 {len(big_content.encode('utf-8'))}B" in summary
+    assert "input=質問" in summary
+    assert "work_plan" not in summary
+
+
+def test_truncated_caps_long_values():
+    """長い値が指定した文字数で切り詰められることをテストします。"""
+    assert str(Truncated("a" * 50, limit=10)) == "a" * 10 + "...(50 chars)"
+    assert str(Truncated({"k": 1}, limit=10)) == "{'k': 1}"
+    assert str(Truncated("a" * 50, limit=0)) == "a" * 50
@@ -0,0 +1,126 @@
+import sqlite3
+import sys
+from pathlib import Path
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeMessagesListChatModel
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_core.tools import tool
+from langgraph.checkpoint.memory import MemorySaver
+
+# Add project root to sys.path to allow importing from src
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.core import agent
+from src.core.checkpointer import PrunedSqliteSaver
+from src.core.message_store import ContentAddressedSerializer, InMemoryBlobStore, SqliteBlobStore
+from src.config import Config
+from benchmarks.bench_checkpoint_size import measure_checkpoint_bytes
+
+THREAD = {"configurable": {"thread_id": "dedup_test"}}
+TURNS = 8
+
+
+@pytest.fixture
+def file_reading_agent(monkeypatch):
+    """毎ターン大きなファイルを読む偽エージェント。"""
+    monkeypatch.setattr(Config, "DEBUG_MODE", False)
+    monkeypatch.setattr(Config, "WRITE_INNER_THOUGHTS", False)
+    monkeypatch.setattr(Config, "CONTEXT_TOKEN_BUDGET", 0)
+    monkeypatch.setattr(agent, "prompt_cache", None)
+    responses = []
+    for turn in range(2 * TURNS):
+        responses.append(AIMessage(content="", tool_calls=[{"name": "read_file", "args": {"path": f"f{turn}.txt"}, "id": f"call_{turn}"}]))
+        responses.append(AIMessage(content="確認しました。"))
+    monkeypatch.setattr(agent, "llm_with_tools", FakeMessagesListChatModel(responses=responses))
+
+    @tool
+    def read_file(path: str) -> str:
+        """偽の read_file"""
+        return path * 2000
+
+    monkeypatch.setitem(agent.tools, "read_file", read_file)
+
+
+def test_messages_are_stored_once():
+    """同じメッセージを含む値を何度シリアライズしても、メッセージの本体は一度だけ保存されることをテストします。"""
+    store = InMemoryBlobStore()
+    serde = ContentAddressedSerializer(store)
+    history = [HumanMessage(content="質問", id="1"), ToolMessage(content="x" * 10000, tool_call_id="c", id="2")]
+
+    first = serde.dumps_typed({"chat_history": history, "input": "質問"})
+    stored_bytes = store.total_bytes()
+    second = serde.dumps_typed({"chat_history": history + [AIMessage(content="回答", id="3")], "input": "質問"})
+
+    assert len(first[1]) < 1000
+    assert store.total_bytes() - stored_bytes < 1000
+    restored = serde.loads_typed(second)
+    assert restored["input"] == "質問"
+    assert restored["chat_history"][:2] == history
+    assert restored["chat_history"][2].content == "回答"
+
+
+def test_memory_saver_with_deduplication(file_reading_agent):
+    """MemorySaver と組み合わせても、会話の状態が変わらないことをテストします。"""
+    agent_app = agent.create_agent_graph(MemorySaver(serde=ContentAddressedSerializer(InMemoryBlobStore())))
+
+    for turn in range(TURNS):
+        result = agent_app.invoke({"input": f"質問 {turn}"}, config=THREAD)
+
+    assert len(result["chat_history"]) == 3 * TURNS
+    assert agent_app.get_state(THREAD).values["chat_history"] == result["chat_history"]
+    assert isinstance(result["chat_history"][1], ToolMessage)
+
+
+def test_sqlite_checkpoints_are_smaller_and_resumable(file_reading_agent, tmp_path):
+    """SQLite のチェックポイントが小さくなり、開き直しても会話を再開できることをテストします。"""
+    sizes = {}
+    for dedup_messages in (False, True):
+        saver = PrunedSqliteSaver.from_path(str(tmp_path / f"{dedup_messages}.sqlite"), keep_last=0, vacuum_interval=0, dedup_messages=dedup_messages)
+        agent_app = agent.create_agent_graph(saver)
+        for turn in range(TURNS):
+            result = agent_app.invoke({"input": f"質問 {turn}"}, config=THREAD)
+        total, checkpoints = measure_checkpoint_bytes(saver)
+        sizes[dedup_messages] = total / checkpoints
+        saver.close()
+
+    assert sizes[True] * 3 < sizes[False]
+
+    saver = PrunedSqliteSaver.from_path(str(tmp_path / "True.sqlite"), dedup_messages=True)
+    restored = agent.create_agent_graph(saver).get_state(THREAD).values["chat_history"]
+    saver.close()
+    assert restored == result["chat_history"]
+
+
+def test_vacuum_removes_unreferenced_messages(file_reading_agent, tmp_path):
+    """古いチェックポイントの削除後、どこからも参照されないメッセージが VACUUM 時に削除されることをテストします。"""
+    saver = PrunedSqliteSaver.from_path(str(tmp_path / "cp.sqlite"), keep_last=2, vacuum_interval=0, dedup_messages=True)
+    agent_app = agent.create_agent_graph(saver)
+    config = {"configurable": {"thread_id": "gc"}}
+    for turn in range(TURNS):
+        agent_app.invoke({"input": f"質問 {turn}"}, config=config)
+    # 別スレッドの会話を削除すると、そのメッセージは参照されなくなる
+    agent_app.invoke({"input": "別の会話"}, config=THREAD)
+    saver.delete_thread("gc")
+    before = saver.conn.execute("SELECT COUNT(*) FROM message_blobs").fetchone()[0]
+
+    saver.vacuum()
+
+    after = saver.conn.execute("SELECT COUNT(*) FROM message_blobs").fetchone()[0]
+    assert after < before
+    assert len(agent_app.get_state(THREAD).values["chat_history"]) == 3
+    saver.close()
+
+
+def test_sqlite_blob_store_with_its_own_connection():
+    """専用の接続を持つ SqliteBlobStore が、保存と取得・不要なメッセージの削除を行えることをテストします。"""
+    store = SqliteBlobStore(sqlite3.connect(":memory:"))
+    store.put("a", "msgpack", b"1")
+    store.put("a", "msgpack", b"1")
+    store.put("b", "msgpack", b"22")
+
+    assert store.get_many(["a", "b", "c"]) == {"a": ("msgpack", b"1"), "b": ("msgpack", b"22")}
+    assert store.total_bytes() == 3
+    assert store.retain({"b"}) == 1
+    assert store.get_many(["a", "b"]) == {"b": ("msgpack", b"22")}
+    store.close()
@@ -0,0 +1,147 @@
+import sys
+from datetime import date
+from pathlib import Path
+import pytest
+from langchain_core.messages import AIMessage, SystemMessage, HumanMessage
+from langchain_core.tools import tool
+
+# Add project root to sys.path to allow importing from src
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.core import agent
+from src.core.prompts import create_static_system_prompt, create_volatile_context
+from src.core.prompt_cache import PromptCacheManager
+from src.config import Config
+
+
+class FakeContextCacheClient:
+    """作成・削除の呼び出しを記録するローカルの偽コンテキストキャッシュクライアント。"""
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.created = []
+        self.deleted = []
+
+    def create(self, *, system_instruction, tools, ttl_seconds):
+        if self.fail:
+            raise RuntimeError("cache unavailable")
+        self.created.append(system_instruction)
+        return f"cachedContents/{len(self.created)}"
+
+    def delete(self, name):
+        self.deleted.append(name)
+
+
+class RecordingModel:
+    """bind された引数と受け取ったメッセージを記録する偽モデル。"""
+
+    def __init__(self):
+        self.bound = {}
+        self.received = []
+
+    def bind(self, **kwargs):
+        self.bound = kwargs
+        return self
+
+    def invoke(self, messages):
+        self.received.append(messages)
+        return AIMessage(content="ok")
+
+
+@tool
+def sample_tool(path: str) -> str:
+    """サンプルツール"""
+    return path
+
+
+def test_static_prompt_is_independent_of_state():
+    """作業状況が異なっても、不変のシステムプロンプトはバイト単位で同一であることをテストします。"""
+    state_a = {"memos": "a", "todo_list": [{"task": "x", "completed": False}]}
+    state_b = {"memos": "b", "work_plan": "plan"}
+
+    assert create_static_system_prompt() == create_static_system_prompt()
+    assert "memos: a" in create_volatile_context(state_a)
+    assert "memos: b" in create_volatile_context(state_b)
+    assert "memos" not in create_static_system_prompt().split("<環境情報>")[1]
+
+
+def test_volatile_context_uses_day_granularity():
+    """日付が日単位で埋め込まれ、同じ日のターン間で変化しないことをテストします。"""
+    context = create_volatile_context({})
+    assert f"今日の日付は {date.today().isoformat()} です。" in context
+    assert context == create_volatile_context({})
+
+
+def test_manager_reuses_cache_for_same_prefix():
+    """同じプレフィックスに対してはキャッシュを1度だけ作成して再利用することをテストします。"""
+    client = FakeContextCacheClient()
+    manager = PromptCacheManager(client, "models/test", [sample_tool], ttl_seconds=3600)
+
+    names = {manager.get_cached_content("static prompt") for _ in range(5)}
+
+    assert names == {"cachedContents/1"}
+    assert len(client.created) == 1
+
+
+def test_manager_recreates_cache_when_prefix_changes():
+    """プレフィックスが変わった場合はキャッシュを作り直し、古いキャッシュを削除することをテストします。"""
+    client = FakeContextCacheClient()
+    manager = PromptCacheManager(client, "models/test", [sample_tool], ttl_seconds=3600)
+
+    first = manager.get_cached_content("prompt v1")
+    second = manager.get_cached_content("prompt v2")
+
+    assert first != second
+    assert client.deleted == [first]
+
+
+def test_manager_falls_back_when_creation_fails():
+    """キャッシュ作成に失敗した場合は None を返し、しばらく再試行しないことをテストします。"""
+    client = FakeContextCacheClient(fail=True)
+    manager = PromptCacheManager(client, "models/test", [sample_tool], retry_after_seconds=300)
+
+    assert manager.get_cached_content("static prompt") is None
+    client.fail = False
+    assert manager.get_cached_content("static prompt") is None
+    assert client.created == []
+
+
+@pytest.fixture
+def agent_config(monkeypatch):
+    monkeypatch.setattr(Config, "DEBUG_MODE", False)
+    monkeypatch.setattr(Config, "WRITE_INNER_THOUGHTS", False)
+    monkeypatch.setattr(Config, "CONTEXT_TOKEN_BUDGET", 0)
+
+
+def test_run_agent_uses_cached_content_without_resending_prefix(agent_config, monkeypatch):
+    """キャッシュが有効な場合、システムプロンプトを送らず cached_content を指定して呼び出すことをテストします。"""
+    model = RecordingModel()
+    client = FakeContextCacheClient()
+    monkeypatch.setattr(agent, "llm", model)
+    monkeypatch.setattr(agent, "prompt_cache", PromptCacheManager(client, "models/test", [sample_tool]))
+
+    agent.run_agent({"input": "こんにちは", "chat_history": [], "memos": "メモ"})
+    agent.run_agent({"input": "もう一度", "chat_history": [], "memos": "更新されたメモ"})
+
+    assert model.bound == {"cached_content": "cachedContents/1"}
+    assert client.created == [create_static_system_prompt()]
+    for messages in model.received:
+        assert not any(isinstance(m, SystemMessage) for m in messages)
+        assert isinstance(messages[-1], HumanMessage)
+    assert "更新されたメモ" in model.received[-1][-1].content[0]["text"]
+    assert model.received[-1][-1].content[1]["text"] == "もう一度"
+
+
+def test_run_agent_sends_static_prefix_first_without_cache(agent_config, monkeypatch):
+    """キャッシュが無効な場合、不変のシステムプロンプトが先頭に置かれることをテストします。"""
+    model = RecordingModel()
+    monkeypatch.setattr(agent, "llm_with_tools", model)
+    monkeypatch.setattr(agent, "prompt_cache", None)
+    history = [HumanMessage(content="前の質問"), AIMessage(content="前の回答")]
+
+    agent.run_agent({"input": "こんにちは", "chat_history": history})
+
+    messages = model.received[0]
+    assert messages[0] == SystemMessage(content=create_static_system_prompt())
+    assert messages[1:3] == history
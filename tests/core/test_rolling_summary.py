@@ -0,0 +1,122 @@
+import sys
+from pathlib import Path
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_core.tools import tool
+
+# Add project root to sys.path to allow importing from src
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.core import agent
+from src.core.token_accounting import estimate_text_tokens
+from src.config import Config
+
+TURNS = 150
+BUDGET = 2000
+KEEP = 500
+SUMMARY_TEXT = "要約" * 50
+
+
+class RecordingSummarizer(FakeListChatModel):
+    """要約LLMへの入力サイズを記録する偽モデル。"""
+    input_tokens: list[int] = []
+
+    def _call(self, messages, stop=None, run_manager=None, **kwargs):
+        self.input_tokens.append(sum(estimate_text_tokens(m.content) for m in messages))
+        return super()._call(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+
+class FreshResponses(FakeListChatModel):
+    """呼び出しごとに新しい AIMessage を返す偽エージェントモデル（ツール呼び出しと回答を交互に返す）。"""
+    calls: int = 0
+
+    def invoke(self, input, config=None, **kwargs):
+        self.calls += 1
+        if self.calls % 2:
+            return AIMessage(content="", tool_calls=[{"name": "read_file", "args": {"path": "big.txt"}, "id": f"call_{self.calls}"}])
+        return AIMessage(content="ファイルを確認しました。")
+
+
+@pytest.fixture
+def long_session(monkeypatch):
+    monkeypatch.setattr(Config, "DEBUG_MODE", False)
+    monkeypatch.setattr(Config, "WRITE_INNER_THOUGHTS", False)
+    monkeypatch.setattr(Config, "CONTEXT_TOKEN_BUDGET", BUDGET)
+    monkeypatch.setattr(Config, "SUMMARY_KEEP_TOKENS", KEEP)
+    summarizer = RecordingSummarizer(responses=[SUMMARY_TEXT], input_tokens=[])
+    monkeypatch.setattr(agent, "llm", summarizer)
+    monkeypatch.setattr(agent, "llm_with_tools", FreshResponses(responses=[""]))
+
+    @tool
+    def read_file(path: str) -> str:
+        """偽の read_file"""
+        return "x" * 1200
+
+    monkeypatch.setitem(agent.tools, "read_file", read_file)
+    return agent.create_agent_graph(), summarizer
+
+
+def test_summarization_input_is_bounded(long_session):
+    """セッションが長くなっても、要約1回あたりの入力サイズが一定の範囲に収まることをテストします。"""
+    agent_app, summarizer = long_session
+    config = {"configurable": {"thread_id": "rolling_summary"}}
+
+    for turn in range(TURNS):
+        result = agent_app.invoke({"input": f"質問 {turn}"}, config=config)
+
+    assert len(summarizer.input_tokens) > 10
+    # 入力は「前回の要約 + 新たに外れた会話（最大で予算分）+ 指示文」のみで、セッションの長さに比例しない
+    bound = BUDGET + estimate_text_tokens(SUMMARY_TEXT) + 500
+    assert max(summarizer.input_tokens) <= bound
+    assert summarizer.input_tokens[-1] <= summarizer.input_tokens[1] * 1.5
+    assert result["conversation_summary"] == SUMMARY_TEXT
+
+
+def test_summary_is_passed_to_the_next_summarization(monkeypatch):
+    """前回の要約が次の要約の入力に含まれ、履歴全体は含まれないことをテストします。"""
+    monkeypatch.setattr(Config, "DEBUG_MODE", False)
+    monkeypatch.setattr(Config, "WRITE_INNER_THOUGHTS", False)
+    monkeypatch.setattr(Config, "CONTEXT_TOKEN_BUDGET", 30)
+    monkeypatch.setattr(Config, "SUMMARY_KEEP_TOKENS", 10)
+    prompts = []
+
+    class CapturingSummarizer(FakeListChatModel):
+        def _call(self, messages, stop=None, run_manager=None, **kwargs):
+            prompts.append(messages[-1].content)
+            return "新しい要約"
+
+    monkeypatch.setattr(agent, "llm", CapturingSummarizer(responses=[""]))
+    state = {
+        "input": "次へ",
+        "chat_history": [
+            AIMessage(content="古い回答その1です", id="old_1"),
+            AIMessage(content="古い回答その2です", id="old_2"),
+            AIMessage(content="最新", id="latest"),
+        ],
+        "conversation_summary": "以前の要約",
+    }
+
+    update = agent.summarize_history(state)
+
+    assert "以前の要約" in prompts[0]
+    assert "古い回答その1です" in prompts[0]
+    assert "最新" not in prompts[0]
+    assert update["conversation_summary"] == "新しい要約"
+    # 要約されたメッセージだけがIDで削除される
+    assert [m.id for m in update["chat_history"]] == ["old_1", "old_2"]
+
+
+def test_summary_is_shown_to_the_agent_before_history(monkeypatch):
+    """要約が会話履歴の先頭に置かれてエージェントに渡されることをテストします。"""
+    monkeypatch.setattr(Config, "DEBUG_MODE", False)
+    monkeypatch.setattr(Config, "WRITE_INNER_THOUGHTS", False)
+    monkeypatch.setattr(agent, "prompt_cache", None)
+    history = [AIMessage(content="直近の回答")]
+
+    _, messages = agent._build_agent_request({"input": "質問", "chat_history": history, "conversation_summary": "要約本文"}, None)
+
+    assert isinstance(messages[1], HumanMessage)
+    assert "要約本文" in messages[1].content
+    assert messages[2] is history[0]
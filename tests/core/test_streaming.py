@@ -0,0 +1,93 @@
+import sys
+import json
+import time
+from pathlib import Path
+from typing import Any, Iterator
+import pytest
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.tools import tool
+
+# Add project root to sys.path to allow importing from src
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.core import agent
+from src.core.streaming import StreamCallbacks, stream_turn
+from src.config import Config
+
+
+class StreamingFakeChatModel(BaseChatModel):
+    """台本どおりの応答を単語単位でストリーミングする偽チャットモデル。"""
+    responses: list[AIMessage]
+    delay: float = 0.0
+    index: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "streaming-fake"
+
+    def _next_response(self) -> AIMessage:
+        response = self.responses[self.index % len(self.responses)]
+        self.index += 1
+        return response
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=self._next_response())])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        response = self._next_response()
+        time.sleep(self.delay)
+        for word in response.content.split(" ") if response.content else []:
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=word + " "))
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+        if response.tool_calls:
+            yield ChatGenerationChunk(message=AIMessageChunk(content="", tool_call_chunks=[
+                {"name": tc["name"], "args": json.dumps(tc["args"]), "id": tc["id"], "index": i}
+                for i, tc in enumerate(response.tool_calls)
+            ]))
+
+
+@pytest.fixture
+def streaming_agent(monkeypatch):
+    monkeypatch.setattr(Config, "DEBUG_MODE", False)
+    monkeypatch.setattr(Config, "WRITE_INNER_THOUGHTS", False)
+    monkeypatch.setattr(Config, "CONTEXT_TOKEN_BUDGET", 0)
+    model = StreamingFakeChatModel(delay=0.05, responses=[
+        AIMessage(content="ファイルを 読みます", tool_calls=[{"name": "read_file", "args": {"path": "a.txt"}, "id": "call_a"}]),
+        AIMessage(content="読み込みが 完了 しました"),
+    ])
+    monkeypatch.setattr(agent, "llm_with_tools", model)
+
+    @tool
+    def read_file(path: str) -> str:
+        """偽の read_file"""
+        return f"content of {path}"
+
+    monkeypatch.setitem(agent.tools, "read_file", read_file)
+    return agent.create_agent_graph()
+
+
+def test_stream_turn_reports_tokens_tool_events_and_latency(streaming_agent):
+    """トークン、ツールイベント、TTFT、ターン全体のレイテンシが報告されることをテストします。"""
+    tokens, tool_events = [], []
+    callbacks = StreamCallbacks(
+        on_token=lambda text, step: tokens.append((text, step)),
+        on_tool_event=tool_events.append,
+    )
+    config = {"configurable": {"thread_id": "stream_test"}}
+
+    final_message, metrics = stream_turn(streaming_agent, {"input": "a.txt を読んで"}, config, callbacks)
+
+    assert "".join(text for text, _ in tokens).split() == ["ファイルを", "読みます", "読み込みが", "完了", "しました"]
+    # ツール呼び出しの前後で、LLM出力のステップ番号が変わる
+    assert len({step for _, step in tokens}) == 2
+    assert [event["event"] for event in tool_events] == ["tool_start", "tool_end"]
+    assert tool_events[0]["tool"] == "read_file"
+    assert final_message.content.strip() == "読み込みが 完了 しました"
+    assert metrics.tool_calls == 1
+    assert metrics.time_to_first_token is not None
+    assert 0.05 <= metrics.time_to_first_token < metrics.total_latency
@@ -0,0 +1,101 @@
+import sys
+from pathlib import Path
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+# Add project root to sys.path to allow importing from src
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.core import agent
+from src.core.token_accounting import (
+    TOKEN_COUNT_KEY,
+    MESSAGE_OVERHEAD_TOKENS,
+    count_message_tokens,
+    estimate_text_tokens,
+)
+from src.config import Config
+
+
+def test_estimate_text_tokens():
+    """ASCII は約4文字で1トークン、非ASCIIは1文字1トークンとして概算されることをテストします。"""
+    assert estimate_text_tokens("") == 0
+    assert estimate_text_tokens("abcdefgh") == 2
+    assert estimate_text_tokens("こんにちは") == 5
+    assert estimate_text_tokens("ok こんにちは") == 1 + 5
+
+
+def test_count_is_cached_on_message():
+    """トークン数がメッセージにキャッシュされ、再計算されないことをテストします。"""
+    message = ToolMessage(content="x" * 400, tool_call_id="t1")
+
+    count = count_message_tokens(message)
+
+    assert count == 100 + MESSAGE_OVERHEAD_TOKENS
+    assert message.response_metadata[TOKEN_COUNT_KEY] == count
+    message.content = "short"
+    assert count_message_tokens(message) == count
+
+
+def test_usage_metadata_is_preferred():
+    """LLM の usage_metadata がある場合はその出力トークン数が使われることをテストします。"""
+    message = AIMessage(
+        content="x" * 4000,
+        usage_metadata={"input_tokens": 10, "output_tokens": 7, "total_tokens": 17},
+    )
+    assert count_message_tokens(message) == 7 + MESSAGE_OVERHEAD_TOKENS
+
+
+def test_tool_call_arguments_are_counted():
+    """ツール呼び出しの引数もトークン数に含まれることをテストします。"""
+    plain = AIMessage(content="")
+    with_call = AIMessage(content="", tool_calls=[{"name": "write_file", "args": {"content": "y" * 400}, "id": "w1"}])
+    assert count_message_tokens(with_call) > count_message_tokens(plain) + 100
+
+
+@pytest.fixture
+def token_budget(monkeypatch):
+    monkeypatch.setattr(Config, "DEBUG_MODE", False)
+    monkeypatch.setattr(Config, "CONTEXT_TOKEN_BUDGET", 1000)
+    monkeypatch.setattr(Config, "SUMMARY_KEEP_TOKENS", 300)
+
+
+def test_many_small_messages_do_not_trigger_compaction(token_budget):
+    """メッセージ数が多くても、トークン数が予算未満なら要約されないことをテストします。"""
+    history = [AIMessage(content="ok") for _ in range(100)]
+    assert agent._split_history_for_summary(history) is None
+
+
+def test_single_large_tool_message_triggers_compaction(token_budget):
+    """巨大な ToolMessage が1件あるだけで要約が始まることをテストします。"""
+    history = [
+        HumanMessage(content="読んで"),
+        AIMessage(content="", tool_calls=[{"name": "read_file", "args": {"path": "big.txt"}, "id": "r1"}]),
+        ToolMessage(content="x" * 8000, tool_call_id="r1"),
+        AIMessage(content="読み終えました。"),
+        HumanMessage(content="次へ"),
+    ]
+
+    messages_to_summarize, recent_history = agent._split_history_for_summary(history)
+
+    assert messages_to_summarize == history[:3]
+    assert recent_history == history[3:]
+
+
+def test_compaction_keeps_tool_call_and_results_together(token_budget):
+    """保持範囲の境界が ToolMessage に当たる場合、対応する AIMessage まで含めることをテストします。"""
+    history = [
+        AIMessage(content="x" * 4000),
+        AIMessage(content="", tool_calls=[
+            {"name": "read_file", "args": {"path": "a"}, "id": "a"},
+            {"name": "read_file", "args": {"path": "b"}, "id": "b"},
+        ]),
+        ToolMessage(content="y" * 800, tool_call_id="a"),
+        ToolMessage(content="z" * 800, tool_call_id="b"),
+    ]
+
+    messages_to_summarize, recent_history = agent._split_history_for_summary(history)
+
+    # 保持予算(300)だけなら最後の ToolMessage 1件で境界になるが、AIMessage(tool_calls) まで後退する
+    assert messages_to_summarize == history[:1]
+    assert recent_history == history[1:]
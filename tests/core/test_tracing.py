@@ -0,0 +1,128 @@
+import asyncio
+import json
+import sys
+from pathlib import Path
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeMessagesListChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.tools import tool
+
+# Add project root to sys.path to allow importing from src
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.core import agent
+from src.core.tracing import tracer, JsonlSpanExporter, TurnProfiler, format_turn_profile
+from src.config import Config
+
+CONFIG = {"configurable": {"thread_id": "tracing_test"}}
+
+
+@pytest.fixture
+def traced_agent(monkeypatch, tmp_path):
+    """読み取り専用ツールと承認が必要なツールを1回ずつ呼び出す偽エージェントと、トレースの出力先。"""
+    monkeypatch.setattr(Config, "DEBUG_MODE", False)
+    monkeypatch.setattr(Config, "WRITE_INNER_THOUGHTS", False)
+    monkeypatch.setattr(Config, "CONTEXT_TOKEN_BUDGET", 0)
+    monkeypatch.setattr(agent, "prompt_cache", None)
+    usage = {"input_tokens": 120, "output_tokens": 8, "total_tokens": 128}
+    monkeypatch.setattr(agent, "llm_with_tools", FakeMessagesListChatModel(responses=[
+        AIMessage(content="", usage_metadata=usage, tool_calls=[
+            {"name": "read_file", "args": {"path": "a.txt"}, "id": "call_a"},
+            {"name": "write_file", "args": {"path": "b.txt"}, "id": "call_b"},
+        ]),
+        AIMessage(content="完了しました。", usage_metadata=usage),
+    ]))
+
+    @tool
+    def read_file(path: str) -> str:
+        """偽の read_file"""
+        return "x" * 100
+
+    @tool
+    def write_file(path: str) -> str:
+        """偽の write_file"""
+        return "書き込みました"
+
+    monkeypatch.setitem(agent.tools, "read_file", read_file)
+    monkeypatch.setitem(agent.tools, "write_file", write_file)
+    monkeypatch.setattr(agent, "_request_tool_approval", lambda tool_name, tool_args: "1")
+
+    trace_file = tmp_path / "traces.jsonl"
+    exporter = JsonlSpanExporter(str(trace_file))
+    profiler = TurnProfiler()
+    tracer.add_exporter(exporter)
+    tracer.add_exporter(profiler)
+    yield agent.create_agent_graph(), profiler, trace_file
+    tracer.remove_exporter(exporter)
+    tracer.remove_exporter(profiler)
+    exporter.close()
+
+
+def _assert_turn_spans(spans, turn_span):
+    by_name = {}
+    for span in spans:
+        by_name.setdefault(span.name, []).append(span)
+
+    assert len(by_name["agent"]) == 2
+    assert len(by_name["tools"]) == 1
+    assert len(by_name["approval"]) == 1
+    assert by_name["tool:read_file"][0].attributes["payload.output_bytes"] == 100
+    llm_spans = by_name["llm"]
+    assert len(llm_spans) == 2
+    assert sum(span.attributes["gen_ai.usage.input_tokens"] for span in llm_spans) == 240
+    assert sum(span.attributes["gen_ai.usage.output_tokens"] for span in llm_spans) == 16
+    # LLM呼び出しは agent ノードの、ツール実行と承認待ちは tools ノードの子になる
+    agent_ids = {span.span_id for span in by_name["agent"]}
+    assert all(span.parent_span_id in agent_ids for span in llm_spans)
+    tools_id = by_name["tools"][0].span_id
+    assert by_name["tool:write_file"][0].parent_span_id == tools_id
+    assert by_name["approval"][0].parent_span_id == tools_id
+    assert all(span.trace_id == turn_span.trace_id for span in spans)
+
+    profile = format_turn_profile(spans)
+    assert "tool:read_file" in profile
+    assert "入力 240 / 出力 16 トークン" in profile
+
+
+def test_spans_cover_nodes_llm_calls_tools_and_approval(traced_agent):
+    """1ターン分のスパンが、ノード・LLM呼び出し・ツール実行・承認待ちの親子関係とトークン数を記録することをテストします。"""
+    agent_app, profiler, trace_file = traced_agent
+
+    with tracer.span("turn", "turn") as turn_span:
+        agent_app.invoke({"input": "読んで書いて"}, config=CONFIG)
+    spans = profiler.take(turn_span.trace_id)
+
+    _assert_turn_spans(spans, turn_span)
+    # トレースファイルは OTLP/JSON 形式のスパンを1行1件で持つ
+    lines = [json.loads(line) for line in trace_file.read_text(encoding="utf-8").splitlines()]
+    assert len(lines) == len(spans)
+    root = next(line for line in lines if line["name"] == "turn")
+    assert "parentSpanId" not in root
+    assert len(root["traceId"]) == 32 and len(root["spanId"]) == 16
+    assert int(root["endTimeUnixNano"]) >= int(root["startTimeUnixNano"])
+    llm = next(line for line in lines if line["name"] == "llm")
+    assert {"key": "gen_ai.usage.input_tokens", "value": {"intValue": "120"}} in llm["attributes"]
+
+
+def test_spans_in_async_mode(traced_agent):
+    """非同期モード (ainvoke) でも同じスパンが記録されることをテストします。"""
+    agent_app, profiler, _ = traced_agent
+
+    async def _run():
+        with tracer.span("turn", "turn") as turn_span:
+            await agent_app.ainvoke({"input": "読んで書いて"}, config=CONFIG)
+        return turn_span
+
+    turn_span = asyncio.run(_run())
+
+    _assert_turn_spans(profiler.take(turn_span.trace_id), turn_span)
+
+
+def test_tracing_is_disabled_without_exporters():
+    """出力先が登録されていない場合はスパンを記録しないことをテストします。"""
+    with tracer.span("turn", "turn") as span:
+        span.set_attribute("key", "value")
+
+    assert not tracer.enabled
+    assert not span.recording
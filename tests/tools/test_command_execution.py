@@ -8,7 +8,10 @@ import pytest
 project_root = Path(__file__).resolve().parent.parent.parent
 sys.path.insert(0, str(project_root))
 
-from src.tools.command_execution import run_shell_command
+from src.config import Config
+from src.tools import shell_process
+from src.tools.command_execution import run_shell_command, shell_job_status, kill_shell_job
+from src.tools.shell_process import shell_jobs
 
 
 def test_run_shell_command_success():
@@ -47,3 +50,87 @@ def test_run_shell_command_with_cwd(tmp_path):
     assert f"Directory: {sub_dir}" in result
     assert str(sub_dir) in result # pwdの出力にサブディレクトリのパスが含まれているはず
     assert "Exit Code: 0" in result
+
+def test_run_shell_command_async():
+    """ainvoke でネイティブな非同期実装が使われ、同じ形式の結果を返すことをテストします。"""
+    import asyncio
+    command = "echo 'hello async'"
+    result = asyncio.run(run_shell_command.ainvoke({"command": command}))
+
+    assert f"Command: {command}" in result
+    assert "Stdout: hello async" in result
+    assert "Exit Code: 0" in result
+
+def test_run_shell_command_timeout_kills_process_group(monkeypatch):
+    """タイムアウトしたコマンドが、バックグラウンドで起動した子プロセスを含めて停止されることをテストします。"""
+    import time
+    monkeypatch.setattr(shell_process, "KILL_GRACE_SECONDS", 0.5)
+    command = "sleep 30 & echo started; wait"
+    started = time.monotonic()
+    result = run_shell_command.invoke({"command": command, "timeout": 0.5})
+
+    assert time.monotonic() - started < 10
+    assert "Stdout: started" in result
+    assert "timed out after 0.5 seconds" in result
+
+def test_run_shell_command_async_timeout(monkeypatch):
+    """非同期版でもタイムアウトしたコマンドが停止されることをテストします。"""
+    import asyncio
+    monkeypatch.setattr(shell_process, "KILL_GRACE_SECONDS", 0.5)
+    result = asyncio.run(run_shell_command.ainvoke({"command": "sleep 30", "timeout": 0.3}))
+
+    assert "timed out after 0.3 seconds" in result
+
+def test_run_shell_command_truncates_long_output(monkeypatch):
+    """長い出力は先頭と末尾のみが返され、省略したバイト数が示されることをテストします。"""
+    monkeypatch.setattr(Config, "SHELL_OUTPUT_HEAD_BYTES", 100)
+    monkeypatch.setattr(Config, "SHELL_OUTPUT_TAIL_BYTES", 100)
+    command = f"{sys.executable} -c \"print('first'); print('x' * 100000); print('last')\""
+    result = run_shell_command.invoke({"command": command})
+
+    assert "Stdout: first" in result
+    assert "last" in result
+    assert "バイトを省略しました（合計 100012 バイト）" in result
+    assert len(result) < 1000
+
+def test_background_job_status_and_kill():
+    """バックグラウンドジョブの開始、状態と出力の確認、停止をテストします。"""
+    import re
+    import time
+    started = run_shell_command.invoke({"command": "echo ready; sleep 30", "background": True})
+    job_id = re.search(r"job-\d+", started).group(0)
+
+    deadline = time.monotonic() + 5
+    while "ready" not in shell_job_status.invoke({"job_id": job_id}) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    status = shell_job_status.invoke({"job_id": job_id})
+    assert "実行中" in status and "ready" in status
+    assert job_id in shell_job_status.invoke({})
+
+    assert "を停止しました" in kill_shell_job.invoke({"job_id": job_id})
+    assert "停止済み" in shell_job_status.invoke({"job_id": job_id})
+    assert "見つかりません" in kill_shell_job.invoke({"job_id": "job-999"})
+
+    finished = run_shell_command.invoke({"command": "echo done", "background": True})
+    finished_id = re.search(r"job-\d+", finished).group(0)
+    shell_jobs.get(finished_id).process.wait(5)
+    assert "終了 (Exit Code 0" in shell_job_status.invoke({"job_id": finished_id})
+
+def test_finished_jobs_are_evicted_beyond_the_cap():
+    """終了したジョブは max_finished 件を超えると、最後に状態を確認した時刻が古いものから破棄され、実行中のジョブは残ることをテストします。"""
+    registry = shell_process.JobRegistry(max_finished=2)
+    running = registry.start("sleep 30", None, 1024, 1024)
+    try:
+        first, second = (registry.start(f"echo {i}", None, 1024, 1024) for i in range(2))
+        for job in (first, second):
+            job.process.wait(5)
+        # 最初のジョブの状態を確認したため、2番目のジョブが最も古くなる
+        assert registry.get(first.job_id) is first
+        third = registry.start("echo 2", None, 1024, 1024)
+        third.process.wait(5)
+
+        assert registry.get(third.job_id) is third
+        assert registry.get(second.job_id) is None
+        assert [job.job_id for job in registry.list()] == [running.job_id, first.job_id, third.job_id]
+    finally:
+        registry.kill_all()
@@ -0,0 +1,111 @@
+import sys
+import os
+from pathlib import Path
+import pytest
+
+# Add project root to sys.path to allow importing from src
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.tools import file_operations
+from src.tools.file_cache import FileCache
+from src.tools.file_operations import (
+    read_file,
+    write_file,
+    modify_file_content,
+    move,
+    delete_file,
+    delete_directory,
+    list_directory_contents,
+    search_file_content,
+)
+
+# --- Test Fixtures ---
+@pytest.fixture
+def cache(monkeypatch):
+    """テストごとに空のキャッシュをファイルツールに設定します。"""
+    cache = FileCache(max_bytes=1024 * 1024)
+    monkeypatch.setattr(file_operations, "file_cache", cache)
+    return cache
+
+@pytest.fixture
+def temp_dir(tmp_path):
+    """一時的なディレクトリを作成し、テスト中にそのパスをカレントディレクトリとして使用します。"""
+    original_cwd = os.getcwd()
+    os.chdir(tmp_path)
+    yield tmp_path
+    os.chdir(original_cwd)
+
+# --- Test Cases ---
+
+def test_repeated_reads_hit_the_cache(cache, temp_dir):
+    """同じファイルを繰り返し読むと、2回目以降はキャッシュから返されることをテストします。"""
+    (temp_dir / "a.txt").write_text("needle\nhaystack", encoding="utf-8")
+
+    first = read_file.invoke({"path": "a.txt"})
+    second = read_file.invoke({"path": str(temp_dir / "a.txt")})
+    search_result = search_file_content.invoke({"pattern": "needle", "path": str(temp_dir)})
+
+    # 表示されるパス以外の内容は同じ
+    assert first.split("\n", 1)[1] == second.split("\n", 1)[1]
+    assert "a.txt:1: needle" in search_result
+    # search_file_content はキャッシュを使わずにワーカープロセスでファイルを読む
+    stats = cache.stats()
+    assert (stats.hits, stats.misses) == (1, 1)
+    assert stats.hit_rate == pytest.approx(1 / 2)
+
+def test_external_change_is_detected_by_stat(cache, temp_dir):
+    """ツール以外でファイルが変更された場合も、サイズや更新時刻の変化で新しい内容を読むことをテストします。"""
+    path = temp_dir / "a.txt"
+    path.write_text("古い内容", encoding="utf-8")
+    read_file.invoke({"path": "a.txt"})
+
+    path.write_text("新しい内容です", encoding="utf-8")
+
+    assert "新しい内容です" in read_file.invoke({"path": "a.txt"})
+
+def test_write_tools_invalidate_immediately(cache, temp_dir):
+    """ファイルを変更するツールが、対象のエントリーを直ちに無効化することをテストします。"""
+    write_file.invoke({"path": "a.txt", "content": "one"})
+    read_file.invoke({"path": "a.txt"})
+    list_directory_contents.invoke({"path": str(temp_dir)})
+
+    # 同じサイズの内容に書き換えても、古い内容は返されない
+    modify_file_content.invoke({"path": "a.txt", "old_text": "one", "new_text": "two"})
+    assert "two" in read_file.invoke({"path": "a.txt"})
+
+    move.invoke({"source_path": "a.txt", "destination_path": "b.txt"})
+    assert "b.txt" in list_directory_contents.invoke({"path": str(temp_dir)})
+    assert "見つかりません" in read_file.invoke({"path": "a.txt"})
+
+    delete_file.invoke({"path": "b.txt"})
+    assert cache.stats().entries == 0  # 親ディレクトリの一覧も無効化される
+    assert "b.txt" not in list_directory_contents.invoke({"path": str(temp_dir)})
+
+def test_delete_directory_invalidates_children(cache, temp_dir):
+    """ディレクトリを削除すると、配下のファイルのエントリーも無効化されることをテストします。"""
+    (temp_dir / "sub").mkdir()
+    (temp_dir / "sub" / "a.txt").write_text("内容", encoding="utf-8")
+    read_file.invoke({"path": "sub/a.txt"})
+
+    delete_directory.invoke({"path": "sub"})
+
+    assert cache.stats().entries == 0
+
+def test_lru_is_bounded_by_bytes(temp_dir):
+    """保持する合計バイト数が上限を超えた場合、最後に使用された時刻が古いものから削除されることをテストします。"""
+    cache = FileCache(max_bytes=250)
+    for name in ("a", "b", "c"):
+        (temp_dir / name).write_bytes(b"x" * 100)
+
+    cache.read_text("a")
+    cache.read_text("b")
+    cache.read_text("a")
+    cache.read_text("c")  # b が削除される
+
+    stats = cache.stats()
+    assert (stats.entries, stats.total_bytes, stats.evictions) == (2, 200, 1)
+    cache.read_text("a")
+    assert cache.stats().hits == 2
+    cache.read_text("b")
+    assert cache.stats().misses == 4
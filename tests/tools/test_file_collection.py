@@ -0,0 +1,82 @@
+import sys
+from pathlib import Path
+import pytest
+
+# Add project root to sys.path to allow importing from src
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.config import Config
+from src.tools.file_collection import collect_files
+from src.tools.file_operations import read_many_files
+
+# --- Test Fixtures ---
+@pytest.fixture
+def tree(tmp_path):
+    """.gitignore と既定で除外されるディレクトリを含む作業ディレクトリ。"""
+    (tmp_path / ".git").mkdir()
+    (tmp_path / ".gitignore").write_text("dist/\n*.secret\n", encoding="utf-8")
+    for name in ("src/pkg", "dist", "node_modules/lib", ".venv/lib", "docs"):
+        (tmp_path / name).mkdir(parents=True, exist_ok=True)
+    (tmp_path / "src" / "main.py").write_text("print('main')\n", encoding="utf-8")
+    (tmp_path / "src" / "pkg" / "util.py").write_text("def util():\n    pass\n", encoding="utf-8")
+    (tmp_path / "src" / "pkg" / "data.json").write_text("{}\n", encoding="utf-8")
+    (tmp_path / "src" / "token.secret").write_text("secret\n", encoding="utf-8")
+    (tmp_path / "dist" / "bundle.py").write_text("bundle\n", encoding="utf-8")
+    (tmp_path / "node_modules" / "lib" / "index.js").write_text("module\n", encoding="utf-8")
+    (tmp_path / ".venv" / "lib" / "site.py").write_text("site\n", encoding="utf-8")
+    (tmp_path / "docs" / "guide.md").write_text("# Guide\n", encoding="utf-8")
+    (tmp_path / "docs" / "run.log").write_text("log\n", encoding="utf-8")
+    return tmp_path
+
+def _relative(paths, root):
+    return [Path(p).relative_to(root).as_posix() for p in paths]
+
+# --- Test Cases ---
+
+def test_collect_prunes_excluded_directories_and_gitignore(tree):
+    """既定の除外パターンと .gitignore に一致するファイル・ディレクトリを除き、名前順に返すことをテストします。"""
+    assert _relative(collect_files([str(tree / "src"), str(tree / "docs")]), tree) == [
+        "docs/guide.md", "src/main.py", "src/pkg/data.json", "src/pkg/util.py",
+    ]
+    # 明示的に指定したファイルには .gitignore を適用しない
+    assert _relative(collect_files([str(tree / "src" / "token.secret")]), tree) == ["src/token.secret"]
+    assert "dist/bundle.py" in _relative(collect_files([str(tree)], use_gitignore=False), tree)
+    assert "node_modules/lib/index.js" in _relative(collect_files([str(tree)], use_default_excludes=False), tree)
+
+def test_collect_glob_recursive_include_and_exclude(tree):
+    """glob パターン、非再帰の走査、include と exclude による絞り込みをテストします。"""
+    assert _relative(collect_files([str(tree / "**" / "*.py")]), tree) == ["src/main.py", "src/pkg/util.py"]
+    assert _relative(collect_files([str(tree / "src" / "*.py")]), tree) == ["src/main.py"]
+    assert _relative(collect_files([str(tree / "src")], recursive=False), tree) == ["src/main.py"]
+    assert _relative(collect_files([str(tree / "src")], include=["*.json"]), tree) == ["src/pkg/data.json"]
+    assert _relative(collect_files([str(tree / "src")], exclude=["pkg/"]), tree) == ["src/main.py"]
+
+def test_read_many_files_outputs_path_headers_and_skips_binary(tree):
+    """各ファイルの内容がパスの見出し付きで名前順に出力され、バイナリファイルは読み飛ばされることをテストします。"""
+    (tree / "src" / "blob.dat").write_bytes(b"\x00\x01binary")
+
+    result = read_many_files.invoke({"paths": [str(tree / "src")]})
+
+    assert result == "\n".join([
+        f"--- {tree / 'src' / 'main.py'} ---", "print('main')", "",
+        f"--- {tree / 'src' / 'pkg' / 'data.json'} ---", "{}", "",
+        f"--- {tree / 'src' / 'pkg' / 'util.py'} ---", "def util():", "    pass", "",
+        "--- End of content ---",
+    ])
+    assert "見つかりませんでした" in read_many_files.invoke({"paths": [str(tree / "missing")]})
+
+def test_read_many_files_truncates_at_output_budget(tmp_path, monkeypatch):
+    """出力の上限に達すると行の区切りで打ち切り、省略したファイルを示すことをテストします。"""
+    monkeypatch.setattr(Config, "READ_MANY_FILES_MAX_BYTES", 200)
+    for i in range(5):
+        (tmp_path / f"f{i}.txt").write_text("".join(f"line {n}\n" for n in range(10)), encoding="utf-8")
+
+    result = read_many_files.invoke({"paths": [str(tmp_path)]})
+
+    content, marker = result.split("\n--- [truncated]")
+    assert len(content.encode("utf-8")) <= 200 and content.endswith("line 9\n")
+    assert result.startswith(f"--- {tmp_path / 'f0.txt'} ---\nline 0\n")
+    assert "--- [truncated] 出力の上限 (200 バイト)" in result
+    assert f"{tmp_path / 'f1.txt'}, {tmp_path / 'f2.txt'}" in marker and str(tmp_path / "f4.txt") in marker
+    assert result.endswith("--- End of content ---")
@@ -0,0 +1,122 @@
+import sys
+import os
+from pathlib import Path
+import pytest
+
+# Add project root to sys.path to allow importing from src
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.tools.file_operations import apply_patch, read_file
+from src.tools.file_patch import PatchError, apply_hunks, atomic_write, parse_unified_diff
+
+# --- Test Fixtures ---
+@pytest.fixture
+def temp_dir(tmp_path):
+    """一時的なディレクトリを作成し、テスト中にそのパスをカレントディレクトリとして使用します。"""
+    original_cwd = os.getcwd()
+    os.chdir(tmp_path)
+    (tmp_path / "app.py").write_text("".join(f"line {i}\n" for i in range(1, 21)), encoding="utf-8")
+    yield tmp_path
+    os.chdir(original_cwd)
+
+# --- Test Cases ---
+
+def test_apply_unified_diff_with_shifted_line_numbers(temp_dir):
+    """行番号がずれたハンクも文脈行の一致する位置に適用され、新規作成と削除を含む複数ファイルを一度に変更できることをテストします。"""
+    (temp_dir / "old.txt").write_text("obsolete\n", encoding="utf-8")
+    patch = "\n".join([
+        "diff --git a/app.py b/app.py",
+        "--- a/app.py",
+        "+++ b/app.py",
+        "@@ -1,3 +1,3 @@",
+        " line 1",
+        "-line 2",
+        "+line two",
+        " line 3",
+        "@@ -30,3 +30,4 @@",  # 実際は 14 行目付近
+        " line 14",
+        " line 15",
+        "+inserted",
+        " line 16",
+        "--- /dev/null",
+        "+++ b/pkg/new.py",
+        "@@ -0,0 +1,2 @@",
+        "+def new():",
+        "+    pass",
+        "--- a/old.txt",
+        "+++ /dev/null",
+        "@@ -1 +0,0 @@",
+        "-obsolete",
+    ])
+
+    result = apply_patch.invoke({"patch": patch})
+
+    assert "3 個のファイルに変更を適用しました" in result
+    assert "- app.py: +2 -1 行" in result
+    lines = (temp_dir / "app.py").read_text(encoding="utf-8").splitlines()
+    assert lines[1] == "line two" and lines[15] == "inserted" and len(lines) == 21
+    assert (temp_dir / "pkg" / "new.py").read_text(encoding="utf-8") == "def new():\n    pass\n"
+    assert not (temp_dir / "old.txt").exists()
+
+def test_failed_hunk_leaves_every_file_untouched(temp_dir):
+    """1つでも一致しないハンクがある場合、他のファイルも含めて何も変更しないことをテストします。"""
+    (temp_dir / "other.py").write_text("a = 1\n", encoding="utf-8")
+    before = (temp_dir / "app.py").read_bytes()
+    patch = "--- a/other.py\n+++ b/other.py\n@@ -1 +1 @@\n-a = 1\n+a = 2\n--- a/app.py\n+++ b/app.py\n@@ -1 +1 @@\n-no such line\n+x\n"
+
+    result = apply_patch.invoke({"patch": patch})
+
+    assert "ファイルは変更されていません" in result and "no such line" in result
+    assert (temp_dir / "other.py").read_text(encoding="utf-8") == "a = 1\n"
+    assert (temp_dir / "app.py").read_bytes() == before
+
+def test_rename_diff_moves_the_patched_file(temp_dir):
+    """変更前と変更後のパスが異なり、変更後のファイルがない diff は、変更前のファイルにハンクを適用して名前を変更することをテストします。"""
+    (temp_dir / "old.txt").write_text("keep\nold\n", encoding="utf-8")
+    patch = "--- a/old.txt\n+++ b/new.txt\n@@ -1,2 +1,2 @@\n keep\n-old\n+new\n"
+
+    result = apply_patch.invoke({"patch": patch})
+
+    assert "2 個のファイルに変更を適用しました" in result
+    assert (temp_dir / "new.txt").read_text(encoding="utf-8") == "keep\nnew\n"
+    assert not (temp_dir / "old.txt").exists()
+
+    # 変更前のファイルもない場合は、変更後のパスが見つからないエラーにする
+    result = apply_patch.invoke({"patch": patch.replace("new.txt", "other.txt")})
+    assert "ファイル 'other.txt' が見つかりません" in result
+
+def test_anchored_edits(temp_dir):
+    """edits は順に適用され、一意でない old_text は replace_all を指定しない限りエラーになることをテストします。"""
+    result = apply_patch.invoke({"path": "app.py", "edits": [
+        {"old_text": "line 1\n", "new_text": "first\n"},
+        {"old_text": "line 20", "new_text": "last"},
+    ]})
+    assert "+2 -2 行" in result
+    content = read_file.invoke({"path": "app.py"})
+    assert "first" in content and "last" in content and "line 1\n" not in content
+
+    assert "10 箇所あります" in apply_patch.invoke({"path": "app.py", "edits": [{"old_text": "line 1", "new_text": "x"}]})
+    apply_patch.invoke({"path": "app.py", "edits": [{"old_text": "line 1", "new_text": "x", "replace_all": True}]})
+    assert "line 1" not in (temp_dir / "app.py").read_text(encoding="utf-8")
+
+def test_crlf_and_missing_final_newline_are_preserved():
+    """CRLF の改行文字と、ファイル末尾の改行の有無が維持されることをテストします。"""
+    patch = "--- a/f\n+++ b/f\n@@ -1,2 +1,2 @@\n a\n-b\n+c\n"
+    hunks = parse_unified_diff(patch)[0].hunks
+    assert apply_hunks("a\r\nb\r\n", hunks) == "a\r\nc\r\n"
+    assert apply_hunks("a\nb", parse_unified_diff(patch + "\\ No newline at end of file\n")[0].hunks) == "a\nc"
+    with pytest.raises(PatchError):
+        parse_unified_diff("not a diff")
+
+def test_atomic_write_preserves_mode_and_leaves_no_temp_file(tmp_path):
+    """atomic_write が既存のファイルのパーミッションを維持し、一時ファイルを残さないことをテストします。"""
+    path = tmp_path / "script.sh"
+    path.write_text("old\n", encoding="utf-8")
+    path.chmod(0o755)
+
+    atomic_write(str(path), "new\n")
+
+    assert path.read_text(encoding="utf-8") == "new\n"
+    assert path.stat().st_mode & 0o777 == 0o755
+    assert [p.name for p in tmp_path.iterdir()] == ["script.sh"]
@@ -0,0 +1,112 @@
+import sys
+from pathlib import Path
+import pytest
+
+# Add project root to sys.path to allow importing from src
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.config import Config
+from src.tools import file_reader
+from src.tools.file_operations import read_file
+
+LINES = 1000
+
+# --- Test Fixtures ---
+@pytest.fixture
+def log_file(tmp_path):
+    """索引の間隔 (LINE_INDEX_STRIDE) をまたぐ行数のファイル。"""
+    path = tmp_path / "app.log"
+    path.write_text("".join(f"line {i}\n" for i in range(1, LINES + 1)), encoding="utf-8")
+    return path
+
+# --- Test Cases ---
+
+def test_line_range(log_file):
+    """指定した行範囲のみが返されることをテストします。"""
+    result = read_file.invoke({"path": str(log_file), "start_line": 300, "end_line": 302})
+
+    assert f"300〜302 行目 (全 {LINES} 行" in result
+    assert "---\nline 300\nline 301\nline 302\n\n---" in result
+    assert "line 299" not in result and "line 303" not in result
+
+def test_line_range_is_truncated_at_line_boundary(log_file, monkeypatch):
+    """出力が上限を超える場合は行の区切りで切り詰め、続きの行番号を案内することをテストします。"""
+    monkeypatch.setattr(Config, "READ_FILE_MAX_BYTES", 40)
+
+    result = read_file.invoke({"path": str(log_file), "start_line": 10})
+
+    # "line 10\n" から "line 14\n" までの5行 (40バイト) が上限に収まる
+    assert "10〜14 行目" in result
+    assert "line 14\n" in result and "line 15" not in result
+    assert "start_line=15" in result
+
+def test_long_line_is_cut_with_byte_offset_to_resume(tmp_path, monkeypatch):
+    """1行が上限を超える場合は行の途中で切ったことを示し、続きをバイト範囲で読み込む位置を案内することをテストします。"""
+    monkeypatch.setattr(Config, "READ_FILE_MAX_BYTES", 20)
+    path = tmp_path / "min.js"
+    path.write_text("short\n" + "あ" * 30 + "\nnext\n", encoding="utf-8")
+
+    part = file_reader.read_lines(str(path), 2, None, 20)
+    # UTF-8 の文字（3バイト）の途中では切らない
+    assert (part.text, part.end, part.resume_byte) == ("あ" * 6, 2, 6 + 18)
+
+    result = read_file.invoke({"path": str(path), "start_line": 2})
+    assert "2〜2 行目" in result and "2 行目を途中で切りました" in result
+    assert "start_byte=24" in result and "start_line=3" not in result
+    assert read_file.invoke({"path": str(path), "start_byte": 24}).count("あ") == 6
+
+def test_byte_range(log_file):
+    """指定したバイト範囲のみが返されることをテストします。"""
+    result = read_file.invoke({"path": str(log_file), "start_byte": 7, "end_byte": 14})
+
+    assert "7〜14 バイト目" in result
+    assert "---\nline 2\n\n---" in result
+
+def test_line_and_byte_ranges_are_exclusive(log_file):
+    """行範囲とバイト範囲を同時に指定するとエラーになることをテストします。"""
+    result = read_file.invoke({"path": str(log_file), "start_line": 1, "start_byte": 0})
+
+    assert "同時に指定できません" in result
+
+def test_large_file_defaults_to_head_and_tail_preview(log_file, monkeypatch):
+    """大きなファイルを範囲を指定せずに読み込むと、先頭と末尾と行数・サイズのみが返されることをテストします。"""
+    monkeypatch.setattr(Config, "READ_FILE_MAX_BYTES", 1024)
+    monkeypatch.setattr(Config, "READ_FILE_PREVIEW_LINES", 3)
+
+    result = read_file.invoke({"path": str(log_file)})
+
+    assert f"全 {LINES} 行, {log_file.stat().st_size} バイト" in result
+    assert "line 1\nline 2\nline 3\n" in result
+    assert f"line {LINES - 2}\nline {LINES - 1}\nline {LINES}\n" in result
+    assert f"4〜{LINES - 3} 行目の {LINES - 6} 行を省略" in result
+    assert "line 500\n" not in result
+
+def test_small_file_is_returned_whole(tmp_path):
+    """上限以下のファイルは従来どおり全体が返されることをテストします。"""
+    path = tmp_path / "a.txt"
+    path.write_text("こんにちは", encoding="utf-8")
+
+    assert read_file.invoke({"path": str(path)}) == f"ファイル '{path}' の内容:\n---\nこんにちは\n---"
+
+def test_index_is_rebuilt_when_file_changes(log_file):
+    """ファイルが変更された場合、行オフセットの索引が作り直されることをテストします。"""
+    assert file_reader.read_lines(str(log_file), 600, 600, 1024).text == "line 600\n"
+
+    log_file.write_text("".join(f"row {i}\n" for i in range(1, 700)), encoding="utf-8")
+
+    part = file_reader.read_lines(str(log_file), 600, 600, 1024)
+    assert part.text == "row 600\n"
+    assert part.total_lines == 699
+
+def test_last_line_without_newline_and_empty_file(tmp_path):
+    """末尾に改行がない最後の行と、空のファイルを扱えることをテストします。"""
+    path = tmp_path / "a.txt"
+    path.write_bytes(b"a\nb")
+    empty = tmp_path / "empty.txt"
+    empty.write_bytes(b"")
+
+    part = file_reader.read_lines(str(path), 2, None, 1024)
+    assert (part.text, part.total_lines) == ("b", 2)
+    assert file_reader.read_lines(str(empty), 1, None, 1024).total_lines == 0
+    assert file_reader.preview(str(empty), 3, 1024).size == 0
@@ -0,0 +1,106 @@
+import sys
+import os
+from pathlib import Path
+import pytest
+
+# Add project root to sys.path to allow importing from src
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.tools.file_operations import batch_file_operations, describe_operations
+
+# --- Test Fixtures ---
+@pytest.fixture
+def temp_dir(tmp_path):
+    """一時的なディレクトリを作成し、テスト中にそのパスをカレントディレクトリとして使用します。"""
+    original_cwd = os.getcwd()
+    os.chdir(tmp_path)
+    (tmp_path / "keep.txt").write_text("original\n", encoding="utf-8")
+    (tmp_path / "old").mkdir()
+    (tmp_path / "old" / "data.txt").write_text("data\n", encoding="utf-8")
+    yield tmp_path
+    os.chdir(original_cwd)
+
+def _snapshot(root: Path) -> dict[str, str]:
+    return {p.relative_to(root).as_posix(): (p.read_text(encoding="utf-8") if p.is_file() else "<dir>") for p in sorted(root.rglob("*"))}
+
+# --- Test Cases ---
+
+def test_batch_applies_operations_in_order(temp_dir):
+    """操作が順に実行され、親ディレクトリの作成・上書き・パッチ・移動・削除をまとめて行えることをテストします。"""
+    result = batch_file_operations.invoke({"operations": [
+        {"op": "write_file", "path": "proj/src/main.py", "content": "print('hi')\n"},
+        {"op": "write_file", "path": "keep.txt", "content": "changed\n"},
+        {"op": "apply_patch", "path": "proj/src/main.py", "edits": [{"old_text": "hi", "new_text": "hello"}]},
+        {"op": "create_directory", "path": "proj/docs"},
+        {"op": "move", "source_path": "old/data.txt", "destination_path": "proj/docs"},
+        {"op": "delete_directory", "path": "old"},
+    ]})
+
+    assert result.splitlines()[0] == "6 件の操作を実行しました。"
+    assert "  5. move old/data.txt -> proj/docs" in result
+    assert _snapshot(temp_dir) == {
+        "keep.txt": "changed\n",
+        "proj": "<dir>", "proj/docs": "<dir>", "proj/docs/data.txt": "data\n",
+        "proj/src": "<dir>", "proj/src/main.py": "print('hello')\n",
+    }
+
+def test_failed_operation_rolls_back_everything(temp_dir):
+    """途中の操作が失敗した場合、それまでの上書き・削除・作成が全て元に戻り、バックアップも残らないことをテストします。"""
+    before = _snapshot(temp_dir)
+
+    result = batch_file_operations.invoke({"operations": [
+        {"op": "write_file", "path": "keep.txt", "content": "changed\n"},
+        {"op": "write_file", "path": "new/deep/file.txt", "content": "x"},
+        {"op": "delete_directory", "path": "old"},
+        {"op": "move", "source_path": "keep.txt", "destination_path": "moved.txt"},
+        {"op": "delete_file", "path": "missing.txt"},
+    ]})
+
+    assert "操作 5 (delete_file missing.txt) が失敗したため、全ての変更を元に戻しました" in result
+    assert _snapshot(temp_dir) == before
+
+@pytest.mark.parametrize("fail", [False, True], ids=["commit", "rollback"])
+def test_parent_of_backed_up_child_can_be_deleted_or_moved(temp_dir, fail):
+    """子のファイルを変更した後に親や祖先のディレクトリを削除・移動でき、確定・取り消しのどちらでもバックアップが残らないことをテストします。"""
+    (temp_dir / "a" / "b").mkdir(parents=True)
+    (temp_dir / "a" / "x.txt").write_text("x\n", encoding="utf-8")
+    (temp_dir / "a" / "b" / "y.txt").write_text("y\n", encoding="utf-8")
+    before = _snapshot(temp_dir)
+    operations = [
+        {"op": "delete_file", "path": "a/x.txt"},
+        {"op": "write_file", "path": "a/b/y.txt", "content": "changed\n"},
+        {"op": "move", "source_path": "a", "destination_path": "moved"},
+        {"op": "delete_file", "path": "old/data.txt"},
+        {"op": "delete_directory", "path": "old"},
+    ]
+    if fail:
+        operations.append({"op": "delete_file", "path": "missing.txt"})
+
+    result = batch_file_operations.invoke({"operations": operations})
+
+    if fail:
+        assert "全ての変更を元に戻しました" in result
+        assert _snapshot(temp_dir) == before
+    else:
+        assert result.splitlines()[0] == "5 件の操作を実行しました。"
+        assert _snapshot(temp_dir) == {"keep.txt": "original\n", "moved": "<dir>", "moved/b": "<dir>", "moved/b/y.txt": "changed\n"}
+
+def test_invalid_operations_are_rejected_before_any_change(temp_dir):
+    """形式が不正な操作が含まれる場合、何も実行しないことをテストします。"""
+    result = batch_file_operations.invoke({"operations": [
+        {"op": "write_file", "path": "a.txt", "content": "a"},
+        {"op": "chmod", "path": "a.txt"},
+    ]})
+
+    assert "操作 2" in result and "ファイルは変更されていません" in result
+    assert not (temp_dir / "a.txt").exists()
+
+def test_describe_operations_omits_contents():
+    """承認時に表示する操作の一覧に、ファイルの内容が含まれないことをテストします。"""
+    description = describe_operations([
+        {"op": "write_file", "path": "a.py", "content": "secret body" * 100},
+        {"op": "delete_file", "path": "b.py"},
+    ])
+
+    assert description == "  1. write_file a.py (1100 文字)\n  2. delete_file b.py"
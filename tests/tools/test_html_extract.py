@@ -0,0 +1,88 @@
+import sys
+from pathlib import Path
+import pytest
+
+# Add project root to sys.path to allow importing from src
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.core.token_accounting import estimate_text_tokens
+from src.tools.html_extract import extract_main_content, truncate_to_tokens
+
+FIXTURES_DIR = project_root / "benchmarks" / "fixtures" / "web"
+
+# --- Test Fixtures ---
+@pytest.fixture
+def page_html():
+    """定型部分（ナビゲーション・サイドバー・フッター・スクリプト）に囲まれた記事のページ。"""
+    return """<!DOCTYPE html><html><head><title>Sample article</title>
+<style>body { color: red }</style><script>window.config = {"tracking": true};</script></head>
+<body>
+<header class="site-header"><a href="/">Logo</a></header>
+<nav><ul><li><a href="/news">News</a><li><a href="/sports">Sports</a></ul></nav>
+<div class="layout">
+  <div class="sidebar"><h3>Popular</h3><ul><li><a href="/p/1">Popular post one</a></ul></div>
+  <div id="story">
+    <h1>Main heading</h1>
+    <p>The first paragraph of the article is long enough to be counted, and it has commas.
+    <p>Read the <a href="details.html">details</a> or run <code>make test</code>.<br>Second line.
+    <h2>Steps</h2>
+    <ol><li>Install<li>Configure<ul><li>Edit the file</ul><li>Run</ol>
+    <table><tr><th>Key<th>Value<tr><td>a | b<td>1</table>
+    <pre><code class="language-python">def main():
+    return 0
+</code></pre>
+    <div style="display: none">Hidden text</div>
+  </div>
+</div>
+<footer>Copyright footer</footer>
+</body></html>"""
+
+# --- Test Cases ---
+
+def test_removes_boilerplate_and_finds_main_content(page_html):
+    """スクリプト・スタイル・非表示の要素・ナビゲーション・サイドバー・フッターを除き、本文のみを抜き出すことをテストします。"""
+    page = extract_main_content(page_html, "https://example.com/blog/post.html")
+
+    assert page.title == "Sample article"
+    assert page.text.startswith("# Main heading\n\nThe first paragraph")
+    for boilerplate in ("tracking", "color: red", "Logo", "Sports", "Popular post", "Hidden text", "Copyright"):
+        assert boilerplate not in page.text
+
+def test_renders_markdown(page_html):
+    """見出し・リンク（絶対URL）・コード・改行・入れ子のリスト・表・コードブロックを Markdown 風に出力することをテストします。"""
+    text = extract_main_content(page_html, "https://example.com/blog/post.html").text
+
+    assert "Read the [details](https://example.com/blog/details.html) or run `make test`.\nSecond line." in text
+    assert "## Steps\n\n1. Install\n2. Configure\n  - Edit the file\n3. Run" in text
+    assert "| Key | Value |\n| --- | --- |\n| a \\| b | 1 |" in text
+    assert "```python\ndef main():\n    return 0\n```" in text
+
+def test_truncate_to_tokens():
+    """上限を超えた本文を段落の区切りで打ち切り、全体のトークン数を返すことをテストします。"""
+    text = "\n\n".join(f"paragraph {i} " + "word " * 20 for i in range(50))
+    total = estimate_text_tokens(text)
+
+    truncated, counted = truncate_to_tokens(text, 200)
+    assert counted == total
+    assert estimate_text_tokens(truncated) <= 200
+    assert truncated.startswith("paragraph 0 ") and truncated.endswith("word ")
+    assert truncate_to_tokens(text, 0) == (text, total)
+    # 最初の段落だけで上限を超える場合も空にはしない
+    assert 0 < len(truncate_to_tokens("x" * 10_000, 100)[0]) < 10_000
+
+@pytest.mark.parametrize("name, expected", [
+    ("news_article.html", "retail sales on corridors with new bike lanes"),
+    ("docs_page.html", "| `attempts` | `3` | Total number of calls, including the first one. |"),
+    ("blog_ja.html", "## モジュールごとに厳しくしていく"),
+    ("product_spa.html", "- 40-hour battery life (30 hours with ANC on)"),
+])
+def test_fixture_corpus_token_reduction(name, expected):
+    """フィクスチャのページで、本文を保ったまま HTML のトークン数を大幅に削減できることをテストします。"""
+    html = (FIXTURES_DIR / name).read_text(encoding="utf-8")
+    text = extract_main_content(html, "https://example.com/").text
+
+    assert expected in text
+    assert estimate_text_tokens(text) * 4 < estimate_text_tokens(html)
+    for boilerplate in ("dataLayer", "__NEXT_DATA__", "adsbygoogle", "cookies", "Privacy"):
+        assert boilerplate not in text
@@ -0,0 +1,132 @@
+import sys
+import time
+from pathlib import Path
+import pytest
+
+# Add project root to sys.path to allow importing from src
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.config import Config
+from src.tools import search_engine
+from src.tools.file_operations import search_file_content
+from src.tools.path_matcher import PathMatcher
+
+# --- Test Fixtures ---
+@pytest.fixture
+def tree(tmp_path):
+    """.gitignore と除外対象のディレクトリを含む作業ディレクトリ。"""
+    (tmp_path / ".git").mkdir()
+    (tmp_path / ".gitignore").write_text("build/\n*.log\n!keep.log\n/top.txt\n", encoding="utf-8")
+    for name in ("src", "src/build", "build", "node_modules/pkg", "docs"):
+        (tmp_path / name).mkdir(parents=True, exist_ok=True)
+    (tmp_path / "src" / "a.py").write_text("import os\nneedle = 1\n", encoding="utf-8")
+    (tmp_path / "src" / "build" / "gen.py").write_text("needle\n", encoding="utf-8")
+    (tmp_path / "src" / "top.txt").write_text("needle\n", encoding="utf-8")
+    (tmp_path / "build" / "out.py").write_text("needle\n", encoding="utf-8")
+    (tmp_path / "node_modules" / "pkg" / "index.js").write_text("needle\n", encoding="utf-8")
+    (tmp_path / "docs" / "app.log").write_text("needle\n", encoding="utf-8")
+    (tmp_path / "docs" / "keep.log").write_text("needle\n", encoding="utf-8")
+    (tmp_path / "top.txt").write_text("needle\n", encoding="utf-8")
+    (tmp_path / "image.bin").write_bytes(b"\x89PNG\0\0needle\n")
+    return tmp_path
+
+@pytest.fixture(params=[1, 2], ids=["sequential", "pool"])
+def workers(request, monkeypatch):
+    monkeypatch.setattr(Config, "SEARCH_WORKERS", request.param)
+    return request.param
+
+# --- Test Cases ---
+
+def test_walk_prunes_ignored_directories_and_files(tree):
+    """.gitignore の規則（否定とルート基準のパターンを含む）と既定の除外ディレクトリに従って、各ディレクトリのファイル、サブディレクトリの順に列挙することをテストします。"""
+    paths = [Path(p).relative_to(tree).as_posix() for p in PathMatcher.for_directory(str(tree)).walk(str(tree))]
+
+    assert paths == [".gitignore", "image.bin", "docs/keep.log", "src/a.py", "src/top.txt"]
+
+def test_nested_gitignore_and_parent_rules(tree):
+    """サブディレクトリの .gitignore と、検索を開始したディレクトリより上の .gitignore が適用されることをテストします。"""
+    (tree / "src" / ".gitignore").write_text("a.py\n", encoding="utf-8")
+    docs = tree / "docs"
+
+    assert list(PathMatcher.for_directory(str(tree)).walk(str(tree / "src"))) == [
+        str(tree / "src" / ".gitignore"), str(tree / "src" / "top.txt"),
+    ]
+    assert list(PathMatcher.for_directory(str(docs)).walk(str(docs))) == [str(docs / "keep.log")]
+
+def test_search_skips_ignored_and_binary_files(tree, workers):
+    """除外されたファイルとバイナリファイルを検索せず、従来どおりの形式で結果を返すことをテストします。"""
+    result = search_file_content.invoke({"pattern": "needle", "path": str(tree)})
+
+    assert result.splitlines() == [
+        f"{tree / 'docs' / 'keep.log'}:1: needle",
+        f"{tree / 'src' / 'a.py'}:2: needle = 1",
+        f"{tree / 'src' / 'top.txt'}:1: needle",
+    ]
+    assert "見つかりませんでした" in search_file_content.invoke({"pattern": "needle", "path": str(tree), "include": "*.md"})
+
+def test_max_results_stops_early(tmp_path, workers):
+    """一致した行が max_results 件に達すると検索を打ち切り、その旨を表示することをテストします。"""
+    for i in range(100):
+        (tmp_path / f"f{i:03}.txt").write_text("hit\nmiss\nhit\n", encoding="utf-8")
+
+    result = search_engine.search("hit", str(tmp_path), max_results=5, workers=workers)
+    assert result.match_count == 5 and result.truncated
+    assert [Path(m.path).name for m in result.files] == ["f000.txt", "f001.txt", "f002.txt"]
+    assert result.files_scanned < 100
+
+    output = search_file_content.invoke({"pattern": "hit", "path": str(tmp_path), "max_results": 3})
+    assert len(output.splitlines()) == 4
+    assert "3 件に達したため" in output
+
+def test_context_lines(tmp_path, workers):
+    """前後の行が grep と同様の形式で表示され、離れた範囲の間に区切りが入ることをテストします。"""
+    path = tmp_path / "a.txt"
+    path.write_text("".join(f"line {i}\n" for i in range(1, 11)).replace("line 3", "match 3").replace("line 8", "match 8"), encoding="utf-8")
+
+    result = search_file_content.invoke({"pattern": "match", "path": str(tmp_path), "context_lines": 1})
+
+    assert result.splitlines() == [
+        f"{path}-2- line 2", f"{path}:3: match 3", f"{path}-4- line 4",
+        "--",
+        f"{path}-7- line 7", f"{path}:8: match 8", f"{path}-9- line 9",
+    ]
+
+def test_pathological_regex_is_stopped_by_time_budget(tmp_path, monkeypatch):
+    """照合が終わらない正規表現でも、時間の上限を過ぎるとワーカーを停止して結果を返すことをテストします。"""
+    monkeypatch.setattr(Config, "SEARCH_WORKERS", 2)
+    monkeypatch.setattr(Config, "SEARCH_TIMEOUT", 0.5)
+    monkeypatch.setattr(search_engine, "TIMEOUT_GRACE_SECONDS", 0.2)
+    (tmp_path / "a.txt").write_text("a" * 64 + "b\n", encoding="utf-8")
+
+    started = time.monotonic()
+    result = search_file_content.invoke({"pattern": "(a+)+$", "path": str(tmp_path)})
+
+    assert time.monotonic() - started < 5
+    assert "検索時間の上限" in result
+    # プールは作り直され、次の検索は通常どおり実行される
+    assert f"{tmp_path / 'a.txt'}:1:" in search_file_content.invoke({"pattern": "b$", "path": str(tmp_path)})
+
+def test_invalid_regex_returns_error(tmp_path):
+    """不正な正規表現の場合はエラーメッセージを返すことをテストします。"""
+    assert "不正です" in search_file_content.invoke({"pattern": "(", "path": str(tmp_path)})
+
+def test_timeout_keeps_pool_used_by_other_searches(tmp_path, monkeypatch):
+    """時間の上限を過ぎた検索があっても、同時に実行中の検索が使用しているプールは終了せず、使い終わった後に作り直すことをテストします。"""
+    monkeypatch.setattr(search_engine, "TIMEOUT_GRACE_SECONDS", 0.2)
+    (tmp_path / "a.txt").write_text("a" * 64 + "b\n", encoding="utf-8")
+
+    # 同時に実行中の別の検索として、プールを使用中にしておく
+    pool, _, _ = search_engine._worker_pool.acquire(2)
+    try:
+        # ワーカー数が異なる検索も、使用中のプールを終了せずにそのまま使用する
+        assert search_engine.search("b$", str(tmp_path), workers=3).match_count == 1
+        assert search_engine.search("(a+)+$", str(tmp_path), timeout=0.5, workers=2).timed_out
+        assert pool.apply(len, ("abc",)) == 3
+    finally:
+        search_engine._worker_pool.release(pool)
+
+    assert search_engine.search("b$", str(tmp_path), workers=2).match_count == 1
+    replaced, _, _ = search_engine._worker_pool.acquire(2)
+    search_engine._worker_pool.release(replaced)
+    assert replaced is not pool
@@ -0,0 +1,92 @@
+import sys
+import os
+from pathlib import Path
+import pytest
+
+# Add project root to sys.path to allow importing from src
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.config import Config
+from src.tools import search_index
+from src.tools.file_operations import search_file_content, write_file
+from src.tools.search_index import SearchIndex, build_query
+
+# --- Test Fixtures ---
+@pytest.fixture
+def tree(tmp_path):
+    root = tmp_path / "repo"
+    (root / "pkg").mkdir(parents=True)
+    (root / "pkg" / "a.py").write_text("def load_config():\n    return None\n", encoding="utf-8")
+    (root / "pkg" / "b.py").write_text("def save_state():\n    return None\n", encoding="utf-8")
+    (root / "c.txt").write_text("Load_Config is documented here\n", encoding="utf-8")
+    return root
+
+@pytest.fixture
+def index(tmp_path, tree):
+    index = SearchIndex.from_path(str(tmp_path / "index.sqlite"))
+    index.add_root(str(tree))
+    yield index
+    index.close()
+
+@pytest.fixture
+def enabled_index(tmp_path, tree, monkeypatch):
+    """search_file_content が使用する索引を、テストごとの一時ファイルに作成します。"""
+    monkeypatch.setattr(Config, "SEARCH_INDEX", "true")
+    monkeypatch.setattr(Config, "SEARCH_INDEX_PATH", str(tmp_path / "index.sqlite"))
+    monkeypatch.setattr(search_index, "_index", None)
+    yield
+    if search_index._index is not None:
+        search_index._index.close()
+
+def _names(paths):
+    return sorted(Path(path).name for path in paths)
+
+# --- Test Cases ---
+
+def test_build_query_extracts_required_trigrams():
+    """正規表現から、一致する行が必ず含む単語のトライグラムの条件を求めることをテストします。"""
+    assert build_query("load_config") == build_query("LOAD_CONFIG")  # 索引は小文字で照合する
+    assert len(build_query(r"(load|save)_\w+\(")) == 2
+    assert build_query(r"ab.c") is None
+    assert build_query(r"(load|x)") is None  # 選択肢の1つが絞り込めない場合は全体も絞り込めない
+    assert build_query(r"\w+") is None
+
+def test_candidates_are_narrowed_by_index(index, tree):
+    """パターンの文字列を含むファイルのみが候補になり、大文字と小文字の違いは候補に含まれることをテストします。"""
+    assert _names(index.candidate_paths(str(tree), r"load_config\(")) == ["a.py", "c.txt"]
+    assert _names(index.candidate_paths(str(tree), r"(load|save)_\w+\(")) == ["a.py", "b.py", "c.txt"]
+    assert _names(index.candidate_paths(str(tree), r"never_seen_word")) == []
+    # 絞り込めないパターンでは全てのファイルが候補になる
+    assert _names(index.candidate_paths(str(tree), r"\w+")) == ["a.py", "b.py", "c.txt"]
+
+def test_refresh_is_incremental(index, tree):
+    """変更・追加・削除されたファイルのみが索引に反映されることをテストします。"""
+    assert index.refresh(str(tree)).indexed == 3
+    assert index.refresh(str(tree)).indexed == 0
+
+    (tree / "pkg" / "b.py").write_text("def load_config_v2():\n", encoding="utf-8")
+    (tree / "d.py").write_text("load_config()\n", encoding="utf-8")
+    (tree / "c.txt").unlink()
+
+    stats = index.refresh(str(tree))
+    assert (stats.indexed, stats.removed) == (2, 1)
+    assert _names(index.candidate_paths(str(tree), "load_config")) == ["a.py", "b.py", "d.py"]
+
+def test_search_file_content_uses_index_and_write_tools_invalidate(enabled_index, tree):
+    """索引を使った検索の結果が全走査と同じで、書き込みツールの変更が次の検索に反映されることをテストします。"""
+    expected = [f"{tree / 'pkg' / 'a.py'}:1: def load_config():"]
+    assert search_file_content.invoke({"pattern": "load_config", "path": str(tree)}).splitlines() == expected
+
+    index = search_index.get_search_index()
+    assert index.covers(str(tree / "pkg"))
+    path = tree / "pkg" / "b.py"
+    before = os.stat(path)
+    content = "def load_config():\n"
+    write_file.invoke({"path": str(path), "content": content + "#" * (before.st_size - len(content) - 1) + "\n"})
+    # 更新時刻とサイズが変わらない書き込みでも、ツールが索引を無効化するため新しい内容が検索される
+    os.utime(path, ns=(before.st_atime_ns, before.st_mtime_ns))
+    assert os.stat(path).st_size == before.st_size
+
+    result = search_file_content.invoke({"pattern": "load_config", "path": str(tree)})
+    assert f"{tree / 'pkg' / 'b.py'}:1: def load_config():" in result
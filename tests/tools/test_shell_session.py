@@ -0,0 +1,103 @@
+import sys
+import os
+import time
+from pathlib import Path
+import pytest
+
+# Add project root to sys.path to allow importing from src
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.config import Config
+from src.tools import shell_process, shell_session
+from src.tools.command_execution import run_shell_command
+from src.tools.shell_session import SessionManager, ShellSession
+
+pytestmark = pytest.mark.skipif(not shell_session.is_supported(), reason="bash がない環境ではセッションを使用しない")
+
+# --- Test Fixtures ---
+@pytest.fixture
+def sessions(monkeypatch):
+    """テストごとに新しいセッションの管理を使用し、終了時に全てのシェルを停止します。"""
+    manager = SessionManager(max_sessions=2)
+    monkeypatch.setattr(Config, "SHELL_SESSION", True)
+    monkeypatch.setattr("src.tools.command_execution.shell_sessions", manager)
+    yield manager
+    manager.close_all()
+
+def _run(command: str, thread_id: str, **args) -> str:
+    return run_shell_command.invoke({"command": command, **args}, config={"configurable": {"thread_id": thread_id}})
+
+# --- Test Cases ---
+
+def test_state_persists_per_thread(sessions, tmp_path):
+    """cd と export した状態が同じスレッドの次のコマンドに引き継がれ、別のスレッドには影響しないことをテストします。"""
+    _run(f"cd {tmp_path} && export AGENT_TEST_VALUE=42", "a")
+
+    result = _run("pwd; echo $AGENT_TEST_VALUE", "a")
+    assert f"Directory: {tmp_path}" in result
+    assert f"Stdout: {tmp_path}\n42\n" in result
+
+    assert "Stdout: \n" in _run("printf '%s' \"$AGENT_TEST_VALUE\"; echo", "b")
+    # cwd を指定した場合はそのコマンドのみをそのディレクトリで実行する
+    sub = tmp_path / "sub"
+    sub.mkdir()
+    assert f"Stdout: {sub}" in _run("pwd", "a", cwd=str(sub))
+    assert f"Stdout: {tmp_path}\n" in _run("pwd", "a")
+
+def test_exit_codes_output_and_syntax_errors(sessions):
+    """終了コード、末尾に改行のない出力、構文エラーがそれぞれ正しく扱われ、シェルが残ることをテストします。"""
+    result = _run("printf 'no newline'; echo err >&2; false", "a")
+    assert "Stdout: no newline\nStderr: err\n" in result
+    assert "Exit Code: 1" in result
+
+    assert "Exit Code: 2" in _run("if then fi", "a")
+    assert "Stdout: ok" in _run("cat <<'EOF'\nok\nEOF", "a")
+
+def test_session_restarts_after_exit_and_timeout(sessions, tmp_path, monkeypatch):
+    """exit やタイムアウトでシェルが終了した場合、次のコマンドは最後のディレクトリで起動した新しいシェルで実行されることをテストします。"""
+    monkeypatch.setattr(shell_process, "KILL_GRACE_SECONDS", 0.5)
+    _run(f"cd {tmp_path}", "a")
+
+    result = _run("exit 3", "a")
+    assert "Exit Code: 3" in result and "新しいシェル" in result
+    assert f"Stdout: {tmp_path}" in _run("pwd", "a")
+
+    result = _run("echo before; sleep 30", "a", timeout=0.5)
+    assert "Stdout: before" in result and "timed out" in result
+    assert "Stdout: after" in _run("echo after", "a")
+
+def test_least_recently_used_session_is_closed(sessions):
+    """セッション数が上限を超えた場合、最後に使用された時刻が古いセッションのシェルが終了することをテストします。"""
+    for thread_id in ("a", "b"):
+        _run("true", thread_id)
+    first = sessions.peek("a")
+    _run("true", "c")
+
+    assert sessions.peek("a") is None and first.process.poll() is not None
+    assert sessions.peek("b") is not None and sessions.peek("c") is not None
+
+def test_long_output_is_capped():
+    """セッションでも長い出力は先頭と末尾のみが保持されることをテストします。"""
+    session = ShellSession()
+    try:
+        result = session.run("seq 1 100000", None, None, 64, 64)
+    finally:
+        session.close()
+    assert result.returncode == 0
+    assert result.stdout.total_bytes == len("".join(f"{i}\n" for i in range(1, 100001)))
+    assert result.stdout.render().startswith("1\n2\n") and result.stdout.render().endswith("99999\n100000\n")
+
+def test_redirected_shell_output_does_not_hang(sessions, monkeypatch):
+    """コマンドがシェルの標準出力を付け替えた・閉じた場合も、待ち続けずにシェルを停止して起動し直すことをテストします。"""
+    monkeypatch.setattr(shell_process, "KILL_GRACE_SECONDS", 0.5)
+    for command in ("exec >/dev/null", "exec >&-"):
+        session = ShellSession()
+        try:
+            started = time.monotonic()
+            result = session.run(command, None, 2, 1024, 1024)
+            assert time.monotonic() - started < 5
+            assert result.restarted and session.process.poll() is not None
+            assert session.run("echo again", None, 2, 1024, 1024).stdout.render() == "again\n"
+        finally:
+            session.close()
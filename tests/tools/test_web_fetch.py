@@ -0,0 +1,154 @@
+import sys
+import os
+import asyncio
+import gzip
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+import pytest
+
+# Add project root to sys.path to allow importing from src
+project_root = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.config import Config
+from src.tools import http_client
+from src.tools.http_client import HttpCache
+from src.tools.web_fetch import detect_encoding, web_fetch
+
+# パスごとの (ヘッダー, 本文)。ETag を持つ応答は If-None-Match が一致すれば 304 を返す
+PAGES = {
+    "/etag": ({"Content-Type": "text/plain; charset=utf-8", "ETag": '"v1"'}, "キャッシュされる本文".encode("utf-8")),
+    "/sjis": ({"Content-Type": "text/html"}, '<html><head><meta charset="Shift_JIS"></head><body>日本語のページ</body></html>'.encode("cp932")),
+    "/eucjp": ({"Content-Type": "text/plain; charset=EUC-JP"}, "ヘッダーの文字コード".encode("euc_jp")),
+    "/large": ({"Content-Type": "text/plain"}, b"x" * 200_000),
+    "/article": ({"Content-Type": "text/html; charset=utf-8"}, (
+        "<html><head><title>記事</title><script>track()</script></head><body><nav><a href='/'>ホーム</a></nav>"
+        "<article><h2>見出し</h2>" + "<p>本文の段落です。詳しくは<a href='/more'>こちら</a>を参照してください。</p>" * 20 + "</article></body></html>"
+    ).encode("utf-8")),
+    "/nostore": ({"Content-Type": "text/plain", "ETag": '"v1"', "Cache-Control": "no-store"}, b"not stored"),
+}
+
+# --- Test Fixtures ---
+@pytest.fixture
+def server():
+    """テスト用のHTTPサーバーを起動し、(ベースURL, パスごとのリクエスト回数のリスト) を返します。"""
+    requests = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            requests.append((self.path, self.headers.get("If-None-Match")))
+            headers, body = PAGES[self.path]
+            if headers.get("ETag") and self.headers.get("If-None-Match") == headers["ETag"]:
+                self.send_response(304)
+                self.send_header("ETag", headers["ETag"])
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            if "gzip" in self.headers.get("Accept-Encoding", ""):
+                body = gzip.compress(body)
+                self.send_response(200)
+                self.send_header("Content-Encoding", "gzip")
+            else:
+                self.send_response(200)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}", requests
+    httpd.shutdown()
+    httpd.server_close()
+
+@pytest.fixture
+def cache(monkeypatch, tmp_path):
+    """テストごとに一時ディレクトリのキャッシュを使用します。"""
+    http_cache = HttpCache.from_path(str(tmp_path / "http_cache.sqlite"))
+    monkeypatch.setattr(http_client, "get_http_cache", lambda: http_cache)
+    monkeypatch.setattr("src.tools.web_fetch.get_http_cache", lambda: http_cache)
+    yield http_cache
+    http_cache.close()
+
+# --- Test Cases ---
+
+def test_conditional_get_uses_cache(server, cache):
+    """ETag のある応答を保存し、2回目は If-None-Match を送って 304 の場合に保存した本文を返すことをテストします。"""
+    base, requests = server
+    assert web_fetch.invoke({"url": base + "/etag"}) == "キャッシュされる本文"
+    assert web_fetch.invoke({"url": base + "/etag"}) == "キャッシュされる本文"
+    assert requests == [("/etag", None), ("/etag", '"v1"')]
+
+    result = http_client.fetch(base + "/etag", Config.WEB_FETCH_MAX_BYTES, cache)
+    assert result.cached == "revalidated"
+
+def test_no_store_is_not_cached(server, cache):
+    """Cache-Control: no-store の応答は保存せず、毎回条件なしで取得することをテストします。"""
+    base, requests = server
+    web_fetch.invoke({"url": base + "/nostore"})
+    web_fetch.invoke({"url": base + "/nostore"})
+    assert requests == [("/nostore", None), ("/nostore", None)]
+
+def test_gzip_and_max_bytes(server, cache, monkeypatch):
+    """gzip で圧縮された応答を展開し、上限を超えた本文は打ち切って注意書きを付けることをテストします。"""
+    base, _ = server
+    # 圧縮後の本文は数百バイトのため、上限は展開後の大きさに適用されている
+    result = http_client.fetch(base + "/large", 50_000, None)
+    assert result.body == b"x" * 50_000
+    assert result.truncated
+
+    full = http_client.fetch(base + "/large", 1_000_000, None)
+    assert len(full.body) == 200_000 and not full.truncated
+
+    monkeypatch.setattr(Config, "WEB_FETCH_MAX_BYTES", 1000)
+    text = web_fetch.invoke({"url": base + "/large"})
+    assert text.startswith("x" * 1000 + "\n\n[注意: 本文が上限 (1000 バイト)")
+
+def test_encoding_detection(server, cache):
+    """<meta charset> と Content-Type の charset から文字コードを判定することをテストします。"""
+    base, _ = server
+    assert "日本語のページ" in web_fetch.invoke({"url": base + "/sjis"})
+    assert web_fetch.invoke({"url": base + "/eucjp"}) == "ヘッダーの文字コード"
+
+    # ヘッダーは本文の判定より優先され、先頭で途切れた UTF-8 の文字は UTF-8 として扱う
+    assert detect_encoding("テスト".encode("utf-8"), "text/plain; charset=Shift_JIS") == "cp932"
+    assert detect_encoding("テスト".encode("utf-8")[:-1], None) == "utf-8"
+
+def test_async_fetch(server, cache):
+    """非同期版がイベントループごとのクライアントとキャッシュを使用し、aclose() でクライアントを閉じることをテストします。"""
+    base, requests = server
+
+    async def fetch_twice():
+        first = await web_fetch.ainvoke({"url": base + "/etag"})
+        second = await web_fetch.ainvoke({"url": base + "/etag"})
+        client = http_client.get_async_client()
+        await http_client.aclose()
+        assert client.is_closed and http_client.get_async_client() is not client
+        await http_client.aclose()
+        return first, second
+
+    assert asyncio.run(fetch_twice()) == ("キャッシュされる本文", "キャッシュされる本文")
+    assert requests[-1] == ("/etag", '"v1"')
+
+def test_html_is_extracted_unless_raw(server, cache, monkeypatch):
+    """HTML は本文を抜き出して Markdown 風にし、トークン数の上限で打ち切ること、raw=True では HTML をそのまま返すことをテストします。"""
+    base, _ = server
+    text = web_fetch.invoke({"url": base + "/article"})
+    assert text.startswith(f"# 記事\n\n## 見出し\n\n本文の段落です。詳しくは[こちら]({base}/more)を参照してください。")
+    assert "track()" not in text and "ホーム" not in text
+
+    monkeypatch.setattr(Config, "WEB_FETCH_MAX_TOKENS", 100)
+    text = web_fetch.invoke({"url": base + "/article"})
+    assert text.count("本文の段落です。") < 20
+    assert "[注意: 本文が上限 (100 トークン) を超えたため、以降を省略しました" in text
+
+    raw = web_fetch.invoke({"url": base + "/article", "raw": True})
+    assert raw.startswith("<html><head><title>記事</title><script>track()</script>")